@@ -11,6 +11,7 @@ from typing import List, Optional, Dict, Any
 import logging
 
 from core.auth.jwt import User, require_role
+from core.auth.unified import invalidate_user_cache
 from core.shared.unified_db_adapter import (
     get_unified_adapter,
     get_all_departments,
@@ -314,6 +315,7 @@ async def update_department(
         """, params)
 
         conn.commit()
+        invalidate_user_cache()  # afecta a todos los usuarios asignados
 
         # Fetch updated department
         cursor.execute("""
@@ -377,6 +379,7 @@ async def delete_department(
             raise HTTPException(status_code=404, detail="Department not found")
 
         conn.commit()
+        invalidate_user_cache()  # afecta a todos los usuarios asignados
         conn.close()
 
         return {"message": "Department deactivated successfully"}
@@ -12,6 +12,7 @@ import logging
 import json
 
 from core.auth.jwt import User, require_role
+from core.auth.unified import invalidate_user_cache
 from core.shared.unified_db_adapter import get_unified_adapter, get_all_roles
 
 router = APIRouter(prefix="/api/admin/roles", tags=["Admin - Roles"])
@@ -323,6 +324,7 @@ async def update_role(
         """, params)
 
         conn.commit()
+        invalidate_user_cache()  # afecta a todos los usuarios asignados
 
         # Fetch updated role
         cursor.execute("""
@@ -405,6 +407,7 @@ async def delete_role(
         """, (role_id,))
 
         conn.commit()
+        invalidate_user_cache()  # afecta a todos los usuarios asignados
         conn.close()
 
         return {"message": "Role deactivated successfully"}
@@ -12,6 +12,7 @@ from datetime import datetime
 import logging
 
 from core.auth.jwt import User, get_current_user, require_role
+from core.auth.unified import invalidate_user_cache
 from core.shared.unified_db_adapter import (
     get_unified_adapter,
     get_user_roles_with_details,
@@ -244,6 +245,7 @@ async def assign_role_to_user(
         """, (user_id, role_id, current_user.id, request.expires_at))
 
         conn.commit()
+        invalidate_user_cache(user_id)
         conn.close()
 
         return {
@@ -297,6 +299,7 @@ async def remove_role_from_user(
             raise HTTPException(status_code=404, detail="Role assignment not found")
 
         conn.commit()
+        invalidate_user_cache(user_id)
         conn.close()
 
         return {"message": f"Role '{role_name}' removed successfully"}
@@ -365,6 +368,7 @@ async def assign_department_to_user(
         """, (user_id, request.department_id, request.is_primary, current_user.id))
 
         conn.commit()
+        invalidate_user_cache(user_id)
         conn.close()
 
         return {
@@ -406,6 +410,7 @@ async def remove_department_from_user(
             raise HTTPException(status_code=404, detail="Department assignment not found")
 
         conn.commit()
+        invalidate_user_cache(user_id)
         conn.close()
 
         return {"message": "Department removed successfully"}
@@ -465,6 +470,7 @@ async def update_user(
             raise HTTPException(status_code=404, detail="User not found")
 
         conn.commit()
+        invalidate_user_cache(user_id)
         conn.close()
 
         return {"message": "User updated successfully", "user_id": user_id}
@@ -533,6 +539,7 @@ async def delete_user(
             raise HTTPException(status_code=404, detail="User not found")
 
         conn.commit()
+        invalidate_user_cache(user_id)
         conn.close()
 
         logger.info(f"User {user_id} deleted by admin {current_user.id}")
@@ -246,58 +246,57 @@ async def verificar_batch(
                 "total": 0
             }
 
-        # Verificar CFDIs
+        # Verificar CFDIs (concurrente, con rate limit, reintentos y cache de estatus)
         verifier = SATCFDIVerifier(use_mock=False)
 
+        # Un UUID repetido se consulta una sola vez, pero cada fila recibe su estatus
+        statuses = await verifier.averify_multiple_cfdis([
+            {
+                'uuid': cfdi['uuid'],
+                'rfc_emisor': cfdi['rfc_emisor'],
+                'rfc_receptor': cfdi['rfc_receptor'],
+                'total': float(cfdi['total'])
+            }
+            for cfdi in cfdis
+        ])
+
         verified_count = 0
         errors = []
 
         for cfdi in cfdis:
-            try:
-                success, status_info, error = verifier.check_cfdi_status(
-                    uuid=cfdi['uuid'],
-                    rfc_emisor=cfdi['rfc_emisor'],
-                    rfc_receptor=cfdi['rfc_receptor'],
-                    total=float(cfdi['total'])
-                )
-
-                if success:
-                    # Actualizar en BD
-                    cursor.execute("""
-                        UPDATE expense_invoices
-                        SET
-                            sat_status = %s,
-                            sat_codigo_estatus = %s,
-                            sat_es_cancelable = %s,
-                            sat_estado = %s,
-                            sat_validacion_efos = %s,
-                            sat_fecha_verificacion = %s,
-                            sat_verificacion_count = COALESCE(sat_verificacion_count, 0) + 1,
-                            updated_at = %s
-                        WHERE id = %s;
-                    """, (
-                        status_info['status'],
-                        status_info['codigo_estatus'],
-                        status_info['es_cancelable'],
-                        status_info['estado'],
-                        status_info['validacion_efos'],
-                        status_info['fecha_consulta'],
-                        datetime.utcnow(),
-                        cfdi['id']
-                    ))
-
-                    verified_count += 1
-                else:
-                    errors.append({
-                        'uuid': cfdi['uuid'],
-                        'error': error
-                    })
-
-            except Exception as e:
+            status_info = statuses[cfdi['uuid']]
+            if status_info.get('error'):
                 errors.append({
                     'uuid': cfdi['uuid'],
-                    'error': str(e)
+                    'error': status_info['error']
                 })
+                continue
+
+            # Actualizar en BD
+            cursor.execute("""
+                UPDATE expense_invoices
+                SET
+                    sat_status = %s,
+                    sat_codigo_estatus = %s,
+                    sat_es_cancelable = %s,
+                    sat_estado = %s,
+                    sat_validacion_efos = %s,
+                    sat_fecha_verificacion = %s,
+                    sat_verificacion_count = COALESCE(sat_verificacion_count, 0) + 1,
+                    updated_at = %s
+                WHERE id = %s;
+            """, (
+                status_info['status'],
+                status_info['codigo_estatus'],
+                status_info['es_cancelable'],
+                status_info['estado'],
+                status_info['validacion_efos'],
+                status_info['fecha_consulta'],
+                datetime.utcnow(),
+                cfdi['id']
+            ))
+
+            verified_count += 1
 
         conn.commit()
 
@@ -14,16 +14,47 @@ from core.reports.financial_reports_engine import FinancialReportsEngine
 
 router = APIRouter(prefix="/financial-intelligence", tags=["Financial Intelligence"])
 
+
+def _get_engine(
+    tenancy: TenancyContext,
+    account_ids: Optional[str] = None,
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+) -> FinancialReportsEngine:
+    """Motor acotado al tenant; los reportes se sirven desde su caché por versión de datos."""
+    accounts = None
+    if account_ids:
+        try:
+            accounts = [int(value) for value in account_ids.split(",") if value.strip()]
+        except ValueError:
+            raise HTTPException(status_code=400, detail="account_ids debe ser una lista de enteros separada por comas")
+    for value in (start_date, end_date):
+        if value:
+            try:
+                datetime.strptime(value, "%Y-%m-%d")
+            except ValueError:
+                raise HTTPException(status_code=400, detail=f"Fecha inválida: {value} (formato YYYY-MM-DD)")
+    return FinancialReportsEngine(
+        tenant_id=tenancy.tenant_id,
+        account_ids=accounts,
+        start_date=start_date,
+        end_date=end_date,
+    )
+
+
 @router.get("/tax-deductibility-report")
 async def get_tax_deductibility_report(
+    account_ids: Optional[str] = Query(None, description="Cuentas bancarias separadas por coma (default: configuradas)"),
+    start_date: Optional[str] = Query(None, description="Inicio del periodo YYYY-MM-DD"),
+    end_date: Optional[str] = Query(None, description="Fin del periodo YYYY-MM-DD"),
     current_user: User = Depends(get_current_active_user),
     tenancy: TenancyContext = Depends(get_tenancy_context)
 ) -> Dict[str, Any]:
     """
     Obtiene reporte de deducibilidad fiscal automático
     """
+    engine = _get_engine(tenancy, account_ids, start_date, end_date)
     try:
-        engine = FinancialReportsEngine()
         report = engine.generate_tax_deductibility_report()
 
         return {
@@ -37,14 +68,17 @@ async def get_tax_deductibility_report(
 
 @router.get("/cash-flow-analysis")
 async def get_cash_flow_analysis(
+    account_ids: Optional[str] = Query(None, description="Cuentas bancarias separadas por coma (default: configuradas)"),
+    start_date: Optional[str] = Query(None, description="Inicio del periodo YYYY-MM-DD"),
+    end_date: Optional[str] = Query(None, description="Fin del periodo YYYY-MM-DD"),
     current_user: User = Depends(get_current_active_user),
     tenancy: TenancyContext = Depends(get_tenancy_context)
 ) -> Dict[str, Any]:
     """
     Obtiene análisis de flujo de efectivo
     """
+    engine = _get_engine(tenancy, account_ids, start_date, end_date)
     try:
-        engine = FinancialReportsEngine()
         analysis = engine.generate_cash_flow_analysis()
 
         return {
@@ -58,6 +92,9 @@ async def get_cash_flow_analysis(
 
 @router.get("/financial-insights")
 async def get_financial_insights(
+    account_ids: Optional[str] = Query(None, description="Cuentas bancarias separadas por coma (default: configuradas)"),
+    start_date: Optional[str] = Query(None, description="Inicio del periodo YYYY-MM-DD"),
+    end_date: Optional[str] = Query(None, description="Fin del periodo YYYY-MM-DD"),
     severity: Optional[str] = Query(None, description="Filter by severity: info, warning, critical"),
     current_user: User = Depends(get_current_active_user),
     tenancy: TenancyContext = Depends(get_tenancy_context)
@@ -65,8 +102,8 @@ async def get_financial_insights(
     """
     Obtiene insights financieros y anomalías detectadas
     """
+    engine = _get_engine(tenancy, account_ids, start_date, end_date)
     try:
-        engine = FinancialReportsEngine()
         insights = engine.detect_financial_anomalies()
 
         # Filtrar por severidad si se especifica
@@ -93,14 +130,17 @@ async def get_financial_insights(
 
 @router.get("/optimization-suggestions")
 async def get_optimization_suggestions(
+    account_ids: Optional[str] = Query(None, description="Cuentas bancarias separadas por coma (default: configuradas)"),
+    start_date: Optional[str] = Query(None, description="Inicio del periodo YYYY-MM-DD"),
+    end_date: Optional[str] = Query(None, description="Fin del periodo YYYY-MM-DD"),
     current_user: User = Depends(get_current_active_user),
     tenancy: TenancyContext = Depends(get_tenancy_context)
 ) -> Dict[str, Any]:
     """
     Obtiene sugerencias de optimización de gastos
     """
+    engine = _get_engine(tenancy, account_ids, start_date, end_date)
     try:
-        engine = FinancialReportsEngine()
         suggestions = engine.generate_expense_optimization_suggestions()
 
         total_potential_savings = sum(s.get('potential_savings', 0) for s in suggestions)
@@ -121,14 +161,17 @@ async def get_optimization_suggestions(
 
 @router.get("/comprehensive-report")
 async def get_comprehensive_financial_report(
+    account_ids: Optional[str] = Query(None, description="Cuentas bancarias separadas por coma (default: configuradas)"),
+    start_date: Optional[str] = Query(None, description="Inicio del periodo YYYY-MM-DD"),
+    end_date: Optional[str] = Query(None, description="Fin del periodo YYYY-MM-DD"),
     current_user: User = Depends(get_current_active_user),
     tenancy: TenancyContext = Depends(get_tenancy_context)
 ) -> Dict[str, Any]:
     """
     Obtiene reporte financiero comprensivo con todos los análisis
     """
+    engine = _get_engine(tenancy, account_ids, start_date, end_date)
     try:
-        engine = FinancialReportsEngine()
         comprehensive_report = engine.generate_comprehensive_financial_report()
 
         return {
@@ -152,4 +152,23 @@ async def debug_health_check():
         "debug_enabled": os.getenv("AUTOMATION_DEBUG", "false").lower() == "true",
         "version": "1.0.0",
         "api": "debug-v1"
-    }
\ No newline at end of file
+    }
+
+
+@router.get("/db-pool")
+async def get_db_pool_metrics(deps=Depends(check_debug_access)):
+    """
+    Connection pool metrics (size, waiters, checkout latency) of the unified DB adapter
+    """
+    from core.shared.unified_db_adapter import get_postgres_pool_metrics
+
+    return {"pools": get_postgres_pool_metrics()}
+
+@router.get("/db-queries")
+async def get_db_query_stats(limit: int = 20, deps=Depends(check_debug_access)):
+    """
+    Hottest SQL statements (call count, cumulative time) seen by the PostgreSQL compat cursor
+    """
+    from core.shared.unified_db_adapter import get_query_stats
+
+    return get_query_stats(limit)
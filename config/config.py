@@ -43,6 +43,18 @@ class Config:
     PG_USER = os.getenv("PG_USER", "postgres")
     PG_PASSWORD = os.getenv("PG_PASSWORD", "")
 
+    # PostgreSQL connection pool (UnifiedDBAdapter)
+    PG_POOL_MAX_SIZE = int(os.getenv("PG_POOL_MAX_SIZE", "10"))
+    PG_POOL_MAX_WAIT_SECONDS = float(os.getenv("PG_POOL_MAX_WAIT_SECONDS", "10"))
+    PG_POOL_MAX_LIFETIME_SECONDS = float(os.getenv("PG_POOL_MAX_LIFETIME_SECONDS", "1800"))
+    PG_POOL_IDLE_TIMEOUT_SECONDS = float(os.getenv("PG_POOL_IDLE_TIMEOUT_SECONDS", "300"))
+    PG_POOL_PING_AFTER_SECONDS = float(os.getenv("PG_POOL_PING_AFTER_SECONDS", "10"))
+
+    # PostgresCompatCursor: cache de traducción SQLite -> psycopg2 y sentencias preparadas
+    PG_QUERY_CACHE_SIZE = int(os.getenv("PG_QUERY_CACHE_SIZE", "1024"))
+    PG_PREPARED_STATEMENTS = os.getenv("PG_PREPARED_STATEMENTS", "false").lower() == "true"
+    PG_PREPARE_THRESHOLD = int(os.getenv("PG_PREPARE_THRESHOLD", "50"))
+
     # External system credentials (placeholders for now)
     # Odoo Configuration
     ODOO_URL = os.getenv("ODOO_URL", "https://your-odoo-instance.com")
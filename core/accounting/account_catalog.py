@@ -12,12 +12,12 @@ from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
 import numpy as np
 import psycopg2
 
-try:
-    from sentence_transformers import SentenceTransformer
-except ImportError:  # pragma: no cover - optional dependency
-    SentenceTransformer = None  # type: ignore
-
 from config.config import config
+from core.shared.embedding_service import (
+    EmbeddingService,
+    get_embedding_service,
+    sentence_transformers_available,
+)
 from core.shared.text_normalizer import normalize_expense_text
 from core.sat_utils import extract_family_code
 
@@ -62,8 +62,8 @@ def _load_context_cache() -> Dict[str, Dict[str, Any]]:
 
 
 @lru_cache(maxsize=1)
-def _load_sentence_model() -> Optional[SentenceTransformer]:
-    if SentenceTransformer is None:
+def _load_embedding_service() -> Optional[EmbeddingService]:
+    if not sentence_transformers_available():
         logger.warning("sentence-transformers not installed; falling back to keyword retrieval.")
         return None
 
@@ -88,9 +88,10 @@ def _load_sentence_model() -> Optional[SentenceTransformer]:
             ordered_candidates.append(candidate)
 
     for candidate in ordered_candidates:
+        service = get_embedding_service(candidate)
         try:
-            model = SentenceTransformer(candidate)
-            return model
+            service.model  # carga compartida por proceso
+            return service
         except Exception as exc:  # pragma: no cover - defensive logging
             logger.warning("Unable to load embedding model from %s: %s", candidate, exc)
 
@@ -278,8 +279,8 @@ def _normalize_text(value: Optional[str]) -> str:
 
 
 def _build_query_embedding(expense_payload: Dict[str, Any]) -> Optional[np.ndarray]:
-    model = _load_sentence_model()
-    if model is None:
+    service = _load_embedding_service()
+    if service is None:
         return None
 
     fields = [
@@ -309,9 +310,8 @@ def _build_query_embedding(expense_payload: Dict[str, Any]) -> Optional[np.ndarr
     normalize_embeddings = bool(metadata.get("normalize_embeddings", True))
 
     try:
-        vector = model.encode(
+        vector = service.encode(
             [text],
-            convert_to_numpy=True,
             normalize_embeddings=normalize_embeddings,
         )
     except Exception as exc:  # pragma: no cover - defensive logging
@@ -4,6 +4,11 @@ This module stores human corrections to AI classifications so that future bank
 statement parses can immediately benefit from prior feedback. It uses a
 pgvector-compatible schema but gracefully degrades to JSON-stored embeddings
 when running on SQLite during local development.
+
+Retrieval is served from a per-company in-memory index (a NumPy matrix of the
+stored vectors plus the result columns). It is built lazily, extended in place
+by ``store_correction_feedback`` and by a cheap row-count check for writes made
+by other processes, and answers a whole statement with one matrix multiply.
 """
 
 from __future__ import annotations
@@ -13,12 +18,15 @@ import logging
 import math
 import os
 import sqlite3
+import threading
 from contextlib import contextmanager
 from dataclasses import dataclass
 from hashlib import sha512
 from pathlib import Path
 from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
 
+import numpy as np
+
 from config.config import config
 from core.reconciliation.bank.bank_statements_models import normalize_description
 
@@ -213,6 +221,22 @@ def store_correction_feedback(
             ),
         )
         record_id = cursor.lastrowid
+        cursor.execute("SELECT created_at FROM ai_correction_memory WHERE id = ?", (record_id,))
+        created_at = cursor.fetchone()["created_at"]
+
+    _record_in_index(
+        company_id,
+        {
+            "id": record_id,
+            "corrected_category": corrected_category,
+            "original_description": description.strip(),
+            "notes": notes,
+            "movement_kind": movement_kind,
+            "amount": amount,
+            "created_at": created_at,
+        },
+        embedding,
+    )
 
     logger.info(
         "Stored correction feedback id=%s company=%s original='%s' -> category='%s'",
@@ -229,51 +253,216 @@ def store_correction_feedback(
     }
 
 
-def _fetch_corrections(company_id: int, limit: int = 250) -> List[CorrectionRecord]:
-    with _get_connection() as conn:
+# ---------------------------------------------------------------------------
+# Per-company correction index
+# ---------------------------------------------------------------------------
+
+# Result columns kept in memory next to the vector matrix
+_INDEX_COLUMNS = (
+    "id",
+    "corrected_category",
+    "original_description",
+    "notes",
+    "movement_kind",
+    "amount",
+    "created_at",
+)
+
+
+class _CorrectionIndex:
+    """Unit-normalized correction vectors of one company plus their result columns.
+
+    Rows are kept oldest first. Ties are resolved towards the newest row, matching
+    the previous ``ORDER BY created_at DESC, id DESC`` scan.
+    """
+
+    def __init__(self, company_id: int):
+        self.company_id = company_id
+        self.dimensions: Optional[int] = None
+        self._vectors = np.zeros((0, 0), dtype=np.float64)
+        self.size = 0
+        self.max_id = 0
+        self.rows: List[Dict[str, Any]] = []
+        self.lock = threading.RLock()
+
+    @property
+    def vectors(self) -> np.ndarray:
+        return self._vectors[: self.size]
+
+    def reset(self) -> None:
+        self.dimensions = None
+        self._vectors = np.zeros((0, 0), dtype=np.float64)
+        self.size = 0
+        self.max_id = 0
+        self.rows = []
+
+    def append(self, rows: List[Dict[str, Any]], embeddings: List[Sequence[float]]) -> None:
+        if not rows:
+            return
+        if self.dimensions is None:
+            self.dimensions = len(embeddings[0])
+            self._vectors = np.zeros((max(64, len(rows)), self.dimensions), dtype=np.float64)
+
+        needed = self.size + len(rows)
+        if needed > self._vectors.shape[0]:
+            grown = np.zeros((max(needed, self._vectors.shape[0] * 2), self.dimensions), dtype=np.float64)
+            grown[: self.size] = self._vectors[: self.size]
+            self._vectors = grown
+
+        block = np.zeros((len(rows), self.dimensions), dtype=np.float64)
+        for position, embedding in enumerate(embeddings):
+            # Vectors of another size never matched before (similarity 0): keep a zero row
+            if len(embedding) == self.dimensions:
+                block[position] = embedding
+        norms = np.linalg.norm(block, axis=1, keepdims=True)
+        np.divide(block, norms, out=block, where=norms > 0)
+
+        self._vectors[self.size : needed] = block
+        self.size = needed
+        self.rows.extend(rows)
+        self.max_id = max(self.max_id, max(row["id"] for row in rows))
+
+    def similarities(self, queries: np.ndarray) -> np.ndarray:
+        """Cosine similarity of each query row against every stored correction."""
+        if not self.size or queries.shape[1] != self.dimensions:
+            return np.zeros((queries.shape[0], self.size))
+        norms = np.linalg.norm(queries, axis=1, keepdims=True)
+        unit = np.divide(queries, norms, out=np.zeros_like(queries), where=norms > 0)
+        # Newest first so that argmax/stable sorts prefer recent corrections on ties
+        return (unit @ self.vectors.T)[:, ::-1]
+
+    def row_newest_first(self, position: int) -> Dict[str, Any]:
+        return self.rows[self.size - 1 - position]
+
+
+_indexes: Dict[Tuple[str, int], _CorrectionIndex] = {}
+_indexes_lock = threading.Lock()
+
+
+def _index_key(company_id: int) -> Tuple[str, int]:
+    return (str(_get_db_path()), int(company_id))
+
+
+def _load_rows(conn: sqlite3.Connection, company_id: int, after_id: int = 0):
+    cursor = conn.cursor()
+    cursor.execute(
+        f"""
+        SELECT {", ".join(_INDEX_COLUMNS)}, embedding_json
+        FROM ai_correction_memory
+        WHERE company_id = ? AND id > ?
+        ORDER BY datetime(created_at) ASC, id ASC
+        """,
+        (company_id, after_id),
+    )
+    rows, embeddings = [], []
+    for row in cursor.fetchall():
+        rows.append({column: row[column] for column in _INDEX_COLUMNS})
+        embeddings.append(json.loads(row["embedding_json"] or "[]"))
+    return rows, embeddings
+
+
+def _get_index(company_id: int) -> _CorrectionIndex:
+    """Return the company index, loading only rows written since the last call."""
+    key = _index_key(company_id)
+    with _indexes_lock:
+        index = _indexes.get(key)
+        if index is None:
+            index = _indexes[key] = _CorrectionIndex(company_id)
+
+    with index.lock, _get_connection() as conn:
         cursor = conn.cursor()
         cursor.execute(
-            """
-            SELECT *
-            FROM ai_correction_memory
-            WHERE company_id = ?
-            ORDER BY datetime(created_at) DESC, id DESC
-            LIMIT ?
-            """,
-            (company_id, limit),
-        )
-        rows = cursor.fetchall()
-
-    corrections: List[CorrectionRecord] = []
-    for row in rows:
-        embedding = json.loads(row["embedding_json"] or "[]")
-        try:
-            raw_txn = json.loads(row["raw_transaction"] or "{}")
-        except json.JSONDecodeError:
-            raw_txn = {}
-
-        corrections.append(
-            CorrectionRecord(
-                id=row["id"],
-                company_id=row["company_id"],
-                tenant_id=row["tenant_id"],
-                user_id=row["user_id"],
-                original_description=row["original_description"],
-                normalized_description=row["normalized_description"],
-                ai_category=row["ai_category"],
-                corrected_category=row["corrected_category"],
-                movement_kind=row["movement_kind"],
-                amount=row["amount"],
-                model_used=row["model_used"],
-                notes=row["notes"],
-                raw_transaction=raw_txn,
-                embedding=embedding,
-                similarity_hint=row["similarity_hint"],
-                created_at=row["created_at"],
-            )
+            "SELECT COUNT(*) AS total, MAX(id) AS max_id FROM ai_correction_memory WHERE company_id = ?",
+            (company_id,),
         )
+        state = cursor.fetchone()
+        total, max_id = state["total"], state["max_id"] or 0
+        if total == index.size and max_id == index.max_id:
+            return index
+
+        rows, embeddings = _load_rows(conn, company_id, index.max_id)
+        if index.size + len(rows) != total:
+            # Rows deleted or written out of order by another process: rebuild
+            index.reset()
+            rows, embeddings = _load_rows(conn, company_id)
+        index.append(rows, embeddings)
+        logger.debug("Correction index company=%s now holds %s rows", company_id, index.size)
+    return index
+
+
+def _record_in_index(company_id: int, row: Dict[str, Any], embedding: List[float]) -> None:
+    """Append a freshly stored correction to an already loaded index."""
+    index = _indexes.get(_index_key(company_id))
+    if index is None:
+        return  # Built lazily on the next query
+    with index.lock:
+        if row["id"] > index.max_id:
+            index.append([row], [embedding])
+
+
+def invalidate_correction_index(company_id: Optional[int] = None) -> None:
+    """Drop cached indexes (all companies when ``company_id`` is None)."""
+    with _indexes_lock:
+        if company_id is None:
+            _indexes.clear()
+        else:
+            _indexes.pop(_index_key(company_id), None)
+
+
+def _query_matrix(descriptions: Sequence[str]) -> Tuple[np.ndarray, List[int]]:
+    """Embed the non-empty normalized descriptions; return matrix and their positions."""
+    vectors, positions = [], []
+    for position, description in enumerate(descriptions):
+        description = description or ""
+        normalized = normalize_description(description) or description.strip().lower()
+        if normalized:
+            vectors.append(_compute_embedding(normalized))
+            positions.append(position)
+    if not vectors:
+        return np.zeros((0, 0)), positions
+    return np.asarray(vectors, dtype=np.float64), positions
+
+
+def _result_row(row: Dict[str, Any], similarity: float) -> Dict[str, Any]:
+    return {
+        "id": row["id"],
+        "similarity": round(float(similarity), 4),
+        "corrected_category": row["corrected_category"],
+        "original_description": row["original_description"],
+        "notes": row["notes"],
+        "movement_kind": row["movement_kind"],
+        "amount": row["amount"],
+        "created_at": row["created_at"],
+    }
+
 
-    return corrections
+def find_similar_corrections_batch(
+    *,
+    company_id: int,
+    descriptions: Sequence[str],
+    top_k: int = 3,
+) -> List[List[Dict[str, Any]]]:
+    """Return top-k similar corrections for each description with one matrix multiply."""
+
+    results: List[List[Dict[str, Any]]] = [[] for _ in descriptions]
+    if company_id is None or not descriptions:
+        return results
+
+    queries, positions = _query_matrix(descriptions)
+    if not positions:
+        return results
+
+    index = _get_index(company_id)
+    with index.lock:
+        if not index.size:
+            return results
+        scores = index.similarities(queries)
+        for row_scores, position in zip(scores, positions):
+            order = np.argsort(-row_scores, kind="stable")[:top_k]
+            results[position] = [
+                _result_row(index.row_newest_first(i), row_scores[i]) for i in order
+            ]
+    return results
 
 
 def find_similar_corrections(
@@ -287,33 +476,9 @@ def find_similar_corrections(
     if company_id is None or not description:
         return []
 
-    normalized = normalize_description(description) or description.strip().lower()
-    query_vector = _compute_embedding(normalized)
-    corrections = _fetch_corrections(company_id)
-
-    scored: List[Tuple[float, CorrectionRecord]] = []
-    for record in corrections:
-        similarity = _cosine_similarity(query_vector, record.embedding)
-        scored.append((similarity, record))
-
-    scored.sort(key=lambda item: item[0], reverse=True)
-
-    results: List[Dict[str, Any]] = []
-    for similarity, record in scored[:top_k]:
-        results.append(
-            {
-                "id": record.id,
-                "similarity": round(float(similarity), 4),
-                "corrected_category": record.corrected_category,
-                "original_description": record.original_description,
-                "notes": record.notes,
-                "movement_kind": record.movement_kind,
-                "amount": record.amount,
-                "created_at": record.created_at,
-            }
-        )
-
-    return results
+    return find_similar_corrections_batch(
+        company_id=company_id, descriptions=[description], top_k=top_k
+    )[0]
 
 
 def apply_corrections_to_transactions(
@@ -328,39 +493,39 @@ def apply_corrections_to_transactions(
     if company_id is None or not transactions:
         return []
 
-    corrections = _fetch_corrections(company_id)
-    if not corrections:
+    descriptions = [getattr(txn, "description", None) or "" for txn in transactions]
+    queries, positions = _query_matrix(descriptions)
+    if not positions:
         return []
 
-    updates: List[Dict[str, Any]] = []
-
-    for txn in transactions:
-        description = getattr(txn, "description", None) or ""
-        normalized = normalize_description(description) or description.strip().lower()
-        if not normalized:
-            continue
-
-        query_vector = _compute_embedding(normalized)
-        best_similarity = 0.0
-        best_record: Optional[CorrectionRecord] = None
+    index = _get_index(company_id)
+    with index.lock:
+        if not index.size:
+            return []
+        scores = index.similarities(queries)
+        best_positions = scores.argmax(axis=1)
+        matches = [
+            (position, float(row_scores[best]), index.row_newest_first(best))
+            for position, row_scores, best in zip(positions, scores, best_positions)
+        ]
 
-        for record in corrections:
-            similarity = _cosine_similarity(query_vector, record.embedding)
-            if similarity > best_similarity:
-                best_similarity = similarity
-                best_record = record
+    updates: List[Dict[str, Any]] = []
 
-        if not best_record or best_similarity < similarity_threshold:
+    for position, best_similarity, best_record in matches:
+        # Non-positive scores never beat the previous 0.0 starting point
+        if best_similarity <= 0 or best_similarity < similarity_threshold:
             continue
 
+        txn = transactions[position]
+        description = descriptions[position]
         original_category = getattr(txn, "category", None)
-        if original_category == best_record.corrected_category:
+        if original_category == best_record["corrected_category"]:
             continue
 
-        txn.category = best_record.corrected_category
-        if best_record.movement_kind:
+        txn.category = best_record["corrected_category"]
+        if best_record["movement_kind"]:
             try:
-                txn.movement_kind = best_record.movement_kind
+                txn.movement_kind = best_record["movement_kind"]
             except AttributeError:
                 pass
         txn.ai_model = f"{getattr(txn, 'ai_model', '')}+local-correction".strip("+")
@@ -370,9 +535,9 @@ def apply_corrections_to_transactions(
             {
                 "transaction_description": description[:80],
                 "original_category": original_category,
-                "corrected_category": best_record.corrected_category,
+                "corrected_category": best_record["corrected_category"],
                 "similarity": round(float(best_similarity), 4),
-                "correction_id": best_record.id,
+                "correction_id": best_record["id"],
             }
         )
 
@@ -436,7 +601,9 @@ def aggregate_correction_stats(company_id: int) -> Dict[str, Any]:
 __all__ = [
     "store_correction_feedback",
     "find_similar_corrections",
+    "find_similar_corrections_batch",
     "apply_corrections_to_transactions",
+    "invalidate_correction_index",
     "aggregate_correction_stats",
 ]
 
@@ -17,28 +17,22 @@ import logging
 import numpy as np
 from typing import Dict, Any, List, Optional, Tuple
 from dataclasses import dataclass
-from sentence_transformers import SentenceTransformer
 from core.shared.db_config import get_connection
+from core.shared.embedding_service import get_embedding_service
 
 logger = logging.getLogger(__name__)
 
-# Global model instance (loaded once on first use)
-_embedding_model: Optional[SentenceTransformer] = None
+EMBEDDING_MODEL_NAME = 'paraphrase-multilingual-MiniLM-L12-v2'
 
 
-def get_embedding_model() -> SentenceTransformer:
+def get_embedding_model():
     """
-    Get or initialize the embedding model (singleton pattern).
+    Get the shared embedding model (loaded once per process).
 
     Returns:
         SentenceTransformer model for generating 384-dim embeddings
     """
-    global _embedding_model
-    if _embedding_model is None:
-        logger.info("Loading sentence transformer model: paraphrase-multilingual-MiniLM-L12-v2")
-        _embedding_model = SentenceTransformer('paraphrase-multilingual-MiniLM-L12-v2')
-        logger.info("Sentence transformer model loaded successfully")
-    return _embedding_model
+    return get_embedding_service(EMBEDDING_MODEL_NAME).model
 
 
 @dataclass
@@ -74,8 +68,7 @@ def generate_invoice_embedding(
     # Combine emisor + concepto for semantic representation
     text = f"{nombre_emisor} - {concepto}".strip()
 
-    model = get_embedding_model()
-    embedding = model.encode(text, convert_to_numpy=True)
+    embedding = get_embedding_service(EMBEDDING_MODEL_NAME).encode(text)
 
     return embedding
 
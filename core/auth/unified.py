@@ -12,11 +12,15 @@ from passlib.context import CryptContext
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from pydantic import BaseModel, EmailStr, ConfigDict
+import asyncio
 import logging
 import hashlib
 import secrets
 import json
 import sqlite3
+import threading
+import time
+from collections import OrderedDict
 
 from core.shared.unified_db_adapter import get_unified_adapter
 from core.ai.ai_context_memory_service import analyze_and_store_context
@@ -35,6 +39,9 @@ if not SECRET_KEY and ENVIRONMENT in {"development", "local", "test", "testing"}
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "30"))
 REFRESH_TOKEN_EXPIRE_DAYS = int(os.getenv("REFRESH_TOKEN_EXPIRE_DAYS", "7"))
+# Caché de usuarios autenticados (get_current_user)
+AUTH_USER_CACHE_TTL_SECONDS = float(os.getenv("AUTH_USER_CACHE_TTL_SECONDS", "30"))
+AUTH_USER_CACHE_MAX_ENTRIES = int(os.getenv("AUTH_USER_CACHE_MAX_ENTRIES", "10000"))
 
 # Password hashing configuration
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
@@ -187,6 +194,7 @@ class TokenData(BaseModel):
     email: Optional[str] = None
     user_id: Optional[int] = None
     tenant_id: Optional[int] = None
+    jti: Optional[str] = None
 
 class LoginRequest(BaseModel):
     email: EmailStr
@@ -513,8 +521,8 @@ def create_refresh_token(data: Dict[str, Any]) -> str:
 
     return encoded_jwt
 
-def decode_token(token: str) -> TokenData:
-    """Decodificar y validar JWT token"""
+def _decode_claims(token: str) -> TokenData:
+    """Decodificar JWT sin tocar la BD (``user_id`` puede quedar vacío)"""
     # Handle demo token special case
     if token == "demo_token":
         return TokenData(email="demo@example.com", user_id=999, tenant_id=1)
@@ -526,45 +534,6 @@ def decode_token(token: str) -> TokenData:
             algorithms=[ALGORITHM],
             options={"verify_sub": False}
         )
-
-        raw_sub = payload.get("sub")
-        email: Optional[str] = None
-        user_id: Optional[int] = payload.get("user_id")
-        tenant_id: Optional[int] = payload.get("tenant_id")
-
-        # Attempt to derive values from new JWT structure (core.auth_jwt)
-        if isinstance(raw_sub, str) and "@" in raw_sub:
-            email = raw_sub
-        if isinstance(raw_sub, int):
-            user_id = user_id or raw_sub
-        elif isinstance(raw_sub, str):
-            try:
-                user_id = user_id or int(raw_sub)
-            except ValueError:
-                pass
-
-        # Fallback to explicit username/email fields present in new JWTs
-        if email is None:
-            username = payload.get("username") or payload.get("email")
-            if isinstance(username, str):
-                email = username
-
-        # If still missing user_id, try resolving it from the database using email
-        if user_id is None and email:
-            user = get_user_by_email(email)
-            if user:
-                user_id = user.id
-                tenant_id = tenant_id or user.tenant_id
-
-        if user_id is None or email is None:
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Invalid token",
-                headers={"WWW-Authenticate": "Bearer"},
-            )
-
-        return TokenData(email=email, user_id=user_id, tenant_id=tenant_id)
-
     except JWTError as e:
         logger.error(f"JWT decode error: {e}")
         raise HTTPException(
@@ -573,6 +542,159 @@ def decode_token(token: str) -> TokenData:
             headers={"WWW-Authenticate": "Bearer"},
         )
 
+    raw_sub = payload.get("sub")
+    email: Optional[str] = None
+    user_id: Optional[int] = payload.get("user_id")
+    tenant_id: Optional[int] = payload.get("tenant_id")
+
+    # Attempt to derive values from new JWT structure (core.auth_jwt)
+    if isinstance(raw_sub, str) and "@" in raw_sub:
+        email = raw_sub
+    if isinstance(raw_sub, int):
+        user_id = user_id or raw_sub
+    elif isinstance(raw_sub, str):
+        try:
+            user_id = user_id or int(raw_sub)
+        except ValueError:
+            pass
+
+    # Fallback to explicit username/email fields present in new JWTs
+    if email is None:
+        username = payload.get("username") or payload.get("email")
+        if isinstance(username, str):
+            email = username
+
+    jti = payload.get("jti")
+    return TokenData(email=email, user_id=user_id, tenant_id=tenant_id, jti=jti if isinstance(jti, str) else None)
+
+
+def _invalid_token() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Invalid token",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+
+
+def decode_token(token: str) -> TokenData:
+    """Decodificar y validar JWT token"""
+    token_data = _decode_claims(token)
+
+    # If still missing user_id, try resolving it from the database using email
+    if token_data.user_id is None and token_data.email:
+        user = get_user_by_email(token_data.email)
+        if user:
+            token_data.user_id = user.id
+            token_data.tenant_id = token_data.tenant_id or user.tenant_id
+
+    if token_data.user_id is None or token_data.email is None:
+        raise _invalid_token()
+
+    return token_data
+
+
+class _AuthUserCache:
+    """
+    Caché LRU con TTL corto de usuarios autenticados.
+
+    Las llaves son ``(user_id, jti)``; un índice por usuario y otro por jti
+    permiten invalidar todas las entradas de un usuario (cambios de login,
+    roles o departamentos) o de un token revocado.
+    """
+
+    def __init__(self, ttl_seconds: float = AUTH_USER_CACHE_TTL_SECONDS,
+                 max_entries: int = AUTH_USER_CACHE_MAX_ENTRIES):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Tuple[int, Optional[str]], Tuple[float, UserInDB]]" = OrderedDict()
+        self._by_user: Dict[int, set] = {}
+        self._by_jti: Dict[str, set] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def get(self, user_id: int, jti: Optional[str] = None) -> Optional[UserInDB]:
+        key = (user_id, jti)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    self._remove(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, user: UserInDB, jti: Optional[str] = None) -> None:
+        if self.ttl_seconds <= 0 or self.max_entries <= 0:
+            return
+        key = (user.id, jti)
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, user)
+            self._entries.move_to_end(key)
+            self._by_user.setdefault(user.id, set()).add(key)
+            if jti:
+                self._by_jti.setdefault(jti, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+
+    def _remove(self, key: Tuple[int, Optional[str]]) -> None:
+        self._entries.pop(key, None)
+        user_id, jti = key
+        for index, index_key in ((self._by_user, user_id), (self._by_jti, jti)):
+            keys = index.get(index_key)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del index[index_key]
+
+    def invalidate_user(self, user_id: int) -> None:
+        with self._lock:
+            for key in list(self._by_user.get(user_id, ())):
+                self._remove(key)
+            self.invalidations += 1
+
+    def invalidate_token(self, jti: str) -> None:
+        with self._lock:
+            for key in list(self._by_jti.get(jti, ())):
+                self._remove(key)
+            self.invalidations += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._by_user.clear()
+            self._by_jti.clear()
+            self.invalidations += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0,
+            "invalidations": self.invalidations,
+            "ttl_seconds": self.ttl_seconds,
+        }
+
+
+_user_cache = _AuthUserCache()
+
+
+def invalidate_user_cache(user_id: Optional[int] = None) -> None:
+    """Invalidar el caché de get_current_user para un usuario (o todo si es None)"""
+    if user_id is None:
+        _user_cache.clear()
+    else:
+        _user_cache.invalidate_user(user_id)
+
+
+def get_user_cache_stats() -> Dict[str, Any]:
+    return _user_cache.get_stats()
+
 # Database integration functions
 def get_user_by_email(email: str) -> Optional[UserInDB]:
     """Obtener usuario por email desde BD unificada"""
@@ -732,6 +854,8 @@ def increment_failed_attempts(user_id: int):
 
     except Exception as e:
         logger.error(f"Error incrementing failed attempts: {e}")
+    finally:
+        _user_cache.invalidate_user(user_id)
 
 def update_successful_login(user_id: int):
     """Actualizar último login exitoso"""
@@ -750,6 +874,8 @@ def update_successful_login(user_id: int):
 
     except Exception as e:
         logger.error(f"Error updating successful login: {e}")
+    finally:
+        _user_cache.invalidate_user(user_id)
 
 def create_tenant(
     company_name: str,
@@ -1056,11 +1182,34 @@ def revoke_refresh_token(refresh_token: str):
     except Exception as e:
         logger.error(f"Error revoking refresh token: {e}")
 
+    # Sacar del caché al dueño del token (claims sin verificar: solo se usan para invalidar)
+    try:
+        claims = jwt.get_unverified_claims(refresh_token)
+    except JWTError:
+        return
+    user_id = claims.get("user_id")
+    if isinstance(user_id, int):
+        _user_cache.invalidate_user(user_id)
+    if isinstance(claims.get("jti"), str):
+        _user_cache.invalidate_token(claims["jti"])
+
 # Dependency functions
 async def get_current_user(token: str = Depends(oauth2_scheme)) -> UserInDB:
-    """Obtener usuario actual autenticado"""
-    token_data = decode_token(token)
-    user = get_user_by_id(token_data.user_id)
+    """Obtener usuario actual autenticado (caché por user_id/jti; la BD se consulta fuera del event loop)"""
+    token_data = _decode_claims(token)
+
+    if token_data.user_id is None and token_data.email:
+        resolved = await asyncio.to_thread(get_user_by_email, token_data.email)
+        if resolved:
+            token_data.user_id = resolved.id
+    if token_data.user_id is None or token_data.email is None:
+        raise _invalid_token()
+
+    user = _user_cache.get(token_data.user_id, token_data.jti)
+    if user is None:
+        user = await asyncio.to_thread(get_user_by_id, token_data.user_id)
+        if user is not None:
+            _user_cache.put(user, token_data.jti)
 
     if user is None:
         raise HTTPException(
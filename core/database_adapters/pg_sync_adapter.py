@@ -119,6 +119,12 @@ class PostgreSQLCursor:
         self._cursor.executemany(pg_query, params_list)
         return self
 
+    def execute_batch(self, query: str, params_list, page_size: int = 500):
+        """Execute many queries grouping statements into few round trips"""
+        pg_query = convert_query_sqlite_to_pg(query)
+        psycopg2.extras.execute_batch(self._cursor, pg_query, params_list, page_size=page_size)
+        return self
+
     def fetchone(self):
         """Fetch one row"""
         return self._cursor.fetchone()
@@ -12,6 +12,8 @@ Este módulo proporciona:
 
 import uuid
 import asyncio
+import bisect
+import heapq
 import time
 import psutil
 import os
@@ -24,6 +26,12 @@ import json
 
 logger = logging.getLogger(__name__)
 
+# Write-behind de estados de items: se vacía cada N cambios o cada T milisegundos
+STATUS_FLUSH_MAX_ITEMS = int(os.getenv("BULK_STATUS_FLUSH_MAX_ITEMS", "200"))
+STATUS_FLUSH_INTERVAL_MS = int(os.getenv("BULK_STATUS_FLUSH_INTERVAL_MS", "500"))
+# Reintentos del flush final antes de marcar el batch como fallido
+STATUS_FLUSH_RETRIES = int(os.getenv("BULK_STATUS_FLUSH_RETRIES", "3"))
+
 
 class BatchStatus(Enum):
     """Estados del batch de procesamiento"""
@@ -151,6 +159,294 @@ class BatchRecord:
     updated_at: Optional[datetime] = None
 
 
+class StatusWriteBuffer:
+    """
+    Buffer write-behind para estados de items y progreso de batches.
+
+    Cada transición de estado reemplaza la anterior del mismo item en
+    memoria; el buffer se vacía con un UPDATE en bloque (``execute_many``)
+    al juntar ``max_items`` cambios o tras ``interval_ms``. Si un flush
+    falla, los cambios se reencolan y el timer se vuelve a armar.
+    ``flush_batch`` reintenta hasta dejar todo persistido antes de finalizar
+    un batch.
+    """
+
+    ITEM_UPDATE_QUERY = """
+    UPDATE bulk_invoice_batch_items SET
+        item_status = ?, processing_started_at = ?, processing_completed_at = ?,
+        processing_time_ms = ?, matched_expense_id = ?, match_confidence = ?,
+        match_method = ?, match_reasons = ?, candidates_found = ?,
+        candidates_data = ?, error_message = ?, error_code = ?,
+        error_details = ?, updated_at = ?
+    WHERE batch_id = ? AND filename = ?
+    """
+
+    PROGRESS_UPDATE_QUERY = """
+    UPDATE bulk_invoice_batches SET
+        processed_count = ?, linked_count = ?, no_matches_count = ?,
+        errors_count = ?, updated_at = ?
+    WHERE batch_id = ?
+    """
+
+    def __init__(self, get_db, max_items: int = STATUS_FLUSH_MAX_ITEMS,
+                 interval_ms: int = STATUS_FLUSH_INTERVAL_MS, retries: int = STATUS_FLUSH_RETRIES):
+        self._get_db = get_db
+        self.max_items = max(1, max_items)
+        self.interval = max(0, interval_ms) / 1000.0
+        self.retries = max(0, retries)
+
+        self._items: Dict[Tuple[str, str], tuple] = {}
+        self._batches: Dict[str, BatchRecord] = {}
+        self._started_at: Dict[Tuple[str, str], str] = {}
+        self._lock = asyncio.Lock()
+        self._timer: Optional[asyncio.Task] = None
+
+        self.flushes = 0
+        self.rows_written = 0
+        self.updates_coalesced = 0
+
+    @property
+    def pending(self) -> int:
+        return len(self._items) + len(self._batches)
+
+    async def record_item(self, batch_id: str, item: InvoiceItem) -> None:
+        """Registra el estado actual de un item (se escribe en el próximo flush)"""
+        now = datetime.utcnow().isoformat()
+        key = (batch_id, item.filename)
+        if item.status == ItemStatus.PROCESSING:
+            self._started_at[key] = now
+        completed_at = now if item.status != ItemStatus.PROCESSING else None
+
+        if key in self._items:
+            self.updates_coalesced += 1
+        self._items[key] = (
+            item.status.value,
+            self._started_at.get(key),
+            completed_at,
+            item.processing_time_ms,
+            item.matched_expense_id,
+            item.match_confidence,
+            item.match_method,
+            json.dumps(item.match_reasons) if item.match_reasons else None,
+            item.candidates_found,
+            json.dumps(item.candidates_data) if item.candidates_data else None,
+            item.error_message,
+            item.error_code,
+            json.dumps(item.error_details) if item.error_details else None,
+            now,
+            batch_id,
+            item.filename
+        )
+        await self._after_record()
+
+    async def record_progress(self, batch: BatchRecord) -> None:
+        """Marca el progreso del batch para el próximo flush"""
+        self._batches[batch.batch_id] = batch
+        await self._after_record()
+
+    async def _after_record(self) -> None:
+        if len(self._items) >= self.max_items:
+            await self.flush()
+        else:
+            self._arm_timer()
+
+    def _arm_timer(self) -> None:
+        # El propio timer puede re-armarse desde su flush fallido
+        timer = self._timer
+        if timer is None or timer.done() or timer is asyncio.current_task():
+            self._timer = asyncio.get_running_loop().create_task(self._flush_later())
+
+    async def _flush_later(self) -> None:
+        await asyncio.sleep(self.interval)
+        try:
+            await self.flush()
+        except Exception as e:
+            logger.error(f"Error flushing item status buffer: {e}")
+
+    async def flush(self) -> bool:
+        """Escribe en bloque todos los cambios pendientes. Devuelve False si falló"""
+        async with self._lock:
+            items, self._items = self._items, {}
+            batches, self._batches = self._batches, {}
+            if not items and not batches:
+                return True
+
+            now = datetime.utcnow().isoformat()
+            progress_rows = [
+                (b.processed_count, b.linked_count, b.no_matches_count, b.errors_count, now, b.batch_id)
+                for b in batches.values()
+            ]
+            try:
+                db = self._get_db()
+                await self._write(db, self.ITEM_UPDATE_QUERY, list(items.values()))
+                await self._write(db, self.PROGRESS_UPDATE_QUERY, progress_rows)
+            except Exception as e:
+                logger.error(f"Error flushing {len(items)} item status updates: {e}")
+                # Reencolar sin pisar cambios más nuevos que llegaron durante el flush
+                for key, row in items.items():
+                    self._items.setdefault(key, row)
+                for batch_id, batch in batches.items():
+                    self._batches.setdefault(batch_id, batch)
+                self._arm_timer()
+                return False
+
+            self.flushes += 1
+            self.rows_written += len(items) + len(progress_rows)
+            return True
+
+    @staticmethod
+    async def _write(db, query: str, rows: List[tuple]) -> None:
+        if not rows:
+            return
+        execute_many = getattr(db, "execute_many", None)
+        if execute_many is not None:
+            await execute_many(query, rows)
+        else:
+            for row in rows:
+                await db.execute(query, row)
+
+    async def flush_batch(self, batch_id: str) -> bool:
+        """
+        Vacía el buffer y libera el estado en memoria del batch.
+
+        Reintenta ``retries`` veces (esperando ``interval`` entre intentos);
+        devuelve False si los cambios siguen sin persistir.
+        """
+        flushed = await self.flush()
+        for _ in range(self.retries):
+            if flushed:
+                break
+            await asyncio.sleep(self.interval)
+            flushed = await self.flush()
+        if flushed:
+            for key in [key for key in self._started_at if key[0] == batch_id]:
+                del self._started_at[key]
+        if not self.pending and self._timer is not None and not self._timer.done():
+            self._timer.cancel()
+        return flushed
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "pending": self.pending,
+            "flushes": self.flushes,
+            "rows_written": self.rows_written,
+            "updates_coalesced": self.updates_coalesced,
+        }
+
+
+def _metadata_cfdi_uuid(metadata: Any) -> Optional[str]:
+    """cfdi_uuid del metadata de un gasto (dict o JSON)"""
+    if isinstance(metadata, str):
+        try:
+            metadata = json.loads(metadata)
+        except (TypeError, ValueError):
+            return None
+    if isinstance(metadata, dict):
+        return metadata.get("cfdi_uuid")
+    return None
+
+
+class ExpenseMatchIndex:
+    """
+    Índice en memoria de los gastos no conciliados de una empresa.
+
+    Se carga una vez por batch y reemplaza la consulta por factura de
+    ``_find_matching_expenses``: montos ordenados para búsquedas por rango,
+    mapa ``cfdi_uuid -> gastos`` para aciertos exactos y nombres de
+    proveedor ya tokenizados para la similitud Jaccard. Los gastos que un
+    item vincula se retiran con ``remove`` para que otra factura del mismo
+    batch no vuelva a tomarlos.
+    """
+
+    LOAD_QUERY = """
+    SELECT
+        id, description, amount, provider_name, expense_date,
+        category, metadata, created_at
+    FROM manual_expenses
+    WHERE company_id = ?
+    AND bank_status != 'invoiced'
+    ORDER BY created_at DESC
+    """
+
+    def __init__(self, records: List[Dict[str, Any]]):
+        entries = []
+        self._by_uuid: Dict[str, List[Dict[str, Any]]] = {}
+        self._keys: Dict[Any, Tuple[float, int]] = {}
+
+        # ``records`` viene en orden created_at DESC: ese rango desempata como el ORDER BY original
+        for rank, record in enumerate(records):
+            try:
+                amount = float(record["amount"])
+            except (TypeError, ValueError, KeyError):
+                continue
+            record = dict(record)
+            provider = record.get("provider_name")
+            record["_provider_tokens"] = frozenset(provider.lower().split()) if provider else None
+            record["_expense_date"] = self._parse_date(record.get("expense_date"))
+            record["_cfdi_uuid"] = _metadata_cfdi_uuid(record.get("metadata"))
+            entries.append((amount, rank, record))
+            self._keys[record["id"]] = (amount, rank)
+            if record["_cfdi_uuid"]:
+                self._by_uuid.setdefault(record["_cfdi_uuid"], []).append(record)
+
+        entries.sort(key=lambda entry: (entry[0], entry[1]))
+        self._amounts = [entry[0] for entry in entries]
+        self._entries = entries
+
+    @staticmethod
+    def _parse_date(value: Any) -> Optional[datetime]:
+        if isinstance(value, datetime):
+            return value
+        if not value:
+            return None
+        try:
+            return datetime.fromisoformat(str(value))
+        except ValueError:
+            return None
+
+    @classmethod
+    async def load(cls, db, company_id: str) -> "ExpenseMatchIndex":
+        return cls(await db.fetch_all(cls.LOAD_QUERY, (company_id,)))
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def candidates(self, amount: float, limit: int = 10) -> List[Dict[str, Any]]:
+        """Gastos con ``|monto - amount| <= amount * 10%``, los más cercanos primero"""
+        tolerance = amount * 0.1
+        if tolerance < 0:
+            return []
+        lo = bisect.bisect_left(self._amounts, amount - tolerance)
+        hi = bisect.bisect_right(self._amounts, amount + tolerance)
+        nearest = heapq.nsmallest(
+            limit,
+            self._entries[lo:hi],
+            key=lambda entry: (abs(entry[0] - amount), entry[1]),
+        )
+        return [entry[2] for entry in nearest]
+
+    def by_uuid(self, cfdi_uuid: Optional[str]) -> List[Dict[str, Any]]:
+        return self._by_uuid.get(cfdi_uuid, []) if cfdi_uuid else []
+
+    def remove(self, expense_id: Any) -> bool:
+        """Retirar un gasto ya vinculado; devuelve False si no estaba en el índice"""
+        key = self._keys.pop(expense_id, None)
+        if key is None:
+            return False
+        # (monto, rango) es único y ordena igual que las entradas
+        position = bisect.bisect_left(self._entries, key)
+        record = self._entries[position][2]
+        del self._entries[position]
+        del self._amounts[position]
+        if record["_cfdi_uuid"]:
+            remaining = [r for r in self._by_uuid[record["_cfdi_uuid"]] if r["id"] != expense_id]
+            if remaining:
+                self._by_uuid[record["_cfdi_uuid"]] = remaining
+            else:
+                del self._by_uuid[record["_cfdi_uuid"]]
+        return True
+
+
 class BulkInvoiceProcessor:
     """
     Procesador masivo de facturas con capacidades enterprise
@@ -170,6 +466,13 @@ class BulkInvoiceProcessor:
         self.retry_failed_items = True
         self.auto_optimize_performance = True
 
+        # Estados de items/progreso con write-behind; los batches en curso
+        # se sirven desde memoria en get_batch_status
+        self.status_buffer = StatusWriteBuffer(lambda: self.db)
+        self._active_batches: Dict[str, BatchRecord] = {}
+        # Índice de gastos candidatos por batch en curso (ver ExpenseMatchIndex)
+        self._match_indexes: Dict[str, ExpenseMatchIndex] = {}
+
     def _get_conn(self):
         """Get PostgreSQL connection"""
         return self.pg_adapter.connect()
@@ -195,6 +498,17 @@ class BulkInvoiceProcessor:
                 finally:
                     conn.close()
 
+            async def execute_many(self, query, params_list):
+                """Execute query for every params tuple in a single transaction"""
+                conn = self.adapter.connect()
+                try:
+                    cursor = conn.cursor()
+                    cursor.execute_batch(query, params_list)
+                    conn.commit()
+                    return f"OK {len(params_list)}"
+                finally:
+                    conn.close()
+
             async def fetch_one(self, query, params=None):
                 """Fetch one row (async wrapper around sync)"""
                 conn = self.adapter.connect()
@@ -228,6 +542,7 @@ class BulkInvoiceProcessor:
     async def initialize(self, db_adapter=None):
         """Inicializar el procesador con adaptador de BD (opcional)"""
         if db_adapter:
+            await self.status_buffer.flush()
             self.db = db_adapter
         logger.info("BulkInvoiceProcessor initialized")
 
@@ -301,17 +616,44 @@ class BulkInvoiceProcessor:
             logger.error(f"Error creating batch: {e}")
             raise
 
+    async def find_existing_uuids(self, company_id: str, uuids: List[str]) -> set:
+        """
+        UUIDs (en mayúsculas) que ya existen en expense_invoices para la compañía.
+
+        Consulta en bloques para que un paquete SAT grande no genere una
+        consulta por factura; UPPER(uuid) usa el índice
+        idx_expense_invoices_company_upper_uuid.
+        """
+        normalized = list(dict.fromkeys(u.upper() for u in uuids if u))
+        existing = set()
+        for start in range(0, len(normalized), 500):
+            chunk = normalized[start:start + 500]
+            placeholders = ", ".join("?" for _ in chunk)
+            rows = await self.db.fetch_all(
+                f"SELECT uuid FROM expense_invoices WHERE company_id = ? AND UPPER(uuid) IN ({placeholders})",
+                (company_id, *chunk),
+            )
+            existing.update(row["uuid"].upper() for row in rows if row.get("uuid"))
+        return existing
+
     async def process_batch(
         self,
         batch_id: str,
-        max_concurrent_items: Optional[int] = None
+        max_concurrent_items: Optional[int] = None,
+        preloaded_batch: Optional[BatchRecord] = None
     ) -> BatchRecord:
         """
         Procesar un batch completo de facturas
+
+        ``preloaded_batch`` permite procesar el batch recién creado sin
+        recargarlo de BD, conservando el XML de cada item (no se persiste).
         """
         try:
             # Load batch from database
-            batch = await self._load_batch_record(batch_id)
+            if preloaded_batch is not None and preloaded_batch.batch_id == batch_id:
+                batch = preloaded_batch
+            else:
+                batch = await self._load_batch_record(batch_id)
             if not batch:
                 raise ValueError(f"Batch {batch_id} not found")
 
@@ -321,6 +663,7 @@ class BulkInvoiceProcessor:
             # Start processing
             batch.status = BatchStatus.PROCESSING
             batch.started_at = datetime.utcnow()
+            self._active_batches[batch_id] = batch
             await self._update_batch_status(batch)
 
             # Record performance metrics
@@ -332,6 +675,9 @@ class BulkInvoiceProcessor:
 
             logger.info(f"Starting batch processing: {batch_id}")
 
+            # Load match candidates once for the whole batch
+            await self._load_match_index(batch)
+
             # Process items with controlled concurrency
             concurrent_limit = max_concurrent_items or self.max_concurrent_items
             semaphore = asyncio.Semaphore(concurrent_limit)
@@ -362,12 +708,17 @@ class BulkInvoiceProcessor:
 
         except Exception as e:
             logger.error(f"Error processing batch {batch_id}: {e}")
-            if 'batch' in locals():
+            if 'batch' in locals() and batch:
+                await self.status_buffer.flush_batch(batch_id)
                 batch.status = BatchStatus.FAILED
                 batch.error_summary = str(e)
                 await self._update_batch_status(batch)
             raise
 
+        finally:
+            self._active_batches.pop(batch_id, None)
+            self._match_indexes.pop(batch_id, None)
+
     async def _process_item_with_semaphore(
         self,
         semaphore: asyncio.Semaphore,
@@ -450,7 +801,8 @@ class BulkInvoiceProcessor:
                 best_match = self._select_best_match(candidates, batch.auto_link_threshold)
 
                 if best_match and best_match["confidence"] >= batch.auto_link_threshold:
-                    # Auto-link
+                    # Auto-link: el gasto deja de ser candidato para el resto del batch
+                    self._release_matched_expense(batch, best_match["expense_id"])
                     item.status = ItemStatus.MATCHED
                     item.matched_expense_id = best_match["expense_id"]
                     item.match_confidence = best_match["confidence"]
@@ -911,6 +1263,16 @@ class BulkInvoiceProcessor:
             logger.error(f"Traceback: {traceback.format_exc()}")
             # Don't raise - classification failure shouldn't stop the bulk process
 
+    async def _load_match_index(self, batch: BatchRecord) -> None:
+        """Cargar el índice de gastos candidatos del batch (una consulta)"""
+        try:
+            index = await ExpenseMatchIndex.load(self.db, batch.company_id)
+            self._match_indexes[batch.batch_id] = index
+            logger.info(f"Match index for batch {batch.batch_id}: {len(index)} candidate expenses")
+        except Exception as e:
+            # Sin índice, cada item consulta sus candidatos en BD
+            logger.error(f"Error loading match index for batch {batch.batch_id}: {e}")
+
     async def _find_matching_expenses(
         self,
         batch: BatchRecord,
@@ -920,27 +1282,34 @@ class BulkInvoiceProcessor:
         Buscar gastos que coincidan con la factura
         """
         try:
-            # Query for potential matches
-            query = """
-            SELECT
-                id, description, amount, provider_name, expense_date,
-                category, metadata, created_at
-            FROM manual_expenses
-            WHERE company_id = ?
-            AND bank_status != 'invoiced'
-            AND ABS(amount - ?) <= (? * 0.1)  -- 10% tolerance
-            ORDER BY ABS(amount - ?) ASC, created_at DESC
-            LIMIT 10
-            """
+            index = self._match_indexes.get(batch.batch_id)
+            if index is not None:
+                records = index.candidates(item.total_amount)
+                # Un gasto con el mismo cfdi_uuid es match exacto aunque el monto no esté en rango
+                seen = {record["id"] for record in records}
+                records += [r for r in index.by_uuid(item.uuid) if r["id"] not in seen]
+            else:
+                query = """
+                SELECT
+                    id, description, amount, provider_name, expense_date,
+                    category, metadata, created_at
+                FROM manual_expenses
+                WHERE company_id = ?
+                AND bank_status != 'invoiced'
+                AND ABS(amount - ?) <= (? * 0.1)  -- 10% tolerance
+                ORDER BY ABS(amount - ?) ASC, created_at DESC
+                LIMIT 10
+                """
 
-            records = await self.db.fetch_all(
-                query,
-                (batch.company_id, item.total_amount, item.total_amount, item.total_amount)
-            )
+                records = await self.db.fetch_all(
+                    query,
+                    (batch.company_id, item.total_amount, item.total_amount, item.total_amount)
+                )
 
+            item_tokens = frozenset(item.provider_name.lower().split()) if item.provider_name else None
             candidates = []
             for record in records:
-                confidence = self._calculate_match_confidence(item, record)
+                confidence = self._calculate_match_confidence(item, record, item_tokens)
                 reasons = self._get_match_reasons(item, record, confidence)
 
                 candidates.append({
@@ -968,10 +1337,14 @@ class BulkInvoiceProcessor:
     def _calculate_match_confidence(
         self,
         item: InvoiceItem,
-        expense_record: Dict[str, Any]
+        expense_record: Dict[str, Any],
+        item_tokens: Optional[frozenset] = None
     ) -> float:
         """
         Calcular confianza de match entre factura y gasto
+
+        Usa los campos pre-procesados (``_provider_tokens``, ``_expense_date``,
+        ``_cfdi_uuid``) cuando el registro viene de ExpenseMatchIndex.
         """
         confidence = 0.0
 
@@ -985,17 +1358,26 @@ class BulkInvoiceProcessor:
 
         # Provider name similarity (30% weight)
         if item.provider_name and expense_record.get("provider_name"):
-            provider_similarity = self._calculate_text_similarity(
-                item.provider_name.lower(),
-                expense_record["provider_name"].lower()
-            )
+            expense_tokens = expense_record.get("_provider_tokens")
+            if expense_tokens is not None:
+                if item_tokens is None:
+                    item_tokens = frozenset(item.provider_name.lower().split())
+                provider_similarity = self._jaccard(item_tokens, expense_tokens)
+            else:
+                provider_similarity = self._calculate_text_similarity(
+                    item.provider_name.lower(),
+                    expense_record["provider_name"].lower()
+                )
             confidence += provider_similarity * 0.3
 
         # Date proximity (20% weight)
         if item.issued_date and expense_record.get("expense_date"):
             try:
                 invoice_date = datetime.fromisoformat(item.issued_date.replace('Z', '+00:00'))
-                expense_date = datetime.fromisoformat(expense_record["expense_date"])
+                if "_expense_date" in expense_record:
+                    expense_date = expense_record["_expense_date"]
+                else:
+                    expense_date = datetime.fromisoformat(expense_record["expense_date"])
 
                 date_diff_days = abs((invoice_date - expense_date).days)
                 if date_diff_days <= 30:  # Within 30 days
@@ -1005,35 +1387,31 @@ class BulkInvoiceProcessor:
                 pass
 
         # UUID exact match (100% if available)
-        if item.uuid:
-            expense_metadata = expense_record.get("metadata", {})
-            if isinstance(expense_metadata, str):
-                try:
-                    expense_metadata = json.loads(expense_metadata)
-                except:
-                    expense_metadata = {}
-
-            if expense_metadata.get("cfdi_uuid") == item.uuid:
-                confidence = 1.0
+        if item.uuid and self._expense_cfdi_uuid(expense_record) == item.uuid:
+            confidence = 1.0
 
         return min(confidence, 1.0)
 
+    @staticmethod
+    def _expense_cfdi_uuid(expense_record: Dict[str, Any]) -> Optional[str]:
+        if "_cfdi_uuid" in expense_record:
+            return expense_record["_cfdi_uuid"]
+        return _metadata_cfdi_uuid(expense_record.get("metadata", {}))
+
+    @staticmethod
+    def _jaccard(words1: frozenset, words2: frozenset) -> float:
+        union = words1 | words2
+        if not union:
+            return 0.0
+        return len(words1 & words2) / len(union)
+
     def _calculate_text_similarity(self, text1: str, text2: str) -> float:
         """Calcular similitud entre dos textos"""
         if not text1 or not text2:
             return 0.0
 
         # Simple Jaccard similarity on words
-        words1 = set(text1.split())
-        words2 = set(text2.split())
-
-        intersection = words1.intersection(words2)
-        union = words1.union(words2)
-
-        if not union:
-            return 0.0
-
-        return len(intersection) / len(union)
+        return self._jaccard(set(text1.split()), set(text2.split()))
 
     def _get_match_reasons(
         self,
@@ -1057,16 +1435,8 @@ class BulkInvoiceProcessor:
             if item.provider_name.lower() in expense_record["provider_name"].lower():
                 reasons.append("provider_name_match")
 
-        if item.uuid:
-            expense_metadata = expense_record.get("metadata", {})
-            if isinstance(expense_metadata, str):
-                try:
-                    expense_metadata = json.loads(expense_metadata)
-                except:
-                    expense_metadata = {}
-
-            if expense_metadata.get("cfdi_uuid") == item.uuid:
-                reasons.append("uuid_exact_match")
+        if item.uuid and self._expense_cfdi_uuid(expense_record) == item.uuid:
+            reasons.append("uuid_exact_match")
 
         return reasons
 
@@ -1099,6 +1469,12 @@ class BulkInvoiceProcessor:
 
         return None
 
+    def _release_matched_expense(self, batch: BatchRecord, expense_id: Any) -> None:
+        """Retirar un gasto vinculado del índice del batch (sin await: atómico entre items)"""
+        index = self._match_indexes.get(batch.batch_id)
+        if index is not None:
+            index.remove(expense_id)
+
     async def _mark_expense_invoiced(self, expense_id: int, item: InvoiceItem):
         """Marcar gasto como facturado"""
         try:
@@ -1354,6 +1730,10 @@ class BulkInvoiceProcessor:
     async def _finalize_batch(self, batch: BatchRecord):
         """Finalizar el procesamiento del batch"""
         try:
+            # Persistir los estados de items pendientes antes del estado final
+            if not await self.status_buffer.flush_batch(batch.batch_id):
+                raise RuntimeError("item status updates could not be persisted")
+
             # Calculate final metrics
             batch.completed_at = datetime.utcnow()
             if batch.started_at:
@@ -1540,8 +1920,8 @@ class BulkInvoiceProcessor:
             ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
             """
 
-            for item in batch.items:
-                await self.db.execute(query, (
+            rows = [
+                (
                     batch.batch_id,
                     item.filename,
                     item.uuid,
@@ -1555,7 +1935,16 @@ class BulkInvoiceProcessor:
                     item.file_size,
                     item.file_hash,
                     item.status.value
-                ))
+                )
+                for item in batch.items
+            ]
+
+            execute_many = getattr(self.db, "execute_many", None)
+            if execute_many is not None:
+                await execute_many(query, rows)
+            else:
+                for row in rows:
+                    await self.db.execute(query, row)
 
         except Exception as e:
             logger.error(f"Error storing batch items: {e}")
@@ -1681,66 +2070,24 @@ class BulkInvoiceProcessor:
                 batch.cpu_usage_percent,
                 batch.error_summary,
                 batch.failed_invoices,
-                datetime.utcnow().isoformat()
-            ), (batch.batch_id,))
+                datetime.utcnow().isoformat(),
+                batch.batch_id
+            ))
 
         except Exception as e:
             logger.error(f"Error updating batch status: {e}")
 
     async def _update_batch_progress(self, batch: BatchRecord):
-        """Actualizar progreso del batch"""
+        """Actualizar progreso del batch (write-behind, ver StatusWriteBuffer)"""
         try:
-            query = """
-            UPDATE bulk_invoice_batches SET
-                processed_count = ?, linked_count = ?, no_matches_count = ?,
-                errors_count = ?, updated_at = ?
-            WHERE batch_id = ?
-            """
-
-            await self.db.execute(query, (
-                batch.processed_count,
-                batch.linked_count,
-                batch.no_matches_count,
-                batch.errors_count,
-                datetime.utcnow().isoformat(),
-                batch.batch_id
-            ))
-
+            await self.status_buffer.record_progress(batch)
         except Exception as e:
             logger.error(f"Error updating batch progress: {e}")
 
     async def _update_item_status(self, batch_id: str, item: InvoiceItem):
-        """Actualizar status de un item"""
+        """Actualizar status de un item (write-behind, ver StatusWriteBuffer)"""
         try:
-            query = """
-            UPDATE bulk_invoice_batch_items SET
-                item_status = ?, processing_started_at = ?, processing_completed_at = ?,
-                processing_time_ms = ?, matched_expense_id = ?, match_confidence = ?,
-                match_method = ?, match_reasons = ?, candidates_found = ?,
-                candidates_data = ?, error_message = ?, error_code = ?,
-                error_details = ?, updated_at = ?
-            WHERE batch_id = ? AND filename = ?
-            """
-
-            await self.db.execute(query, (
-                item.status.value,
-                datetime.utcnow().isoformat() if item.status == ItemStatus.PROCESSING else None,
-                datetime.utcnow().isoformat() if item.status != ItemStatus.PROCESSING else None,
-                item.processing_time_ms,
-                item.matched_expense_id,
-                item.match_confidence,
-                item.match_method,
-                json.dumps(item.match_reasons) if item.match_reasons else None,
-                item.candidates_found,
-                json.dumps(item.candidates_data) if item.candidates_data else None,
-                item.error_message,
-                item.error_code,
-                json.dumps(item.error_details) if item.error_details else None,
-                datetime.utcnow().isoformat(),
-                batch_id,
-                item.filename
-            ))
-
+            await self.status_buffer.record_item(batch_id, item)
         except Exception as e:
             logger.error(f"Error updating item status: {e}")
 
@@ -1789,8 +2136,8 @@ class BulkInvoiceProcessor:
 
     # Public API methods
     async def get_batch_status(self, batch_id: str) -> Optional[Dict[str, Any]]:
-        """Obtener estado del batch"""
-        batch = await self._load_batch_record(batch_id)
+        """Obtener estado del batch (desde memoria si está en proceso)"""
+        batch = self._active_batches.get(batch_id) or await self._load_batch_record(batch_id)
         if not batch:
             return None
 
@@ -1896,8 +2243,11 @@ class BulkInvoiceProcessor:
 
             # Process retry items
             batch.status = BatchStatus.PROCESSING
+            self._active_batches[batch_id] = batch
             await self._update_batch_status(batch)
 
+            await self._load_match_index(batch)
+
             # Process items with controlled concurrency
             semaphore = asyncio.Semaphore(self.max_concurrent_items)
 
@@ -1920,12 +2270,17 @@ class BulkInvoiceProcessor:
 
         except Exception as e:
             logger.error(f"Error retrying batch {batch_id}: {e}")
-            if 'batch' in locals():
+            if 'batch' in locals() and batch:
+                await self.status_buffer.flush_batch(batch_id)
                 batch.status = BatchStatus.FAILED
                 batch.error_summary = f"Retry failed: {str(e)}"
                 await self._update_batch_status(batch)
             raise
 
+        finally:
+            self._active_batches.pop(batch_id, None)
+            self._match_indexes.pop(batch_id, None)
+
     async def get_failed_batches(
         self,
         company_id: str,
@@ -4,13 +4,21 @@ Incluye: IVA, pólizas electrónicas (Anexo 24), gastos en revisión.
 """
 
 import logging
-import json
-from datetime import datetime, date
+from datetime import datetime, date, timedelta
 from typing import Dict, List, Optional, Any, Tuple
 from decimal import Decimal
 from enum import Enum
 from collections import defaultdict
 
+from core.fiscal_aggregates import (
+    IVACategory,
+    classify_iva,
+    expense_contribution,
+    fetch_period_aggregates,
+    fetch_review_expense_ids,
+    normalize_expense_row,
+    period_date_sql,
+)
 from core.internal_db import get_sqlite_connection
 from core.sat_catalog_seed import CATEGORY_SAT_MAPPING
 
@@ -25,15 +33,6 @@ class ReportType(Enum):
     RESUMEN_FISCAL = "resumen_fiscal"
 
 
-class IVACategory(Enum):
-    """Categorías de IVA para reporteo."""
-    ACREDITABLE_16 = "acreditable_16"
-    ACREDITABLE_8 = "acreditable_8"
-    NO_ACREDITABLE = "no_acreditable"
-    EXENTO = "exento"
-    TASA_0 = "tasa_0"
-
-
 def calculate_iva_from_amount(
     total: Decimal,
     tasa_iva: Optional[Decimal] = None
@@ -72,60 +71,25 @@ class FinancialReportsGenerator:
         return (source or 'unknown').lower() == self.tax_source_filter
 
     def _normalize_expense_row(self, row: Dict[str, Any]) -> Dict[str, Any]:
-        record = dict(row)
-        metadata_raw = record.get('metadata')
-        metadata: Dict[str, Any] = {}
-        if metadata_raw:
-            try:
-                metadata = json.loads(metadata_raw)
-            except (TypeError, json.JSONDecodeError):
-                metadata = {}
-        record['metadata_dict'] = metadata
-
-        total_amount = Decimal(str(record.get('amount') or 0))
-        subtotal = record.get('subtotal')
-        if subtotal is not None:
-            subtotal = Decimal(str(subtotal))
-        iva_16 = Decimal(str(record.get('iva_16') or 0))
-        iva_8 = Decimal(str(record.get('iva_8') or 0))
-        iva_0 = Decimal(str(record.get('iva_0') or 0))
-        iva_total = iva_16 + iva_8 + iva_0
-        if subtotal is None:
-            subtotal = total_amount - iva_total
-
-        record['total'] = total_amount
-        record['subtotal'] = subtotal
-        record['iva'] = iva_total
-        record['iva_16'] = iva_16
-        record['iva_8'] = iva_8
-        record['iva_0'] = iva_0
-        record['tax_source'] = (record.get('tax_source') or metadata.get('tax_source') or 'unknown').lower()
-        confianza = record.get('categoria_confianza')
-        needs_review_meta = metadata.get('categoria_needs_review')
-        if needs_review_meta is None and confianza is not None:
-            try:
-                needs_review_meta = float(confianza) < 0.6
-            except (TypeError, ValueError):
-                needs_review_meta = False
-        record['needs_review'] = bool(needs_review_meta)
-        record['fecha_gasto'] = record.get('date') or record.get('expense_date')
-        record['merchant_name'] = record.get('merchant_name') or record.get('proveedor')
-        record['description'] = record.get('description') or record.get('descripcion')
-        record['metadata'] = metadata
-        return record
-
-    def _fetch_expenses(self, start_date: date, end_date: date) -> List[Dict[str, Any]]:
+        return normalize_expense_row(row)
+
+    def _fetch_expenses(
+        self,
+        start_date: Optional[date] = None,
+        end_date: Optional[date] = None,
+    ) -> List[Dict[str, Any]]:
+        """Detalle de gastos del rango (o de todos); solo para reportes que listan gastos."""
         with get_sqlite_connection() as conn:
-            query = """
-                SELECT *
-                  FROM expense_records
-                 WHERE tenant_id = ?
-                   AND date >= ?
-                   AND date <= ?
-                   AND (status IS NULL OR status != 'cancelled')
-                ORDER BY date, id
-            """
-            cursor = conn.execute(query, (self.tenant_id, start_date, end_date))
+            # Misma fecha que los agregados: date o, si viene vacía, expense_date
+            fecha_sql = period_date_sql(conn)
+            query = "SELECT * FROM expense_records WHERE tenant_id = ?"
+            params: List[Any] = [self.tenant_id]
+            if start_date and end_date:
+                # Límite exclusivo al día siguiente: incluye fechas con hora del último día
+                query += f" AND {fecha_sql} >= ? AND {fecha_sql} < ?"
+                params.extend([start_date.isoformat(), (end_date + timedelta(days=1)).isoformat()])
+            query += f" AND (status IS NULL OR status != 'cancelled') ORDER BY {fecha_sql}, id"
+            cursor = conn.execute(query, params)
             expenses: List[Dict[str, Any]] = []
             for row in cursor:
                 normalized = self._normalize_expense_row(row)
@@ -134,6 +98,28 @@ class FinancialReportsGenerator:
                 expenses.append(normalized)
             return expenses
 
+    def _fetch_expenses_by_ids(self, expense_ids: List[int]) -> List[Dict[str, Any]]:
+        expenses: List[Dict[str, Any]] = []
+        with get_sqlite_connection() as conn:
+            for start in range(0, len(expense_ids), 500):
+                chunk = expense_ids[start:start + 500]
+                cursor = conn.execute(
+                    f"SELECT * FROM expense_records WHERE id IN ({', '.join('?' * len(chunk))})",
+                    chunk,
+                )
+                expenses.extend(self._normalize_expense_row(row) for row in cursor)
+        expenses.sort(key=lambda e: (str(e.get('fecha_gasto') or ''), e.get('id') or 0))
+        return expenses
+
+    def _fetch_period_aggregates(self, year: int, month: int) -> List[Dict[str, Any]]:
+        """Totales precalculados del periodo (ver core.fiscal_aggregates)."""
+        with get_sqlite_connection() as conn:
+            rows = fetch_period_aggregates(conn, self.tenant_id, year, month, self.tax_source_filter)
+        if rows is None:
+            logger.warning("Agregados fiscales no instalados; totales calculados desde expense_records")
+            rows = self._expense_rows(self._fetch_expenses(*self._get_fiscal_period_dates(year, month)))
+        return rows
+
     def _get_fiscal_period_dates(
         self,
         year: int,
@@ -147,7 +133,6 @@ class FinancialReportsGenerator:
             end_date = date(year, month, 31)
         else:
             next_month = date(year, month + 1, 1)
-            from datetime import timedelta
             end_date = next_month - timedelta(days=1)
 
         return start_date, end_date
@@ -170,17 +155,7 @@ class FinancialReportsGenerator:
             Dict con resumen y detalle de IVA
         """
         start_date, end_date = self._get_fiscal_period_dates(year, month)
-        expenses = self._fetch_expenses(start_date, end_date)
-
-        for expense in expenses:
-            expense['iva_category'] = self._classify_iva({
-                'categoria_slug': expense.get('categoria_slug'),
-                'iva': expense.get('iva'),
-                'subtotal': expense.get('subtotal'),
-                'cfdi_uuid': expense.get('cfdi_uuid'),
-            })
-
-        summary = self._generate_iva_summary(expenses)
+        summary = self._summarize_aggregates(self._fetch_period_aggregates(year, month))
 
         report = {
             'periodo': {
@@ -197,7 +172,8 @@ class FinancialReportsGenerator:
 
         if detailed:
             detalle = []
-            for expense in expenses:
+            for expense in self._fetch_expenses(start_date, end_date):
+                expense['iva_category'] = self._classify_iva(expense)
                 detalle.append({
                     'id': expense.get('id'),
                     'proveedor': expense.get('merchant_name') or expense.get('proveedor'),
@@ -219,33 +195,24 @@ class FinancialReportsGenerator:
 
     def _classify_iva(self, expense: Dict) -> str:
         """Clasifica el IVA según las reglas fiscales."""
-        categoria_info = CATEGORY_SAT_MAPPING.get(expense['categoria_slug'], {})
-
-        # Gastos no deducibles = IVA no acreditable
-        if categoria_info.get('sat_product_service_code') == '99999998':
-            return IVACategory.NO_ACREDITABLE.value
-
-        # Gastos de representación = IVA no acreditable generalmente
-        if expense['categoria_slug'] in ['gastos_representacion', 'entretenimiento']:
-            return IVACategory.NO_ACREDITABLE.value
-
-        # Por defecto, IVA es acreditable
-        if expense['iva'] and expense['iva'] > 0:
-            # Determinar tasa
-            if expense['subtotal'] and expense['subtotal'] > 0:
-                tasa = expense['iva'] / expense['subtotal']
-                if tasa >= 0.15:  # ~16%
-                    return IVACategory.ACREDITABLE_16.value
-                elif tasa >= 0.07:  # ~8%
-                    return IVACategory.ACREDITABLE_8.value
-
-        if expense['iva'] == 0:
-            return IVACategory.TASA_0.value
-
-        return IVACategory.EXENTO.value
+        return classify_iva(expense)
 
     def _generate_iva_summary(self, expenses: List[Dict]) -> Dict:
-        """Genera resumen de IVA por categorías."""
+        """Genera resumen de IVA por categorías a partir de gastos ya normalizados."""
+        return self._summarize_aggregates(self._expense_rows(expenses))
+
+    def _expense_rows(self, expenses: List[Dict]) -> List[Dict]:
+        """Una fila con forma de agregado (importes en pesos) por gasto."""
+        rows = []
+        for expense in expenses:
+            row = expense_contribution(expense)
+            for measure in ('total', 'subtotal', 'iva'):
+                row[measure] = row.pop(f'{measure}_cents') / 100.0
+            rows.append(row)
+        return rows
+
+    def _summarize_aggregates(self, rows: List[Dict]) -> Dict:
+        """Genera resumen de IVA por categorías desde filas agregadas."""
         summary = {
             'total_gastos': 0.0,
             'total_subtotal': 0.0,
@@ -263,28 +230,28 @@ class FinancialReportsGenerator:
 
         tax_counts = defaultdict(lambda: {'cantidad': 0, 'total': 0.0})
 
-        for expense in expenses:
-            total = float(expense['total'])
-            subtotal = float(expense['subtotal']) if expense['subtotal'] is not None else total
-            iva_value = float(expense['iva'])
+        for row in rows:
+            cantidad = row['cantidad']
+            total = row['total']
+            iva_value = row['iva']
 
             summary['total_gastos'] += total
-            summary['total_subtotal'] += subtotal
+            summary['total_subtotal'] += row['subtotal']
             summary['total_iva'] += iva_value
 
-            if expense.get('cfdi_uuid'):
-                summary['gastos_con_cfdi'] += 1
+            if row['has_cfdi']:
+                summary['gastos_con_cfdi'] += cantidad
             else:
-                summary['gastos_sin_cfdi'] += 1
+                summary['gastos_sin_cfdi'] += cantidad
 
-            if expense.get('needs_review'):
-                summary['gastos_revision'] += 1
+            if row['needs_review']:
+                summary['gastos_revision'] += cantidad
 
-            source = (expense.get('tax_source') or 'unknown').lower()
-            tax_counts[source]['cantidad'] += 1
+            source = row['tax_source'] or 'unknown'
+            tax_counts[source]['cantidad'] += cantidad
             tax_counts[source]['total'] += total
 
-            iva_cat = expense.get('iva_category')
+            iva_cat = row['iva_category']
             if iva_cat == IVACategory.ACREDITABLE_16.value:
                 summary['iva_acreditable_16'] += iva_value
             elif iva_cat == IVACategory.ACREDITABLE_8.value:
@@ -448,13 +415,19 @@ class FinancialReportsGenerator:
         Returns:
             Dict con gastos que requieren revisión
         """
-        if year and month:
-            start_date, end_date = self._get_fiscal_period_dates(year, month)
+        # Solo se leen las filas marcadas para revisión; el índice de contribuciones da sus ids
+        with get_sqlite_connection() as conn:
+            expense_ids = fetch_review_expense_ids(
+                conn,
+                self.tenant_id,
+                (year, month) if year and month else None,
+                self.tax_source_filter,
+            )
+        if expense_ids is None:
+            period_dates = self._get_fiscal_period_dates(year, month) if year and month else ()
+            expenses = self._fetch_expenses(*period_dates)
         else:
-            start_date = date(2000, 1, 1)
-            end_date = datetime.now().date()
-
-        expenses = self._fetch_expenses(start_date, end_date)
+            expenses = self._fetch_expenses_by_ids(expense_ids)
 
         gastos_revision: List[Dict[str, Any]] = []
         razones_revision: Dict[str, int] = defaultdict(int)
@@ -532,26 +505,31 @@ class FinancialReportsGenerator:
         - Gastos con y sin CFDI
         - Alertas y recomendaciones
         """
-        iva_report = self.generate_iva_report(year, month, detailed=False)
+        aggregates = self._fetch_period_aggregates(year, month)
+        iva_summary = self._summarize_aggregates(aggregates)
+        iva_report = {'resumen': iva_summary, 'tax_sources': iva_summary.get('tax_sources', {})}
         revision_report = self.generate_gastos_revision_report(year, month)
 
-        start_date, end_date = self._get_fiscal_period_dates(year, month)
-        expenses = self._fetch_expenses(start_date, end_date)
-
         categorias_map: Dict[str, Dict[str, Any]] = defaultdict(lambda: {
             'cantidad': 0,
             'total': 0.0,
-            'con_cfdi': 0
+            'con_cfdi': 0,
+            'cuentas_sat': defaultdict(int)
         })
 
-        for expense in expenses:
-            slug = expense.get('categoria_slug') or 'sin_categoria'
+        for row in aggregates:
+            slug = row['categoria_slug'] or 'sin_categoria'
             categoria = categorias_map[slug]
-            categoria['cantidad'] += 1
-            categoria['total'] += float(expense['total'])
-            if expense.get('cfdi_uuid'):
-                categoria['con_cfdi'] += 1
-            categoria['codigo_sat'] = expense.get('sat_account_code')
+            categoria['cantidad'] += row['cantidad']
+            categoria['total'] += row['total']
+            if row['has_cfdi']:
+                categoria['con_cfdi'] += row['cantidad']
+            categoria['cuentas_sat'][row['sat_account_code']] += row['cantidad']
+
+        for data in categorias_map.values():
+            # Cuenta SAT más usada en la categoría
+            codigo = max(data.pop('cuentas_sat').items(), key=lambda item: (item[1], item[0]))[0]
+            data['codigo_sat'] = codigo or None
 
         categorias = []
         total_general = sum(item['total'] for item in categorias_map.values())
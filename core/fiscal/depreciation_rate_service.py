@@ -15,7 +15,7 @@ from typing import Dict, Any, Optional, List, Tuple
 from dataclasses import dataclass, asdict
 import psycopg2
 from psycopg2.extras import RealDictCursor
-from sentence_transformers import SentenceTransformer
+from core.shared.embedding_service import get_embedding_service
 import numpy as np
 
 logger = logging.getLogger(__name__)
@@ -97,7 +97,8 @@ class DepreciationRateService:
         """
         # Initialize sentence transformer for embeddings
         # Using multilingual model for Spanish fiscal text
-        self.model = SentenceTransformer('paraphrase-multilingual-MiniLM-L12-v2')
+        self.embedding_service = get_embedding_service('paraphrase-multilingual-MiniLM-L12-v2')
+        self.model = self.embedding_service.model
 
         # Database config
         if db_config is None:
@@ -168,7 +169,7 @@ class DepreciationRateService:
             logger.info(f"Searching depreciation rate for: {search_query}")
 
             # 2. Generate embedding
-            query_embedding = self.model.encode(search_query)
+            query_embedding = self.embedding_service.encode(search_query)
 
             # 3. Semantic search in fiscal_regulations
             candidates = self._search_regulations(query_embedding)
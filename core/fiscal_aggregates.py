@@ -0,0 +1,558 @@
+"""
+Agregados fiscales mensuales precalculados.
+
+Mantiene ``fiscal_monthly_aggregates`` por (tenant, año, mes, categoría de IVA,
+tax_source, cuenta SAT) más las dimensiones que usan los reportes (categoría,
+con/sin CFDI, en revisión), de modo que los totales del periodo no requieran
+leer cada ``expense_records``.
+
+Mantenimiento incremental:
+- Triggers sobre ``expense_records`` anotan el id de cada gasto insertado,
+  actualizado o borrado en ``fiscal_aggregate_pending`` (cubre todos los
+  caminos de escritura: adaptador, pipeline fiscal y SQL directo).
+- ``apply_pending_changes`` resta la contribución anterior del gasto
+  (``fiscal_aggregate_contributions``) y suma la nueva; un gasto cancelado
+  simplemente deja de contribuir. Lo llaman los caminos de escritura
+  (arranque del adaptador, alta de gastos, ``rebuild_period``).
+- ``rebuild_period`` recalcula un periodo completo bajo demanda.
+
+El esquema lo instala ``UnifiedDBAdapter._ensure_fiscal_aggregates`` al
+arrancar. Las lecturas no escriben: suman en memoria los cambios aún
+pendientes y, si el esquema no está instalado, devuelven None para que el
+llamador calcule desde ``expense_records``.
+
+Los importes se guardan en centavos enteros para que sumar y restar deltas
+no acumule error de punto flotante.
+"""
+
+import json
+import logging
+import sqlite3
+from contextlib import contextmanager
+from datetime import datetime
+from decimal import Decimal, ROUND_HALF_UP
+from enum import Enum
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from core.sat_catalog_seed import CATEGORY_SAT_MAPPING
+
+logger = logging.getLogger(__name__)
+
+MEASURES = ('cantidad', 'total_cents', 'subtotal_cents', 'iva_cents')
+DIMENSIONS = (
+    'iva_category', 'tax_source', 'sat_account_code',
+    'categoria_slug', 'has_cfdi', 'needs_review',
+)
+
+_SCHEMA = (
+    """
+    CREATE TABLE IF NOT EXISTS fiscal_monthly_aggregates (
+        tenant_id TEXT NOT NULL,
+        year INTEGER NOT NULL,
+        month INTEGER NOT NULL,
+        iva_category TEXT NOT NULL,
+        tax_source TEXT NOT NULL,
+        sat_account_code TEXT NOT NULL DEFAULT '',
+        categoria_slug TEXT NOT NULL DEFAULT '',
+        has_cfdi INTEGER NOT NULL DEFAULT 0,
+        needs_review INTEGER NOT NULL DEFAULT 0,
+        cantidad INTEGER NOT NULL DEFAULT 0,
+        total_cents INTEGER NOT NULL DEFAULT 0,
+        subtotal_cents INTEGER NOT NULL DEFAULT 0,
+        iva_cents INTEGER NOT NULL DEFAULT 0,
+        updated_at TEXT,
+        PRIMARY KEY (tenant_id, year, month, iva_category, tax_source,
+                     sat_account_code, categoria_slug, has_cfdi, needs_review)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS fiscal_aggregate_contributions (
+        expense_id INTEGER PRIMARY KEY,
+        tenant_id TEXT NOT NULL,
+        year INTEGER NOT NULL,
+        month INTEGER NOT NULL,
+        iva_category TEXT NOT NULL,
+        tax_source TEXT NOT NULL,
+        sat_account_code TEXT NOT NULL DEFAULT '',
+        categoria_slug TEXT NOT NULL DEFAULT '',
+        has_cfdi INTEGER NOT NULL DEFAULT 0,
+        needs_review INTEGER NOT NULL DEFAULT 0,
+        cantidad INTEGER NOT NULL DEFAULT 1,
+        total_cents INTEGER NOT NULL DEFAULT 0,
+        subtotal_cents INTEGER NOT NULL DEFAULT 0,
+        iva_cents INTEGER NOT NULL DEFAULT 0
+    )
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS idx_fiscal_contributions_period
+        ON fiscal_aggregate_contributions(tenant_id, year, month, needs_review)
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS fiscal_aggregate_pending (
+        expense_id INTEGER PRIMARY KEY
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_fiscal_aggregates_insert
+    AFTER INSERT ON expense_records
+    BEGIN
+        INSERT OR IGNORE INTO fiscal_aggregate_pending(expense_id) VALUES (NEW.id);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_fiscal_aggregates_update
+    AFTER UPDATE ON expense_records
+    BEGIN
+        INSERT OR IGNORE INTO fiscal_aggregate_pending(expense_id) VALUES (OLD.id);
+        INSERT OR IGNORE INTO fiscal_aggregate_pending(expense_id) VALUES (NEW.id);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_fiscal_aggregates_delete
+    AFTER DELETE ON expense_records
+    BEGIN
+        INSERT OR IGNORE INTO fiscal_aggregate_pending(expense_id) VALUES (OLD.id);
+    END
+    """,
+)
+
+
+_SCHEMA_OBJECTS = (
+    "fiscal_monthly_aggregates",
+    "fiscal_aggregate_contributions",
+    "fiscal_aggregate_pending",
+    "trg_fiscal_aggregates_insert",
+    "trg_fiscal_aggregates_update",
+    "trg_fiscal_aggregates_delete",
+)
+
+
+class IVACategory(Enum):
+    """Categorías de IVA para reporteo."""
+    ACREDITABLE_16 = "acreditable_16"
+    ACREDITABLE_8 = "acreditable_8"
+    NO_ACREDITABLE = "no_acreditable"
+    EXENTO = "exento"
+    TASA_0 = "tasa_0"
+
+
+def normalize_expense_row(row: Any) -> Dict[str, Any]:
+    """Normaliza una fila de expense_records (importes Decimal, tax_source, revisión)."""
+    record = dict(row)
+    metadata_raw = record.get('metadata')
+    metadata: Dict[str, Any] = {}
+    if isinstance(metadata_raw, dict):
+        metadata = metadata_raw
+    elif metadata_raw:
+        try:
+            metadata = json.loads(metadata_raw)
+        except (TypeError, json.JSONDecodeError):
+            metadata = {}
+    record['metadata_dict'] = metadata
+
+    total_amount = Decimal(str(record.get('amount') or 0))
+    subtotal = record.get('subtotal')
+    if subtotal is not None:
+        subtotal = Decimal(str(subtotal))
+    iva_16 = Decimal(str(record.get('iva_16') or 0))
+    iva_8 = Decimal(str(record.get('iva_8') or 0))
+    iva_0 = Decimal(str(record.get('iva_0') or 0))
+    iva_total = iva_16 + iva_8 + iva_0
+    if subtotal is None:
+        subtotal = total_amount - iva_total
+
+    record['total'] = total_amount
+    record['subtotal'] = subtotal
+    record['iva'] = iva_total
+    record['iva_16'] = iva_16
+    record['iva_8'] = iva_8
+    record['iva_0'] = iva_0
+    record['tax_source'] = (record.get('tax_source') or metadata.get('tax_source') or 'unknown').lower()
+    confianza = record.get('categoria_confianza')
+    needs_review_meta = metadata.get('categoria_needs_review')
+    if needs_review_meta is None and confianza is not None:
+        try:
+            needs_review_meta = float(confianza) < 0.6
+        except (TypeError, ValueError):
+            needs_review_meta = False
+    record['needs_review'] = bool(needs_review_meta)
+    record['fecha_gasto'] = record.get('date') or record.get('expense_date')
+    record['merchant_name'] = record.get('merchant_name') or record.get('proveedor')
+    record['description'] = record.get('description') or record.get('descripcion')
+    record['metadata'] = metadata
+    return record
+
+
+def classify_iva(expense: Dict) -> str:
+    """Clasifica el IVA según las reglas fiscales."""
+    categoria_slug = expense.get('categoria_slug')
+    categoria_info = CATEGORY_SAT_MAPPING.get(categoria_slug, {})
+
+    # Gastos no deducibles = IVA no acreditable
+    if categoria_info.get('sat_product_service_code') == '99999998':
+        return IVACategory.NO_ACREDITABLE.value
+
+    # Gastos de representación = IVA no acreditable generalmente
+    if categoria_slug in ['gastos_representacion', 'entretenimiento']:
+        return IVACategory.NO_ACREDITABLE.value
+
+    # Por defecto, IVA es acreditable
+    if expense['iva'] and expense['iva'] > 0:
+        # Determinar tasa
+        if expense['subtotal'] and expense['subtotal'] > 0:
+            tasa = expense['iva'] / expense['subtotal']
+            if tasa >= Decimal('0.15'):  # ~16%
+                return IVACategory.ACREDITABLE_16.value
+            elif tasa >= Decimal('0.07'):  # ~8%
+                return IVACategory.ACREDITABLE_8.value
+
+    if expense['iva'] == 0:
+        return IVACategory.TASA_0.value
+
+    return IVACategory.EXENTO.value
+
+
+def _to_cents(value: Decimal) -> int:
+    return int(Decimal(value).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP) * 100)
+
+
+def _period_of(fecha: Any) -> Optional[Tuple[int, int]]:
+    text = str(fecha or '')[:7]
+    try:
+        year, month = int(text[:4]), int(text[5:7])
+    except ValueError:
+        return None
+    return (year, month) if 1 <= month <= 12 else None
+
+
+def expense_contribution(expense: Dict[str, Any]) -> Dict[str, Any]:
+    """Dimensiones y medidas con las que un gasto normalizado entra a los agregados."""
+    return {
+        'iva_category': expense.get('iva_category') or classify_iva(expense),
+        'tax_source': expense.get('tax_source') or 'unknown',
+        'sat_account_code': expense.get('sat_account_code') or '',
+        'categoria_slug': expense.get('categoria_slug') or '',
+        'has_cfdi': 1 if expense.get('cfdi_uuid') else 0,
+        'needs_review': 1 if expense.get('needs_review') else 0,
+        'cantidad': 1,
+        'total_cents': _to_cents(expense['total']),
+        'subtotal_cents': _to_cents(expense['subtotal'] if expense['subtotal'] is not None else expense['total']),
+        'iva_cents': _to_cents(expense['iva']),
+    }
+
+
+def _row_contribution(row: Any) -> Optional[Dict[str, Any]]:
+    """Contribución de una fila cruda; None si no cuenta (cancelada, sin tenant o sin fecha)."""
+    record = dict(row)
+    if (record.get('status') or '') == 'cancelled' or record.get('tenant_id') is None:
+        return None
+    expense = normalize_expense_row(record)
+    period = _period_of(expense.get('fecha_gasto'))
+    if period is None:
+        return None
+    contribution = expense_contribution(expense)
+    contribution['tenant_id'] = str(record['tenant_id'])
+    contribution['year'], contribution['month'] = period
+    return contribution
+
+
+def ensure_fiscal_aggregate_schema(conn: sqlite3.Connection) -> bool:
+    """Crea tablas y triggers si faltan. Devuelve True si la tabla de agregados es nueva.
+
+    Al crearse por primera vez, todos los gastos existentes quedan pendientes
+    para que el siguiente ``apply_pending_changes`` haga el backfill.
+    """
+    exists = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type='table' AND name='fiscal_monthly_aggregates'"
+    ).fetchone() is not None
+    for statement in _SCHEMA:
+        conn.execute(statement)
+    if not exists:
+        conn.execute("INSERT OR IGNORE INTO fiscal_aggregate_pending(expense_id) SELECT id FROM expense_records")
+        logger.info("Agregados fiscales creados; gastos existentes encolados para backfill")
+    conn.commit()
+    return not exists
+
+
+def fiscal_aggregates_installed(conn: sqlite3.Connection) -> bool:
+    """True si las tablas y los triggers de los agregados existen en la base."""
+    found = conn.execute(
+        f"SELECT COUNT(*) FROM sqlite_master WHERE type IN ('table', 'trigger') "
+        f"AND name IN ({', '.join('?' * len(_SCHEMA_OBJECTS))})",
+        _SCHEMA_OBJECTS,
+    ).fetchone()[0]
+    return found == len(_SCHEMA_OBJECTS)
+
+
+def _apply_delta(conn: sqlite3.Connection, contribution: Dict[str, Any], sign: int, now: str) -> None:
+    key = [contribution['tenant_id'], contribution['year'], contribution['month']]
+    key += [contribution[dim] for dim in DIMENSIONS]
+    deltas = [sign * contribution[measure] for measure in MEASURES]
+    conn.execute(
+        f"""
+        INSERT INTO fiscal_monthly_aggregates (
+            tenant_id, year, month, {', '.join(DIMENSIONS)}, {', '.join(MEASURES)}, updated_at
+        ) VALUES ({', '.join('?' * (3 + len(DIMENSIONS) + len(MEASURES) + 1))})
+        ON CONFLICT (tenant_id, year, month, {', '.join(DIMENSIONS)}) DO UPDATE SET
+            {', '.join(f'{m} = {m} + excluded.{m}' for m in MEASURES)},
+            updated_at = excluded.updated_at
+        """,
+        key + deltas + [now],
+    )
+
+
+def _replace_contribution(
+    conn: sqlite3.Connection,
+    expense_id: int,
+    previous: Optional[Dict[str, Any]],
+    current: Optional[Dict[str, Any]],
+    now: str,
+) -> None:
+    if previous is not None:
+        _apply_delta(conn, previous, -1, now)
+        conn.execute("DELETE FROM fiscal_aggregate_contributions WHERE expense_id = ?", (expense_id,))
+    if current is not None:
+        _apply_delta(conn, current, 1, now)
+        columns = ['expense_id', 'tenant_id', 'year', 'month', *DIMENSIONS, *MEASURES]
+        conn.execute(
+            f"INSERT INTO fiscal_aggregate_contributions ({', '.join(columns)}) "
+            f"VALUES ({', '.join('?' * len(columns))})",
+            [expense_id] + [current[column] for column in columns[1:]],
+        )
+
+
+def _load_contributions(conn: sqlite3.Connection, expense_ids: List[int]) -> Dict[int, Dict[str, Any]]:
+    columns = ['expense_id', 'tenant_id', 'year', 'month', *DIMENSIONS, *MEASURES]
+    result: Dict[int, Dict[str, Any]] = {}
+    for chunk in _chunks(expense_ids):
+        rows = conn.execute(
+            f"SELECT {', '.join(columns)} FROM fiscal_aggregate_contributions "
+            f"WHERE expense_id IN ({', '.join('?' * len(chunk))})",
+            chunk,
+        ).fetchall()
+        for row in rows:
+            result[row[0]] = dict(zip(columns, row))
+    return result
+
+
+def _chunks(values: List[Any], size: int = 500) -> Iterable[List[Any]]:
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+def _select_rows(conn: sqlite3.Connection, query: str, params: Any) -> List[sqlite3.Row]:
+    cursor = conn.cursor()
+    cursor.row_factory = sqlite3.Row
+    return cursor.execute(query, params).fetchall()
+
+
+@contextmanager
+def _read_snapshot(conn: sqlite3.Connection) -> Iterator[None]:
+    # BEGIN diferido: agregados y pendientes se leen del mismo estado sin tomar el candado de escritura
+    if conn.in_transaction:
+        yield
+        return
+    conn.execute("BEGIN")
+    try:
+        yield
+    finally:
+        conn.rollback()
+
+
+def _pending_contributions(
+    conn: sqlite3.Connection,
+) -> Tuple[List[int], Dict[int, Dict[str, Any]], Dict[int, Optional[Dict[str, Any]]]]:
+    """Gastos pendientes con su contribución registrada y la actual, sin escribir nada."""
+    pending = [row[0] for row in conn.execute("SELECT expense_id FROM fiscal_aggregate_pending")]
+    previous = _load_contributions(conn, pending)
+    current: Dict[int, Optional[Dict[str, Any]]] = {}
+    for chunk in _chunks(pending):
+        rows = _select_rows(
+            conn, f"SELECT * FROM expense_records WHERE id IN ({', '.join('?' * len(chunk))})", chunk
+        )
+        current.update((row['id'], _row_contribution(row)) for row in rows)
+    return pending, previous, current
+
+
+def _begin(conn: sqlite3.Connection) -> None:
+    # Serializa el drenado: dos lectores concurrentes no deben aplicar el mismo delta dos veces
+    if not conn.in_transaction:
+        conn.execute("BEGIN IMMEDIATE")
+
+
+def apply_pending_changes(conn: sqlite3.Connection) -> int:
+    """Aplica a los agregados los gastos modificados desde la última llamada."""
+    _begin(conn)
+    pending = [row[0] for row in conn.execute("SELECT expense_id FROM fiscal_aggregate_pending")]
+    if not pending:
+        conn.commit()
+        return 0
+
+    now = datetime.utcnow().isoformat()
+    previous = _load_contributions(conn, pending)
+    for chunk in _chunks(pending):
+        rows = _select_rows(
+            conn, f"SELECT * FROM expense_records WHERE id IN ({', '.join('?' * len(chunk))})", chunk
+        )
+        current = {row['id']: _row_contribution(row) for row in rows}
+        for expense_id in chunk:
+            _replace_contribution(conn, expense_id, previous.get(expense_id), current.get(expense_id), now)
+        conn.execute(
+            f"DELETE FROM fiscal_aggregate_pending WHERE expense_id IN ({', '.join('?' * len(chunk))})", chunk
+        )
+    conn.execute("DELETE FROM fiscal_monthly_aggregates WHERE cantidad = 0")
+    conn.commit()
+    logger.debug("Agregados fiscales: %s gastos aplicados", len(pending))
+    return len(pending)
+
+
+def period_date_sql(conn: sqlite3.Connection) -> str:
+    """Equivalente SQL de ``fecha_gasto`` (``date`` o, si viene vacía, ``expense_date``)."""
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(expense_records)")}
+    present = [column for column in ('date', 'expense_date') if column in columns]
+    if not present:
+        raise sqlite3.OperationalError("expense_records no tiene columna de fecha (date / expense_date)")
+    if len(present) == 1:
+        return present[0]
+    return "COALESCE(NULLIF(date, ''), expense_date)"
+
+
+def rebuild_period(conn: sqlite3.Connection, tenant_id: Any, year: int, month: int) -> int:
+    """Recalcula desde cero los agregados de un periodo. Devuelve los gastos que cuentan."""
+    apply_pending_changes(conn)
+    _begin(conn)
+    tenant_key = str(tenant_id)
+    conn.execute(
+        "DELETE FROM fiscal_monthly_aggregates WHERE tenant_id = ? AND year = ? AND month = ?",
+        (tenant_key, year, month),
+    )
+    conn.execute(
+        "DELETE FROM fiscal_aggregate_contributions WHERE tenant_id = ? AND year = ? AND month = ?",
+        (tenant_key, year, month),
+    )
+    # Mismo criterio de periodo que _row_contribution, para no dejar fuera
+    # gastos que solo traen expense_date
+    rows = _select_rows(
+        conn,
+        f"SELECT * FROM expense_records WHERE tenant_id = ? AND substr({period_date_sql(conn)}, 1, 7) = ?",
+        (tenant_id, f"{year:04d}-{month:02d}"),
+    )
+    now = datetime.utcnow().isoformat()
+    contributions = {row['id']: _row_contribution(row) for row in rows}
+    previous = _load_contributions(conn, list(contributions))  # gastos registrados en otro periodo
+    counted = 0
+    for expense_id, contribution in contributions.items():
+        _replace_contribution(conn, expense_id, previous.get(expense_id), contribution, now)
+        counted += contribution is not None
+    conn.execute("DELETE FROM fiscal_monthly_aggregates WHERE cantidad = 0")
+    conn.commit()
+    logger.info("Agregados fiscales reconstruidos para %s %04d-%02d (%s gastos)", tenant_key, year, month, counted)
+    return counted
+
+
+def fetch_period_aggregates(
+    conn: sqlite3.Connection,
+    tenant_id: Any,
+    year: int,
+    month: int,
+    tax_source: Optional[str] = None,
+) -> Optional[List[Dict[str, Any]]]:
+    """Filas agregadas del periodo, con importes en pesos (float).
+
+    Solo lee: los gastos pendientes se suman en memoria. None si los
+    agregados no están instalados.
+    """
+    if not fiscal_aggregates_installed(conn):
+        return None
+    tenant_key = str(tenant_id)
+    query = (
+        f"SELECT {', '.join(DIMENSIONS)}, {', '.join(MEASURES)} FROM fiscal_monthly_aggregates "
+        "WHERE tenant_id = ? AND year = ? AND month = ?"
+    )
+    params: List[Any] = [tenant_key, year, month]
+    if tax_source:
+        query += " AND tax_source = ?"
+        params.append(tax_source)
+    with _read_snapshot(conn):
+        totals = {tuple(row)[:len(DIMENSIONS)]: list(tuple(row)[len(DIMENSIONS):])
+                  for row in conn.execute(query, params)}
+        pending, previous, current = _pending_contributions(conn)
+
+    for expense_id in pending:
+        for contribution, sign in ((previous.get(expense_id), -1), (current.get(expense_id), 1)):
+            if contribution is None:
+                continue
+            if (contribution['tenant_id'], contribution['year'], contribution['month']) != (tenant_key, year, month):
+                continue
+            if tax_source and contribution['tax_source'] != tax_source:
+                continue
+            measures = totals.setdefault(tuple(contribution[dim] for dim in DIMENSIONS), [0] * len(MEASURES))
+            for index, measure in enumerate(MEASURES):
+                measures[index] += sign * contribution[measure]
+
+    rows = []
+    for key, measures in totals.items():
+        data = dict(zip(DIMENSIONS + MEASURES, key + tuple(measures)))
+        if not data['cantidad']:
+            continue
+        for measure in ('total', 'subtotal', 'iva'):
+            data[measure] = data.pop(f'{measure}_cents') / 100.0
+        data['has_cfdi'] = bool(data['has_cfdi'])
+        data['needs_review'] = bool(data['needs_review'])
+        rows.append(data)
+    return rows
+
+
+def fetch_review_expense_ids(
+    conn: sqlite3.Connection,
+    tenant_id: Any,
+    period: Optional[Tuple[int, int]] = None,
+    tax_source: Optional[str] = None,
+) -> Optional[List[int]]:
+    """Ids de gastos en revisión (de un periodo o de todos), sin leer expense_records completo.
+
+    Solo lee, igual que ``fetch_period_aggregates``; None si los agregados no
+    están instalados.
+    """
+    if not fiscal_aggregates_installed(conn):
+        return None
+    tenant_key = str(tenant_id)
+    query = "SELECT expense_id FROM fiscal_aggregate_contributions WHERE tenant_id = ? AND needs_review = 1"
+    params: List[Any] = [tenant_key]
+    if period:
+        query += " AND year = ? AND month = ?"
+        params.extend(period)
+    if tax_source:
+        query += " AND tax_source = ?"
+        params.append(tax_source)
+    with _read_snapshot(conn):
+        expense_ids = {row[0] for row in conn.execute(query, params)}
+        pending, _, current = _pending_contributions(conn)
+
+    for expense_id in pending:
+        expense_ids.discard(expense_id)
+        contribution = current.get(expense_id)
+        if (
+            contribution is not None
+            and contribution['needs_review']
+            and contribution['tenant_id'] == tenant_key
+            and (not period or (contribution['year'], contribution['month']) == tuple(period))
+            and (not tax_source or contribution['tax_source'] == tax_source)
+        ):
+            expense_ids.add(expense_id)
+    return sorted(expense_ids)
+
+
+__all__ = [
+    "IVACategory",
+    "apply_pending_changes",
+    "classify_iva",
+    "ensure_fiscal_aggregate_schema",
+    "expense_contribution",
+    "fetch_period_aggregates",
+    "fetch_review_expense_ids",
+    "fiscal_aggregates_installed",
+    "normalize_expense_row",
+    "period_date_sql",
+    "rebuild_period",
+]
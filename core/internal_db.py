@@ -11,11 +11,12 @@ from __future__ import annotations
 import json
 import logging
 import sqlite3
+from contextlib import contextmanager
 from datetime import datetime, timedelta
 from pathlib import Path
 from threading import Lock
 from collections import defaultdict
-from typing import Any, Dict, Iterable, List, Optional
+from typing import Any, Dict, Iterable, Iterator, List, Optional
 
 import uuid
 
@@ -36,6 +37,25 @@ def _get_db_path() -> Path:
     return db_path
 
 
+@contextmanager
+def get_sqlite_connection(db_path: Optional[Path] = None) -> Iterator[sqlite3.Connection]:
+    """Open the unified SQLite database (``expense_records`` with tenant columns).
+
+    Used by the fiscal report generators; commits on success and always closes.
+    """
+
+    connection = sqlite3.connect(str(db_path or config.UNIFIED_DB_PATH))
+    connection.row_factory = sqlite3.Row
+    try:
+        yield connection
+        connection.commit()
+    except Exception:
+        connection.rollback()
+        raise
+    finally:
+        connection.close()
+
+
 def _ensure_storage_path(path: Path) -> None:
     """Make sure the directory for the database exists."""
 
@@ -2230,6 +2250,7 @@ def get_company_demo_snapshot(company_id: str) -> Dict[str, Any]:
 
 __all__ = [
     "initialize_internal_database",
+    "get_sqlite_connection",
     "get_account_catalog",
     "record_internal_expense",
     "fetch_expense_records",
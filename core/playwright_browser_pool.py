@@ -0,0 +1,353 @@
+"""
+Pool de browsers Chromium calientes para PlaywrightExecutor.
+
+Lanzar Chromium cuesta varios segundos por ejecución; este pool mantiene N
+browsers headless abiertos y entrega a cada job un contexto aislado
+(cookies, storage y descargas propias) que se cierra al terminar.
+
+Características:
+- Concurrencia acotada: ``size * max_contexts_per_browser`` contextos a la vez
+- Reciclaje de cada browser tras ``max_uses`` contextos o si se desconecta (crash)
+- Bloqueo opcional de recursos por portal (imágenes, fuentes, media)
+- Métricas: utilización, contextos en uso, latencia de obtener un contexto
+
+Configuración por entorno:
+- PLAYWRIGHT_POOL_SIZE: browsers calientes (default 2)
+- PLAYWRIGHT_POOL_MAX_CONTEXTS: contextos simultáneos por browser (default 4)
+- PLAYWRIGHT_BROWSER_MAX_USES: contextos antes de reciclar un browser (default 50)
+- PLAYWRIGHT_POOL_ACQUIRE_TIMEOUT: segundos máximos de espera por un contexto (default 60)
+"""
+
+import asyncio
+import logging
+import os
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_POOL_SIZE = int(os.getenv("PLAYWRIGHT_POOL_SIZE", "2"))
+DEFAULT_MAX_CONTEXTS = int(os.getenv("PLAYWRIGHT_POOL_MAX_CONTEXTS", "4"))
+DEFAULT_MAX_USES = int(os.getenv("PLAYWRIGHT_BROWSER_MAX_USES", "50"))
+DEFAULT_ACQUIRE_TIMEOUT = float(os.getenv("PLAYWRIGHT_POOL_ACQUIRE_TIMEOUT", "60"))
+
+DEFAULT_LAUNCH_ARGS = [
+    "--disable-blink-features=AutomationControlled",
+    "--disable-web-security",
+    "--disable-features=VizDisplayCompositor",
+    "--disable-dev-shm-usage",
+]
+
+# Tipos de recurso de Playwright que se pueden bloquear por portal
+BLOCKABLE_RESOURCE_TYPES = frozenset({"image", "font", "media", "stylesheet"})
+
+
+class BrowserPoolTimeoutError(RuntimeError):
+    """No se obtuvo un contexto del pool dentro del tiempo de espera."""
+
+
+async def apply_resource_blocking(context: Any, resource_types: Optional[Iterable[str]]) -> None:
+    """Abortar en el contexto las peticiones de los tipos de recurso indicados"""
+    blocked = frozenset(resource_types or ()) & BLOCKABLE_RESOURCE_TYPES
+    if not blocked:
+        return
+
+    async def _block(route):
+        if route.request.resource_type in blocked:
+            await route.abort()
+        else:
+            await route.fallback()
+
+    await context.route("**/*", _block)
+
+
+class _PooledBrowser:
+    __slots__ = ("browser", "uses", "active", "connected", "created_at")
+
+    def __init__(self, browser: Any):
+        self.browser = browser
+        self.uses = 0
+        self.active = 0
+        self.connected = True
+        self.created_at = time.monotonic()
+
+
+class ContextLease:
+    """Contexto prestado por el pool; se devuelve con ``BrowserPool.release``"""
+
+    __slots__ = ("context", "_entry", "acquired_at")
+
+    def __init__(self, context: Any, entry: _PooledBrowser):
+        self.context = context
+        self._entry = entry
+        self.acquired_at = time.monotonic()
+
+
+async def _start_playwright() -> Any:
+    from playwright.async_api import async_playwright
+
+    return await async_playwright().start()
+
+
+class BrowserPool:
+    """
+    Pool de browsers Chromium headless con contextos aislados por job.
+
+    Args:
+        size: Browsers calientes
+        max_contexts_per_browser: Contextos simultáneos por browser
+        max_uses: Contextos servidos antes de reciclar un browser
+        acquire_timeout: Segundos máximos de espera por un contexto
+        launch_options: Opciones extra de ``chromium.launch``
+        launcher: Corrutina que devuelve el objeto playwright (para tests)
+    """
+
+    def __init__(
+        self,
+        size: int = DEFAULT_POOL_SIZE,
+        max_contexts_per_browser: int = DEFAULT_MAX_CONTEXTS,
+        max_uses: int = DEFAULT_MAX_USES,
+        acquire_timeout: float = DEFAULT_ACQUIRE_TIMEOUT,
+        launch_options: Optional[Dict[str, Any]] = None,
+        launcher: Optional[Callable[[], Awaitable[Any]]] = None,
+    ):
+        if size < 1 or max_contexts_per_browser < 1:
+            raise ValueError("size and max_contexts_per_browser must be >= 1")
+
+        self.size = size
+        self.max_contexts_per_browser = max_contexts_per_browser
+        self.max_uses = max_uses
+        self.acquire_timeout = acquire_timeout
+        self.launch_options = {"headless": True, "args": list(DEFAULT_LAUNCH_ARGS)}
+        self.launch_options.update(launch_options or {})
+        self._launcher = launcher or _start_playwright
+
+        self._playwright = None
+        self._browsers: List[_PooledBrowser] = []
+        self._slots = asyncio.Semaphore(size * max_contexts_per_browser)
+        self._lock = asyncio.Lock()
+        self._closed = False
+        self._waiting = 0
+
+        # Métricas
+        self._acquires = 0
+        self._timeouts = 0
+        self._launched = 0
+        self._recycled = 0
+        self._crashed = 0
+        self._acquire_latencies: Deque[float] = deque(maxlen=1024)
+
+    @property
+    def capacity(self) -> int:
+        return self.size * self.max_contexts_per_browser
+
+    # ------------------------------------------------------------------
+    # Browsers
+    # ------------------------------------------------------------------
+
+    async def start(self) -> None:
+        """Arrancar playwright y calentar los browsers"""
+        async with self._lock:
+            await self._fill()
+
+    async def _launch(self) -> _PooledBrowser:
+        if self._playwright is None:
+            self._playwright = await self._launcher()
+        browser = await self._playwright.chromium.launch(**self.launch_options)
+        entry = _PooledBrowser(browser)
+
+        def _on_disconnected(*_):
+            entry.connected = False
+
+        try:
+            browser.on("disconnected", _on_disconnected)
+        except Exception:  # pragma: no cover - browsers sin eventos
+            pass
+        self._launched += 1
+        return entry
+
+    async def _fill(self) -> None:
+        """Reemplazar browsers caídos y completar ``size`` (con el lock tomado)"""
+        if self._closed:
+            raise RuntimeError("BrowserPool está cerrado")
+        for entry in [e for e in self._browsers if not self._is_alive(e)]:
+            self._browsers.remove(entry)
+            self._crashed += 1
+            logger.warning("Browser del pool desconectado; se reemplaza")
+            await self._close_browser(entry)
+        while len(self._browsers) < self.size:
+            self._browsers.append(await self._launch())
+
+    @staticmethod
+    def _is_alive(entry: _PooledBrowser) -> bool:
+        if not entry.connected:
+            return False
+        is_connected = getattr(entry.browser, "is_connected", None)
+        return bool(is_connected()) if callable(is_connected) else True
+
+    @staticmethod
+    async def _close_browser(entry: _PooledBrowser) -> None:
+        try:
+            await entry.browser.close()
+        except Exception:
+            pass
+
+    # ------------------------------------------------------------------
+    # Contextos
+    # ------------------------------------------------------------------
+
+    async def acquire(
+        self,
+        context_options: Optional[Dict[str, Any]] = None,
+        block_resources: Optional[Iterable[str]] = None,
+        timeout: Optional[float] = None,
+    ) -> ContextLease:
+        """Obtener un contexto nuevo en el browser menos cargado"""
+        started = time.monotonic()
+        timeout = self.acquire_timeout if timeout is None else timeout
+        self._waiting += 1
+        try:
+            await asyncio.wait_for(self._slots.acquire(), timeout=timeout)
+        except asyncio.TimeoutError:
+            self._timeouts += 1
+            raise BrowserPoolTimeoutError(
+                f"Sin contextos libres tras {timeout:g}s (capacidad={self.capacity})"
+            )
+        finally:
+            self._waiting -= 1
+
+        try:
+            async with self._lock:
+                await self._fill()
+                # Los browsers por reciclar solo reciben contextos si no hay otro libre
+                entry = min(
+                    (e for e in self._browsers if e.active < self.max_contexts_per_browser),
+                    key=lambda e: (bool(self.max_uses) and e.uses >= self.max_uses, e.active, e.uses),
+                )
+                entry.active += 1
+                entry.uses += 1
+
+            try:
+                context = await entry.browser.new_context(**(context_options or {}))
+                await apply_resource_blocking(context, block_resources)
+            except Exception:
+                entry.active -= 1
+                if not self._is_alive(entry):
+                    entry.connected = False
+                raise
+        except Exception:
+            self._slots.release()
+            raise
+
+        self._acquires += 1
+        self._acquire_latencies.append(time.monotonic() - started)
+        return ContextLease(context, entry)
+
+    async def release(self, lease: ContextLease) -> None:
+        """Cerrar el contexto y reciclar el browser si ya cumplió ``max_uses``"""
+        entry = lease._entry
+        try:
+            await lease.context.close()
+        except Exception as e:
+            logger.debug(f"Error cerrando contexto del pool: {e}")
+
+        to_close = None
+        async with self._lock:
+            entry.active -= 1
+            worn_out = self.max_uses and entry.uses >= self.max_uses
+            if entry in self._browsers and entry.active == 0 and (worn_out or not self._is_alive(entry)):
+                self._browsers.remove(entry)
+                if worn_out:
+                    self._recycled += 1
+                else:
+                    self._crashed += 1
+                to_close = entry
+        self._slots.release()
+
+        if to_close is not None:
+            await self._close_browser(to_close)
+
+    async def close(self) -> None:
+        """Cerrar todos los browsers y playwright"""
+        async with self._lock:
+            self._closed = True
+            browsers, self._browsers = self._browsers, []
+        for entry in browsers:
+            await self._close_browser(entry)
+        if self._playwright is not None:
+            try:
+                await self._playwright.stop()
+            except Exception:
+                pass
+            self._playwright = None
+
+    # ------------------------------------------------------------------
+    # Métricas
+    # ------------------------------------------------------------------
+
+    def get_metrics(self) -> Dict[str, Any]:
+        in_use = sum(entry.active for entry in self._browsers)
+        latencies = sorted(self._acquire_latencies)
+        metrics = {
+            "browsers": len(self._browsers),
+            "size": self.size,
+            "capacity": self.capacity,
+            "contexts_in_use": in_use,
+            "utilization": in_use / self.capacity,
+            "waiting": self._waiting,
+            "acquires": self._acquires,
+            "timeouts": self._timeouts,
+            "launched": self._launched,
+            "recycled": self._recycled,
+            "crashed": self._crashed,
+        }
+        if latencies:
+            metrics["acquire_latency_ms"] = {
+                "avg": round(sum(latencies) / len(latencies) * 1000, 3),
+                "p50": round(latencies[len(latencies) // 2] * 1000, 3),
+                "p95": round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))] * 1000, 3),
+                "max": round(latencies[-1] * 1000, 3),
+            }
+        else:
+            metrics["acquire_latency_ms"] = {"avg": 0.0, "p50": 0.0, "p95": 0.0, "max": 0.0}
+        return metrics
+
+
+_pool: Optional[BrowserPool] = None
+_pool_loop: Optional[asyncio.AbstractEventLoop] = None
+
+
+def _discard_pool(pool: BrowserPool, loop: asyncio.AbstractEventLoop) -> None:
+    """Cerrar un pool de otro event loop; solo se puede si ese loop sigue corriendo"""
+    if pool._closed:
+        return
+    if loop.is_running() and not loop.is_closed():
+        asyncio.run_coroutine_threadsafe(pool.close(), loop)
+    else:
+        logger.warning("Pool de browsers abandonado: su event loop ya no corre y no se puede cerrar")
+
+
+def get_browser_pool() -> BrowserPool:
+    """Pool compartido del proceso (los objetos de playwright viven en un event loop)"""
+    global _pool, _pool_loop
+    loop = asyncio.get_running_loop()
+    if _pool is None or _pool._closed or _pool_loop is not loop:
+        if _pool is not None and _pool_loop is not None and _pool_loop is not loop:
+            _discard_pool(_pool, _pool_loop)
+        _pool = BrowserPool()
+        _pool_loop = loop
+    return _pool
+
+
+async def close_browser_pool() -> None:
+    """Cerrar el pool compartido (llamar en shutdown de FastAPI)"""
+    global _pool, _pool_loop
+    pool, loop = _pool, _pool_loop
+    _pool = _pool_loop = None
+    if pool is None:
+        return
+    if loop is asyncio.get_running_loop():
+        await pool.close()
+    else:
+        _discard_pool(pool, loop)
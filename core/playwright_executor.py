@@ -18,6 +18,7 @@ from pathlib import Path
 import uuid
 
 from .ai_rpa_planner import RPAPlan, RPAAction, ActionType
+from .playwright_browser_pool import apply_resource_blocking, get_browser_pool
 
 logger = logging.getLogger(__name__)
 
@@ -89,10 +90,19 @@ class PlaywrightExecutor:
         self.screenshot_on_error = True
         self.save_har = True  # Guardar tráfico de red
 
+        # Pool de browsers calientes (desactivar con use_browser_pool=False)
+        self.use_browser_pool = self.config.get(
+            "use_browser_pool",
+            os.getenv("PLAYWRIGHT_USE_BROWSER_POOL", "true").lower() == "true"
+        )
+
         # Variables de estado
         self._current_execution = None
         self._browser = None
+        self._context = None
         self._page = None
+        self._lease = None
+        self._pool = None
 
     async def execute_plan(
         self,
@@ -199,27 +209,9 @@ class PlaywrightExecutor:
         browser_config: Dict[str, Any],
         execution_config: Optional[Dict[str, Any]]
     ):
-        """Configurar y lanzar el browser"""
+        """Configurar el browser: contexto del pool caliente o Chromium dedicado"""
 
         try:
-            from playwright.async_api import async_playwright
-
-            self._playwright = await async_playwright().__aenter__()
-
-            # Configuración del browser
-            config = {
-                "headless": browser_config.get("headless", False),
-                "slow_mo": execution_config.get("slow_mo", 100) if execution_config else 100,
-                "args": [
-                    "--disable-blink-features=AutomationControlled",
-                    "--disable-web-security",
-                    "--disable-features=VizDisplayCompositor"
-                ]
-            }
-
-            # Lanzar browser
-            self._browser = await self._playwright.chromium.launch(**config)
-
             # Crear contexto con configuración específica
             context_config = {
                 "viewport": browser_config.get("viewport", {"width": 1920, "height": 1080}),
@@ -238,7 +230,39 @@ class PlaywrightExecutor:
                 har_path = self.logs_dir / f"execution_{self._current_execution.execution_id}.har"
                 context_config["record_har_path"] = str(har_path)
 
-            self._context = await self._browser.new_context(**context_config)
+            # Tipos de recurso a bloquear por portal (p.ej. ["image", "font"])
+            block_resources = browser_config.get("block_resources")
+            if execution_config and "block_resources" in execution_config:
+                block_resources = execution_config["block_resources"]
+
+            slow_mo = execution_config.get("slow_mo", 0) if execution_config else 0
+            headless = browser_config.get("headless", True)
+
+            if self.use_browser_pool and headless and not slow_mo:
+                # Browser caliente del pool: solo se crea un contexto aislado
+                self._pool = get_browser_pool()
+                self._lease = await self._pool.acquire(context_config, block_resources)
+                self._context = self._lease.context
+            else:
+                from playwright.async_api import async_playwright
+
+                self._playwright = await async_playwright().__aenter__()
+
+                # Configuración del browser
+                config = {
+                    "headless": headless,
+                    "slow_mo": slow_mo,
+                    "args": [
+                        "--disable-blink-features=AutomationControlled",
+                        "--disable-web-security",
+                        "--disable-features=VizDisplayCompositor"
+                    ]
+                }
+
+                # Lanzar browser
+                self._browser = await self._playwright.chromium.launch(**config)
+                self._context = await self._browser.new_context(**context_config)
+                await apply_resource_blocking(self._context, block_resources)
 
             # Crear página
             self._page = await self._context.new_page()
@@ -640,8 +664,8 @@ class PlaywrightExecutor:
 
     async def _handle_route(self, route):
         """Interceptar requests si es necesario"""
-        # Por ahora, permitir todos los requests
-        await route.continue_()
+        # Delegar a las rutas del contexto (bloqueo de recursos por portal)
+        await route.fallback()
 
     def _handle_console_message(self, msg):
         """Manejar mensajes de consola del browser"""
@@ -667,6 +691,12 @@ class PlaywrightExecutor:
                 await self._page.close()
                 self._page = None
 
+            if self._lease is not None:
+                # El pool cierra el contexto y conserva el browser caliente
+                lease, self._lease = self._lease, None
+                self._context = None
+                await self._pool.release(lease)
+
             if self._context:
                 await self._context.close()
                 self._context = None
@@ -675,8 +705,9 @@ class PlaywrightExecutor:
                 await self._browser.close()
                 self._browser = None
 
-            if hasattr(self, '_playwright'):
+            if getattr(self, '_playwright', None) is not None:
                 await self._playwright.__aexit__(None, None, None)
+                self._playwright = None
 
             logger.info("Recursos del browser limpiados")
 
@@ -10,7 +10,7 @@ try:
 except ImportError:  # pragma: no cover - pandas no disponible en algunos entornos
     pd = None
 from datetime import datetime, date, timedelta
-from typing import List, Dict, Any, Optional, Tuple
+from typing import List, Dict, Any, Iterator, Optional, Tuple
 from pathlib import Path
 import logging
 import PyPDF2
@@ -45,6 +45,171 @@ POSTGRES_CONFIG = {
     "password": os.getenv("POSTGRES_PASSWORD", "changeme")
 }
 
+# Ingesta por página para estados grandes: "never" (default), "auto" (por número de páginas), "always".
+# El modo streaming usa solo el extractor de texto (sin Gemini/Inbursa/intelligent_parser),
+# por eso es opt-in.
+BANK_PDF_STREAMING = os.getenv("BANK_PDF_STREAMING", "never").lower()
+BANK_PDF_STREAM_MIN_PAGES = int(os.getenv("BANK_PDF_STREAM_MIN_PAGES", "150"))
+BANK_PDF_STREAM_HEADER_PAGES = int(os.getenv("BANK_PDF_STREAM_HEADER_PAGES", "3"))
+
+PERIOD_PATTERNS = [
+    r'periodo\s+del?\s+(\d{1,2}[\/\-]\d{1,2}[\/\-]\d{2,4})\s+al?\s+(\d{1,2}[\/\-]\d{1,2}[\/\-]\d{2,4})',
+    r'from\s+(\d{1,2}[\/\-]\d{1,2}[\/\-]\d{2,4})\s+to\s+(\d{1,2}[\/\-]\d{1,2}[\/\-]\d{2,4})',
+]
+
+BALANCE_PATTERNS = [
+    r'saldo\s+inicial[:\s]+\$?\s*([+-]?\d{1,3}(?:,\d{3})*(?:\.\d{2})?)',
+    r'saldo\s+final[:\s]+\$?\s*([+-]?\d{1,3}(?:,\d{3})*(?:\.\d{2})?)',
+    r'balance\s+anterior[:\s]+\$?\s*([+-]?\d{1,3}(?:,\d{3})*(?:\.\d{2})?)',
+]
+
+
+class _PeriodInfoScanner:
+    """
+    Periodo y saldos acumulados sobre uno o varios fragmentos de texto.
+
+    Cada patrón conserva su primera coincidencia, así que alimentar página por
+    página da el mismo resultado que buscar sobre el texto completo.
+    """
+
+    def __init__(self, parse_date):
+        self._parse_date = parse_date
+        self._period_matches: Dict[int, Tuple[str, str]] = {}
+        self._balance_matches: Dict[int, str] = {}
+
+    def feed(self, text: str) -> None:
+        for idx, pattern in enumerate(PERIOD_PATTERNS):
+            if idx not in self._period_matches:
+                match = re.search(pattern, text, re.IGNORECASE)
+                if match:
+                    self._period_matches[idx] = (match.group(1), match.group(2))
+        for idx, pattern in enumerate(BALANCE_PATTERNS):
+            if idx not in self._balance_matches:
+                match = re.search(pattern, text, re.IGNORECASE)
+                if match:
+                    self._balance_matches[idx] = match.group(1)
+
+    def info(self) -> Dict[str, Any]:
+        info = {
+            'period_start': None,
+            'period_end': None,
+            'opening_balance': 0.0,
+            'closing_balance': 0.0
+        }
+
+        for idx in range(len(PERIOD_PATTERNS)):
+            if idx in self._period_matches:
+                start_raw, end_raw = self._period_matches[idx]
+                start_date = self._parse_date(start_raw)
+                end_date = self._parse_date(end_raw)
+                if start_date and end_date:
+                    info['period_start'] = start_date
+                    info['period_end'] = end_date
+                    break
+
+        for idx, pattern in enumerate(BALANCE_PATTERNS):
+            raw = self._balance_matches.get(idx)
+            if raw is None:
+                continue
+            try:
+                if 'inicial' in pattern or 'anterior' in pattern:
+                    info['opening_balance'] = float(raw.replace(',', ''))
+                elif 'final' in pattern:
+                    info['closing_balance'] = float(raw.replace(',', ''))
+            except ValueError:
+                pass
+
+        return info
+
+    def year_hint(self) -> Optional[int]:
+        info = self.info()
+        if info.get('period_end'):
+            return info['period_end'].year
+        if info.get('period_start'):
+            return info['period_start'].year
+        return None
+
+
+class _TextTransactionExtractor:
+    """
+    Extracción de transacciones línea por línea con estado entre llamadas.
+
+    Deduplica por (fecha, descripción normalizada, monto) y, si el banco lo
+    indica, une líneas de concepto a la última transacción vista, aunque la
+    continuación llegue en otra página.
+    """
+
+    def __init__(self, parser: 'BankFileParser', account_id: int, user_id: int, tenant_id: int):
+        self.parser = parser
+        self.account_id = account_id
+        self.user_id = user_id
+        self.tenant_id = tenant_id
+        self._transactions_map: Dict[Tuple[str, str, float], BankTransaction] = {}
+        self._ordered_keys: List[Tuple[str, str, float]] = []
+        self._last_key: Optional[Tuple[str, str, float]] = None
+
+    @property
+    def count(self) -> int:
+        return len(self._ordered_keys)
+
+    def transactions(self) -> List[BankTransaction]:
+        return [self._transactions_map[key] for key in self._ordered_keys]
+
+    def feed(self, lines: List[str]) -> List[BankTransaction]:
+        """Procesar líneas y devolver solo las transacciones nuevas."""
+        parser = self.parser
+        new_transactions: List[BankTransaction] = []
+
+        for line in lines:
+            line = line.strip()
+            if not line:
+                continue
+
+            # Buscar líneas que parezcan transacciones
+            transaction = None
+            for regex in parser.custom_line_regexes:
+                match = regex.match(line)
+                if match:
+                    transaction = parser._parse_custom_transaction_line(
+                        match, line, self.account_id, self.user_id, self.tenant_id
+                    )
+                    break
+
+            if not transaction and parser._looks_like_transaction(line):
+                transaction = parser._parse_transaction_line(
+                    line, self.account_id, self.user_id, self.tenant_id
+                )
+
+            if transaction:
+                if self._process(transaction):
+                    new_transactions.append(transaction)
+            elif parser.merge_multiline_concepts and self._last_key and not parser._should_skip_description(line):
+                existing = self._transactions_map.get(self._last_key)
+                if existing:
+                    existing.description = parser._merge_descriptions(existing.description, line)
+
+        return new_transactions
+
+    def _process(self, txn: BankTransaction) -> bool:
+        description_signature = normalize_description(txn.description)
+        key = (
+            txn.transaction_date.isoformat() if txn.transaction_date else '',
+            description_signature,
+            round(float(txn.amount or 0.0), 2),
+        )
+        self._last_key = key
+
+        existing = self._transactions_map.get(key)
+        if existing is not None:
+            existing.description = self.parser._merge_descriptions(existing.description, txn.description)
+            if getattr(txn, 'balance', None) is not None:
+                existing.balance = txn.balance
+            return False
+
+        self._transactions_map[key] = txn
+        self._ordered_keys.append(key)
+        return True
+
 
 class BankFileParser:
     """Parser universal para estados de cuenta bancarios"""
@@ -680,6 +845,25 @@ class BankFileParser:
         else:
             logger.warning(f"⚠️ Could not retrieve account info, MSI detection will be skipped")
 
+        if file_type.lower() == 'pdf' and self._should_stream_pdf(file_path):
+            # 📄 Estados multi-año: ingesta por página con memoria acotada
+            logger.info("📄 Using page-streaming parser for large PDF...")
+            transactions, summary = self.parse_pdf_streaming(file_path, account_id, user_id, tenant_id)
+            if not summary.get('detected_bank') and account_info and account_info.get('bank_name'):
+                self._apply_bank_rules(account_info['bank_name'])
+            transactions = self._apply_improved_classification(transactions)
+            summary['transaction_count'] = len(transactions)
+            summary = self._augment_summary(summary, transactions)
+
+            if account_info:
+                logger.info("🔍 Running MSI detection for streamed transactions...")
+                transactions = self._detect_msi_candidates(
+                    transactions, account_info,
+                    summary.get('period_start'), summary.get('period_end')
+                )
+
+            return transactions, summary
+
         if file_type.lower() == 'pdf':
             # 🤖 STRATEGY 1: Try Gemini Vision AI Parser FIRST (most powerful)
             try:
@@ -934,18 +1118,7 @@ class BankFileParser:
     ) -> Tuple[List[BankTransaction], Dict[str, Any]]:
         """Parsear archivo PDF"""
         transactions = []
-        summary = {
-            'total_credits': 0.0,
-            'total_debits': 0.0,
-            'transaction_count': 0,
-            'opening_balance': 0.0,
-            'closing_balance': 0.0,
-            'period_start': None,
-            'period_end': None,
-            'total_incomes': 0.0,
-            'total_expenses': 0.0,
-            'total_transfers': 0.0,
-        }
+        summary = self._empty_pdf_summary()
 
         try:
             # Intentar primero con el parser robusto
@@ -964,14 +1137,15 @@ class BankFileParser:
             # Fallback al método original
             with open(file_path, 'rb') as file:
                 reader = PyPDF2.PdfReader(file)
-                full_text = ""
+                page_texts = []
 
                 for page in reader.pages:
                     try:
-                        full_text += page.extract_text() + "\n"
+                        page_texts.append(page.extract_text() + "\n")
                     except Exception as e:
                         logger.warning(f"Error extracting text from page: {e}")
                         continue
+                full_text = "".join(page_texts)
 
             detected_bank = self.bank_detector.detect_bank_from_text(full_text)
             self._apply_bank_rules(detected_bank)
@@ -997,18 +1171,7 @@ class BankFileParser:
 
             # Calcular totales
             for txn in transactions:
-                amount_abs = abs(txn.amount)
-                if txn.transaction_type == TransactionType.CREDIT:
-                    summary['total_credits'] += amount_abs
-                else:
-                    summary['total_debits'] += amount_abs
-
-                if txn.movement_kind == MovementKind.INGRESO:
-                    summary['total_incomes'] += amount_abs
-                elif txn.movement_kind == MovementKind.GASTO:
-                    summary['total_expenses'] += amount_abs
-                elif txn.movement_kind == MovementKind.TRANSFERENCIA:
-                    summary['total_transfers'] += amount_abs
+                self._accumulate_totals(summary, txn)
 
             summary['transaction_count'] = len(transactions)
 
@@ -1019,6 +1182,150 @@ class BankFileParser:
         summary = self._augment_summary(summary, transactions)
         return transactions, summary
 
+    @staticmethod
+    def _empty_pdf_summary() -> Dict[str, Any]:
+        return {
+            'total_credits': 0.0,
+            'total_debits': 0.0,
+            'transaction_count': 0,
+            'opening_balance': 0.0,
+            'closing_balance': 0.0,
+            'period_start': None,
+            'period_end': None,
+            'total_incomes': 0.0,
+            'total_expenses': 0.0,
+            'total_transfers': 0.0,
+        }
+
+    @staticmethod
+    def _accumulate_totals(summary: Dict[str, Any], txn: BankTransaction) -> None:
+        """Sumar una transacción a los totales del resumen."""
+        amount_abs = abs(txn.amount)
+        if txn.transaction_type == TransactionType.CREDIT:
+            summary['total_credits'] += amount_abs
+        else:
+            summary['total_debits'] += amount_abs
+
+        if txn.movement_kind == MovementKind.INGRESO:
+            summary['total_incomes'] += amount_abs
+        elif txn.movement_kind == MovementKind.GASTO:
+            summary['total_expenses'] += amount_abs
+        elif txn.movement_kind == MovementKind.TRANSFERENCIA:
+            summary['total_transfers'] += amount_abs
+
+    def _should_stream_pdf(self, file_path: str) -> bool:
+        """Decidir si un PDF se procesa en modo streaming (BANK_PDF_STREAMING)."""
+        if BANK_PDF_STREAMING == 'never':
+            return False
+        if BANK_PDF_STREAMING == 'always':
+            return True
+        try:
+            from core.reconciliation.bank.pdf_page_extractor import count_pages
+            return count_pages(file_path) >= BANK_PDF_STREAM_MIN_PAGES
+        except Exception as exc:
+            logger.debug("Could not count pages for %s: %s", file_path, exc)
+            return False
+
+    def iter_pdf_transactions(
+        self,
+        file_path: str,
+        account_id: int,
+        user_id: int,
+        tenant_id: int,
+        summary: Optional[Dict[str, Any]] = None,
+        workers: Optional[int] = None,
+    ) -> Iterator[BankTransaction]:
+        """
+        Generar transacciones de un PDF página por página.
+
+        Solo se retienen en memoria las primeras páginas (detección de banco y
+        periodo) y la última transacción emitida, que aún puede recibir líneas
+        de concepto de la página siguiente. ``summary`` se actualiza de forma
+        incremental y queda completo al agotar el generador. Un duplicado que
+        aparezca en una página posterior solo extiende la descripción del
+        objeto ya emitido.
+        """
+        from core.reconciliation.bank.pdf_page_extractor import iter_page_texts
+
+        if summary is None:
+            summary = {}
+        summary.update(self._empty_pdf_summary())
+        summary['parser_used'] = 'streaming_page_parser'
+        summary['pages_processed'] = 0
+        summary['page_extractors'] = {}
+
+        extractor = _TextTransactionExtractor(self, account_id, user_id, tenant_id)
+        period_scanner = _PeriodInfoScanner(self._parse_date)
+        header_pages: List[str] = []
+        started = False
+        held: List[BankTransaction] = []
+
+        def start(texts: List[str]) -> None:
+            detected_bank = self.bank_detector.detect_bank_from_text("\n".join(texts))
+            self._apply_bank_rules(detected_bank)
+            if detected_bank:
+                summary['detected_bank'] = detected_bank
+            self.current_year_hint = period_scanner.year_hint()
+
+        def consume(text: str) -> None:
+            for txn in extractor.feed(text.split('\n')):
+                self._accumulate_totals(summary, txn)
+                held.append(txn)
+
+        for page in iter_page_texts(file_path, workers=workers):
+            summary['pages_processed'] += 1
+            if page.extractor:
+                counts = summary['page_extractors']
+                counts[page.extractor] = counts.get(page.extractor, 0) + 1
+            period_scanner.feed(page.text)
+
+            if not started:
+                header_pages.append(page.text)
+                if len(header_pages) < BANK_PDF_STREAM_HEADER_PAGES:
+                    continue
+                start(header_pages)
+                started = True
+                for text in header_pages:
+                    consume(text)
+                header_pages = []
+            else:
+                consume(page.text)
+
+            if len(held) > 1:
+                ready, held = held[:-1], held[-1:]
+                yield from ready
+
+        if not started:
+            start(header_pages)
+            for text in header_pages:
+                consume(text)
+        yield from held
+
+        summary.update(period_scanner.info())
+        summary['total_credits'] = round(summary['total_credits'], 2)
+        summary['total_debits'] = round(summary['total_debits'], 2)
+        summary['transaction_count'] = extractor.count
+        self._log_balance_check(summary)
+
+    def parse_pdf_streaming(
+        self,
+        file_path: str,
+        account_id: int,
+        user_id: int,
+        tenant_id: int,
+        workers: Optional[int] = None,
+    ) -> Tuple[List[BankTransaction], Dict[str, Any]]:
+        """Versión materializada de iter_pdf_transactions (misma salida que parse_file)."""
+        summary: Dict[str, Any] = {}
+        transactions = list(self.iter_pdf_transactions(
+            file_path, account_id, user_id, tenant_id, summary=summary, workers=workers
+        ))
+        logger.info(
+            f"✅ Streaming parser extracted {len(transactions)} transactions "
+            f"from {summary['pages_processed']} pages {summary['page_extractors']}"
+        )
+        return transactions, summary
+
     def _parse_excel(
         self,
         file_path: str,
@@ -1328,48 +1635,9 @@ class BankFileParser:
 
     def _extract_period_info(self, text: str) -> Dict[str, Any]:
         """Extraer información de periodo y saldos del texto"""
-        info = {
-            'period_start': None,
-            'period_end': None,
-            'opening_balance': 0.0,
-            'closing_balance': 0.0
-        }
-
-        # Buscar fechas de periodo
-        period_patterns = [
-            r'periodo\s+del?\s+(\d{1,2}[\/\-]\d{1,2}[\/\-]\d{2,4})\s+al?\s+(\d{1,2}[\/\-]\d{1,2}[\/\-]\d{2,4})',
-            r'from\s+(\d{1,2}[\/\-]\d{1,2}[\/\-]\d{2,4})\s+to\s+(\d{1,2}[\/\-]\d{1,2}[\/\-]\d{2,4})',
-        ]
-
-        for pattern in period_patterns:
-            match = re.search(pattern, text, re.IGNORECASE)
-            if match:
-                start_date = self._parse_date(match.group(1))
-                end_date = self._parse_date(match.group(2))
-                if start_date and end_date:
-                    info['period_start'] = start_date
-                    info['period_end'] = end_date
-                    break
-
-        # Buscar saldos
-        balance_patterns = [
-            r'saldo\s+inicial[:\s]+\$?\s*([+-]?\d{1,3}(?:,\d{3})*(?:\.\d{2})?)',
-            r'saldo\s+final[:\s]+\$?\s*([+-]?\d{1,3}(?:,\d{3})*(?:\.\d{2})?)',
-            r'balance\s+anterior[:\s]+\$?\s*([+-]?\d{1,3}(?:,\d{3})*(?:\.\d{2})?)',
-        ]
-
-        for pattern in balance_patterns:
-            matches = re.findall(pattern, text, re.IGNORECASE)
-            if matches:
-                try:
-                    if 'inicial' in pattern or 'anterior' in pattern:
-                        info['opening_balance'] = float(matches[0].replace(',', ''))
-                    elif 'final' in pattern:
-                        info['closing_balance'] = float(matches[0].replace(',', ''))
-                except:
-                    pass
-
-        return info
+        scanner = _PeriodInfoScanner(self._parse_date)
+        scanner.feed(text)
+        return scanner.info()
 
     def _extract_transactions_from_text(
         self,
@@ -1379,66 +1647,9 @@ class BankFileParser:
         tenant_id: int
     ) -> List[BankTransaction]:
         """Extraer transacciones del texto PDF"""
-        transactions_map = {}
-        ordered_keys = []
-        last_key = None
-
-        def process_transaction(txn: BankTransaction):
-            nonlocal last_key
-            description_signature = normalize_description(txn.description)
-            key = (
-                txn.transaction_date.isoformat() if txn.transaction_date else '',
-                description_signature,
-                round(float(txn.amount or 0.0), 2),
-            )
-
-            if key in transactions_map:
-                existing = transactions_map[key]
-                existing.description = self._merge_descriptions(existing.description, txn.description)
-                if getattr(txn, 'balance', None) is not None:
-                    existing.balance = txn.balance
-            else:
-                transactions_map[key] = txn
-                ordered_keys.append(key)
-
-            last_key = key
-
-        # Dividir en líneas y buscar patrones de transacciones
-        lines = text.split('\n')
-
-        for line in lines:
-            line = line.strip()
-            if not line:
-                continue
-
-            # Buscar líneas que parezcan transacciones
-            transaction = None
-            for regex in self.custom_line_regexes:
-                match = regex.match(line)
-                if match:
-                    transaction = self._parse_custom_transaction_line(
-                        match, line, account_id, user_id, tenant_id
-                    )
-                    break
-
-            if not transaction and self._looks_like_transaction(line):
-                transaction = self._parse_transaction_line(
-                    line, account_id, user_id, tenant_id
-                )
-
-            if transaction:
-                process_transaction(transaction)
-                continue
-            else:
-                if self.merge_multiline_concepts and last_key and not self._should_skip_description(line):
-                    extra_text = line.strip()
-                    if extra_text:
-                        existing = transactions_map.get(last_key)
-                        if existing:
-                            existing.description = self._merge_descriptions(existing.description, extra_text)
-                    continue
-
-        return [transactions_map[key] for key in ordered_keys]
+        extractor = _TextTransactionExtractor(self, account_id, user_id, tenant_id)
+        extractor.feed(text.split('\n'))
+        return extractor.transactions()
 
     def _augment_summary(self, summary: Optional[Dict[str, Any]], transactions: List[BankTransaction]) -> Dict[str, Any]:
         """Fill in aggregate fields and validate balances for a summary dict."""
@@ -1467,6 +1678,11 @@ class BankFileParser:
                 summary.setdefault('opening_balance', opening)
             summary.setdefault('closing_balance', round(float(balances[-1]), 2))
 
+        self._log_balance_check(summary)
+        return summary
+
+    @staticmethod
+    def _log_balance_check(summary: Dict[str, Any]) -> None:
         opening = summary.get('opening_balance')
         closing = summary.get('closing_balance')
         if opening is not None and closing is not None:
@@ -1481,8 +1697,6 @@ class BankFileParser:
                     balance_check,
                 )
 
-        return summary
-
     def _parse_inbursa_pdf_with_layout(
         self,
         file_path: str,
@@ -8,7 +8,7 @@ from typing import List, Optional, Dict, Any, Union, Tuple
 from enum import Enum
 from pydantic import BaseModel, Field, field_validator, ConfigDict, ValidationInfo
 import psycopg2
-from psycopg2.extras import RealDictCursor, Json
+from psycopg2.extras import RealDictCursor, Json, execute_values
 import logging
 import os
 import json
@@ -501,6 +501,11 @@ class BankStatementsServicePostgres:
         cursor.close()
         conn.close()
 
+    @staticmethod
+    def _transaction_dedupe_key(transaction_date, amount, description) -> Tuple[str, int, str]:
+        """Llave de duplicado: misma fecha, mismo monto al centavo y misma descripción"""
+        return (str(transaction_date), int(round(float(amount or 0.0) * 100)), description or "")
+
     def add_transactions(self, statement_id: int, transactions: List[BankTransaction]):
         """Agregar transacciones parseadas a un statement"""
         if not transactions:
@@ -509,31 +514,22 @@ class BankStatementsServicePostgres:
         conn = self._get_connection()
         cursor = conn.cursor()
 
+        # Verificar duplicados con una sola consulta en lugar de una por transacción
+        cursor.execute("""
+            SELECT transaction_date, amount, description FROM bank_transactions
+            WHERE statement_id = %s
+        """, (statement_id,))
+        seen = {self._transaction_dedupe_key(*row) for row in cursor.fetchall()}
+
+        rows = []
         for txn in transactions:
-            # Verificar duplicados
-            cursor.execute("""
-                SELECT id FROM bank_transactions
-                WHERE statement_id = %s
-                AND transaction_date = %s
-                AND ABS(amount - %s) < 0.01
-                AND description = %s
-                LIMIT 1
-            """, (statement_id, txn.transaction_date, txn.amount, txn.description))
-
-            if cursor.fetchone():
+            key = self._transaction_dedupe_key(txn.transaction_date, txn.amount, txn.description)
+            if key in seen:
                 logger.info(f"Duplicate transaction skipped: {txn.transaction_date} {txn.amount}")
                 continue
+            seen.add(key)
 
-            # Insertar transacción
-            cursor.execute("""
-                INSERT INTO bank_transactions (
-                    statement_id, account_id, tenant_id, company_id,
-                    transaction_date, description, amount, balance,
-                    transaction_type, category, reference,
-                    reconciled, msi_candidate, msi_invoice_id, msi_months, msi_confidence,
-                    ai_model, confidence, created_at
-                ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, CURRENT_TIMESTAMP)
-            """, (
+            rows.append((
                 statement_id, txn.account_id, txn.tenant_id, txn.company_id,
                 txn.transaction_date, txn.description, txn.amount, txn.balance,
                 txn.transaction_type.value if hasattr(txn.transaction_type, 'value') else txn.transaction_type,
@@ -543,6 +539,21 @@ class BankStatementsServicePostgres:
                 txn.ai_model, txn.confidence
             ))
 
+        if rows:
+            # Insertar todas las transacciones con INSERT multi-fila
+            execute_values(cursor, """
+                INSERT INTO bank_transactions (
+                    statement_id, account_id, tenant_id, company_id,
+                    transaction_date, description, amount, balance,
+                    transaction_type, category, reference,
+                    reconciled, msi_candidate, msi_invoice_id, msi_months, msi_confidence,
+                    ai_model, confidence, created_at
+                ) VALUES %s
+            """, rows,
+                template="(%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, CURRENT_TIMESTAMP)",
+                page_size=1000,
+            )
+
         conn.commit()
         cursor.close()
         conn.close()
@@ -0,0 +1,186 @@
+"""
+Extracción de texto de PDFs bancarios página por página
+
+Cada página se resuelve con el extractor más barato que produzca texto
+utilizable (PyMuPDF → pdfplumber → PyPDF2), en lugar de elegir un extractor
+para todo el documento. Los estados de cuenta grandes se reparten en bloques
+de páginas sobre un pool de procesos y se entregan en orden, con un número
+acotado de bloques en vuelo para mantener la memoria estable.
+"""
+
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+try:
+    import fitz  # pymupdf
+except ImportError:  # pragma: no cover - dependencia opcional
+    fitz = None
+
+try:
+    import pdfplumber
+except ImportError:  # pragma: no cover - dependencia opcional
+    pdfplumber = None
+
+try:
+    import PyPDF2
+except ImportError:  # pragma: no cover - dependencia opcional
+    PyPDF2 = None
+
+PDF_STREAM_WORKERS = int(os.getenv("PDF_STREAM_WORKERS", "0"))  # 0 = automático
+PDF_PARALLEL_MIN_PAGES = int(os.getenv("PDF_PARALLEL_MIN_PAGES", "40"))
+PDF_PAGES_PER_CHUNK = int(os.getenv("PDF_PAGES_PER_CHUNK", "16"))
+MIN_PAGE_TEXT_CHARS = 20
+
+# Orden de prueba por página: del más barato al más caro
+EXTRACTOR_ORDER = ("pymupdf", "pdfplumber", "pypdf2")
+
+
+@dataclass
+class PageText:
+    number: int  # 1-based
+    text: str
+    extractor: Optional[str]
+
+
+def _is_usable(text: Optional[str]) -> bool:
+    """Sondeo rápido: suficiente texto y sin glifos sin mapear (fuentes CID)."""
+    if not text:
+        return False
+    stripped = text.strip()
+    if len(stripped) < MIN_PAGE_TEXT_CHARS:
+        return False
+    if "(cid:" in stripped:
+        return False
+    return stripped.count("�") <= len(stripped) * 0.05
+
+
+def count_pages(file_path: str) -> int:
+    """Número de páginas sin extraer texto."""
+    if fitz is not None:
+        with fitz.open(file_path) as doc:
+            return doc.page_count
+    if PyPDF2 is not None:
+        with open(file_path, "rb") as handle:
+            return len(PyPDF2.PdfReader(handle).pages)
+    raise RuntimeError("No PDF backend available (install pymupdf or PyPDF2)")
+
+
+class _PageBackends:
+    """Abre cada backend solo cuando alguna página lo necesita."""
+
+    def __init__(self, file_path: str):
+        self.file_path = file_path
+        self._handles = {}
+        self._files = []
+
+    def extract(self, name: str, index: int) -> Optional[str]:
+        handle = self._open(name)
+        if handle is None:
+            return None
+        if name == "pymupdf":
+            return handle[index].get_text()
+        return handle.pages[index].extract_text()
+
+    def _open(self, name: str):
+        if name in self._handles:
+            return self._handles[name]
+        handle = None
+        try:
+            if name == "pymupdf" and fitz is not None:
+                handle = fitz.open(self.file_path)
+            elif name == "pdfplumber" and pdfplumber is not None:
+                handle = pdfplumber.open(self.file_path)
+            elif name == "pypdf2" and PyPDF2 is not None:
+                stream = open(self.file_path, "rb")
+                self._files.append(stream)
+                handle = PyPDF2.PdfReader(stream)
+        except Exception as exc:
+            logger.warning(f"⚠️ No se pudo abrir {self.file_path} con {name}: {exc}")
+        self._handles[name] = handle
+        return handle
+
+    def close(self) -> None:
+        for handle in self._handles.values():
+            close = getattr(handle, "close", None)
+            if close:
+                try:
+                    close()
+                except Exception:
+                    pass
+        for stream in self._files:
+            stream.close()
+        self._handles.clear()
+        self._files.clear()
+
+
+def extract_page_range(file_path: str, start: int, stop: int) -> List[PageText]:
+    """Extraer páginas [start, stop) (0-based) eligiendo extractor por página."""
+    backends = _PageBackends(file_path)
+    pages: List[PageText] = []
+    try:
+        for index in range(start, stop):
+            best_text, best_extractor = "", None
+            for name in EXTRACTOR_ORDER:
+                try:
+                    text = backends.extract(name, index)
+                except Exception as exc:
+                    logger.debug(f"Página {index + 1} falló con {name}: {exc}")
+                    continue
+                if _is_usable(text):
+                    best_text, best_extractor = text, name
+                    break
+                if text and len(text.strip()) > len(best_text.strip()):
+                    best_text, best_extractor = text, name
+            pages.append(PageText(number=index + 1, text=best_text or "", extractor=best_extractor))
+    finally:
+        backends.close()
+    return pages
+
+
+def _default_workers() -> int:
+    if PDF_STREAM_WORKERS > 0:
+        return PDF_STREAM_WORKERS
+    return max(1, min(4, (os.cpu_count() or 1) - 1))
+
+
+def iter_page_texts(
+    file_path: str,
+    workers: Optional[int] = None,
+    pages_per_chunk: Optional[int] = None,
+    parallel_min_pages: Optional[int] = None,
+) -> Iterator[PageText]:
+    """
+    Generar el texto de cada página en orden.
+
+    Documentos con al menos ``parallel_min_pages`` páginas se extraen en
+    bloques sobre un ProcessPoolExecutor; solo ``2 * workers`` bloques quedan
+    en vuelo a la vez, de modo que un estado de 300+ páginas no se materializa
+    completo en memoria.
+    """
+    total = count_pages(file_path)
+    chunk = max(1, pages_per_chunk or PDF_PAGES_PER_CHUNK)
+    threshold = PDF_PARALLEL_MIN_PAGES if parallel_min_pages is None else parallel_min_pages
+    workers = _default_workers() if workers is None else workers
+    ranges = [(start, min(start + chunk, total)) for start in range(0, total, chunk)]
+
+    if workers <= 1 or total < threshold or len(ranges) <= 1:
+        for start, stop in ranges:
+            yield from extract_page_range(file_path, start, stop)
+        return
+
+    logger.info(f"📄 Extrayendo {total} páginas en {len(ranges)} bloques con {workers} procesos")
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = []
+        next_range = 0
+        max_in_flight = workers * 2
+        while pending or next_range < len(ranges):
+            while next_range < len(ranges) and len(pending) < max_in_flight:
+                start, stop = ranges[next_range]
+                pending.append(executor.submit(extract_page_range, file_path, start, stop))
+                next_range += 1
+            yield from pending.pop(0).result()
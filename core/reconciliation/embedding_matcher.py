@@ -10,13 +10,17 @@ Advantages over LLM approach:
 - Deterministic (same input = same output)
 - Scalable (handles millions of transactions)
 - Private (no data leaves the server)
+- Persistent (vectors are reused across restarts via PersistentEmbeddingStore)
 """
 
+import os
+from datetime import datetime
+
 import numpy as np
 from typing import List, Dict, Optional, Tuple
 from dataclasses import dataclass
-from sentence_transformers import SentenceTransformer
-from sklearn.metrics.pairwise import cosine_similarity
+from core.reconciliation.embedding_store import PersistentEmbeddingStore
+from core.shared.embedding_service import get_embedding_service
 
 
 @dataclass
@@ -37,21 +41,32 @@ class EmbeddingMatcher:
     Fast semantic matching using sentence embeddings
     """
 
-    def __init__(self, model_name: str = "paraphrase-multilingual-MiniLM-L12-v2"):
+    def __init__(
+        self,
+        model_name: str = "paraphrase-multilingual-MiniLM-L12-v2",
+        tenant_id: Optional[int] = None,
+        store_dir: Optional[str] = None,
+        encode_batch_size: int = 256,
+    ):
         """
         Initialize the matcher with a pre-trained model
 
         Args:
             model_name: Sentence transformer model to use
                        Default is multilingual model that works great for Spanish
+            tenant_id: Tenant whose persistent embedding store is used
+            store_dir: Base directory of the embedding store (defaults to EMBEDDING_STORE_DIR)
+            encode_batch_size: Max texts per model.encode() call
         """
-        print(f"🔧 Loading embedding model: {model_name}")
-        self.model = SentenceTransformer(model_name)
-        print(f"✅ Model loaded successfully")
+        # Shared per-process model (loaded once, see core.shared.embedding_service)
+        self.embedding_service = get_embedding_service(model_name)
+        self.model = self.embedding_service.model
 
-        # Cache for embeddings
-        self._tx_embeddings = {}
-        self._invoice_embeddings = {}
+        self.model_name = model_name
+        self.encode_batch_size = encode_batch_size
+
+        # Persistent, tenant-scoped store (memory-mapped, shared across workers)
+        self.store = PersistentEmbeddingStore(tenant_id=tenant_id, model_name=model_name, base_dir=store_dir)
 
     def _normalize_text(self, text: str) -> str:
         """
@@ -80,23 +95,189 @@ class EmbeddingMatcher:
 
         return text
 
-    def _get_embedding(self, text: str, cache: dict, key: any) -> np.ndarray:
+    def _encode(self, texts: List[str]) -> np.ndarray:
+        """Encode a batch of already-normalized texts"""
+        return self.embedding_service.encode(texts)
+
+    def _get_embeddings(self, texts: List[str]) -> np.ndarray:
+        """
+        Get embeddings for many texts, encoding only those not yet stored
+
+        Args:
+            texts: Raw texts to embed
+
+        Returns:
+            Matrix of shape (len(texts), dim)
+        """
+        normalized = [self._normalize_text(text) for text in texts]
+        return self.store.get_or_encode(normalized, self._encode, batch_size=self.encode_batch_size)
+
+    def _get_embedding(self, text: str) -> np.ndarray:
         """
-        Get embedding for text with caching
+        Get embedding for a single text from the persistent store
 
         Args:
             text: Text to embed
-            cache: Cache dictionary
-            key: Cache key
 
         Returns:
             Embedding vector
         """
-        if key not in cache:
-            normalized = self._normalize_text(text)
-            cache[key] = self.model.encode([normalized])[0]
+        return self._get_embeddings([text])[0]
+
+    @staticmethod
+    def _date_ordinals(values: List) -> np.ndarray:
+        """Parse YYYY-MM-DD values once into proleptic ordinals"""
+        return np.fromiter(
+            (datetime.strptime(str(v)[:10], "%Y-%m-%d").toordinal() for v in values),
+            dtype=np.int64,
+            count=len(values),
+        )
+
+    @staticmethod
+    def _unit_rows(matrix: np.ndarray) -> np.ndarray:
+        """L2-normalize rows so cosine similarity becomes a dot product"""
+        matrix = np.asarray(matrix, dtype=np.float32)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return matrix / norms
+
+    def find_candidates(
+        self,
+        transactions: List[Dict],
+        invoices: List[Dict],
+        min_similarity: float = 0.7,
+        max_amount_diff: float = 50.0,
+        max_days_diff: int = 10,
+        top_k: int = 5,
+        tx_chunk_size: int = 512,
+        inv_chunk_size: int = 4096,
+    ) -> List[List[EmbeddingMatch]]:
+        """
+        Blocked top-k candidate generation
 
-        return cache[key]
+        Invoices are sorted by amount so each chunk of transactions (also
+        sorted by amount) is only scored against the contiguous slice of
+        invoices inside its amount window. Date and amount feasibility is
+        applied as a mask before ranking, so a wrong invoice with higher
+        cosine outside the window can never hide a feasible one.
+
+        Args:
+            transactions: List of {id, description, amount, date}
+            invoices: List of {id, nombre_emisor, total, fecha}
+            min_similarity: Minimum cosine similarity (0.7 = 70%)
+            max_amount_diff: Maximum amount difference in pesos
+            max_days_diff: Maximum days difference
+            top_k: Candidates kept per transaction
+            tx_chunk_size: Transactions scored per block
+            inv_chunk_size: Invoices scored per block
+
+        Returns:
+            For each transaction (input order), its feasible candidates sorted by similarity
+        """
+        candidates: List[List[EmbeddingMatch]] = [[] for _ in transactions]
+        if not transactions or not invoices:
+            return candidates
+
+        tx_amounts = np.abs(np.array([float(tx["amount"]) for tx in transactions], dtype=np.float64))
+        inv_amounts = np.array([float(inv["total"]) for inv in invoices], dtype=np.float64)
+        tx_days = self._date_ordinals([tx["date"] for tx in transactions])
+        inv_days = self._date_ordinals([inv["fecha"] for inv in invoices])
+
+        # Generate embeddings in batches (stored vectors are reused)
+        tx_vectors = self._unit_rows(self._get_embeddings([tx["description"] for tx in transactions]))
+        inv_vectors = self._unit_rows(self._get_embeddings([inv["nombre_emisor"] for inv in invoices]))
+
+        # Blocking: sort both sides by amount
+        inv_order = np.argsort(inv_amounts, kind="stable")
+        inv_amounts_sorted = inv_amounts[inv_order]
+        inv_days_sorted = inv_days[inv_order]
+        inv_vectors_sorted = inv_vectors[inv_order]
+
+        tx_order = np.argsort(tx_amounts, kind="stable")
+        window_lo = np.searchsorted(inv_amounts_sorted, tx_amounts - max_amount_diff, side="left")
+        window_hi = np.searchsorted(inv_amounts_sorted, tx_amounts + max_amount_diff, side="right")
+
+        for start in range(0, len(tx_order), tx_chunk_size):
+            chunk = tx_order[start:start + tx_chunk_size]
+            lo = int(window_lo[chunk].min())
+            hi = int(window_hi[chunk].max())
+            if lo >= hi:
+                continue
+
+            chunk_vectors = tx_vectors[chunk]
+            chunk_amounts = tx_amounts[chunk][:, None]
+            chunk_days = tx_days[chunk][:, None]
+
+            best_scores = np.full((len(chunk), 0), -np.inf, dtype=np.float32)
+            best_cols = np.zeros((len(chunk), 0), dtype=np.int64)
+
+            for col_start in range(lo, hi, inv_chunk_size):
+                col_end = min(col_start + inv_chunk_size, hi)
+                scores = chunk_vectors @ inv_vectors_sorted[col_start:col_end].T
+
+                feasible = (
+                    (np.abs(chunk_amounts - inv_amounts_sorted[col_start:col_end][None, :]) <= max_amount_diff)
+                    & (np.abs(chunk_days - inv_days_sorted[col_start:col_end][None, :]) <= max_days_diff)
+                    & (scores >= min_similarity)
+                )
+                scores = np.where(feasible, scores, -np.inf).astype(np.float32, copy=False)
+
+                # Merge this block into the running top-k
+                merged_scores = np.concatenate([best_scores, scores], axis=1)
+                merged_cols = np.concatenate(
+                    [best_cols, np.broadcast_to(np.arange(col_start, col_end), scores.shape)], axis=1
+                )
+                if merged_scores.shape[1] > top_k:
+                    keep = np.argpartition(-merged_scores, top_k - 1, axis=1)[:, :top_k]
+                    merged_scores = np.take_along_axis(merged_scores, keep, axis=1)
+                    merged_cols = np.take_along_axis(merged_cols, keep, axis=1)
+                best_scores, best_cols = merged_scores, merged_cols
+
+            for row, tx_idx in enumerate(chunk):
+                tx = transactions[tx_idx]
+                ranked = np.argsort(-best_scores[row], kind="stable")
+                for pos in ranked:
+                    score = float(best_scores[row, pos])
+                    if not np.isfinite(score):
+                        break
+                    inv_idx = int(inv_order[best_cols[row, pos]])
+                    inv = invoices[inv_idx]
+                    amount_diff = abs(tx_amounts[tx_idx] - inv_amounts[inv_idx])
+                    days_diff = int(abs(tx_days[tx_idx] - inv_days[inv_idx]))
+                    candidates[tx_idx].append(EmbeddingMatch(
+                        transaction_id=tx["id"],
+                        invoice_id=inv["id"],
+                        transaction_description=tx["description"],
+                        invoice_name=inv["nombre_emisor"],
+                        similarity_score=score,
+                        confidence=self._calculate_confidence(score, amount_diff, days_diff),
+                        amount_diff=amount_diff,
+                        days_diff=days_diff
+                    ))
+
+        return candidates
+
+    @staticmethod
+    def _assign_one_to_one(candidates: List[List[EmbeddingMatch]]) -> List[EmbeddingMatch]:
+        """
+        Greedy one-to-one assignment over all candidate edges
+
+        Edges are taken best-first (similarity, then smaller amount and
+        date differences); an invoice or transaction is never used twice.
+        """
+        edges = [match for per_tx in candidates for match in per_tx]
+        edges.sort(key=lambda m: (-m.similarity_score, m.amount_diff, m.days_diff))
+
+        used_tx = set()
+        used_inv = set()
+        assigned = []
+        for match in edges:
+            if match.transaction_id in used_tx or match.invoice_id in used_inv:
+                continue
+            used_tx.add(match.transaction_id)
+            used_inv.add(match.invoice_id)
+            assigned.append(match)
+        return assigned
 
     def match_batch(
         self,
@@ -104,7 +285,8 @@ class EmbeddingMatcher:
         invoices: List[Dict],
         min_similarity: float = 0.7,
         max_amount_diff: float = 50.0,
-        max_days_diff: int = 10
+        max_days_diff: int = 10,
+        top_k: int = 5
     ) -> List[EmbeddingMatch]:
         """
         Find matches using semantic similarity
@@ -115,83 +297,25 @@ class EmbeddingMatcher:
             min_similarity: Minimum cosine similarity (0.7 = 70%)
             max_amount_diff: Maximum amount difference in pesos
             max_days_diff: Maximum days difference
+            top_k: Feasible candidates considered per transaction
 
         Returns:
-            List of EmbeddingMatch objects
+            List of EmbeddingMatch objects (each invoice matched at most once)
         """
         if not transactions or not invoices:
             return []
 
         print(f"\n🔍 Matching {len(transactions)} transactions vs {len(invoices)} invoices...")
 
-        # Generate embeddings for all transactions
-        tx_embeddings = []
-        for tx in transactions:
-            emb = self._get_embedding(tx["description"], self._tx_embeddings, tx["id"])
-            tx_embeddings.append(emb)
-
-        # Generate embeddings for all invoices
-        inv_embeddings = []
-        for inv in invoices:
-            emb = self._get_embedding(inv["nombre_emisor"], self._invoice_embeddings, inv["id"])
-            inv_embeddings.append(emb)
-
-        # Convert to numpy arrays
-        tx_embeddings = np.array(tx_embeddings)
-        inv_embeddings = np.array(inv_embeddings)
-
-        # Calculate cosine similarity matrix
-        # Shape: (num_transactions, num_invoices)
-        similarity_matrix = cosine_similarity(tx_embeddings, inv_embeddings)
-
-        matches = []
-
-        # For each transaction, find best matching invoice
-        for tx_idx, tx in enumerate(transactions):
-            # Get similarities for this transaction
-            similarities = similarity_matrix[tx_idx]
-
-            # Find best match
-            best_inv_idx = np.argmax(similarities)
-            best_similarity = similarities[best_inv_idx]
-
-            # Check if similarity is above threshold
-            if best_similarity < min_similarity:
-                continue
-
-            inv = invoices[best_inv_idx]
-
-            # Calculate amount and date differences
-            from datetime import datetime
-
-            amount_diff = abs(abs(float(tx["amount"])) - float(inv["total"]))
-
-            tx_date = datetime.strptime(str(tx["date"]), "%Y-%m-%d").date()
-            inv_date = datetime.strptime(str(inv["fecha"]), "%Y-%m-%d").date()
-            days_diff = abs((tx_date - inv_date).days)
-
-            # Check constraints
-            if amount_diff > max_amount_diff:
-                continue
-
-            if days_diff > max_days_diff:
-                continue
-
-            # Determine confidence level
-            confidence = self._calculate_confidence(
-                best_similarity, amount_diff, days_diff
-            )
-
-            matches.append(EmbeddingMatch(
-                transaction_id=tx["id"],
-                invoice_id=inv["id"],
-                transaction_description=tx["description"],
-                invoice_name=inv["nombre_emisor"],
-                similarity_score=best_similarity,
-                confidence=confidence,
-                amount_diff=amount_diff,
-                days_diff=days_diff
-            ))
+        candidates = self.find_candidates(
+            transactions,
+            invoices,
+            min_similarity=min_similarity,
+            max_amount_diff=max_amount_diff,
+            max_days_diff=max_days_diff,
+            top_k=top_k,
+        )
+        matches = self._assign_one_to_one(candidates)
 
         # Sort by similarity score (best first)
         matches.sort(key=lambda m: m.similarity_score, reverse=True)
@@ -229,20 +353,30 @@ class EmbeddingMatcher:
         return "low"
 
     def clear_cache(self):
-        """Clear embedding cache"""
-        self._tx_embeddings.clear()
-        self._invoice_embeddings.clear()
+        """Drop the in-memory view of the store (vectors on disk are kept)"""
+        self.store = PersistentEmbeddingStore(
+            tenant_id=self.store.tenant_id,
+            model_name=self.model_name,
+            base_dir=os.path.dirname(os.path.dirname(self.store.directory)),
+        )
         print("🗑️  Embedding cache cleared")
 
+    def get_cache_stats(self) -> Dict:
+        """Hit/miss statistics of the persistent embedding store"""
+        return self.store.get_stats()
+
 
-def get_embedding_matcher() -> EmbeddingMatcher:
+def get_embedding_matcher(tenant_id: Optional[int] = None) -> EmbeddingMatcher:
     """
     Factory function to get the matcher
 
+    Args:
+        tenant_id: Tenant whose persistent embedding store is used
+
     Returns:
         Initialized EmbeddingMatcher
     """
-    return EmbeddingMatcher()
+    return EmbeddingMatcher(tenant_id=tenant_id)
 
 
 # Example usage
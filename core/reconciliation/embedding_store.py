@@ -0,0 +1,261 @@
+"""
+Persistent Embedding Store for Bank Reconciliation
+
+Disk-backed, tenant-scoped store of sentence embeddings so that worker
+restarts do not re-encode every invoice issuer name.
+
+Layout (one directory per tenant + model):
+
+    <base_dir>/<tenant>/<model>/
+        meta.json      -> {"model_name": ..., "dim": 384}
+        vectors.f32    -> row-major float32 matrix, appended only
+        index.tsv      -> "<sha1(normalized text)>\t<row>\n" sidecar
+
+- Vectors are read through a read-only ``np.memmap`` so every uvicorn
+  worker shares the same OS page cache instead of its own dict copy.
+- Writers append under an exclusive ``flock``; readers only trust rows
+  that are fully present in ``vectors.f32``.
+- Missing texts are encoded in batches by the caller-provided encoder.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+from typing import Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_STORE_DIR = os.getenv("EMBEDDING_STORE_DIR", os.path.join("data", "embedding_store"))
+
+_SAFE_SEGMENT = re.compile(r"[^A-Za-z0-9_.-]+")
+
+
+def text_hash(normalized_text: str) -> str:
+    """Stable key for a normalized text."""
+    return hashlib.sha1(normalized_text.encode("utf-8")).hexdigest()
+
+
+class PersistentEmbeddingStore:
+    """
+    Embeddings keyed by (tenant, normalized-text hash, model name) kept in a
+    memory-mapped float32 matrix with an id/offset sidecar.
+    """
+
+    def __init__(
+        self,
+        tenant_id: Optional[object] = None,
+        model_name: str = "paraphrase-multilingual-MiniLM-L12-v2",
+        base_dir: Optional[str] = None,
+    ):
+        self.tenant_id = "default" if tenant_id is None else str(tenant_id)
+        self.model_name = model_name
+        self.directory = os.path.join(
+            base_dir or DEFAULT_STORE_DIR,
+            _SAFE_SEGMENT.sub("_", self.tenant_id),
+            _SAFE_SEGMENT.sub("_", model_name),
+        )
+        self._vectors_path = os.path.join(self.directory, "vectors.f32")
+        self._index_path = os.path.join(self.directory, "index.tsv")
+        self._meta_path = os.path.join(self.directory, "meta.json")
+        self._lock_path = os.path.join(self.directory, ".lock")
+
+        self._dim: Optional[int] = None
+        self._offsets: Dict[str, int] = {}
+        self._index_bytes_read = 0
+        self._matrix: Optional[np.memmap] = None
+        self._loaded = False
+        self._mutex = threading.RLock()
+
+        self.hits = 0
+        self.misses = 0
+
+    # ------------------------------------------------------------------
+    # Loading
+    # ------------------------------------------------------------------
+
+    def _ensure_loaded(self) -> None:
+        """Lazily read metadata and the sidecar on first use."""
+        if self._loaded:
+            return
+        with self._mutex:
+            if self._loaded:
+                return
+            self._refresh()
+            self._loaded = True
+
+    def _read_meta(self) -> None:
+        if self._dim is not None or not os.path.exists(self._meta_path):
+            return
+        with open(self._meta_path, "r", encoding="utf-8") as fh:
+            meta = json.load(fh)
+        if meta.get("model_name") != self.model_name:
+            raise ValueError(f"Embedding store at {self.directory} belongs to model {meta.get('model_name')}")
+        self._dim = int(meta["dim"])
+
+    def _rows_on_disk(self) -> int:
+        if not self._dim or not os.path.exists(self._vectors_path):
+            return 0
+        return os.path.getsize(self._vectors_path) // (self._dim * 4)
+
+    def _refresh(self) -> None:
+        """Pick up rows appended by other processes since the last read."""
+        self._read_meta()
+        if not self._dim or not os.path.exists(self._index_path):
+            return
+
+        complete_rows = self._rows_on_disk()
+        with open(self._index_path, "rb") as fh:
+            fh.seek(self._index_bytes_read)
+            chunk = fh.read()
+
+        # Only consume whole lines whose vector row has been fully written
+        consumed = 0
+        for line in chunk.splitlines(keepends=True):
+            if not line.endswith(b"\n"):
+                break
+            key, _, row = line.decode("utf-8").rstrip("\n").partition("\t")
+            row_idx = int(row)
+            if row_idx >= complete_rows:
+                break
+            self._offsets[key] = row_idx
+            consumed += len(line)
+        self._index_bytes_read += consumed
+
+        if self._matrix is None or self._matrix.shape[0] != complete_rows:
+            self._matrix = (
+                np.memmap(self._vectors_path, dtype=np.float32, mode="r", shape=(complete_rows, self._dim))
+                if complete_rows
+                else None
+            )
+
+    # ------------------------------------------------------------------
+    # Public API
+    # ------------------------------------------------------------------
+
+    def __len__(self) -> int:
+        self._ensure_loaded()
+        return len(self._offsets)
+
+    def get_many(self, keys: Sequence[str]) -> Dict[str, np.ndarray]:
+        """Return stored vectors for the given text hashes (missing keys are omitted)."""
+        self._ensure_loaded()
+        with self._mutex:
+            if any(key not in self._offsets for key in keys):
+                self._refresh()
+            found = {}
+            for key in keys:
+                row = self._offsets.get(key)
+                if row is not None and self._matrix is not None:
+                    found[key] = np.asarray(self._matrix[row])
+            self.hits += len(found)
+            self.misses += len(keys) - len(found)
+            return found
+
+    def put_many(self, items: Dict[str, np.ndarray]) -> None:
+        """Append vectors for new text hashes; keys already on disk are skipped."""
+        if not items:
+            return
+        self._ensure_loaded()
+        os.makedirs(self.directory, exist_ok=True)
+
+        with self._mutex, open(self._lock_path, "a") as lock_fh:
+            if fcntl is not None:
+                fcntl.flock(lock_fh, fcntl.LOCK_EX)
+            try:
+                self._refresh()
+
+                pending = {k: v for k, v in items.items() if k not in self._offsets}
+                if not pending:
+                    return
+
+                matrix = np.vstack([np.asarray(v, dtype=np.float32).reshape(1, -1) for v in pending.values()])
+                if self._dim is None:
+                    self._dim = int(matrix.shape[1])
+                    with open(self._meta_path, "w", encoding="utf-8") as fh:
+                        json.dump({"model_name": self.model_name, "dim": self._dim}, fh)
+                elif matrix.shape[1] != self._dim:
+                    raise ValueError(f"Expected embeddings of dim {self._dim}, got {matrix.shape[1]}")
+
+                start_row = self._rows_on_disk()
+                # Truncate any torn tail left by a crashed writer before appending
+                if os.path.exists(self._vectors_path):
+                    with open(self._vectors_path, "r+b") as fh:
+                        fh.truncate(start_row * self._dim * 4)
+
+                with open(self._vectors_path, "ab") as fh:
+                    fh.write(np.ascontiguousarray(matrix).tobytes())
+                    fh.flush()
+                    os.fsync(fh.fileno())
+                with open(self._index_path, "a", encoding="utf-8") as fh:
+                    fh.write("".join(f"{key}\t{start_row + i}\n" for i, key in enumerate(pending)))
+
+                self._refresh()
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock_fh, fcntl.LOCK_UN)
+
+    def get_or_encode(
+        self,
+        normalized_texts: Sequence[str],
+        encoder: Callable[[List[str]], np.ndarray],
+        batch_size: int = 256,
+    ) -> np.ndarray:
+        """
+        Return a (len(texts), dim) matrix, encoding only texts not yet stored.
+
+        Args:
+            normalized_texts: Already-normalized texts
+            encoder: Callable mapping a list of texts to a 2D array
+            batch_size: Max texts per encoder call
+
+        Returns:
+            float32 matrix aligned with ``normalized_texts``
+        """
+        if not normalized_texts:
+            return np.zeros((0, self._dim or 0), dtype=np.float32)
+
+        keys = [text_hash(t) for t in normalized_texts]
+        found = self.get_many(list(dict.fromkeys(keys)))
+
+        missing: Dict[str, str] = {}
+        for key, text in zip(keys, normalized_texts):
+            if key not in found and key not in missing:
+                missing[key] = text
+
+        if missing:
+            missing_keys = list(missing)
+            for start in range(0, len(missing_keys), batch_size):
+                batch_keys = missing_keys[start:start + batch_size]
+                vectors = np.asarray(encoder([missing[k] for k in batch_keys]), dtype=np.float32)
+                encoded = dict(zip(batch_keys, vectors))
+                self.put_many(encoded)
+                found.update(encoded)
+            logger.info(
+                "Encoded %d new texts for tenant %s (%d served from store)",
+                len(missing), self.tenant_id, len(keys) - len(missing),
+            )
+
+        return np.vstack([found[k] for k in keys]).astype(np.float32, copy=False)
+
+    def get_stats(self) -> Dict[str, object]:
+        self._ensure_loaded()
+        total = self.hits + self.misses
+        return {
+            "tenant_id": self.tenant_id,
+            "model_name": self.model_name,
+            "entries": len(self._offsets),
+            "dim": self._dim,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
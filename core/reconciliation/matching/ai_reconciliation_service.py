@@ -13,11 +13,25 @@ from datetime import datetime, timedelta
 from typing import List, Dict, Any, Optional, Tuple
 import json
 from difflib import SequenceMatcher
+from functools import lru_cache
 import re
 
+from core.reconciliation.matching.subset_sum import find_subset_sums, to_cents
+
 logger = logging.getLogger(__name__)
 
 
+@lru_cache(maxsize=8192)
+def _parse_iso_date(value: Optional[str]) -> Optional[datetime]:
+    """Parse a stored date once per distinct string (reused across targets)."""
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value.replace(' ', 'T'))
+    except ValueError:
+        return None
+
+
 class AIReconciliationService:
     """Service for AI-powered bank reconciliation suggestions"""
 
@@ -108,7 +122,7 @@ class AIReconciliationService:
 
             for movement in movements:
                 movement_amount = abs(movement['amount'])
-                movement_date = datetime.fromisoformat(movement['date'].replace(' ', 'T')) if movement['date'] else None
+                movement_date = _parse_iso_date(movement['date'])
 
                 if not movement_date:
                     continue
@@ -209,7 +223,7 @@ class AIReconciliationService:
             suggestions = []
 
             for expense in expenses:
-                expense_date = datetime.fromisoformat(expense['date'].replace(' ', 'T')) if expense['date'] else None
+                expense_date = _parse_iso_date(expense['date'])
 
                 if not expense_date:
                     continue
@@ -280,55 +294,21 @@ class AIReconciliationService:
         """
         Find combinations of expenses that sum close to target amount
 
-        Uses greedy algorithm + date filtering for performance
+        Exact bounded subset-sum in cents (within 5%), expenses within ±30 days
+        of the movement and spread over at most 30 days.
         """
-        # Filter expenses by date (±30 days)
-        date_filtered = [
-            e for e in expenses
-            if e['date'] and abs((datetime.fromisoformat(e['date'].replace(' ', 'T')) - target_date).days) <= 30
-        ]
-
-        if not date_filtered:
-            date_filtered = expenses[:20]  # Fallback to recent expenses
-
-        combinations = []
-
-        # Try exact matches first (2-5 expenses)
-        for combo_size in range(2, min(max_combo_size + 1, len(date_filtered) + 1)):
-            # Simple greedy: pick closest amounts
-            sorted_expenses = sorted(date_filtered, key=lambda e: abs(e['amount'] - target_amount / combo_size))
-
-            combo = sorted_expenses[:combo_size]
-            combo_sum = sum(e['amount'] for e in combo)
-            amount_diff = abs(target_amount - combo_sum)
-
-            # Only consider if difference is small
-            if amount_diff <= target_amount * 0.05:  # Within 5%
-                date_diffs = [
-                    abs((datetime.fromisoformat(e['date'].replace(' ', 'T')) - target_date).days)
-                    for e in combo if e['date']
-                ]
-                date_diff_avg = sum(date_diffs) / len(date_diffs) if date_diffs else 999
-
-                # Calculate description similarity
-                desc_similarity = self._calculate_description_similarity(
-                    movement_description,
-                    [e['description'] for e in combo]
-                )
-
-                combinations.append({
-                    'manual_expenses': combo,
-                    'amount_diff': amount_diff,
-                    'date_diff_avg': date_diff_avg,
-                    'desc_similarity': desc_similarity,
-                    'breakdown': {
-                        'amount_match': 100 - (amount_diff / target_amount * 100),
-                        'date_proximity': max(0, 100 - date_diff_avg * 3),  # 3 points per day
-                        'description_similarity': desc_similarity
-                    }
-                })
-
-        return sorted(combinations, key=lambda c: (c['amount_diff'], c['date_diff_avg']))[:5]
+        return self._find_combinations(
+            items=expenses,
+            amount_of=lambda e: e['amount'],
+            target_amount=target_amount,
+            target_date=target_date,
+            description=movement_description,
+            window_days=30,
+            max_span_days=30,
+            max_combo_size=max_combo_size,
+            items_key='manual_expenses',
+            points_per_day=3,
+        )
 
     def _find_movement_combinations(
         self,
@@ -341,49 +321,88 @@ class AIReconciliationService:
         """
         Find combinations of movements that sum close to target amount
         """
-        # Filter movements by date (±60 days for installments)
-        date_filtered = [
-            m for m in movements
-            if m['date'] and abs((datetime.fromisoformat(m['date'].replace(' ', 'T')) - target_date).days) <= 60
-        ]
-
-        if not date_filtered:
-            date_filtered = movements[:20]
-
-        combinations = []
+        # ±60 days for installments, no span limit
+        return self._find_combinations(
+            items=movements,
+            amount_of=lambda m: abs(m['amount']),
+            target_amount=target_amount,
+            target_date=target_date,
+            description=expense_description,
+            window_days=60,
+            max_span_days=None,
+            max_combo_size=max_combo_size,
+            items_key='movements',
+            points_per_day=2,
+        )
 
-        for combo_size in range(2, min(max_combo_size + 1, len(date_filtered) + 1)):
-            sorted_movements = sorted(date_filtered, key=lambda m: abs(abs(m['amount']) - target_amount / combo_size))
+    def _find_combinations(
+        self,
+        items: List[Dict],
+        amount_of,
+        target_amount: float,
+        target_date: datetime,
+        description: str,
+        window_days: int,
+        max_span_days: Optional[int],
+        max_combo_size: int,
+        items_key: str,
+        points_per_day: int,
+    ) -> List[Dict[str, Any]]:
+        """Shared subset-sum search; ranks by (amount_diff, date_diff_avg) like before."""
+        if not target_amount:
+            return []
 
-            combo = sorted_movements[:combo_size]
-            combo_sum = sum(abs(m['amount']) for m in combo)
-            amount_diff = abs(target_amount - combo_sum)
+        dated = [(item, _parse_iso_date(item['date'])) for item in items]
+        candidates = [
+            (item, item_date) for item, item_date in dated
+            if item_date and abs((item_date - target_date).days) <= window_days
+        ]
+        if not candidates:
+            candidates = dated[:20]  # Fallback to recent items
 
-            if amount_diff <= target_amount * 0.05:
-                date_diffs = [
-                    abs((datetime.fromisoformat(m['date'].replace(' ', 'T')) - target_date).days)
-                    for m in combo if m['date']
-                ]
-                date_diff_avg = sum(date_diffs) / len(date_diffs) if date_diffs else 999
+        date_diffs = [
+            abs((item_date - target_date).days) if item_date else None
+            for _, item_date in candidates
+        ]
 
-                desc_similarity = self._calculate_description_similarity(
-                    expense_description,
-                    [m['description'] for m in combo]
-                )
+        def date_diff_avg(indices) -> float:
+            known = [date_diffs[i] for i in indices if date_diffs[i] is not None]
+            return sum(known) / len(known) if known else 999
+
+        result = find_subset_sums(
+            [to_cents(amount_of(item)) for item, _ in candidates],
+            to_cents(target_amount),
+            tolerance_cents=to_cents(target_amount * 0.05),
+            min_size=2,
+            max_size=max_combo_size,
+            days=[item_date.toordinal() if item_date else None for _, item_date in candidates],
+            max_span_days=max_span_days,
+            score=lambda indices, diff: (-diff, -date_diff_avg(indices)),
+            top_k=5,
+        )
 
-                combinations.append({
-                    'movements': combo,
-                    'amount_diff': amount_diff,
-                    'date_diff_avg': date_diff_avg,
-                    'desc_similarity': desc_similarity,
-                    'breakdown': {
-                        'amount_match': 100 - (amount_diff / target_amount * 100),
-                        'date_proximity': max(0, 100 - date_diff_avg * 2),
-                        'description_similarity': desc_similarity
-                    }
-                })
-
-        return sorted(combinations, key=lambda c: (c['amount_diff'], c['date_diff_avg']))[:5]
+        combinations = []
+        for match in result.matches:
+            combo = [candidates[i][0] for i in match.indices]
+            amount_diff = match.diff_cents / 100.0
+            avg_days = date_diff_avg(match.indices)
+            desc_similarity = self._calculate_description_similarity(
+                description,
+                [item['description'] for item in combo]
+            )
+            combinations.append({
+                items_key: combo,
+                'amount_diff': amount_diff,
+                'date_diff_avg': avg_days,
+                'desc_similarity': desc_similarity,
+                'breakdown': {
+                    'amount_match': 100 - (amount_diff / target_amount * 100),
+                    'date_proximity': max(0, 100 - avg_days * points_per_day),
+                    'description_similarity': desc_similarity
+                }
+            })
+
+        return combinations
 
     # =====================================================
     # CONFIDENCE SCORING
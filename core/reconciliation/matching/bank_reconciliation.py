@@ -10,12 +10,13 @@ from __future__ import annotations
 import json
 import logging
 import math
+import os
 from datetime import datetime
 from difflib import SequenceMatcher
-from itertools import combinations
 from typing import Any, Dict, Iterable, List, Optional, Set
 
 from core.internal_db import list_bank_movements
+from core.reconciliation.matching.subset_sum import find_subset_sums, to_cents
 
 logger = logging.getLogger(__name__)
 
@@ -181,6 +182,12 @@ def _extract_linked_ids(expense: Dict[str, Any]) -> Set[str]:
     return linked
 
 
+COMBINATION_CANDIDATE_LIMIT = int(os.getenv("BANK_COMBINATION_CANDIDATES", "40"))
+COMBINATION_MAX_SIZE = int(os.getenv("BANK_COMBINATION_MAX_SIZE", "3"))
+COMBINATION_MAX_SPAN_DAYS = 10
+COMBINATION_TOP_K = 10
+
+
 def _select_combination_candidates(
     candidate_movements: List[Dict[str, Any]],
     expense_amount: float,
@@ -199,7 +206,7 @@ def _select_combination_candidates(
     ]
 
     filtered.sort(key=lambda m: (abs(expense_amount - m["amount"]), m["amount"]))
-    return filtered[:15]
+    return filtered[:COMBINATION_CANDIDATE_LIMIT]
 
 
 def _combine_movements(
@@ -217,96 +224,107 @@ def _combine_movements(
     seen_group_ids: Set[str] = set()
 
     combination_candidates = _select_combination_candidates(candidate_movements, expense_amount)
+    if len(combination_candidates) < 2:
+        return suggestions
+
+    # Per-movement scores are computed once; a combination takes the max of its members
+    expense_dt = _parse_date(expense_date)
+    movement_dts = [_parse_date(movement.get("movement_date")) for movement in combination_candidates]
+    date_scores = [_date_score(expense_date, movement.get("movement_date")) for movement in combination_candidates]
+    text_scores = [_text_score(expense_text, movement.get("description")) for movement in combination_candidates]
+    payment_scores = [_payment_mode_score(expense, movement) for movement in combination_candidates]
+    movement_ids = [
+        str(movement.get("movement_id") or movement.get("id") or "")
+        for movement in combination_candidates
+    ]
+
+    def combo_aggregate(indices) -> float:
+        combined_amount = sum(combination_candidates[i]["amount"] for i in indices)
+        amount_score = _amount_score(expense_amount, combined_amount)
+        aggregate = (
+            amount_score * 0.55
+            + max(date_scores[i] for i in indices) * 0.25
+            + max(text_scores[i] for i in indices) * 0.15
+            + max(payment_scores[i] for i in indices) * 0.05
+        )
+        if linked_ids and any(movement_ids[i] in linked_ids for i in indices):
+            aggregate += 0.08
+        return min(1.0, aggregate)
+
+    result = find_subset_sums(
+        [to_cents(movement.get("amount")) for movement in combination_candidates],
+        to_cents(expense_amount),
+        tolerance_cents=to_cents(tolerance),
+        min_size=2,
+        max_size=COMBINATION_MAX_SIZE,
+        days=[dt.date().toordinal() if dt else None for dt in movement_dts],
+        max_span_days=COMBINATION_MAX_SPAN_DAYS,
+        score=lambda indices, diff: (combo_aggregate(indices), -len(indices), -diff),
+        top_k=COMBINATION_TOP_K,
+    )
+
+    for match in result.matches:
+        combo = [combination_candidates[i] for i in match.indices]
+        size = len(combo)
+        combined_amount = sum(item["amount"] for item in combo)
+        diff = abs(expense_amount - combined_amount)
 
-    for size in (2, 3):
-        if len(combination_candidates) < size:
+        group_id = _generate_group_id(combo)
+        if not group_id or group_id in seen_group_ids:
             continue
-        for combo in combinations(combination_candidates, size):
-            combined_amount = sum(item["amount"] for item in combo)
-            diff = abs(expense_amount - combined_amount)
-            if diff > tolerance:
-                continue
-
-            group_id = _generate_group_id(combo)
-            if not group_id or group_id in seen_group_ids:
-                continue
-
-            amount_score = _amount_score(expense_amount, combined_amount)
-            date_score = max(_date_score(expense_date, movement.get("movement_date")) for movement in combo)
-            text_score = max(_text_score(expense_text, movement.get("description")) for movement in combo)
-            payment_score = max(_payment_mode_score(expense, movement) for movement in combo)
-
-            expense_dt = _parse_date(expense_date)
-            combo_dates = [
-                _parse_date(movement.get("movement_date"))
-                for movement in combo
-                if movement.get("movement_date")
-            ]
-            span_days = None
-            if len(combo_dates) >= 2 and all(date is not None for date in combo_dates):
-                days = sorted(date.date() for date in combo_dates if date)
-                span_days = abs((days[-1] - days[0]).days)
-                if span_days > 10:
-                    continue
-
-            aggregate = (
-                amount_score * 0.55
-                + date_score * 0.25
-                + text_score * 0.15
-                + payment_score * 0.05
-            )
-            combo_ids: Set[str] = set()
-            for movement in combo:
-                identifier = movement.get("movement_id") or movement.get("id")
-                if identifier:
-                    combo_ids.add(str(identifier))
-
-            link_bonus = 0.08 if linked_ids and combo_ids & linked_ids else 0.0
-            confidence = round(min(1.0, aggregate + link_bonus) * 100, 2)
-
-            diff_days_values = []
-            for movement in combo:
-                movement_dt = _parse_date(movement.get("movement_date"))
-                if expense_dt and movement_dt:
-                    diff_days_values.append(abs((expense_dt.date() - movement_dt.date()).days))
-
-            diff_days = min(diff_days_values) if diff_days_values else None
-
-            reasons = _build_reasons(
-                amount_score=amount_score,
-                date_score=date_score,
-                text_score=text_score,
-                payment_score=payment_score,
-                amount_match=diff <= (expense_amount * 0.01),
-                diff_days=diff_days,
-            )
-            reasons.insert(0, f"Pago en {size} cargos")
-            if linked_ids and combo_ids & linked_ids:
-                reasons.append("Coincide con movimientos registrados en el gasto")
-            if span_days and span_days > 0:
-                reasons.append(f"Cargos repartidos en {span_days} días")
-
-            suggestions.append(
-                {
-                    "type": "combination",
-                    "movements": list(combo),
-                    "movement": combo[0],
-                    "movement_ids": sorted(combo_ids),
-                    "group_id": group_id,
-                    "combined_amount": round(combined_amount, 2),
-                    "confidence": confidence,
-                    "split_payment": True,
-                    "linked_match": bool(linked_ids and combo_ids & linked_ids),
-                    "reasons": reasons,
-                    "score_breakdown": {
-                        "amount": round(amount_score, 4),
-                        "date": round(date_score, 4),
-                        "text": round(text_score, 4),
-                        "payment": round(payment_score, 4),
-                    },
-                }
-            )
-            seen_group_ids.add(group_id)
+
+        amount_score = _amount_score(expense_amount, combined_amount)
+        date_score = max(date_scores[i] for i in match.indices)
+        text_score = max(text_scores[i] for i in match.indices)
+        payment_score = max(payment_scores[i] for i in match.indices)
+        span_days = match.span_days
+
+        combo_ids: Set[str] = {movement_ids[i] for i in match.indices if movement_ids[i]}
+        linked_match = bool(linked_ids and combo_ids & linked_ids)
+        confidence = round(match.score[0] * 100, 2)
+
+        diff_days_values = [
+            abs((expense_dt.date() - movement_dts[i].date()).days)
+            for i in match.indices
+            if expense_dt and movement_dts[i]
+        ]
+        diff_days = min(diff_days_values) if diff_days_values else None
+
+        reasons = _build_reasons(
+            amount_score=amount_score,
+            date_score=date_score,
+            text_score=text_score,
+            payment_score=payment_score,
+            amount_match=diff <= (expense_amount * 0.01),
+            diff_days=diff_days,
+        )
+        reasons.insert(0, f"Pago en {size} cargos")
+        if linked_match:
+            reasons.append("Coincide con movimientos registrados en el gasto")
+        if span_days and span_days > 0:
+            reasons.append(f"Cargos repartidos en {span_days} días")
+
+        suggestions.append(
+            {
+                "type": "combination",
+                "movements": combo,
+                "movement": combo[0],
+                "movement_ids": sorted(combo_ids),
+                "group_id": group_id,
+                "combined_amount": round(combined_amount, 2),
+                "confidence": confidence,
+                "split_payment": True,
+                "linked_match": linked_match,
+                "reasons": reasons,
+                "score_breakdown": {
+                    "amount": round(amount_score, 4),
+                    "date": round(date_score, 4),
+                    "text": round(text_score, 4),
+                    "payment": round(payment_score, 4),
+                },
+            }
+        )
+        seen_group_ids.add(group_id)
 
     return suggestions
 
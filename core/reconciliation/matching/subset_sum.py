@@ -0,0 +1,241 @@
+"""Bounded subset-sum search for split reconciliation suggestions.
+
+Shared by the one-to-many / many-to-one suggestion paths. Amounts are handled
+in integer cents so tolerance checks are exact, and every query runs under a
+time budget so a large candidate pool degrades to "best found so far" instead
+of blocking the request.
+
+The search walks candidates sorted by amount and prunes with prefix sums: a
+branch is cut as soon as the smallest possible completion overshoots the
+target or the largest possible completion cannot reach it. The last two picks
+are resolved with a bisect sweep over the sorted suffix and the last four as a
+meet-in-the-middle join over a sum-sorted pair table, so sizes 2–4 cost about
+O(n² log n) plus output and size 5 adds one linear level on top.
+"""
+
+from __future__ import annotations
+
+import heapq
+import logging
+import os
+import time
+from bisect import bisect_left, bisect_right
+from dataclasses import dataclass, field
+from typing import Any, Callable, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+SUBSET_SUM_TIME_BUDGET_MS = float(os.getenv("SUBSET_SUM_TIME_BUDGET_MS", "50"))
+_BUDGET_CHECK_EVERY = 512
+
+
+def to_cents(amount: Any) -> int:
+    """Convert a float/Decimal/str amount to integer cents (half away from zero)."""
+    value = float(amount or 0.0)
+    return int(value * 100 + (0.5 if value >= 0 else -0.5))
+
+
+@dataclass(frozen=True)
+class SubsetMatch:
+    indices: Tuple[int, ...]  # positions in the caller's candidate list
+    total_cents: int
+    diff_cents: int
+    span_days: Optional[int]
+    score: Any
+
+
+@dataclass
+class SubsetSearchResult:
+    matches: List[SubsetMatch] = field(default_factory=list)
+    feasible: int = 0
+    nodes: int = 0
+    timed_out: bool = False
+    elapsed_ms: float = 0.0
+
+
+class _BudgetExceeded(Exception):
+    pass
+
+
+def find_subset_sums(
+    amounts_cents: Sequence[int],
+    target_cents: int,
+    *,
+    tolerance_cents: int = 0,
+    min_size: int = 2,
+    max_size: int = 5,
+    days: Optional[Sequence[Optional[int]]] = None,
+    max_span_days: Optional[int] = None,
+    score: Optional[Callable[[Tuple[int, ...], int], Any]] = None,
+    top_k: int = 5,
+    time_budget_ms: Optional[float] = None,
+) -> SubsetSearchResult:
+    """Return the top-k subsets whose sum is within tolerance of the target.
+
+    Args:
+        amounts_cents: Candidate amounts; non-positive or oversized ones are ignored.
+        target_cents: Amount to reach.
+        tolerance_cents: Allowed absolute difference.
+        min_size / max_size: Bounds on the number of items per subset.
+        days: Optional day ordinal per candidate (``date.toordinal()``); None = unknown.
+        max_span_days: Max distance between the earliest and latest known day in a subset.
+        score: ``score(indices, diff_cents)``; higher is better, any orderable value.
+            Defaults to the smallest difference, then fewer items.
+        top_k: Number of subsets to keep.
+        time_budget_ms: Wall-clock budget; when exceeded the best subsets found so far
+            are returned with ``timed_out=True``.
+    """
+    started = time.perf_counter()
+    budget = SUBSET_SUM_TIME_BUDGET_MS if time_budget_ms is None else time_budget_ms
+    deadline = started + budget / 1000.0 if budget and budget > 0 else None
+    result = SubsetSearchResult()
+
+    low = target_cents - tolerance_cents
+    high = target_cents + tolerance_cents
+    order = sorted(
+        (idx for idx, cents in enumerate(amounts_cents) if 0 < cents <= high),
+        key=lambda idx: amounts_cents[idx],
+    )
+    values = [amounts_cents[idx] for idx in order]
+    item_days = [days[idx] for idx in order] if days is not None else None
+    check_span = item_days is not None and max_span_days is not None
+    n = len(values)
+    if n == 0 or top_k <= 0:
+        return result
+
+    prefix = [0]
+    for cents in values:
+        prefix.append(prefix[-1] + cents)
+
+    heap: List[Tuple[Any, int, SubsetMatch]] = []
+    sequence = 0
+
+    def span_of(positions: Sequence[int]) -> Optional[int]:
+        if item_days is None:
+            return None
+        known = [item_days[p] for p in positions if item_days[p] is not None]
+        return max(known) - min(known) if len(known) >= 2 else None
+
+    def emit(positions: Tuple[int, ...], total: int) -> None:
+        nonlocal sequence
+        span = span_of(positions)
+        if check_span and span is not None and span > max_span_days:
+            return
+        indices = tuple(order[p] for p in positions)
+        diff = abs(total - target_cents)
+        rank = score(indices, diff) if score else (-diff, -len(indices))
+        result.feasible += 1
+        sequence += 1
+        entry = (rank, -sequence, SubsetMatch(indices, total, diff, span, rank))
+        if len(heap) < top_k:
+            heapq.heappush(heap, entry)
+        elif entry[:2] > heap[0][:2]:
+            heapq.heapreplace(heap, entry)
+
+    def tick() -> None:
+        result.nodes += 1
+        if deadline is not None and result.nodes % _BUDGET_CHECK_EVERY == 0 and time.perf_counter() > deadline:
+            raise _BudgetExceeded
+
+    def close_pair(start: int, chosen: List[int], current: int) -> None:
+        # Last two items: for each i, the partner range is a contiguous slice of the sorted suffix.
+        for i in range(start, n - 1):
+            tick()
+            first = current + values[i]
+            if first + values[i + 1] > high:
+                break
+            lo = bisect_left(values, low - first, i + 1)
+            hi = bisect_right(values, high - first, i + 1)
+            for j in range(lo, hi):
+                tick()
+                emit(tuple(chosen) + (i, j), first + values[j])
+
+    def close_single(start: int, chosen: List[int], current: int) -> None:
+        lo = bisect_left(values, low - current, start)
+        hi = bisect_right(values, high - current, start)
+        for i in range(lo, hi):
+            tick()
+            emit(tuple(chosen) + (i,), current + values[i])
+
+    pair_table: List[Tuple[int, int, int]] = []
+    pair_sums: List[int] = []
+
+    def build_pair_table() -> None:
+        for i in range(n - 1):
+            if values[i] + values[i + 1] > high:
+                break
+            for j in range(i + 1, n):
+                total = values[i] + values[j]
+                if total > high:
+                    break
+                pair_table.append((total, i, j))
+        pair_table.sort()
+        pair_sums.extend(entry[0] for entry in pair_table)
+
+    def close_quad(start: int, chosen: List[int], current: int) -> None:
+        # Last four items as two pairs a < b < c < d: the first pair is the smaller half of the
+        # remaining sum, the second one is a bisect range of the sum-sorted pair table.
+        if not pair_table:
+            build_pair_table()
+        rest_low, rest_high = low - current, high - current
+        for first_sum, a, b in pair_table:
+            if 2 * first_sum > rest_high:
+                break
+            tick()
+            if a < start:
+                continue
+            lo = bisect_left(pair_sums, rest_low - first_sum)
+            hi = bisect_right(pair_sums, rest_high - first_sum)
+            for k in range(lo, hi):
+                _, c, d = pair_table[k]
+                if c > b:
+                    tick()
+                    emit(tuple(chosen) + (a, b, c, d), current + first_sum + values[c] + values[d])
+
+    def search(start: int, remaining: int, chosen: List[int], current: int, day_lo, day_hi) -> None:
+        if remaining == 4:
+            close_quad(start, chosen, current)
+            return
+        if remaining == 2:
+            close_pair(start, chosen, current)
+            return
+        if remaining == 1:
+            close_single(start, chosen, current)
+            return
+        for i in range(start, n - remaining + 1):
+            tick()
+            total = current + values[i]
+            rest = remaining - 1
+            # Lower bound: even the next `rest` (smallest) items overshoot
+            if total + prefix[i + 1 + rest] - prefix[i + 1] > high:
+                break
+            # Upper bound: even the `rest` largest items fall short
+            if total + prefix[n] - prefix[max(i + 1, n - rest)] < low:
+                continue
+            new_lo, new_hi = day_lo, day_hi
+            if check_span and item_days[i] is not None:
+                day = item_days[i]
+                new_lo = day if new_lo is None else min(new_lo, day)
+                new_hi = day if new_hi is None else max(new_hi, day)
+                if new_hi - new_lo > max_span_days:
+                    continue
+            chosen.append(i)
+            search(i + 1, rest, chosen, total, new_lo, new_hi)
+            chosen.pop()
+
+    try:
+        for size in range(max(1, min_size), min(max_size, n) + 1):
+            search(0, size, [], 0, None, None)
+    except _BudgetExceeded:
+        result.timed_out = True
+        logger.debug(
+            "Subset-sum budget of %.0fms exhausted after %s nodes (%s feasible)",
+            budget, result.nodes, result.feasible,
+        )
+
+    result.matches = [entry[2] for entry in sorted(heap, key=lambda e: e[:2], reverse=True)]
+    result.elapsed_ms = (time.perf_counter() - started) * 1000.0
+    return result
+
+
+__all__ = ["SubsetMatch", "SubsetSearchResult", "find_subset_sums", "to_cents"]
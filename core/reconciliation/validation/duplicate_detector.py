@@ -10,6 +10,8 @@ from typing import Dict, Any, List, Optional, Tuple
 import numpy as np
 from dataclasses import dataclass
 
+from .embedding_cache import EmbeddingCache, get_embedding_cache
+
 try:
     from openai import OpenAI
 except ImportError:
@@ -17,6 +19,8 @@ except ImportError:
 
 logger = logging.getLogger(__name__)
 
+EMBEDDING_MODEL = "text-embedding-3-small"
+
 
 @dataclass
 class DuplicateMatch:
@@ -55,6 +59,48 @@ class DuplicateDetector:
         # Ventana de tiempo para buscar duplicados (días)
         self.TIME_WINDOW_DAYS = 30
 
+        # Cache persistente de embeddings (compartido con OptimizedDuplicateDetector)
+        self._embedding_cache: Optional[EmbeddingCache] = None
+
+    @property
+    def embedding_cache(self) -> EmbeddingCache:
+        if self._embedding_cache is None:
+            self._embedding_cache = get_embedding_cache()
+        return self._embedding_cache
+
+    @embedding_cache.setter
+    def embedding_cache(self, cache: EmbeddingCache):
+        self._embedding_cache = cache
+
+    def _get_cached_embedding(self, text: str) -> Optional[List[float]]:
+        """Obtiene embedding del cache"""
+        return self.embedding_cache.get(text, EMBEDDING_MODEL)
+
+    def _cache_embedding(self, text: str, embedding: List[float]):
+        """Cachea un embedding"""
+        self.embedding_cache.put(text, embedding, EMBEDDING_MODEL)
+
+    def _get_embeddings(self, texts: List[str]) -> Dict[str, List[float]]:
+        """Embeddings de varios textos: cache primero, una sola llamada a OpenAI para los faltantes"""
+        unique = list(dict.fromkeys(texts))
+        embeddings = self.embedding_cache.get_many(unique, EMBEDDING_MODEL)
+        missing = [t for t in unique if t not in embeddings]
+
+        if missing:
+            response = self.client.embeddings.create(
+                model=EMBEDDING_MODEL,
+                input=missing
+            )
+            fetched = {text: response.data[i].embedding for i, text in enumerate(missing)}
+            self.embedding_cache.put_many(fetched, EMBEDDING_MODEL)
+            embeddings.update(fetched)
+
+        return embeddings
+
+    def get_cache_stats(self) -> Dict[str, Any]:
+        """Obtiene estadísticas del cache (hits, misses, desalojos, bytes)"""
+        return self.embedding_cache.get_stats()
+
     def detect_duplicates(self, new_expense: Dict[str, Any], existing_expenses: List[Dict[str, Any]]) -> List[DuplicateMatch]:
         """
         Detecta posibles duplicados de un gasto nuevo comparándolo con gastos existentes
@@ -195,18 +241,11 @@ class DuplicateDetector:
     def _embedding_similarity(self, text1: str, text2: str) -> float:
         """Calcula similitud usando embeddings de OpenAI"""
         try:
-            # Obtener embeddings
-            response1 = self.client.embeddings.create(
-                model="text-embedding-3-small",
-                input=text1
-            )
-            response2 = self.client.embeddings.create(
-                model="text-embedding-3-small",
-                input=text2
-            )
+            # Obtener embeddings (cacheados en disco)
+            embeddings = self._get_embeddings([text1, text2])
 
-            embedding1 = np.array(response1.data[0].embedding)
-            embedding2 = np.array(response2.data[0].embedding)
+            embedding1 = np.array(embeddings[text1])
+            embedding2 = np.array(embeddings[text2])
 
             # Calcular similitud coseno
             dot_product = np.dot(embedding1, embedding2)
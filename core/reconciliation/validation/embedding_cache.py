@@ -0,0 +1,267 @@
+"""
+Embedding Cache - Cache persistente de embeddings compartido entre workers
+
+Backend SQLite (modo WAL) con presupuesto de bytes configurable y desalojo
+LRU. Las llaves son hash(texto normalizado) + modelo, así que el mismo
+texto bancario no se vuelve a pagar después de un deploy ni en otro
+worker de uvicorn.
+
+Configuración por entorno:
+- EMBEDDING_CACHE_PATH: archivo SQLite (default data/embedding_cache.sqlite3)
+- EMBEDDING_CACHE_MAX_BYTES: presupuesto de bytes de vectores (default 256 MB)
+"""
+
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", os.path.join("data", "embedding_cache.sqlite3"))
+DEFAULT_MAX_BYTES = int(os.getenv("EMBEDDING_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+
+# Al desalojar se baja hasta este porcentaje del presupuesto para no desalojar en cada inserción
+EVICTION_TARGET_RATIO = 0.9
+# Solo se reescribe last_access si la última marca es más vieja que esto (segundos)
+TOUCH_INTERVAL_SECONDS = 60.0
+
+
+class EmbeddingCache:
+    """
+    Cache LRU de embeddings con persistencia en SQLite.
+
+    Un pequeño LRU en memoria evita ir a disco para los textos más
+    calientes; SQLite es la fuente de verdad compartida entre procesos.
+    """
+
+    def __init__(self, path: Optional[str] = None, max_bytes: Optional[int] = None,
+                 memory_entries: int = 2048, ttl_seconds: Optional[float] = None):
+        self.path = path or DEFAULT_CACHE_PATH
+        self.max_bytes = max_bytes if max_bytes is not None else DEFAULT_MAX_BYTES
+        self.memory_entries = memory_entries
+        self.ttl_seconds = ttl_seconds
+
+        self._memory: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.RLock()
+        self._local = threading.local()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.writes = 0
+
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._init_schema()
+
+    # ------------------------------------------------------------------
+    # SQLite
+    # ------------------------------------------------------------------
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode = WAL")
+            conn.execute("PRAGMA synchronous = NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _init_schema(self) -> None:
+        conn = self._connection()
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS embedding_cache (
+                cache_key TEXT PRIMARY KEY,
+                model TEXT NOT NULL,
+                dim INTEGER NOT NULL,
+                vector BLOB NOT NULL,
+                nbytes INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                last_access REAL NOT NULL
+            )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_embedding_cache_last_access ON embedding_cache(last_access)")
+
+    @staticmethod
+    def make_key(text: str, model: str) -> str:
+        normalized = (text or "").lower().strip()
+        return hashlib.sha256(f"{model}\x00{normalized}".encode("utf-8")).hexdigest()
+
+    # ------------------------------------------------------------------
+    # Lectura
+    # ------------------------------------------------------------------
+
+    def _remember(self, key: str, vector: List[float], last_access: float) -> None:
+        self._memory[key] = (vector, last_access)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def get_many(self, texts: Sequence[str], model: str) -> Dict[str, List[float]]:
+        """Embeddings cacheados por texto (los faltantes se omiten)"""
+        now = time.time()
+        found: Dict[str, List[float]] = {}
+        pending: Dict[str, str] = {}
+
+        with self._lock:
+            for text in texts:
+                key = self.make_key(text, model)
+                cached = self._memory.get(key)
+                if cached is not None:
+                    self._memory.move_to_end(key)
+                    found[text] = cached[0]
+                else:
+                    pending[key] = text
+
+            if pending:
+                to_touch = []
+                rows = self._fetch_rows(list(pending))
+                for key, dim, blob, created_at, last_access in rows:
+                    if self.ttl_seconds and now - created_at > self.ttl_seconds:
+                        continue
+                    vector = np.frombuffer(blob, dtype=np.float32, count=dim).tolist()
+                    found[pending[key]] = vector
+                    self._remember(key, vector, now)
+                    if now - last_access > TOUCH_INTERVAL_SECONDS:
+                        to_touch.append((now, key))
+
+                if to_touch:
+                    try:
+                        self._connection().executemany(
+                            "UPDATE embedding_cache SET last_access = ? WHERE cache_key = ?", to_touch
+                        )
+                    except sqlite3.Error as e:
+                        logger.debug(f"Could not refresh embedding cache LRU marks: {e}")
+
+            self.hits += len(found)
+            self.misses += len(texts) - len(found)
+
+        return found
+
+    def _fetch_rows(self, keys: List[str]):
+        rows = []
+        conn = self._connection()
+        # SQLite limita el número de parámetros por sentencia
+        for start in range(0, len(keys), 500):
+            chunk = keys[start:start + 500]
+            placeholders = ",".join("?" * len(chunk))
+            rows.extend(conn.execute(
+                f"SELECT cache_key, dim, vector, created_at, last_access FROM embedding_cache "
+                f"WHERE cache_key IN ({placeholders})",
+                chunk,
+            ).fetchall())
+        return rows
+
+    def get(self, text: str, model: str) -> Optional[List[float]]:
+        return self.get_many([text], model).get(text)
+
+    # ------------------------------------------------------------------
+    # Escritura
+    # ------------------------------------------------------------------
+
+    def put_many(self, items: Dict[str, Sequence[float]], model: str) -> None:
+        """Guarda embeddings por texto y desaloja LRU si se excede el presupuesto"""
+        if not items:
+            return
+
+        now = time.time()
+        rows = []
+        with self._lock:
+            for text, embedding in items.items():
+                key = self.make_key(text, model)
+                vector = np.asarray(embedding, dtype=np.float32)
+                blob = vector.tobytes()
+                rows.append((key, model, int(vector.shape[0]), blob, len(blob), now, now))
+                self._remember(key, vector.tolist(), now)
+
+            conn = self._connection()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO embedding_cache "
+                    "(cache_key, model, dim, vector, nbytes, created_at, last_access) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    rows,
+                )
+                self._evict_if_needed(conn)
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+            self.writes += len(rows)
+
+    def put(self, text: str, embedding: Sequence[float], model: str) -> None:
+        self.put_many({text: embedding}, model)
+
+    def _evict_if_needed(self, conn: sqlite3.Connection) -> None:
+        total = conn.execute("SELECT COALESCE(SUM(nbytes), 0) FROM embedding_cache").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+
+        target = int(self.max_bytes * EVICTION_TARGET_RATIO)
+        to_free = total - target
+        victims = []
+        freed = 0
+        for key, nbytes in conn.execute("SELECT cache_key, nbytes FROM embedding_cache ORDER BY last_access ASC"):
+            victims.append((key,))
+            freed += nbytes
+            if freed >= to_free:
+                break
+
+        conn.executemany("DELETE FROM embedding_cache WHERE cache_key = ?", victims)
+        for (key,) in victims:
+            self._memory.pop(key, None)
+        self.evictions += len(victims)
+        logger.info(f"Embedding cache evicted {len(victims)} entries ({freed} bytes)")
+
+    # ------------------------------------------------------------------
+    # Administración
+    # ------------------------------------------------------------------
+
+    def clear(self) -> None:
+        with self._lock:
+            self._memory.clear()
+            self._connection().execute("DELETE FROM embedding_cache")
+            self.hits = self.misses = self.evictions = self.writes = 0
+
+    def get_stats(self) -> Dict[str, object]:
+        entries, total_bytes = self._connection().execute(
+            "SELECT COUNT(*), COALESCE(SUM(nbytes), 0) FROM embedding_cache"
+        ).fetchone()
+        total_requests = self.hits + self.misses
+        return {
+            "cache_size": entries,
+            "cache_bytes": total_bytes,
+            "max_bytes": self.max_bytes,
+            "memory_entries": len(self._memory),
+            "cache_hits": self.hits,
+            "cache_misses": self.misses,
+            "evictions": self.evictions,
+            "writes": self.writes,
+            "hit_rate": self.hits / total_requests if total_requests > 0 else 0,
+            "total_requests": total_requests,
+            "path": self.path,
+        }
+
+
+_caches: Dict[str, EmbeddingCache] = {}
+_caches_lock = threading.Lock()
+
+
+def get_embedding_cache(path: Optional[str] = None, **kwargs) -> EmbeddingCache:
+    """Instancia compartida por archivo dentro del proceso"""
+    resolved = os.path.abspath(path or DEFAULT_CACHE_PATH)
+    with _caches_lock:
+        cache = _caches.get(resolved)
+        if cache is None:
+            cache = EmbeddingCache(path=resolved, **kwargs)
+            _caches[resolved] = cache
+        return cache
@@ -5,14 +5,16 @@ Optimized Duplicate Expense Detector - Versión mejorada con cache y batch proce
 import os
 import logging
 import json
-import hashlib
+import math
 import time
-from datetime import datetime, timedelta
+from datetime import datetime
 from typing import Dict, Any, List, Optional, Tuple
 import numpy as np
 from dataclasses import dataclass
 from functools import lru_cache
 
+from .embedding_cache import EmbeddingCache, get_embedding_cache
+
 try:
     from openai import OpenAI
 except ImportError:
@@ -20,6 +22,8 @@ except ImportError:
 
 logger = logging.getLogger(__name__)
 
+EMBEDDING_MODEL = "text-embedding-3-small"
+
 
 @dataclass
 class DuplicateMatch:
@@ -32,6 +36,182 @@ class DuplicateMatch:
     processing_time_ms: Optional[int] = None
 
 
+_DATE_FORMATS = (
+    "%Y-%m-%d",
+    "%Y/%m/%d",
+    "%d-%m-%Y",
+    "%d/%m/%Y",
+    "%Y-%m-%dT%H:%M:%S",
+    "%Y-%m-%dT%H:%M:%S.%f",
+    "%Y-%m-%dT%H:%M:%S.%fZ"
+)
+
+
+@lru_cache(maxsize=4096)
+def _parse_date_value(date_str: Optional[str]) -> Optional[datetime]:
+    """Parsea una fecha en cualquiera de los formatos soportados"""
+    if not date_str:
+        return None
+
+    date_str = str(date_str).strip()
+    for fmt in _DATE_FORMATS:
+        try:
+            return datetime.strptime(date_str, fmt)
+        except (ValueError, TypeError):
+            continue
+
+    return None
+
+
+def _provider_key(merchant_name: Optional[str]) -> str:
+    """Clave normalizada de proveedor; vacía (solo espacios incluidos) equivale a sin proveedor"""
+    return (merchant_name or '').lower().strip()
+
+
+class DuplicateIndex:
+    """
+    Índice por tenant de gastos existentes ordenado por fecha.
+
+    Las fechas se parsean una sola vez a ordinales en un arreglo NumPy
+    ordenado; las consultas de ventana de tiempo usan ``searchsorted``.
+    Montos y claves de proveedor se guardan en arreglos paralelos para
+    el scoring vectorizado. Los gastos que llegan con ``add`` se acumulan
+    en un buffer que las consultas recorren aparte y que se mezcla con los
+    arreglos ordenados en una sola pasada cuando crece.
+    """
+
+    # Tamaño mínimo del buffer antes de mezclarlo; crece con √N para que
+    # insertar N gastos uno a uno cueste O(N·√N) y no O(N²)
+    MIN_PENDING_MERGE = 256
+
+    def __init__(self, tenant_id: Optional[Any] = None,
+                 expenses: Optional[List[Dict[str, Any]]] = None):
+        self.tenant_id = tenant_id
+        self._ordinals = np.empty(0, dtype=np.int64)
+        self._seq = np.empty(0, dtype=np.int64)
+        self._amounts = np.empty(0, dtype=np.float64)
+        self._provider_keys = np.empty(0, dtype=object)
+        self._expenses = np.empty(0, dtype=object)
+        self._pending: List[Tuple[int, int, Dict[str, Any]]] = []
+        self._next_seq = 0
+        self.skipped_without_date = 0
+
+        if expenses:
+            self.add_many(expenses)
+
+    def __len__(self) -> int:
+        return len(self._ordinals) + len(self._pending)
+
+    @staticmethod
+    def expense_date(expense: Dict[str, Any]) -> Optional[datetime]:
+        """Fecha efectiva del gasto (``date`` o, en su defecto, ``created_at``)"""
+        return _parse_date_value(expense.get('date')) or _parse_date_value(expense.get('created_at'))
+
+    def _columns(self, rows: List[Tuple[int, int, Dict[str, Any]]]):
+        count = len(rows)
+        ordinals = np.fromiter((r[0] for r in rows), dtype=np.int64, count=count)
+        seq = np.fromiter((r[1] for r in rows), dtype=np.int64, count=count)
+        amounts = np.fromiter((float(r[2].get('amount') or 0) for r in rows), dtype=np.float64, count=count)
+        provider_keys = np.empty(count, dtype=object)
+        provider_keys[:] = [_provider_key(r[2].get('merchant_name')) for r in rows]
+        stored = np.empty(count, dtype=object)
+        stored[:] = [r[2] for r in rows]
+        return ordinals, seq, amounts, provider_keys, stored
+
+    def _dated_rows(self, expenses: List[Dict[str, Any]]) -> List[Tuple[int, int, Dict[str, Any]]]:
+        rows = []
+        for expense in expenses:
+            expense_date = self.expense_date(expense)
+            if expense_date is None:
+                self.skipped_without_date += 1
+                continue
+            rows.append((expense_date.toordinal(), self._next_seq, expense))
+            self._next_seq += 1
+        return rows
+
+    def add(self, expense: Dict[str, Any]) -> None:
+        """Agrega un gasto al buffer; se mezcla con el índice al llenarse"""
+        self._pending.extend(self._dated_rows([expense]))
+        if len(self._pending) >= max(self.MIN_PENDING_MERGE, math.isqrt(len(self._ordinals))):
+            self._merge_pending()
+
+    def add_many(self, expenses: List[Dict[str, Any]]) -> None:
+        """Inserta varios gastos con un solo reordenamiento"""
+        self._pending.extend(self._dated_rows(expenses))
+        self._merge_pending()
+
+    def _merge_pending(self) -> None:
+        """Mezcla el buffer con los arreglos ordenados en una sola pasada"""
+        if not self._pending:
+            return
+        rows = sorted(self._pending, key=lambda r: (r[0], r[1]))
+        self._pending = []
+        ordinals, seq, amounts, provider_keys, stored = self._columns(rows)
+
+        # side='right': en empates de fecha lo ya indexado (seq menor) va primero
+        positions = np.searchsorted(self._ordinals, ordinals, side='right')
+        self._ordinals = np.insert(self._ordinals, positions, ordinals)
+        self._seq = np.insert(self._seq, positions, seq)
+        self._amounts = np.insert(self._amounts, positions, amounts)
+        self._provider_keys = np.insert(self._provider_keys, positions, provider_keys)
+        self._expenses = np.insert(self._expenses, positions, stored)
+
+    def _sorted_window(self, center_ordinal: int, window_days: int,
+                       limit: Optional[int]) -> np.ndarray:
+        lo = int(np.searchsorted(self._ordinals, center_ordinal - window_days, side='left'))
+        hi = int(np.searchsorted(self._ordinals, center_ordinal + window_days, side='right'))
+        if lo >= hi:
+            return np.empty(0, dtype=np.int64)
+
+        days_diff = np.abs(self._ordinals[lo:hi] - center_ordinal)
+        order = np.lexsort((self._seq[lo:hi], days_diff))
+        if limit is not None:
+            order = order[:limit]
+        return order + lo
+
+    def window_positions(self, center: datetime, window_days: int,
+                         limit: Optional[int] = None) -> np.ndarray:
+        """
+        Posiciones dentro de ``±window_days`` de ``center``, ordenadas por
+        proximidad temporal (y orden de inserción en empates).
+        """
+        self._merge_pending()
+        return self._sorted_window(center.toordinal(), window_days, limit)
+
+    def query(self, center: datetime, window_days: int,
+              limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Gastos dentro de la ventana de tiempo, más cercanos primero"""
+        center_ordinal = center.toordinal()
+        positions = self._sorted_window(center_ordinal, window_days, limit)
+        pending = [r for r in self._pending if abs(r[0] - center_ordinal) <= window_days]
+        if not pending:
+            return list(self._expenses[positions])
+
+        # Ventana del índice + buffer, con el mismo orden (días, inserción)
+        candidates = [
+            (abs(int(ordinal) - center_ordinal), int(seq), expense)
+            for ordinal, seq, expense in zip(self._ordinals[positions], self._seq[positions],
+                                             self._expenses[positions])
+        ]
+        candidates.extend((abs(ordinal - center_ordinal), seq, expense) for ordinal, seq, expense in pending)
+        candidates.sort(key=lambda c: (c[0], c[1]))
+        if limit is not None:
+            candidates = candidates[:limit]
+        return [c[2] for c in candidates]
+
+    def expenses_at(self, positions: np.ndarray) -> List[Dict[str, Any]]:
+        return list(self._expenses[positions])
+
+    def ordinals_at(self, positions: np.ndarray) -> np.ndarray:
+        return self._ordinals[positions]
+
+    def amounts_at(self, positions: np.ndarray) -> np.ndarray:
+        return self._amounts[positions]
+
+    def provider_keys_at(self, positions: np.ndarray) -> np.ndarray:
+        return self._provider_keys[positions]
+
+
 class OptimizedDuplicateDetector:
     """
     Detector optimizado de gastos duplicados con cache y batch processing
@@ -49,10 +229,8 @@ class OptimizedDuplicateDetector:
             else:
                 self.client = OpenAI(api_key=api_key)
 
-        # Cache para embeddings (en memoria)
-        self._embedding_cache = {}
-        self._cache_hits = 0
-        self._cache_misses = 0
+        # Cache persistente de embeddings (SQLite compartido, LRU por bytes); se abre al primer uso
+        self._embedding_cache: Optional[EmbeddingCache] = None
 
         # Configuración optimizada
         self.config = {
@@ -69,10 +247,19 @@ class OptimizedDuplicateDetector:
             },
             'time_window_days': 30,
             'max_comparisons': 100,  # Límite para performance
-            'cache_ttl_hours': 24,   # TTL del cache
             'batch_size': 10         # Para batch embeddings
         }
 
+    @property
+    def embedding_cache(self) -> EmbeddingCache:
+        if self._embedding_cache is None:
+            self._embedding_cache = get_embedding_cache()
+        return self._embedding_cache
+
+    @embedding_cache.setter
+    def embedding_cache(self, cache: EmbeddingCache):
+        self._embedding_cache = cache
+
     def detect_duplicates(self, new_expense: Dict[str, Any],
                          existing_expenses: List[Dict[str, Any]],
                          custom_config: Optional[Dict[str, Any]] = None) -> List[DuplicateMatch]:
@@ -89,11 +276,59 @@ class OptimizedDuplicateDetector:
 
         logger.info(f"Detecting duplicates for expense: {new_expense.get('description', 'N/A')}")
 
-        potential_duplicates = []
-
         # 1. Filtrar por ventana de tiempo y límite de comparaciones
         filtered_expenses = self._filter_and_limit_expenses(new_expense, existing_expenses, config)
 
+        return self._score_candidates(new_expense, filtered_expenses, config, start_time)
+
+    def detect_duplicates_many(self, new_expenses: List[Dict[str, Any]],
+                               existing_expenses: Optional[List[Dict[str, Any]]] = None,
+                               custom_config: Optional[Dict[str, Any]] = None,
+                               index: Optional[DuplicateIndex] = None,
+                               include_batch: bool = True) -> List[List[DuplicateMatch]]:
+        """
+        Detecta duplicados para un archivo de importación completo.
+
+        Construye (o reutiliza) un ``DuplicateIndex`` una sola vez y consulta
+        la ventana de cada gasto con ``searchsorted``. Con ``include_batch``
+        cada gasto se inserta en el índice después de evaluarse, de modo que
+        también se detectan duplicados dentro del mismo archivo.
+
+        Returns:
+            Lista de coincidencias por cada gasto de ``new_expenses`` (mismo orden)
+        """
+        config = {**self.config, **custom_config} if custom_config else self.config
+        if index is None:
+            index = DuplicateIndex(expenses=existing_expenses or [])
+
+        self._precompute_embeddings_batch_many(new_expenses)
+
+        results = []
+        for new_expense in new_expenses:
+            start_time = time.time()
+            candidates = self._query_index(new_expense, index, config)
+            results.append(self._score_candidates(new_expense, candidates, config, start_time))
+            if include_batch:
+                index.add(new_expense)
+
+        logger.info(
+            f"Batch duplicate detection: {len(new_expenses)} expenses, "
+            f"{sum(1 for r in results if r)} with potential duplicates"
+        )
+        return results
+
+    def _query_index(self, new_expense: Dict[str, Any], index: DuplicateIndex,
+                     config: Dict[str, Any]) -> List[Dict[str, Any]]:
+        new_date = _parse_date_value(new_expense.get('date')) or datetime.now()
+        return index.query(new_date, config['time_window_days'], config['max_comparisons'])
+
+    def _score_candidates(self, new_expense: Dict[str, Any],
+                          filtered_expenses: List[Dict[str, Any]],
+                          config: Dict[str, Any],
+                          start_time: float) -> List[DuplicateMatch]:
+        """Calcula similitudes contra los candidatos ya filtrados"""
+        potential_duplicates = []
+
         if not filtered_expenses:
             return []
 
@@ -105,33 +340,34 @@ class OptimizedDuplicateDetector:
         if config.get('extract_ml_features', True):
             new_expense_features = self._extract_ml_features(new_expense)
 
-        # 3. Calcular similitudes
-        for existing_expense in filtered_expenses:
-            similarity_score, match_reasons = self._calculate_similarity_optimized(
-                new_expense, existing_expense, config
-            )
+        # 3. Calcular similitudes en batch (solo se generan razones sobre el umbral)
+        scores, reasons = self.score_candidates_batch(new_expense, filtered_expenses, config)
 
-            if similarity_score >= config['similarity_thresholds']['low']:
-                confidence_level = self._get_confidence_level(similarity_score, config)
+        for idx in np.flatnonzero(scores >= config['similarity_thresholds']['low']):
+            existing_expense = filtered_expenses[idx]
+            similarity_score = float(scores[idx])
+            match_reasons = reasons[idx]
 
-                processing_time = int((time.time() - start_time) * 1000)
+            confidence_level = self._get_confidence_level(similarity_score, config)
 
-                duplicate_match = DuplicateMatch(
-                    expense_id=existing_expense.get('id'),
-                    similarity_score=similarity_score,
-                    match_reasons=match_reasons,
-                    existing_expense=existing_expense,
-                    confidence_level=confidence_level,
-                    processing_time_ms=processing_time
-                )
+            processing_time = int((time.time() - start_time) * 1000)
 
-                potential_duplicates.append(duplicate_match)
+            duplicate_match = DuplicateMatch(
+                expense_id=existing_expense.get('id'),
+                similarity_score=similarity_score,
+                match_reasons=match_reasons,
+                existing_expense=existing_expense,
+                confidence_level=confidence_level,
+                processing_time_ms=processing_time
+            )
+
+            potential_duplicates.append(duplicate_match)
 
         # Ordenar por score de similitud (mayor a menor)
         potential_duplicates.sort(key=lambda x: x.similarity_score, reverse=True)
 
         total_time = int((time.time() - start_time) * 1000)
-        cache_hit_rate = self._cache_hits / (self._cache_hits + self._cache_misses) if (self._cache_hits + self._cache_misses) > 0 else 0
+        cache_hit_rate = self._cache_hit_rate()
 
         logger.info(f"Found {len(potential_duplicates)} potential duplicates in {total_time}ms (cache hit rate: {cache_hit_rate:.2%})")
         return potential_duplicates
@@ -140,30 +376,8 @@ class OptimizedDuplicateDetector:
                                  existing_expenses: List[Dict[str, Any]],
                                  config: Dict[str, Any]) -> List[Dict[str, Any]]:
         """Filtra y limita gastos para optimizar performance"""
-        new_date = self._parse_date(new_expense.get('date'))
-        if not new_date:
-            new_date = datetime.now()
-
-        time_window_start = new_date - timedelta(days=config['time_window_days'])
-        time_window_end = new_date + timedelta(days=config['time_window_days'])
-
-        # Filtrar por fecha y ordenar por relevancia
-        filtered = []
-        for expense in existing_expenses:
-            expense_date = self._parse_date(expense.get('date'))
-            if not expense_date:
-                expense_date = self._parse_date(expense.get('created_at'))
-
-            if expense_date and time_window_start <= expense_date <= time_window_end:
-                # Agregar score de relevancia basado en proximidad temporal
-                days_diff = abs((expense_date - new_date).days)
-                relevance_score = max(0, 1.0 - (days_diff / config['time_window_days']))
-                expense['_relevance_score'] = relevance_score
-                filtered.append(expense)
-
-        # Ordenar por relevancia y limitar
-        filtered.sort(key=lambda x: x.get('_relevance_score', 0), reverse=True)
-        return filtered[:config['max_comparisons']]
+        index = DuplicateIndex(expenses=existing_expenses)
+        return self._query_index(new_expense, index, config)
 
     def _precompute_embeddings_batch(self, new_expense: Dict[str, Any],
                                    filtered_expenses: List[Dict[str, Any]]):
@@ -171,21 +385,9 @@ class OptimizedDuplicateDetector:
         if not self.client:
             return
 
-        texts_to_embed = []
-        texts_map = {}
-
-        # Agregar texto del nuevo gasto
-        new_text = new_expense.get('description', '')
-        if new_text and not self._get_cached_embedding(new_text):
-            texts_to_embed.append(new_text)
-            texts_map[new_text] = 'new'
-
-        # Agregar textos de gastos existentes
-        for expense in filtered_expenses:
-            text = expense.get('description', '')
-            if text and not self._get_cached_embedding(text):
-                texts_to_embed.append(text)
-                texts_map[text] = expense.get('id')
+        # Texto del nuevo gasto + textos de gastos existentes, una sola consulta al cache
+        texts = [new_expense.get('description', '')] + [e.get('description', '') for e in filtered_expenses]
+        texts_to_embed = self._missing_embeddings(texts)
 
         if not texts_to_embed:
             return
@@ -199,6 +401,20 @@ class OptimizedDuplicateDetector:
             except Exception as e:
                 logger.warning(f"Batch embedding failed: {e}")
 
+    def _precompute_embeddings_batch_many(self, new_expenses: List[Dict[str, Any]]):
+        """Pre-computa embeddings de todo un archivo de importación"""
+        if not self.client:
+            return
+
+        texts = self._missing_embeddings([e.get('description', '') for e in new_expenses])
+
+        batch_size = self.config['batch_size']
+        for i in range(0, len(texts), batch_size):
+            try:
+                self._batch_embed_and_cache(texts[i:i + batch_size])
+            except Exception as e:
+                logger.warning(f"Batch embedding failed: {e}")
+
     def _batch_embed_and_cache(self, texts: List[str]):
         """Obtiene embeddings en batch y los cachea"""
         if not self.client or not texts:
@@ -206,46 +422,181 @@ class OptimizedDuplicateDetector:
 
         try:
             response = self.client.embeddings.create(
-                model="text-embedding-3-small",
+                model=EMBEDDING_MODEL,
                 input=texts
             )
 
-            for i, text in enumerate(texts):
-                if i < len(response.data):
-                    embedding = response.data[i].embedding
-                    self._cache_embedding(text, embedding)
+            self.embedding_cache.put_many(
+                {text: response.data[i].embedding for i, text in enumerate(texts) if i < len(response.data)},
+                EMBEDDING_MODEL
+            )
 
         except Exception as e:
             logger.error(f"Batch embedding error: {e}")
 
+    def _missing_embeddings(self, texts: List[str]) -> List[str]:
+        """Textos únicos (no vacíos) que aún no están en el cache"""
+        unique = list(dict.fromkeys(t for t in texts if t))
+        if not unique:
+            return []
+        cached = self.embedding_cache.get_many(unique, EMBEDDING_MODEL)
+        return [t for t in unique if t not in cached]
+
+    def _get_cached_embeddings(self, texts: List[str]) -> Dict[str, List[float]]:
+        """Obtiene varios embeddings del cache en una sola consulta"""
+        unique = list(dict.fromkeys(t for t in texts if t))
+        return self.embedding_cache.get_many(unique, EMBEDDING_MODEL) if unique else {}
+
     def _get_cached_embedding(self, text: str) -> Optional[List[float]]:
         """Obtiene embedding del cache"""
-        text_hash = self._get_text_hash(text)
-
-        if text_hash in self._embedding_cache:
-            cached_data = self._embedding_cache[text_hash]
-            # Verificar TTL
-            if time.time() - cached_data['timestamp'] < (self.config['cache_ttl_hours'] * 3600):
-                self._cache_hits += 1
-                return cached_data['embedding']
-            else:
-                # Limpiar entrada expirada
-                del self._embedding_cache[text_hash]
-
-        self._cache_misses += 1
-        return None
+        return self.embedding_cache.get(text, EMBEDDING_MODEL)
 
     def _cache_embedding(self, text: str, embedding: List[float]):
         """Cachea un embedding"""
-        text_hash = self._get_text_hash(text)
-        self._embedding_cache[text_hash] = {
-            'embedding': embedding,
-            'timestamp': time.time()
-        }
+        self.embedding_cache.put(text, embedding, EMBEDDING_MODEL)
+
+    def _score_components_batch(self, new_expense: Dict[str, Any],
+                                candidates: List[Dict[str, Any]]) -> Dict[str, np.ndarray]:
+        """
+        Calcula los componentes de similitud de un gasto contra todos los
+        candidatos a la vez con arreglos NumPy.
+
+        Equivale a llamar ``_calculate_similarity_optimized`` por cada par:
+        producto matriz-vector de embeddings, razón de montos, deltas de
+        fecha e igualdad de proveedor vectorizados. Solo los pares sin
+        embeddings o con proveedor distinto caen a ``SequenceMatcher``.
+        """
+        count = len(candidates)
+
+        # 1. Descripción: coseno para pares con embedding, strings para el resto
+        description = np.zeros(count, dtype=np.float64)
+        new_text = new_expense.get('description', '') or ''
+        texts = [c.get('description', '') or '' for c in candidates]
+        has_text = np.fromiter((bool(t) for t in texts), dtype=bool, count=count) & bool(new_text)
+
+        needs_string = has_text.copy()
+        cached = self._get_cached_embeddings([new_text] + texts) if (self.client and new_text) else {}
+        new_embedding = cached.get(new_text)
+        if new_embedding:
+            rows = list(np.flatnonzero(has_text))
+            embeddings = [cached.get(texts[i]) for i in rows]
+            with_embedding = [(i, e) for i, e in zip(rows, embeddings) if e]
+            if with_embedding:
+                idx = np.fromiter((i for i, _ in with_embedding), dtype=np.int64, count=len(with_embedding))
+                matrix = np.asarray([e for _, e in with_embedding], dtype=np.float64)
+                query = np.asarray(new_embedding, dtype=np.float64)
+                norms = np.linalg.norm(matrix, axis=1) * np.linalg.norm(query)
+                dots = matrix @ query
+                cosine = np.divide(dots, norms, out=np.zeros_like(dots), where=norms != 0)
+                description[idx] = np.maximum(0.0, cosine)
+                needs_string[idx] = False
+
+        for i in np.flatnonzero(needs_string):
+            description[i] = self._string_similarity_optimized(new_text, texts[i])
+
+        # 2. Monto: 1 - |a1 - a2| / max(a1, a2), 0 si alguno es <= 0
+        new_amount = float(new_expense.get('amount', 0) or 0)
+        amounts = np.fromiter((float(c.get('amount', 0) or 0) for c in candidates), dtype=np.float64, count=count)
+        amount = np.zeros(count, dtype=np.float64)
+        if new_amount > 0:
+            valid = amounts > 0
+            max_amount = np.maximum(amounts, new_amount)
+            amount[valid] = np.maximum(0.0, 1.0 - np.abs(amounts[valid] - new_amount) / max_amount[valid])
+
+        # 3. Proveedor: igualdad vectorizada, SequenceMatcher solo por par único distinto
+        provider = np.zeros(count, dtype=np.float64)
+        new_provider = new_expense.get('merchant_name')
+        new_key = _provider_key(new_provider)
+        if new_key:
+            names = [c.get('merchant_name') for c in candidates]
+            keys = np.array([_provider_key(n) for n in names], dtype=object)
+            present = keys != ''
+            equal = present & (keys == new_key)
+            provider[equal] = 1.0
+            ratios: Dict[str, float] = {}
+            for i in np.flatnonzero(present & ~equal):
+                name = names[i]
+                if name not in ratios:
+                    ratios[name] = self._string_similarity_optimized(new_provider, name)
+                provider[i] = ratios[name]
+
+        # 4. Fecha: deltas en días con la misma escala por tramos
+        date = np.full(count, 0.5, dtype=np.float64)
+        new_date = _parse_date_value(new_expense.get('date'))
+        if new_date:
+            parsed = [_parse_date_value(c.get('date')) for c in candidates]
+            has_date = np.fromiter((p is not None for p in parsed), dtype=bool, count=count)
+            if has_date.any():
+                diffs = np.fromiter(
+                    (abs((p - new_date).days) for p in parsed if p is not None),
+                    dtype=np.int64, count=int(has_date.sum())
+                )
+                date[has_date] = np.select(
+                    [diffs == 0, diffs <= 1, diffs <= 3, diffs <= 7],
+                    [1.0, 0.9, 0.7, 0.5],
+                    default=np.maximum(0.0, 0.5 - diffs * 0.02)
+                )
+
+        return {'description': description, 'amount': amount, 'provider': provider, 'date': date}
+
+    def _match_reasons_from_components(self, desc_score: float, amount_score: float,
+                                       provider_score: float, date_score: float) -> List[str]:
+        """Razones legibles para un par (mismas reglas que el cálculo escalar)"""
+        match_reasons = []
+
+        if desc_score > 0.7:
+            match_reasons.append(f"Descripción muy similar ({desc_score:.2f})")
+        elif desc_score > 0.5:
+            match_reasons.append(f"Descripción similar ({desc_score:.2f})")
+
+        if amount_score > 0.95:
+            match_reasons.append("Monto exacto")
+        elif amount_score > 0.8:
+            match_reasons.append("Monto muy similar")
+
+        if provider_score > 0.8:
+            match_reasons.append("Mismo proveedor")
+        elif provider_score > 0.5:
+            match_reasons.append("Proveedor similar")
 
-    def _get_text_hash(self, text: str) -> str:
-        """Genera hash único para texto (para usar como clave de cache)"""
-        return hashlib.md5(text.lower().strip().encode()).hexdigest()
+        if date_score > 0.9:
+            match_reasons.append("Misma fecha")
+        elif date_score > 0.7:
+            match_reasons.append("Fecha cercana")
+
+        return match_reasons
+
+    def score_candidates_batch(self, new_expense: Dict[str, Any],
+                               candidates: List[Dict[str, Any]],
+                               config: Optional[Dict[str, Any]] = None) -> Tuple[np.ndarray, List[Optional[List[str]]]]:
+        """
+        Score ponderado de un gasto contra todos los candidatos.
+
+        Returns:
+            (scores, match_reasons) donde ``match_reasons[i]`` solo se genera
+            para filas con score >= umbral ``low`` (None en las demás)
+        """
+        config = config or self.config
+        if not candidates:
+            return np.zeros(0, dtype=np.float64), []
+
+        weights = config['weights']
+        components = self._score_components_batch(new_expense, candidates)
+        scores = (
+            components['description'] * weights['description']
+            + components['amount'] * weights['amount']
+            + components['provider'] * weights['provider']
+            + components['date'] * weights['date']
+        )
+
+        reasons: List[Optional[List[str]]] = [None] * len(candidates)
+        for i in np.flatnonzero(scores >= config['similarity_thresholds']['low']):
+            reasons[i] = self._match_reasons_from_components(
+                components['description'][i], components['amount'][i],
+                components['provider'][i], components['date'][i]
+            )
+
+        return scores, reasons
 
     def _calculate_similarity_optimized(self, expense1: Dict[str, Any],
                                      expense2: Dict[str, Any],
@@ -377,7 +728,7 @@ class OptimizedDuplicateDetector:
 
     def _provider_similarity(self, provider1: Optional[str], provider2: Optional[str]) -> float:
         """Calcula similitud de proveedores"""
-        if not provider1 or not provider2:
+        if not _provider_key(provider1) or not _provider_key(provider2):
             return 0.0
 
         return self._string_similarity_optimized(provider1, provider2)
@@ -403,31 +754,9 @@ class OptimizedDuplicateDetector:
         else:
             return max(0.0, 0.5 - (diff_days * 0.02))
 
-    @lru_cache(maxsize=500)
     def _parse_date(self, date_str: Optional[str]) -> Optional[datetime]:
         """Versión cacheada de parseo de fechas"""
-        if not date_str:
-            return None
-
-        date_str = str(date_str).strip()
-
-        formats = [
-            "%Y-%m-%d",
-            "%Y/%m/%d",
-            "%d-%m-%Y",
-            "%d/%m/%Y",
-            "%Y-%m-%dT%H:%M:%S",
-            "%Y-%m-%dT%H:%M:%S.%f",
-            "%Y-%m-%dT%H:%M:%S.%fZ"
-        ]
-
-        for fmt in formats:
-            try:
-                return datetime.strptime(date_str, fmt)
-            except (ValueError, TypeError):
-                continue
-
-        return None
+        return _parse_date_value(date_str)
 
     def _get_confidence_level(self, similarity_score: float, config: Dict[str, Any]) -> str:
         """Determina nivel de confianza"""
@@ -477,7 +806,7 @@ class OptimizedDuplicateDetector:
             'risk_level': risk_level,
             'recommendation': recommendation,
             'avg_processing_time_ms': int(avg_processing_time),
-            'cache_hit_rate': self._cache_hits / (self._cache_hits + self._cache_misses) if (self._cache_hits + self._cache_misses) > 0 else 0,
+            'cache_hit_rate': self._cache_hit_rate(),
             'top_match': {
                 'expense_id': duplicates[0].expense_id,
                 'similarity_score': duplicates[0].similarity_score,
@@ -498,24 +827,19 @@ class OptimizedDuplicateDetector:
             logger.error(f"Error extracting ML features: {e}")
             return None
 
+    def _cache_hit_rate(self) -> float:
+        if self._embedding_cache is None:
+            return 0
+        total = self._embedding_cache.hits + self._embedding_cache.misses
+        return self._embedding_cache.hits / total if total > 0 else 0
+
     def clear_cache(self):
         """Limpia el cache de embeddings"""
-        self._embedding_cache.clear()
-        self._cache_hits = 0
-        self._cache_misses = 0
+        self.embedding_cache.clear()
 
     def get_cache_stats(self) -> Dict[str, Any]:
-        """Obtiene estadísticas del cache"""
-        total_requests = self._cache_hits + self._cache_misses
-        hit_rate = self._cache_hits / total_requests if total_requests > 0 else 0
-
-        return {
-            'cache_size': len(self._embedding_cache),
-            'cache_hits': self._cache_hits,
-            'cache_misses': self._cache_misses,
-            'hit_rate': hit_rate,
-            'total_requests': total_requests
-        }
+        """Obtiene estadísticas del cache (hits, misses, desalojos, bytes)"""
+        return self.embedding_cache.get_stats()
 
 
 # Factory functions
@@ -2,13 +2,101 @@
 """
 Motor de Reportes Financieros Automáticos
 Genera insights derivados automáticamente para copiloto financiero
+
+El motor se parametriza por tenant, cuentas y periodo. Los reportes se
+memorizan en un caché de proceso con llave (reporte, tenant, cuentas,
+periodo, versión de datos). La versión la mantienen triggers sobre
+``bank_movements`` (migración ``2026_10_16_bank_movement_data_versions``):
+cualquier alta, cambio o baja de un movimiento de esas cuentas cambia la
+llave, así que el caché nunca sirve datos viejos. Sin esos triggers los
+reportes se calculan siempre.
 """
+import copy
+import logging
+import os
 import sqlite3
-from datetime import datetime, timedelta
-from typing import Dict, List, Any
+import threading
+from collections import OrderedDict, defaultdict
+from datetime import date, datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
 from dataclasses import dataclass
 import json
 
+logger = logging.getLogger(__name__)
+
+DEFAULT_ACCOUNT_IDS = tuple(
+    int(value) for value in os.getenv("FINANCIAL_REPORTS_ACCOUNT_IDS", "7,11").split(",") if value.strip()
+)
+FINANCIAL_REPORTS_CACHE_SIZE = int(os.getenv("FINANCIAL_REPORTS_CACHE_SIZE", "256"))
+
+# Triggers de migrations/sqlite/2026_10_16_bank_movement_data_versions.sql
+_VERSION_TRIGGERS = (
+    "trg_bank_movement_version_insert",
+    "trg_bank_movement_version_update",
+    "trg_bank_movement_version_delete",
+)
+
+
+class _ReportCache:
+    """LRU en memoria compartido por todas las instancias del motor."""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Tuple, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_compute(self, key: Tuple, compute: Callable[[], Any]) -> Any:
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return copy.deepcopy(self._entries[key])
+            self.misses += 1
+        value = compute()
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return copy.deepcopy(value)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = 0
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+_REPORT_CACHE = _ReportCache(FINANCIAL_REPORTS_CACHE_SIZE)
+
+
+def get_report_cache_stats() -> Dict[str, int]:
+    """Entradas y aciertos del caché de reportes (para métricas / tests)."""
+    return _REPORT_CACHE.stats()
+
+
+def clear_report_cache() -> None:
+    _REPORT_CACHE.clear()
+
+
+def _week_key(value: Any) -> Optional[str]:
+    """Equivalente a strftime('%Y-%W', date) de SQLite."""
+    text = str(value or "")[:10]
+    try:
+        return datetime.strptime(text, "%Y-%m-%d").strftime("%Y-%W")
+    except ValueError:
+        return None
+
+
+def _null_first(value: Any) -> Tuple[bool, Any]:
+    return (value is not None, value if value is not None else "")
+
+
 @dataclass
 class FinancialInsight:
     """Insight financiero con metadatos"""
@@ -21,8 +109,29 @@ class FinancialInsight:
     details: Dict[str, Any]
 
 class FinancialReportsEngine:
-    def __init__(self, db_path: str = "unified_mcp_system.db"):
+    def __init__(
+        self,
+        db_path: str = "unified_mcp_system.db",
+        tenant_id: Optional[int] = None,
+        account_ids: Optional[Sequence[int]] = None,
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None,
+        use_cache: bool = True,
+    ):
+        """
+        Args:
+            db_path: Ruta de la DB unificada.
+            tenant_id: Tenant a reportar; None = todos los movimientos de las cuentas.
+            account_ids: Cuentas bancarias a incluir (default FINANCIAL_REPORTS_ACCOUNT_IDS).
+            start_date / end_date: Periodo 'YYYY-MM-DD' inclusivo; None = sin límite.
+            use_cache: Memorizar reportes por versión de datos.
+        """
         self.db_path = db_path
+        self.tenant_id = tenant_id
+        self.account_ids = tuple(sorted({int(a) for a in (account_ids or DEFAULT_ACCOUNT_IDS)}))
+        self.start_date = start_date
+        self.end_date = end_date
+        self.use_cache = use_cache
 
     def _get_connection(self):
         """Obtener conexión a la base de datos"""
@@ -30,15 +139,78 @@ class FinancialReportsEngine:
         conn.row_factory = sqlite3.Row
         return conn
 
+    def _scope(self) -> Tuple[str, List[Any]]:
+        """Filtro de cuentas, tenant y periodo para bank_movements."""
+        clause = f"account_id IN ({', '.join('?' * len(self.account_ids))})"
+        params: List[Any] = list(self.account_ids)
+        if self.tenant_id is not None:
+            clause += " AND tenant_id = ?"
+            params.append(self.tenant_id)
+        if self.start_date:
+            clause += " AND date >= ?"
+            params.append(self.start_date)
+        if self.end_date:
+            # Límite exclusivo al día siguiente para incluir fechas con hora
+            clause += " AND date < ?"
+            params.append((date.fromisoformat(self.end_date[:10]) + timedelta(days=1)).isoformat())
+        return clause, params
+
+    @staticmethod
+    def _versioning_installed(conn: sqlite3.Connection) -> bool:
+        rows = conn.execute(
+            f"SELECT name FROM sqlite_master WHERE type = 'trigger' AND tbl_name = 'bank_movements' "
+            f"AND name IN ({', '.join('?' * len(_VERSION_TRIGGERS))})",
+            _VERSION_TRIGGERS,
+        ).fetchall()
+        return len(rows) == len(_VERSION_TRIGGERS)
+
+    def data_version(self) -> Optional[int]:
+        """Versión de los movimientos del alcance; None si falta la migración de versionado (sin caché)."""
+        conn = self._get_connection()
+        try:
+            if not self._versioning_installed(conn):
+                logger.debug("Versionado de bank_movements no instalado en %s; reportes sin caché", self.db_path)
+                return None
+            clause = f"account_id IN ({', '.join('?' * len(self.account_ids))})"
+            params: List[Any] = list(self.account_ids)
+            if self.tenant_id is not None:
+                clause += " AND tenant_id = ?"
+                params.append(self.tenant_id)
+            row = conn.execute(
+                f"SELECT COALESCE(SUM(version), 0) FROM bank_movement_data_versions WHERE {clause}", params
+            ).fetchone()
+            return int(row[0])
+        except sqlite3.OperationalError as exc:
+            logger.warning("No se pudo leer la versión de bank_movements: %s", exc)
+            return None
+        finally:
+            conn.close()
+
+    def _cached(self, report: str, compute: Callable[[], Any], *extra_key: Any) -> Any:
+        if not self.use_cache:
+            return compute()
+        version = self.data_version()
+        if version is None:
+            return compute()
+        key = (
+            self.db_path, report, self.tenant_id, self.account_ids,
+            self.start_date, self.end_date, version, *extra_key,
+        )
+        return _REPORT_CACHE.get_or_compute(key, compute)
+
     def generate_tax_deductibility_report(self) -> Dict[str, Any]:
         """
         Reporte de deducibilidad fiscal automático
         """
+        return self._cached("tax_deductibility", self._compute_tax_deductibility_report)
+
+    def _compute_tax_deductibility_report(self) -> Dict[str, Any]:
+        scope, params = self._scope()
         conn = self._get_connection()
         cursor = conn.cursor()
 
         # Gastos deducibles por categoría
-        cursor.execute("""
+        cursor.execute(f"""
             SELECT
                 category_auto,
                 subcategory,
@@ -47,33 +219,33 @@ class FinancialReportsEngine:
                 ROUND(SUM(iva_amount), 2) as total_iva,
                 ROUND(AVG(ABS(amount)), 2) as avg_amount
             FROM bank_movements
-            WHERE account_id IN (7, 11)
+            WHERE {scope}
                 AND tax_deductible = 1
                 AND movement_kind = 'Gasto'
             GROUP BY category_auto, subcategory
             ORDER BY total_amount DESC
-        """)
+        """, params)
 
         deductible_expenses = cursor.fetchall()
 
         # Gastos que requieren factura
-        cursor.execute("""
+        cursor.execute(f"""
             SELECT COUNT(*) as pending_receipts, SUM(ABS(amount)) as pending_amount
             FROM bank_movements
-            WHERE account_id IN (7, 11)
+            WHERE {scope}
                 AND requires_receipt = 1
                 AND reconciliation_status = 'pending'
                 AND movement_kind = 'Gasto'
-        """)
+        """, params)
 
         pending_receipts = cursor.fetchone()
 
         # Total deducible
-        cursor.execute("""
+        cursor.execute(f"""
             SELECT SUM(ABS(amount)) as total_deductible, SUM(iva_amount) as total_iva_acreditable
             FROM bank_movements
-            WHERE account_id IN (7, 11) AND tax_deductible = 1
-        """)
+            WHERE {scope} AND tax_deductible = 1
+        """, params)
 
         totals = cursor.fetchone()
 
@@ -96,82 +268,105 @@ class FinancialReportsEngine:
         """
         Análisis de flujo de efectivo por categorías
         """
-        conn = self._get_connection()
-        cursor = conn.cursor()
-
-        # Flujo por tipo de movimiento
-        cursor.execute("""
-            SELECT
-                cash_flow_category,
-                movement_kind,
-                COUNT(*) as transaction_count,
-                ROUND(SUM(CASE WHEN movement_kind = 'Ingreso' THEN amount ELSE 0 END), 2) as total_inflows,
-                ROUND(SUM(CASE WHEN movement_kind = 'Gasto' THEN ABS(amount) ELSE 0 END), 2) as total_outflows
-            FROM bank_movements
-            WHERE account_id IN (7, 11)
-                AND display_type != 'balance_inicial'
-            GROUP BY cash_flow_category, movement_kind
-            ORDER BY cash_flow_category, movement_kind
-        """)
-
-        cash_flow_data = cursor.fetchall()
-
-        # Balance inicial y final
-        cursor.execute("""
-            SELECT
-                MIN(running_balance) as min_balance,
-                MAX(running_balance) as max_balance,
-                (SELECT running_balance FROM bank_movements WHERE account_id IN (7,11) ORDER BY date DESC, id DESC LIMIT 1) as final_balance
-            FROM bank_movements
-            WHERE account_id IN (7, 11)
-        """)
+        return self._cached("cash_flow_analysis", self._compute_cash_flow_analysis)
 
-        balance_info = cursor.fetchone()
-
-        # Tendencia semanal
-        cursor.execute("""
-            SELECT
-                strftime('%Y-%W', date) as week,
-                ROUND(SUM(CASE WHEN movement_kind = 'Ingreso' THEN amount ELSE 0 END), 2) as weekly_income,
-                ROUND(SUM(CASE WHEN movement_kind = 'Gasto' THEN ABS(amount) ELSE 0 END), 2) as weekly_expenses,
-                ROUND(SUM(CASE WHEN movement_kind = 'Ingreso' THEN amount ELSE -ABS(amount) END), 2) as net_flow
-            FROM bank_movements
-            WHERE account_id IN (7, 11)
-                AND display_type != 'balance_inicial'
-            GROUP BY strftime('%Y-%W', date)
-            ORDER BY week
-        """)
-
-        weekly_trends = cursor.fetchall()
-
-        conn.close()
+    def _compute_cash_flow_analysis(self) -> Dict[str, Any]:
+        # Una sola lectura ordenada del periodo: categorías, saldos y serie semanal
+        scope, params = self._scope()
+        conn = self._get_connection()
+        try:
+            rows = conn.execute(f"""
+                SELECT date, amount, movement_kind, cash_flow_category, display_type, running_balance
+                FROM bank_movements
+                WHERE {scope}
+                ORDER BY date, id
+            """, params).fetchall()
+        finally:
+            conn.close()
+
+        categories: Dict[Tuple[Any, Any], Dict[str, Any]] = {}
+        weeks: Dict[Optional[str], List[float]] = defaultdict(lambda: [0.0, 0.0, 0.0])
+        balances = [row['running_balance'] for row in rows if row['running_balance'] is not None]
+
+        for row in rows:
+            # Mismo criterio que `display_type != 'balance_inicial'` en SQL (NULL no cuenta)
+            if row['display_type'] is None or row['display_type'] == 'balance_inicial':
+                continue
+            amount = row['amount'] or 0.0
+            kind = row['movement_kind']
+            inflow = amount if kind == 'Ingreso' else 0.0
+            outflow = abs(amount) if kind == 'Gasto' else 0.0
+
+            group = categories.setdefault((row['cash_flow_category'], kind), {
+                "cash_flow_category": row['cash_flow_category'],
+                "movement_kind": kind,
+                "transaction_count": 0,
+                "total_inflows": 0.0,
+                "total_outflows": 0.0,
+            })
+            group["transaction_count"] += 1
+            group["total_inflows"] += inflow
+            group["total_outflows"] += outflow
+
+            week = weeks[_week_key(row['date'])]
+            week[0] += inflow
+            week[1] += outflow
+            week[2] += amount if kind == 'Ingreso' else -abs(amount)
+
+        cash_flow_data = [categories[key] for key in sorted(
+            categories, key=lambda key: (_null_first(key[0]), _null_first(key[1]))
+        )]
+        for group in cash_flow_data:
+            group["total_inflows"] = round(group["total_inflows"], 2)
+            group["total_outflows"] = round(group["total_outflows"], 2)
+
+        weekly_trends = [
+            {
+                "week": week,
+                "weekly_income": round(values[0], 2),
+                "weekly_expenses": round(values[1], 2),
+                "net_flow": round(values[2], 2),
+            }
+            for week, values in sorted(weeks.items(), key=lambda item: _null_first(item[0]))
+        ]
 
         return {
             "report_type": "cash_flow_analysis",
             "generated_at": datetime.now().isoformat(),
-            "balance_summary": dict(balance_info),
-            "cash_flow_by_category": [dict(row) for row in cash_flow_data],
-            "weekly_trends": [dict(row) for row in weekly_trends]
+            "balance_summary": {
+                "min_balance": min(balances) if balances else None,
+                "max_balance": max(balances) if balances else None,
+                "final_balance": rows[-1]['running_balance'] if rows else None,
+            },
+            "cash_flow_by_category": cash_flow_data,
+            "weekly_trends": weekly_trends
         }
 
     def detect_financial_anomalies(self) -> List[FinancialInsight]:
         """
         Detecta anomalías financieras y genera insights
         """
+        # La tendencia usa "últimos 3 meses": la fecha entra a la llave del caché
+        return self._cached(
+            "financial_anomalies", self._compute_financial_anomalies, date.today().isoformat()
+        )
+
+    def _compute_financial_anomalies(self) -> List[FinancialInsight]:
+        scope, params = self._scope()
         conn = self._get_connection()
         cursor = conn.cursor()
         insights = []
 
         # 1. Gastos inusuales por monto
-        cursor.execute("""
+        cursor.execute(f"""
             SELECT description, amount, category_auto, date
             FROM bank_movements
-            WHERE account_id IN (7, 11)
+            WHERE {scope}
                 AND unusual_amount = 1
                 AND movement_kind = 'Gasto'
             ORDER BY ABS(amount) DESC
             LIMIT 5
-        """)
+        """, params)
 
         unusual_expenses = cursor.fetchall()
         if unusual_expenses:
@@ -186,13 +381,13 @@ class FinancialReportsEngine:
             ))
 
         # 2. Categorías sin clasificar
-        cursor.execute("""
+        cursor.execute(f"""
             SELECT COUNT(*) as unclassified_count, SUM(ABS(amount)) as unclassified_amount
             FROM bank_movements
-            WHERE account_id IN (7, 11)
+            WHERE {scope}
                 AND category_auto = 'Sin categoría'
                 AND movement_kind = 'Gasto'
-        """)
+        """, params)
 
         unclassified = cursor.fetchone()
         if unclassified['unclassified_count'] > 0:
@@ -207,14 +402,14 @@ class FinancialReportsEngine:
             ))
 
         # 3. Facturas pendientes de alto valor
-        cursor.execute("""
+        cursor.execute(f"""
             SELECT COUNT(*) as pending_count, SUM(ABS(amount)) as pending_amount
             FROM bank_movements
-            WHERE account_id IN (7, 11)
+            WHERE {scope}
                 AND requires_receipt = 1
                 AND reconciliation_status = 'pending'
                 AND ABS(amount) > 1000
-        """)
+        """, params)
 
         pending_receipts = cursor.fetchone()
         if pending_receipts['pending_count'] > 0:
@@ -229,17 +424,17 @@ class FinancialReportsEngine:
             ))
 
         # 4. Análisis de tendencia de gastos
-        cursor.execute("""
+        cursor.execute(f"""
             SELECT
                 strftime('%Y-%m', date) as month,
                 SUM(ABS(amount)) as monthly_expenses
             FROM bank_movements
-            WHERE account_id IN (7, 11)
+            WHERE {scope}
                 AND movement_kind = 'Gasto'
                 AND date >= date('now', '-3 months')
             GROUP BY strftime('%Y-%m', date)
             ORDER BY month
-        """)
+        """, params)
 
         monthly_expenses = cursor.fetchall()
         if len(monthly_expenses) >= 2:
@@ -265,12 +460,16 @@ class FinancialReportsEngine:
         """
         Genera sugerencias de optimización de gastos
         """
+        return self._cached("optimization_suggestions", self._compute_expense_optimization_suggestions)
+
+    def _compute_expense_optimization_suggestions(self) -> List[Dict[str, Any]]:
+        scope, params = self._scope()
         conn = self._get_connection()
         cursor = conn.cursor()
         suggestions = []
 
         # 1. Categorías con mayor gasto que podrían optimizarse
-        cursor.execute("""
+        cursor.execute(f"""
             SELECT
                 category_auto,
                 subcategory,
@@ -278,13 +477,13 @@ class FinancialReportsEngine:
                 ROUND(SUM(ABS(amount)), 2) as total_spent,
                 ROUND(AVG(ABS(amount)), 2) as avg_amount
             FROM bank_movements
-            WHERE account_id IN (7, 11)
+            WHERE {scope}
                 AND movement_kind = 'Gasto'
                 AND category_auto != 'Sin categoría'
             GROUP BY category_auto, subcategory
             HAVING total_spent > 1000
             ORDER BY total_spent DESC
-        """)
+        """, params)
 
         high_spend_categories = cursor.fetchall()
 
@@ -300,19 +499,19 @@ class FinancialReportsEngine:
             })
 
         # 2. Gastos recurrentes que podrían negociarse
-        cursor.execute("""
+        cursor.execute(f"""
             SELECT
                 cleaned_description,
                 COUNT(*) as frequency,
                 ROUND(SUM(ABS(amount)), 2) as total_amount,
                 ROUND(AVG(ABS(amount)), 2) as avg_amount
             FROM bank_movements
-            WHERE account_id IN (7, 11)
+            WHERE {scope}
                 AND movement_kind = 'Gasto'
             GROUP BY cleaned_description
             HAVING frequency >= 2 AND avg_amount > 500
             ORDER BY total_amount DESC
-        """)
+        """, params)
 
         recurring_expenses = cursor.fetchall()
 
@@ -333,6 +532,12 @@ class FinancialReportsEngine:
         """
         Genera un reporte financiero comprensivo
         """
+        return self._cached(
+            "comprehensive", self._compute_comprehensive_financial_report, date.today().isoformat()
+        )
+
+    def _compute_comprehensive_financial_report(self) -> Dict[str, Any]:
+        # Cada sección sale del caché si ya se pidió con la misma versión de datos
         return {
             "report_id": f"financial_report_{datetime.now().strftime('%Y%m%d_%H%M%S')}",
             "generated_at": datetime.now().isoformat(),
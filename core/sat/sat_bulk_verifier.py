@@ -0,0 +1,419 @@
+"""
+SAT Bulk Verifier - Verificación masiva de estatus de CFDI
+==========================================================
+Pipeline asíncrono para verificar miles de CFDIs contra ConsultaCFDIService
+sin saturar al SAT ni repetir consultas innecesarias:
+
+- Pool acotado de workers; cada consulta SOAP (bloqueante) corre en un hilo
+- Token bucket compartido por todo el proceso para respetar el ritmo
+  permitido por el SAT aunque corran varias verificaciones a la vez
+- Reintentos con backoff exponencial solo para errores que
+  SATCFDIVerifier.should_retry considera transitorios
+- Cache de estatus por UUID con TTL según el estado: 'cancelado' y
+  'sustituido' son finales, 'vigente' se vuelve a consultar después de
+  SAT_STATUS_TTL_VIGENTE_DAYS
+- Checkpoints por run_id: una corrida interrumpida retoma donde se quedó
+
+Configuración por entorno:
+- SAT_VERIFY_CONCURRENCY: consultas simultáneas (default 8)
+- SAT_VERIFY_RATE_PER_SECOND / SAT_VERIFY_BURST: token bucket (default 5/s, ráfaga 10)
+- SAT_VERIFY_MAX_ATTEMPTS / SAT_VERIFY_BACKOFF_SECONDS: reintentos (default 4, 1s base)
+- SAT_STATUS_CACHE_PATH: archivo SQLite (default data/sat_cfdi_status.sqlite3)
+"""
+
+import asyncio
+import json
+import logging
+import os
+import random
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass
+from datetime import datetime
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+SAT_VERIFY_CONCURRENCY = int(os.getenv("SAT_VERIFY_CONCURRENCY", "8"))
+SAT_VERIFY_RATE_PER_SECOND = float(os.getenv("SAT_VERIFY_RATE_PER_SECOND", "5"))
+SAT_VERIFY_BURST = int(os.getenv("SAT_VERIFY_BURST", "10"))
+SAT_VERIFY_MAX_ATTEMPTS = int(os.getenv("SAT_VERIFY_MAX_ATTEMPTS", "4"))
+SAT_VERIFY_BACKOFF_SECONDS = float(os.getenv("SAT_VERIFY_BACKOFF_SECONDS", "1.0"))
+SAT_STATUS_CACHE_PATH = os.getenv("SAT_STATUS_CACHE_PATH", os.path.join("data", "sat_cfdi_status.sqlite3"))
+SAT_CHECKPOINT_EVERY = int(os.getenv("SAT_CHECKPOINT_EVERY", "100"))
+
+_DAY = 86400.0
+
+# None = estado final, nunca expira; los estados ausentes (error) no se guardan
+STATUS_TTL_SECONDS: Dict[str, Optional[float]] = {
+    "vigente": float(os.getenv("SAT_STATUS_TTL_VIGENTE_DAYS", "7")) * _DAY,
+    "por_cancelar": 1 * _DAY,
+    "no_encontrado": 1 * _DAY,  # CFDIs recién timbrados tardan en aparecer
+    "cancelado": None,
+    "sustituido": None,
+}
+
+
+class TokenBucket:
+    """
+    Token bucket asíncrono: `rate` tokens por segundo con ráfaga `capacity`.
+
+    Cada acquire reserva su token bajo un lock de hilos y después duerme lo
+    que le toque, así un mismo bucket sirve a corridas en distintos event
+    loops (cada verify_multiple_cfdis síncrono abre el suyo) y a varios
+    hilos a la vez.
+    """
+
+    def __init__(self, rate: float, capacity: Optional[int] = None, clock: Callable[[], float] = time.monotonic):
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None else max(1, int(rate)))
+        self._clock = clock
+        self._tokens = self.capacity
+        self._updated = clock()
+        self._lock = threading.Lock()
+        self.waited_seconds = 0.0
+
+    def _refill(self) -> None:
+        now = self._clock()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def reserve(self) -> float:
+        """Toma un token (a crédito si no hay) y regresa los segundos a esperar."""
+        if self.rate <= 0:
+            return 0.0
+        with self._lock:
+            self._refill()
+            self._tokens -= 1
+            wait = max(0.0, -self._tokens / self.rate)
+            self.waited_seconds += wait
+            return wait
+
+    async def acquire(self) -> float:
+        wait = self.reserve()
+        if wait > 0:
+            await asyncio.sleep(wait)
+        return wait
+
+
+_shared_buckets: Dict[Tuple[float, int], TokenBucket] = {}
+_shared_buckets_lock = threading.Lock()
+
+
+def get_shared_bucket(rate: Optional[float] = None, burst: Optional[int] = None) -> TokenBucket:
+    """
+    Token bucket del proceso para un ritmo dado (default SAT_VERIFY_RATE_PER_SECOND /
+    SAT_VERIFY_BURST): corridas simultáneas comparten el límite hacia el SAT.
+    """
+    key = (float(SAT_VERIFY_RATE_PER_SECOND if rate is None else rate), int(burst or SAT_VERIFY_BURST))
+    with _shared_buckets_lock:
+        bucket = _shared_buckets.get(key)
+        if bucket is None:
+            bucket = _shared_buckets[key] = TokenBucket(*key)
+        return bucket
+
+
+def _encode_status(status_info: Dict) -> str:
+    return json.dumps(status_info, default=lambda value: value.isoformat() if isinstance(value, datetime) else str(value))
+
+
+def _decode_status(raw: str) -> Dict:
+    info = json.loads(raw)
+    fecha = info.get("fecha_consulta")
+    if isinstance(fecha, str):
+        try:
+            info["fecha_consulta"] = datetime.fromisoformat(fecha)
+        except ValueError:
+            pass
+    return info
+
+
+class SATStatusCache:
+    """
+    Cache de estatus SAT por UUID y checkpoints de corridas masivas (SQLite).
+
+    Solo se escribe desde el hilo del event loop del pipeline; las lecturas
+    son por lotes para que una corrida de decenas de miles de UUIDs haga
+    pocas consultas.
+    """
+
+    def __init__(self, path: Optional[str] = None, ttl_seconds: Optional[Dict[str, Optional[float]]] = None):
+        self.path = path or SAT_STATUS_CACHE_PATH
+        self.ttl_seconds = dict(STATUS_TTL_SECONDS if ttl_seconds is None else ttl_seconds)
+        self._lock = threading.Lock()
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode = WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS sat_cfdi_status_cache (
+                uuid TEXT PRIMARY KEY,
+                status TEXT NOT NULL,
+                status_info TEXT NOT NULL,
+                checked_at REAL NOT NULL,
+                expires_at REAL
+            )
+        """)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS sat_verification_checkpoints (
+                run_id TEXT NOT NULL,
+                uuid TEXT NOT NULL,
+                status_info TEXT NOT NULL,
+                completed_at REAL NOT NULL,
+                PRIMARY KEY (run_id, uuid)
+            )
+        """)
+
+    @staticmethod
+    def _key(uuid: str) -> str:
+        return uuid.strip().upper()
+
+    def ttl_for(self, status: Optional[str]) -> Tuple[bool, Optional[float]]:
+        """(cacheable, ttl_seconds); ttl None = no expira."""
+        if status not in self.ttl_seconds:
+            return False, None
+        return True, self.ttl_seconds[status]
+
+    def get_many(self, uuids: Iterable[str], now: Optional[float] = None) -> Dict[str, Dict]:
+        now = time.time() if now is None else now
+        by_key = {self._key(uuid): uuid for uuid in uuids}
+        found: Dict[str, Dict] = {}
+        keys = list(by_key)
+        with self._lock:
+            for start in range(0, len(keys), 500):
+                chunk = keys[start:start + 500]
+                rows = self._conn.execute(
+                    f"SELECT uuid, status_info FROM sat_cfdi_status_cache "
+                    f"WHERE uuid IN ({','.join('?' * len(chunk))}) AND (expires_at IS NULL OR expires_at > ?)",
+                    (*chunk, now),
+                ).fetchall()
+                for key, raw in rows:
+                    found[by_key[key]] = _decode_status(raw)
+        return found
+
+    def put_many(self, items: List[Tuple[str, Dict]], now: Optional[float] = None) -> int:
+        now = time.time() if now is None else now
+        rows = []
+        for uuid, status_info in items:
+            cacheable, ttl = self.ttl_for(status_info.get("status"))
+            if cacheable:
+                rows.append((self._key(uuid), status_info["status"], _encode_status(status_info),
+                             now, None if ttl is None else now + ttl))
+        if rows:
+            with self._lock:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO sat_cfdi_status_cache (uuid, status, status_info, checked_at, expires_at) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    rows,
+                )
+        return len(rows)
+
+    def load_checkpoint(self, run_id: str) -> Dict[str, Dict]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT uuid, status_info FROM sat_verification_checkpoints WHERE run_id = ?", (run_id,)
+            ).fetchall()
+        return {uuid: _decode_status(raw) for uuid, raw in rows}
+
+    def save_checkpoint(self, run_id: str, items: List[Tuple[str, Dict]]) -> None:
+        if not items:
+            return
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO sat_verification_checkpoints (run_id, uuid, status_info, completed_at) "
+                "VALUES (?, ?, ?, ?)",
+                [(run_id, uuid, _encode_status(info), now) for uuid, info in items],
+            )
+
+    def clear_checkpoint(self, run_id: str) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM sat_verification_checkpoints WHERE run_id = ?", (run_id,))
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+_default_cache: Optional[SATStatusCache] = None
+_default_cache_lock = threading.Lock()
+
+
+def get_status_cache() -> SATStatusCache:
+    """Cache compartido del proceso (SAT_STATUS_CACHE_PATH)."""
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = SATStatusCache()
+        return _default_cache
+
+
+@dataclass
+class BulkVerificationStats:
+    total: int = 0
+    resumed: int = 0
+    cached: int = 0
+    verified: int = 0
+    errors: int = 0
+    retries: int = 0
+    rate_limit_wait_seconds: float = 0.0
+    elapsed_seconds: float = 0.0
+
+    def to_dict(self) -> Dict:
+        return asdict(self)
+
+
+class BulkCFDIVerifier:
+    """Verificación concurrente y con rate limit sobre un SATCFDIVerifier."""
+
+    def __init__(
+        self,
+        verifier,
+        *,
+        concurrency: Optional[int] = None,
+        rate_per_second: Optional[float] = None,
+        burst: Optional[int] = None,
+        max_attempts: Optional[int] = None,
+        backoff_seconds: Optional[float] = None,
+        cache: Optional[SATStatusCache] = None,
+        checkpoint_every: int = SAT_CHECKPOINT_EVERY,
+        bucket: Optional[TokenBucket] = None,
+    ):
+        self.verifier = verifier
+        self.concurrency = max(1, concurrency or SAT_VERIFY_CONCURRENCY)
+        self.rate_per_second = SAT_VERIFY_RATE_PER_SECOND if rate_per_second is None else rate_per_second
+        self.burst = burst or SAT_VERIFY_BURST
+        self.max_attempts = max(1, max_attempts or SAT_VERIFY_MAX_ATTEMPTS)
+        self.backoff_seconds = SAT_VERIFY_BACKOFF_SECONDS if backoff_seconds is None else backoff_seconds
+        self.cache = cache
+        self.checkpoint_every = max(1, checkpoint_every)
+        self.bucket = bucket or get_shared_bucket(self.rate_per_second, self.burst)
+
+    async def run(
+        self,
+        cfdis: List[Dict],
+        *,
+        run_id: Optional[str] = None,
+        force_refresh: bool = False,
+        progress_callback: Optional[Callable[[int, int], None]] = None,
+    ) -> Tuple[Dict[str, Dict], BulkVerificationStats]:
+        """
+        Verifica `cfdis` (uuid, rfc_emisor, rfc_receptor, total).
+
+        Returns:
+            (UUID -> status_info en el orden de entrada, estadísticas)
+        """
+        started = time.perf_counter()
+        by_uuid = {cfdi["uuid"]: cfdi for cfdi in cfdis}
+        stats = BulkVerificationStats(total=len(by_uuid))
+        results: Dict[str, Dict] = {}
+
+        if run_id and self.cache:
+            resumed = self.cache.load_checkpoint(run_id)
+            for uuid in by_uuid:
+                if uuid in resumed:
+                    results[uuid] = resumed[uuid]
+            stats.resumed = len(results)
+            if stats.resumed:
+                logger.info(f"Retomando corrida {run_id}: {stats.resumed} CFDIs ya verificados")
+
+        if self.cache and not force_refresh:
+            cached = self.cache.get_many([uuid for uuid in by_uuid if uuid not in results])
+            results.update(cached)
+            stats.cached = len(cached)
+
+        pending = [by_uuid[uuid] for uuid in by_uuid if uuid not in results]
+        done_count = len(results)
+        unsaved: List[Tuple[str, Dict]] = []
+
+        def flush() -> None:
+            if not unsaved or not self.cache:
+                unsaved.clear()
+                return
+            batch = list(unsaved)
+            unsaved.clear()
+            self.cache.put_many(batch)
+            if run_id:
+                self.cache.save_checkpoint(run_id, batch)
+
+        if pending:
+            queue: asyncio.Queue = asyncio.Queue()
+            for cfdi in pending:
+                queue.put_nowait(cfdi)
+            executor = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="sat-verify")
+            loop = asyncio.get_running_loop()
+
+            async def worker() -> None:
+                nonlocal done_count
+                while True:
+                    try:
+                        cfdi = queue.get_nowait()
+                    except asyncio.QueueEmpty:
+                        return
+                    success, status_info, error = await self._verify_with_retry(cfdi, executor, loop, stats)
+                    uuid = cfdi["uuid"]
+                    if success:
+                        results[uuid] = status_info
+                        stats.verified += 1
+                        unsaved.append((uuid, status_info))
+                        if len(unsaved) >= self.checkpoint_every:
+                            flush()
+                    else:
+                        stats.errors += 1
+                        results[uuid] = {
+                            "status": self.verifier.STATUS_ERROR,
+                            "error": error,
+                            "fecha_consulta": datetime.utcnow(),
+                        }
+                    done_count += 1
+                    if progress_callback:
+                        progress_callback(done_count, stats.total)
+
+            try:
+                await asyncio.gather(*(worker() for _ in range(min(self.concurrency, len(pending)))))
+            finally:
+                # También al cancelar: lo verificado queda en cache/checkpoint para retomar
+                flush()
+                executor.shutdown(wait=False)
+                stats.rate_limit_wait_seconds = round(stats.rate_limit_wait_seconds, 3)
+
+        if run_id and self.cache:
+            self.cache.clear_checkpoint(run_id)
+
+        stats.elapsed_seconds = round(time.perf_counter() - started, 3)
+        logger.info(
+            f"Verificación SAT masiva: {stats.total} CFDIs | {stats.verified} consultados, "
+            f"{stats.cached} de cache, {stats.resumed} retomados, {stats.errors} errores, "
+            f"{stats.retries} reintentos en {stats.elapsed_seconds:.1f}s"
+        )
+        return {uuid: results[uuid] for uuid in by_uuid}, stats
+
+    async def _verify_with_retry(self, cfdi: Dict, executor, loop, stats):
+        error: Optional[str] = None
+        for attempt in range(self.max_attempts):
+            stats.rate_limit_wait_seconds += await self.bucket.acquire()
+            try:
+                success, status_info, error = await loop.run_in_executor(
+                    executor,
+                    lambda: self.verifier.check_cfdi_status(
+                        uuid=cfdi["uuid"],
+                        rfc_emisor=cfdi["rfc_emisor"],
+                        rfc_receptor=cfdi["rfc_receptor"],
+                        total=float(cfdi["total"]),
+                    ),
+                )
+            except Exception as exc:  # defensivo: check_cfdi_status ya captura sus errores
+                success, status_info, error = False, None, f"Error al verificar CFDI: {exc}"
+
+            if success:
+                return True, status_info, None
+            if attempt + 1 >= self.max_attempts or not self.verifier.should_retry(error or ""):
+                break
+            stats.retries += 1
+            delay = self.backoff_seconds * (2 ** attempt) * (1 + random.random() * 0.25)
+            logger.debug(f"Reintentando CFDI {cfdi['uuid']} en {delay:.2f}s ({error})")
+            await asyncio.sleep(delay)
+        return False, None, error
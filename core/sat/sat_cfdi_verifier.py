@@ -17,15 +17,29 @@ Referencias:
 - Estados posibles: Vigente, Cancelado, No Encontrado
 """
 
-from zeep import Client
-from zeep.exceptions import Fault
+try:
+    from zeep import Client
+    from zeep.exceptions import Fault
+except ImportError:  # pragma: no cover - zeep solo es necesario para consultas reales
+    Client = None
+    Fault = None
 from datetime import datetime, timedelta
 from typing import Optional, Dict, Tuple
+import asyncio
+import os
+import random
+import time
 import uuid as uuid_lib
 import logging
 
 logger = logging.getLogger(__name__)
 
+_SOAP_FAULTS = (Fault,) if Fault is not None else ()
+
+# Modo mock como sustituto local del SAT en pruebas de carga
+SAT_MOCK_LATENCY_MS = float(os.getenv("SAT_MOCK_LATENCY_MS", "0"))
+SAT_MOCK_ERROR_RATE = float(os.getenv("SAT_MOCK_ERROR_RATE", "0"))
+
 
 class SATCFDIVerifier:
     """
@@ -46,17 +60,30 @@ class SATCFDIVerifier:
     STATUS_NO_ENCONTRADO = "no_encontrado"
     STATUS_ERROR = "error"
 
-    def __init__(self, use_mock: bool = False):
+    def __init__(
+        self,
+        use_mock: bool = False,
+        mock_latency_ms: Optional[float] = None,
+        mock_error_rate: Optional[float] = None
+    ):
         """
         Inicializa el verificador de CFDIs
 
         Args:
             use_mock: Si True, usa respuestas mock sin conectar al SAT
+            mock_latency_ms: Latencia simulada por consulta mock (SAT_MOCK_LATENCY_MS)
+            mock_error_rate: Fracción de consultas mock que fallan con un error
+                transitorio (SAT_MOCK_ERROR_RATE), para ejercitar reintentos
         """
         self.use_mock = use_mock
         self.client = None
+        self.mock_latency_ms = SAT_MOCK_LATENCY_MS if mock_latency_ms is None else mock_latency_ms
+        self.mock_error_rate = SAT_MOCK_ERROR_RATE if mock_error_rate is None else mock_error_rate
+        self.last_bulk_stats = None
 
         if not use_mock:
+            if Client is None:
+                raise ImportError("zeep es requerido para consultar el SAT (pip install zeep)")
             try:
                 self.client = Client(self.WSDL_URL)
                 logger.info(f"CFDI Verifier initialized with SAT WSDL: {self.WSDL_URL}")
@@ -112,7 +139,7 @@ class SATCFDIVerifier:
 
             return True, status_info, None
 
-        except Fault as e:
+        except _SOAP_FAULTS as e:
             # Error SOAP del SAT
             logger.error(f"SAT SOAP Fault: {e}")
             return False, None, f"Error del SAT: {e.message}"
@@ -201,7 +228,13 @@ class SATCFDIVerifier:
 
         Retorna diferentes estados basados en el UUID para testing
         """
-        logger.info(f"[MOCK] Verificando CFDI {uuid}")
+        logger.debug(f"[MOCK] Verificando CFDI {uuid}")
+
+        if self.mock_latency_ms:
+            time.sleep(self.mock_latency_ms / 1000.0)
+
+        if self.mock_error_rate and random.random() < self.mock_error_rate:
+            return False, None, "Error del SAT: 503 Servicio no disponible (MOCK)"
 
         # Simular diferentes estados basados en el último carácter del UUID
         last_char = uuid[-1].lower()
@@ -250,38 +283,79 @@ class SATCFDIVerifier:
 
     def verify_multiple_cfdis(
         self,
-        cfdis: list
+        cfdis: list,
+        *,
+        run_id: Optional[str] = None,
+        force_refresh: bool = False,
+        cache=None,
+        concurrency: Optional[int] = None,
+        rate_per_second: Optional[float] = None,
+        progress_callback=None
     ) -> Dict[str, Dict]:
         """
         Verifica el estatus de múltiples CFDIs
 
+        Las consultas corren en paralelo con rate limit, reintentos y cache de
+        estatus (ver core.sat.sat_bulk_verifier). Desde código async usar
+        averify_multiple_cfdis.
+
         Args:
             cfdis: Lista de diccionarios con uuid, rfc_emisor, rfc_receptor, total
+            run_id: Identificador de corrida para checkpoint/reanudación
+            force_refresh: Ignora el cache y consulta todo de nuevo
+            cache: SATStatusCache a usar; por defecto el compartido en modo real
+                y ninguno en modo mock (para no mezclar estatus simulados)
+            concurrency: Consultas simultáneas (SAT_VERIFY_CONCURRENCY)
+            rate_per_second: Consultas por segundo (SAT_VERIFY_RATE_PER_SECOND)
+            progress_callback: callable(completados, total)
 
         Returns:
             Diccionario mapeando UUID -> status_info
         """
-        results = {}
-
-        for cfdi in cfdis:
-            uuid = cfdi['uuid']
-
-            success, status_info, error = self.check_cfdi_status(
-                uuid=uuid,
-                rfc_emisor=cfdi['rfc_emisor'],
-                rfc_receptor=cfdi['rfc_receptor'],
-                total=cfdi['total']
-            )
-
-            if success:
-                results[uuid] = status_info
-            else:
-                results[uuid] = {
-                    'status': self.STATUS_ERROR,
-                    'error': error,
-                    'fecha_consulta': datetime.utcnow()
-                }
-
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return asyncio.run(self.averify_multiple_cfdis(
+                cfdis,
+                run_id=run_id,
+                force_refresh=force_refresh,
+                cache=cache,
+                concurrency=concurrency,
+                rate_per_second=rate_per_second,
+                progress_callback=progress_callback
+            ))
+        raise RuntimeError("verify_multiple_cfdis no puede usarse dentro de un event loop; usa averify_multiple_cfdis")
+
+    async def averify_multiple_cfdis(
+        self,
+        cfdis: list,
+        *,
+        run_id: Optional[str] = None,
+        force_refresh: bool = False,
+        cache=None,
+        concurrency: Optional[int] = None,
+        rate_per_second: Optional[float] = None,
+        progress_callback=None
+    ) -> Dict[str, Dict]:
+        """Versión async de verify_multiple_cfdis."""
+        from core.sat.sat_bulk_verifier import BulkCFDIVerifier, get_status_cache
+
+        if cache is None and not self.use_mock:
+            cache = get_status_cache()
+
+        bulk = BulkCFDIVerifier(
+            self,
+            concurrency=concurrency,
+            rate_per_second=rate_per_second,
+            cache=cache
+        )
+        results, stats = await bulk.run(
+            cfdis,
+            run_id=run_id,
+            force_refresh=force_refresh,
+            progress_callback=progress_callback
+        )
+        self.last_bulk_stats = stats
         return results
 
     def should_retry(self, error: str) -> bool:
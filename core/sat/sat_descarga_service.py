@@ -12,12 +12,16 @@ Este servicio:
 """
 
 from datetime import datetime, timedelta
-from typing import Optional, Dict, List, Tuple
+from typing import Optional, Dict, Iterator, List, Tuple
 from pathlib import Path
 import zipfile
-import io
 import asyncio
+import hashlib
+import itertools
 import json
+import logging
+import os
+import tempfile
 
 from sqlalchemy.orm import Session
 from sqlalchemy import text
@@ -26,6 +30,47 @@ from core.sat.sat_cfdiclient import SATCfdiClient, SATCfdiClientMock
 from core.sat.nom151_evidence import NOM151EvidenceGenerator
 from core.sat.credential_loader import CredentialLoader
 from core.expenses.invoices.bulk_invoice_processor import BulkInvoiceProcessor
+from core.ai_pipeline.parsers.invoice_parser import parse_cfdi_xml
+
+logger = logging.getLogger(__name__)
+
+# CFDIs por batch de BulkInvoiceProcessor al procesar un paquete (un paquete puede traer 200k)
+SAT_PACKAGE_CHUNK_SIZE = int(os.getenv("SAT_PACKAGE_CHUNK_SIZE", "500"))
+# Tamaño a partir del cual el ZIP del paquete se vuelca a un archivo temporal
+SAT_PACKAGE_SPOOL_BYTES = int(os.getenv("SAT_PACKAGE_SPOOL_BYTES", str(32 * 1024 * 1024)))
+
+
+def _cfdi_to_invoice(filename: str, content: bytes) -> Dict:
+    """Convierte un CFDI (bytes) al formato de factura de BulkInvoiceProcessor.create_batch"""
+    parsed = parse_cfdi_xml(content, fast=True)
+    emisor = parsed.get("emisor") or {}
+    return {
+        "filename": filename,
+        "uuid": parsed.get("uuid"),
+        "total": parsed.get("total", 0.0),
+        "subtotal": parsed.get("subtotal"),
+        "iva_amount": parsed.get("iva_amount"),
+        "currency": parsed.get("currency", "MXN"),
+        "issued_date": parsed.get("fecha"),
+        "provider_name": emisor.get("nombre"),
+        "provider_rfc": emisor.get("rfc"),
+        "file_size": len(content),
+        "file_hash": hashlib.sha256(content).hexdigest(),
+        "raw_xml": content.decode("utf-8", errors="replace"),
+    }
+
+
+def _parse_cfdi_chunk(members: List[Tuple[str, bytes]]) -> Tuple[List[Dict], List[Dict]]:
+    """Parsea un bloque de CFDIs; regresa (facturas, errores)"""
+    invoices = []
+    errors = []
+    for filename, content in members:
+        try:
+            invoices.append(_cfdi_to_invoice(filename, content))
+        except Exception as e:
+            # Un XML corrupto (encoding, número mal formado, etc.) no tumba el bloque
+            errors.append({"filename": filename, "error": str(e) or type(e).__name__})
+    return invoices, errors
 
 
 class SATDescargaService:
@@ -578,52 +623,57 @@ class SATDescargaService:
                 )
                 return False, None, error
 
-            # Extraer XMLs del ZIP
-            xml_files = self._extract_xmls_from_zip(zip_bytes)
-
-            # Guardar evidencia de descarga
-            download_evidence = self.evidence_gen.generate_download_evidence(
-                rfc_solicitante=package_dict['rfc'],
-                package_uuid=package_dict['package_uuid'],
-                zip_content=zip_bytes,
-                xml_count=len(xml_files),
-                sat_response={'mensaje': 'Descarga exitosa'}
-            )
-
-            # Actualizar package en BD
-            self.db.execute(
-                text("""
-                    UPDATE sat_packages
-                    SET
-                        download_status = 'downloaded',
-                        zip_size_bytes = :zip_size,
-                        xml_count = :xml_count,
-                        downloaded_at = :downloaded_at,
-                        download_evidence = :evidence,
-                        updated_at = :updated_at
-                    WHERE package_id = :package_id;
-                """),
-                {
-                    'zip_size': len(zip_bytes),
-                    'xml_count': len(xml_files),
-                    'downloaded_at': datetime.utcnow(),
-                    'evidence': download_evidence,
-                    'updated_at': datetime.utcnow(),
-                    'package_id': package_id
-                }
-            )
-            self.db.commit()
-
-            # Procesar CFDIs con BulkInvoiceProcessor
-            processor = BulkInvoiceProcessor(self.db)
+            # El ZIP se vuelca a un archivo temporal (si es grande) y los XMLs se
+            # leen bajo demanda, sin materializar el paquete completo en memoria
+            with tempfile.SpooledTemporaryFile(max_size=SAT_PACKAGE_SPOOL_BYTES) as spool:
+                spool.write(zip_bytes)
+                spool.seek(0)
+                zip_size = len(zip_bytes)
+
+                with zipfile.ZipFile(spool, 'r') as zip_file:
+                    xml_count = self._count_xmls_in_zip(zip_file)
+
+                    # Guardar evidencia de descarga
+                    download_evidence = self.evidence_gen.generate_download_evidence(
+                        rfc_solicitante=package_dict['rfc'],
+                        package_uuid=package_dict['package_uuid'],
+                        zip_content=zip_bytes,
+                        xml_count=xml_count,
+                        sat_response={'mensaje': 'Descarga exitosa'}
+                    )
+                    del zip_bytes
 
-            # TODO: Integrar con BulkInvoiceProcessor real
-            # Por ahora, simula el procesamiento
-            processing_result = {
-                'inserted': len(xml_files),
-                'duplicates': 0,
-                'errors': 0
-            }
+                    # Actualizar package en BD
+                    self.db.execute(
+                        text("""
+                            UPDATE sat_packages
+                            SET
+                                download_status = 'downloaded',
+                                zip_size_bytes = :zip_size,
+                                xml_count = :xml_count,
+                                downloaded_at = :downloaded_at,
+                                download_evidence = :evidence,
+                                updated_at = :updated_at
+                            WHERE package_id = :package_id;
+                        """),
+                        {
+                            'zip_size': zip_size,
+                            'xml_count': xml_count,
+                            'downloaded_at': datetime.utcnow(),
+                            'evidence': download_evidence,
+                            'updated_at': datetime.utcnow(),
+                            'package_id': package_id
+                        }
+                    )
+                    self.db.commit()
+
+                    # Procesar CFDIs con BulkInvoiceProcessor en bloques acotados
+                    processing_result = await self._process_cfdi_stream(
+                        zip_file,
+                        company_id=package_dict['company_id'],
+                        package_id=package_id,
+                        user_id=user_id
+                    )
 
             # Actualizar package a procesado
             self.db.execute(
@@ -648,7 +698,10 @@ class SATDescargaService:
                 company_id=package_dict['company_id'],
                 operation='procesar',
                 status='success',
-                message=f"Procesados {len(xml_files)} XMLs: {processing_result['inserted']} insertados",
+                message=(
+                    f"Procesados {xml_count} XMLs: {processing_result['inserted']} insertados, "
+                    f"{processing_result['duplicates']} duplicados, {processing_result['errors']} errores"
+                ),
                 user_id=user_id
             )
 
@@ -662,28 +715,100 @@ class SATDescargaService:
     # Helper Methods
     # ========================================
 
-    def _extract_xmls_from_zip(self, zip_bytes: bytes) -> List[Dict]:
+    def _iter_xmls_from_zip(self, zip_file: zipfile.ZipFile) -> Iterator[Tuple[str, bytes]]:
         """
-        Extrae XMLs de un ZIP SAT
+        Itera los XMLs de un ZIP SAT leyendo cada miembro bajo demanda
 
         Args:
-            zip_bytes: Contenido del ZIP
+            zip_file: ZIP abierto
+
+        Yields:
+            (filename, contenido en bytes)
+        """
+        for info in zip_file.infolist():
+            if info.is_dir() or not info.filename.lower().endswith('.xml'):
+                continue
+            with zip_file.open(info) as member:
+                yield info.filename, member.read()
+
+    def _count_xmls_in_zip(self, zip_file: zipfile.ZipFile) -> int:
+        """Cuenta los XMLs del ZIP sin descomprimirlos"""
+        return sum(
+            1 for info in zip_file.infolist()
+            if not info.is_dir() and info.filename.lower().endswith('.xml')
+        )
+
+    async def _process_cfdi_stream(
+        self,
+        zip_file: zipfile.ZipFile,
+        company_id: int,
+        package_id: int,
+        user_id: Optional[int] = None,
+        chunk_size: Optional[int] = None,
+        processor: Optional[BulkInvoiceProcessor] = None
+    ) -> Dict:
+        """
+        Parsea los CFDIs del paquete y los procesa en batches de ``chunk_size``
+
+        Cada bloque se deduplica por UUID contra la BD (una consulta por bloque)
+        y contra los bloques anteriores del mismo paquete antes de crear el batch.
 
         Returns:
-            Lista de diccionarios con filename y content
+            Dict con inserted, duplicates, errors y los batch_ids creados
         """
-        xml_files = []
-
-        with zipfile.ZipFile(io.BytesIO(zip_bytes), 'r') as zip_file:
-            for filename in zip_file.namelist():
-                if filename.lower().endswith('.xml'):
-                    content = zip_file.read(filename).decode('utf-8')
-                    xml_files.append({
-                        'filename': filename,
-                        'content': content
-                    })
-
-        return xml_files
+        chunk_size = chunk_size or SAT_PACKAGE_CHUNK_SIZE
+        if processor is None:
+            processor = BulkInvoiceProcessor()
+            await processor.initialize()
+
+        company_key = str(company_id)
+        result = {'inserted': 0, 'duplicates': 0, 'errors': 0, 'batches': []}
+        seen_uuids = set()
+        loop = asyncio.get_running_loop()
+        members = self._iter_xmls_from_zip(zip_file)
+
+        while True:
+            chunk = list(itertools.islice(members, chunk_size))
+            if not chunk:
+                break
+
+            # El parseo es CPU: fuera del event loop
+            invoices, parse_errors = await loop.run_in_executor(None, _parse_cfdi_chunk, chunk)
+            del chunk
+            result['errors'] += len(parse_errors)
+            for error in parse_errors:
+                logger.warning(f"CFDI inválido en paquete {package_id}: {error['filename']}: {error['error']}")
+
+            existing = await processor.find_existing_uuids(
+                company_key, [invoice['uuid'] for invoice in invoices if invoice['uuid']]
+            )
+
+            fresh = []
+            for invoice in invoices:
+                uuid_key = (invoice['uuid'] or '').upper()
+                if uuid_key and (uuid_key in existing or uuid_key in seen_uuids):
+                    result['duplicates'] += 1
+                    continue
+                if uuid_key:
+                    seen_uuids.add(uuid_key)
+                fresh.append(invoice)
+
+            if not fresh:
+                continue
+
+            batch = await processor.create_batch(
+                company_id=company_key,
+                invoices=fresh,
+                batch_metadata={'source': 'sat_descarga_masiva', 'package_id': package_id},
+                created_by=user_id
+            )
+            batch = await processor.process_batch(batch.batch_id, preloaded_batch=batch)
+
+            result['errors'] += batch.errors_count
+            result['inserted'] += batch.processed_count - batch.errors_count
+            result['batches'].append(batch.batch_id)
+
+        return result
 
     def _map_sat_status(self, estado_solicitud: int) -> str:
         """
@@ -9,6 +9,26 @@ from typing import List, Tuple
 
 logger = logging.getLogger(__name__)
 
+# Índices que usa el matcher por lotes de conciliación bancaria
+# (UnifiedDBAdapter.find_matching_expenses_for_movements):
+# (nombre, tabla, columnas, descripción, predicado parcial)
+RECONCILIATION_INDEXES = [
+    (
+        "idx_expense_records_tenant_date_amount",
+        "expense_records",
+        ["tenant_id", "date", "amount"],
+        "Candidate expense window by tenant, date and amount",
+        None,
+    ),
+    (
+        "idx_bank_movements_matched_expense",
+        "bank_movements",
+        ["matched_expense_id"],
+        "Anti-join of expenses already matched to a movement",
+        "matched_expense_id IS NOT NULL",
+    ),
+]
+
 
 class DatabaseOptimizer:
     """Handles database performance optimizations"""
@@ -97,7 +117,7 @@ class DatabaseOptimizer:
                 ["rfc_proveedor", "merchant_name"],
                 "Provider-based queries"
             )
-        ]
+        ] + [(name, table, columns, description) for name, table, columns, description, _ in RECONCILIATION_INDEXES]
 
         created_count = 0
         for index_name, table_name, columns, description in indexes:
@@ -150,6 +170,26 @@ class DatabaseOptimizer:
         else:
             logger.info("✅ All indexes already exist")
 
+    @staticmethod
+    def create_reconciliation_indexes(connection) -> None:
+        """Create the bank reconciliation indexes (SQLite or PostgreSQL, idempotent)"""
+        cursor = connection.cursor()
+        try:
+            for index_name, table_name, columns, description, predicate in RECONCILIATION_INDEXES:
+                where = f" WHERE {predicate}" if predicate else ""
+                try:
+                    cursor.execute("SAVEPOINT reconciliation_index")
+                    cursor.execute(
+                        f"CREATE INDEX IF NOT EXISTS {index_name} ON {table_name} ({', '.join(columns)}){where}"
+                    )
+                    cursor.execute("RELEASE SAVEPOINT reconciliation_index")
+                except Exception as e:
+                    cursor.execute("ROLLBACK TO SAVEPOINT reconciliation_index")
+                    logger.debug(f"Could not create index {index_name}: {e}")
+            connection.commit()
+        finally:
+            cursor.close()
+
     @staticmethod
     def analyze_table_statistics(connection: sqlite3.Connection) -> None:
         """Update SQLite table statistics for better query planning"""
@@ -0,0 +1,270 @@
+"""
+Pool de conexiones acotado y thread-safe para la DB unificada.
+
+Se usa detrás de ``PostgresCompatConnection`` para que cada llamada del
+``UnifiedDBAdapter`` no pague un handshake TCP + auth nuevo.
+
+Características:
+- Tamaño máximo acotado; si no hay conexiones libres se espera hasta ``max_wait``
+- Health check al hacer checkout (``closed`` siempre, ``SELECT 1`` si estuvo ociosa)
+- Reciclaje por tiempo de vida máximo y por tiempo ocioso
+- Métricas: tamaño, en uso, ociosas, esperando, latencia de checkout
+"""
+
+import logging
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class PoolTimeoutError(RuntimeError):
+    """No se obtuvo una conexión del pool dentro del tiempo de espera."""
+
+
+class _PooledEntry:
+    __slots__ = ("conn", "created_at", "last_used")
+
+    def __init__(self, conn: Any):
+        now = time.monotonic()
+        self.conn = conn
+        self.created_at = now
+        self.last_used = now
+
+
+class ConnectionPool:
+    """
+    Pool genérico de conexiones DB-API.
+
+    Args:
+        connect: Callable sin argumentos que abre una conexión nueva
+        max_size: Máximo de conexiones abiertas (en uso + ociosas)
+        max_wait: Segundos máximos de espera por una conexión libre
+        max_lifetime: Segundos tras los cuales una conexión se recicla
+        idle_timeout: Segundos ociosa tras los cuales una conexión se cierra
+        ping_after: Segundos ociosa tras los cuales se valida con ``SELECT 1``
+        name: Nombre para logs y métricas
+    """
+
+    def __init__(
+        self,
+        connect: Callable[[], Any],
+        max_size: int = 10,
+        max_wait: float = 10.0,
+        max_lifetime: float = 1800.0,
+        idle_timeout: float = 300.0,
+        ping_after: float = 10.0,
+        name: str = "db",
+    ):
+        if max_size < 1:
+            raise ValueError("max_size must be >= 1")
+
+        self._connect = connect
+        self.max_size = max_size
+        self.max_wait = max_wait
+        self.max_lifetime = max_lifetime
+        self.idle_timeout = idle_timeout
+        self.ping_after = ping_after
+        self.name = name
+
+        self._idle: Deque[_PooledEntry] = deque()
+        self._in_use: Dict[int, _PooledEntry] = {}
+        self._size = 0
+        self._waiting = 0
+        self._closed = False
+        self._cond = threading.Condition(threading.Lock())
+
+        # Métricas
+        self._checkouts = 0
+        self._timeouts = 0
+        self._created = 0
+        self._discarded = 0
+        self._failed_health_checks = 0
+        self._checkout_latencies: Deque[float] = deque(maxlen=1024)
+
+    # ------------------------------------------------------------------
+    # Checkout / checkin
+    # ------------------------------------------------------------------
+
+    def _expired(self, entry: _PooledEntry, now: float) -> bool:
+        return (
+            now - entry.created_at > self.max_lifetime
+            or now - entry.last_used > self.idle_timeout
+        )
+
+    def _is_healthy(self, entry: _PooledEntry, now: float) -> bool:
+        conn = entry.conn
+        if getattr(conn, "closed", 0):
+            return False
+        if now - entry.last_used < self.ping_after:
+            return True
+        try:
+            cur = conn.cursor()
+            try:
+                cur.execute("SELECT 1")
+                cur.fetchone()
+            finally:
+                cur.close()
+            conn.rollback()
+            return True
+        except Exception as exc:
+            logger.warning("Pool %s: descartando conexión que falló el health check: %s", self.name, exc)
+            return False
+
+    def _close_quietly(self, conn: Any) -> None:
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def acquire(self, timeout: Optional[float] = None) -> Any:
+        """Obtiene una conexión del pool (bloquea hasta ``timeout``/``max_wait``)."""
+        started = time.monotonic()
+        deadline = started + (self.max_wait if timeout is None else timeout)
+
+        while True:
+            entry = None
+            create = False
+            to_close: List[Any] = []
+
+            with self._cond:
+                if self._closed:
+                    raise RuntimeError(f"Pool {self.name} está cerrado")
+
+                while True:
+                    now = time.monotonic()
+                    while self._idle:
+                        candidate = self._idle.pop()  # LIFO: la más caliente primero
+                        if self._expired(candidate, now):
+                            self._size -= 1
+                            self._discarded += 1
+                            to_close.append(candidate.conn)
+                            continue
+                        entry = candidate
+                        break
+                    if entry is not None:
+                        break
+                    if self._size < self.max_size:
+                        self._size += 1
+                        create = True
+                        break
+
+                    remaining = deadline - now
+                    if remaining <= 0:
+                        self._timeouts += 1
+                        for conn in to_close:
+                            self._close_quietly(conn)
+                        raise PoolTimeoutError(
+                            f"Pool {self.name}: sin conexiones libres tras {self.max_wait:.1f}s "
+                            f"(max_size={self.max_size})"
+                        )
+                    self._waiting += 1
+                    try:
+                        self._cond.wait(remaining)
+                    finally:
+                        self._waiting -= 1
+
+            for conn in to_close:
+                self._close_quietly(conn)
+
+            if create:
+                try:
+                    entry = _PooledEntry(self._connect())
+                except Exception:
+                    with self._cond:
+                        self._size -= 1
+                        self._cond.notify()
+                    raise
+                with self._cond:
+                    self._created += 1
+            elif not self._is_healthy(entry, time.monotonic()):
+                self._close_quietly(entry.conn)
+                with self._cond:
+                    self._size -= 1
+                    self._discarded += 1
+                    self._failed_health_checks += 1
+                    self._cond.notify()
+                continue
+
+            with self._cond:
+                self._in_use[id(entry.conn)] = entry
+                self._checkouts += 1
+                self._checkout_latencies.append(time.monotonic() - started)
+            return entry.conn
+
+    def release(self, conn: Any, discard: bool = False) -> None:
+        """Devuelve una conexión al pool (o la cierra si está rota o ``discard``)."""
+        with self._cond:
+            entry = self._in_use.pop(id(conn), None)
+        if entry is None:
+            # No pertenece al pool (o ya fue devuelta)
+            return
+
+        if not discard and not getattr(conn, "closed", 0):
+            try:
+                # Nunca devolver una conexión con una transacción abierta
+                conn.rollback()
+            except Exception:
+                discard = True
+        else:
+            discard = True
+
+        with self._cond:
+            if discard or self._closed or time.monotonic() - entry.created_at > self.max_lifetime:
+                self._size -= 1
+                self._discarded += 1
+                close_it = True
+            else:
+                entry.last_used = time.monotonic()
+                self._idle.append(entry)
+                close_it = False
+            self._cond.notify()
+
+        if close_it:
+            self._close_quietly(conn)
+
+    def close(self) -> None:
+        """Cierra las conexiones ociosas; las que están en uso se cierran al devolverse."""
+        with self._cond:
+            self._closed = True
+            idle = list(self._idle)
+            self._idle.clear()
+            self._size -= len(idle)
+            self._cond.notify_all()
+        for entry in idle:
+            self._close_quietly(entry.conn)
+
+    # ------------------------------------------------------------------
+    # Métricas
+    # ------------------------------------------------------------------
+
+    def get_metrics(self) -> Dict[str, Any]:
+        with self._cond:
+            latencies = sorted(self._checkout_latencies)
+            in_use = len(self._in_use)
+            metrics = {
+                "name": self.name,
+                "max_size": self.max_size,
+                "size": self._size,
+                "in_use": in_use,
+                "idle": len(self._idle),
+                "waiting": self._waiting,
+                "checkouts": self._checkouts,
+                "timeouts": self._timeouts,
+                "created": self._created,
+                "discarded": self._discarded,
+                "failed_health_checks": self._failed_health_checks,
+            }
+
+        if latencies:
+            metrics["checkout_latency_ms"] = {
+                "avg": round(sum(latencies) / len(latencies) * 1000, 3),
+                "p50": round(latencies[len(latencies) // 2] * 1000, 3),
+                "p95": round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))] * 1000, 3),
+                "max": round(latencies[-1] * 1000, 3),
+            }
+        else:
+            metrics["checkout_latency_ms"] = {"avg": 0.0, "p50": 0.0, "p95": 0.0, "max": 0.0}
+        return metrics
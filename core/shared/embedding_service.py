@@ -0,0 +1,196 @@
+"""
+Servicio compartido de embeddings (SentenceTransformer) dentro del proceso.
+
+El modelo multilingüe pesa cientos de MB y tarda segundos en cargar; antes
+se cargaba por separado en el matcher de conciliación, el aprendizaje de
+clasificaciones, el catálogo de cuentas SAT y el servicio de depreciación.
+Este módulo lo carga una sola vez por proceso y por modelo.
+
+``encode`` usa un caché LRU por texto normalizado; solo los textos faltantes
+van al modelo, en una sola llamada. Todos los llamadores son síncronos.
+
+Configuración por entorno:
+- EMBEDDING_MODEL_NAME: modelo por defecto
+- EMBEDDING_SERVICE_CACHE_SIZE: entradas del LRU (default 10000)
+- EMBEDDING_SERVICE_MAX_BATCH: textos máximos por forward pass (default 64)
+"""
+
+import importlib.util
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MODEL_NAME = os.getenv("EMBEDDING_MODEL_NAME", "paraphrase-multilingual-MiniLM-L12-v2")
+DEFAULT_CACHE_SIZE = int(os.getenv("EMBEDDING_SERVICE_CACHE_SIZE", "10000"))
+DEFAULT_MAX_BATCH = int(os.getenv("EMBEDDING_SERVICE_MAX_BATCH", "64"))
+
+_CacheKey = Tuple[str, bool]
+
+
+def sentence_transformers_available() -> bool:
+    """True si sentence-transformers está instalado (sin importarlo)"""
+    return importlib.util.find_spec("sentence_transformers") is not None
+
+
+def _load_sentence_transformer(model_name: str) -> Any:
+    from sentence_transformers import SentenceTransformer
+
+    return SentenceTransformer(model_name)
+
+
+def normalize_text(text: str) -> str:
+    """Texto que se codifica y se usa como llave del caché (espacios colapsados)"""
+    return " ".join(str(text or "").split())
+
+
+class EmbeddingService:
+    """
+    Modelo de embeddings compartido con caché LRU.
+
+    Args:
+        model_name: Nombre o ruta del modelo SentenceTransformer
+        loader: Callable que recibe ``model_name`` y devuelve el modelo
+        cache_size: Entradas máximas del caché LRU (0 lo desactiva)
+        max_batch_size: Textos máximos por forward pass
+    """
+
+    def __init__(
+        self,
+        model_name: str = DEFAULT_MODEL_NAME,
+        loader: Optional[Callable[[str], Any]] = None,
+        cache_size: int = DEFAULT_CACHE_SIZE,
+        max_batch_size: int = DEFAULT_MAX_BATCH,
+    ):
+        self.model_name = model_name
+        self._loader = loader or _load_sentence_transformer
+        self.cache_size = cache_size
+        self.max_batch_size = max(1, max_batch_size)
+
+        self._model = None
+        self._model_lock = threading.Lock()
+        self._encode_lock = threading.Lock()
+        self._cache: "OrderedDict[_CacheKey, np.ndarray]" = OrderedDict()
+        self._cache_lock = threading.Lock()
+
+    # ------------------------------------------------------------------
+    # Modelo
+    # ------------------------------------------------------------------
+
+    @property
+    def model(self) -> Any:
+        """Modelo cargado (se carga en el primer uso)"""
+        if self._model is None:
+            with self._model_lock:
+                if self._model is None:
+                    logger.info("Loading embedding model: %s", self.model_name)
+                    started = time.perf_counter()
+                    self._model = self._loader(self.model_name)
+                    logger.info("Embedding model %s loaded in %.1fs", self.model_name, time.perf_counter() - started)
+        return self._model
+
+    @property
+    def is_loaded(self) -> bool:
+        return self._model is not None
+
+    # ------------------------------------------------------------------
+    # Caché
+    # ------------------------------------------------------------------
+
+    def _cache_get(self, key: _CacheKey) -> Optional[np.ndarray]:
+        with self._cache_lock:
+            vector = self._cache.get(key)
+            if vector is not None:
+                self._cache.move_to_end(key)
+            return vector
+
+    def _cache_put(self, key: _CacheKey, vector: np.ndarray) -> None:
+        if self.cache_size <= 0:
+            return
+        with self._cache_lock:
+            self._cache[key] = vector
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def clear_cache(self) -> None:
+        with self._cache_lock:
+            self._cache.clear()
+
+    # ------------------------------------------------------------------
+    # Encode
+    # ------------------------------------------------------------------
+
+    def _forward(self, texts: List[str], normalize_embeddings: bool) -> np.ndarray:
+        """Una llamada al modelo"""
+        model = self.model
+        with self._encode_lock:
+            vectors = model.encode(
+                texts,
+                batch_size=min(len(texts), self.max_batch_size),
+                convert_to_numpy=True,
+                normalize_embeddings=normalize_embeddings,
+                show_progress_bar=False,
+            )
+        return np.asarray(vectors, dtype=np.float32).reshape(len(texts), -1)
+
+    def _encode_keys(self, keys: Sequence[_CacheKey]) -> Dict[_CacheKey, np.ndarray]:
+        """Vectores para llaves únicas, codificando solo las que no están en caché"""
+        found: Dict[_CacheKey, np.ndarray] = {}
+        missing: Dict[bool, List[_CacheKey]] = {}
+        for key in dict.fromkeys(keys):
+            vector = self._cache_get(key)
+            if vector is None:
+                missing.setdefault(key[1], []).append(key)
+            else:
+                found[key] = vector
+
+        for normalize_embeddings, missing_keys in missing.items():
+            vectors = self._forward([text for text, _ in missing_keys], normalize_embeddings)
+            for key, vector in zip(missing_keys, vectors):
+                vector.setflags(write=False)
+                found[key] = vector
+                self._cache_put(key, vector)
+        return found
+
+    def encode(
+        self,
+        texts: Union[str, Sequence[str]],
+        normalize_embeddings: bool = False,
+    ) -> np.ndarray:
+        """
+        Embeddings de uno o varios textos.
+
+        Returns:
+            Vector 1-D para un ``str``; matriz ``(len(texts), dim)`` para una lista
+        """
+        single = isinstance(texts, str)
+        keys = [(normalize_text(text), bool(normalize_embeddings)) for text in ([texts] if single else texts)]
+        if not keys:
+            return np.zeros((0, 0), dtype=np.float32)
+
+        found = self._encode_keys(keys)
+        if single:
+            return np.array(found[keys[0]])
+        return np.stack([found[key] for key in keys])
+
+
+_services: Dict[str, EmbeddingService] = {}
+_services_lock = threading.Lock()
+
+
+def get_embedding_service(model_name: Optional[str] = None, **kwargs) -> EmbeddingService:
+    """Instancia compartida por modelo dentro del proceso"""
+    name = model_name or DEFAULT_MODEL_NAME
+    with _services_lock:
+        service = _services.get(name)
+        if service is None:
+            service = EmbeddingService(model_name=name, **kwargs)
+            _services[name] = service
+        return service
@@ -3,6 +3,7 @@
 from __future__ import annotations
 
 import asyncio
+import functools
 import logging
 import sqlite3
 from typing import Any, Dict, Optional
@@ -131,10 +132,15 @@ def enqueue_expense_classification_sync(
     priority: TaskPriority = TaskPriority.HIGH,
     timeout_seconds: int = 900,
 ) -> str:
-    """Synchronous helper for scripts or CLI tooling."""
+    """
+    Synchronous helper for scripts or CLI tooling.
+
+    Tasks run on the caller's event loop, so this waits for the task to finish
+    before ``asyncio.run`` closes the loop.
+    """
 
     async def _runner() -> str:
-        return await enqueue_expense_classification(
+        task_id = await enqueue_expense_classification(
             expense_id,
             tenant_id,
             descripcion=descripcion,
@@ -143,6 +149,8 @@ def enqueue_expense_classification_sync(
             priority=priority,
             timeout_seconds=timeout_seconds,
         )
+        await worker_system.wait_for_task(task_id)
+        return task_id
 
     return asyncio.run(_runner())
 
@@ -220,12 +228,16 @@ async def _handle_expense_classification(task, update_progress) -> Dict[str, Any
         },
     )
 
-    result = _run_expense_classification_impl(
-        expense_id,
-        tenant_id,
-        descripcion=descripcion,
-        proveedor=proveedor,
-        monto=monto,
+    # SQLite + LLM are blocking: run them on the worker system's bounded thread pool.
+    result = await worker_system.run_blocking(
+        functools.partial(
+            _run_expense_classification_impl,
+            expense_id,
+            tenant_id,
+            descripcion=descripcion,
+            proveedor=proveedor,
+            monto=monto,
+        )
     )
 
     await update_progress(
@@ -6,18 +6,26 @@ Mantiene compatibilidad con el código existente mientras usa la nueva DB
 import sqlite3
 import json
 import logging
+import hashlib
 import re
+import threading
+import time
+import weakref
+from collections import OrderedDict
 from pathlib import Path
 from datetime import datetime
 from typing import Dict, Any, List, Optional, Sequence, Tuple, Union
 
+import numpy as np
+
 from config.config import config
+from core.shared.db_pool import ConnectionPool
 
 try:
     import psycopg2  # type: ignore
     from psycopg2 import OperationalError as PostgresOperationalError  # type: ignore
     from psycopg2 import ProgrammingError as PostgresProgrammingError  # type: ignore
-    from psycopg2.extras import RealDictConnection, RealDictCursor  # type: ignore
+    from psycopg2.extras import RealDictConnection, RealDictCursor, execute_values  # type: ignore
     from psycopg2 import errors as psycopg2_errors  # type: ignore
 except ImportError:  # pragma: no cover - psycopg2 is optional unless Postgres is enabled
     psycopg2 = None  # type: ignore
@@ -26,6 +34,11 @@ except ImportError:  # pragma: no cover - psycopg2 is optional unless Postgres i
     psycopg2_errors = None  # type: ignore
 
 from core.reconciliation.bank.bank_statements_models import MovementKind, infer_movement_kind
+from core.fiscal_aggregates import (
+    apply_pending_changes,
+    ensure_fiscal_aggregate_schema,
+    fiscal_aggregates_installed,
+)
 from core.sat_catalog_seed import (
     SAT_ACCOUNT_CATALOG_SEED,
     SAT_PRODUCT_SERVICE_CATALOG_SEED,
@@ -47,6 +60,27 @@ else:
     IntegrityErrors = (sqlite3.IntegrityError,)
 
 SQLITE_PLACEHOLDER_PATTERN = re.compile(r"\?")
+INSERT_TABLE_PATTERN = re.compile(r'^\s*INSERT\s+INTO\s+"?([\w.]+)"?', re.IGNORECASE)
+# ``%%`` es un % literal (incluye ``%%s``); solo ``%s`` es parámetro
+PYFORMAT_TOKEN_PATTERN = re.compile(r"%%|%s")
+
+# Filas por sentencia INSERT multi-fila en las APIs *_bulk
+BULK_INSERT_PAGE_SIZE = 1000
+
+# Días de diferencia máximos entre un movimiento bancario y un gasto candidato
+MOVEMENT_MATCH_DATE_WINDOW_DAYS = 7
+
+
+def _day_ordinal(value: Any) -> Optional[int]:
+    """Día (ordinal) de una fecha ISO, ``date`` o ``datetime``; None si no se puede leer."""
+    if value is None:
+        return None
+    if hasattr(value, "toordinal"):
+        return value.toordinal()
+    try:
+        return datetime.strptime(str(value)[:10], "%Y-%m-%d").toordinal()
+    except ValueError:
+        return None
 
 
 def _convert_sqlite_placeholders(query: str) -> str:
@@ -54,36 +88,208 @@ def _convert_sqlite_placeholders(query: str) -> str:
     return SQLITE_PLACEHOLDER_PATTERN.sub("%s", query)
 
 
+def _pyformat_to_numbered(sql: str) -> Tuple[str, int]:
+    """Convierte ``%s`` a ``$1..$n`` (y ``%%`` a ``%``) para PREPARE; devuelve (sql, n)."""
+    count = 0
+
+    def replace(match):
+        nonlocal count
+        if match.group(0) == "%%":
+            return "%"
+        count += 1
+        return f"${count}"
+
+    return PYFORMAT_TOKEN_PATTERN.sub(replace, sql), count
+
+
+class _QueryPlan:
+    """Traducción cacheada de una consulta estilo SQLite + estadísticas de uso."""
+
+    __slots__ = (
+        "original", "translated", "is_pragma", "insert_table", "returning_query",
+        "statement_name", "prepared", "prepare_failed", "calls", "total_seconds", "max_seconds", "errors",
+    )
+
+    def __init__(self, query: str):
+        stripped = query.lstrip()
+        upper = stripped.upper()
+        self.original = query
+        self.translated = _convert_sqlite_placeholders(query)
+        self.is_pragma = upper.startswith("PRAGMA")
+
+        self.insert_table: Optional[str] = None
+        self.returning_query: Optional[str] = None
+        if upper.startswith("INSERT ") and "RETURNING" not in upper:
+            match = INSERT_TABLE_PATTERN.match(stripped)
+            self.insert_table = match.group(1).lower() if match else None
+            self.returning_query = f"{self.translated.rstrip().rstrip(';')} RETURNING *"
+
+        self.statement_name = "mcp_" + hashlib.md5(query.encode("utf-8")).hexdigest()[:16]
+        self.prepared = False
+        self.prepare_failed = False
+        self.calls = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+        self.errors = 0
+
+    def record(self, elapsed: float, failed: bool = False) -> None:
+        self.calls += 1
+        self.total_seconds += elapsed
+        if elapsed > self.max_seconds:
+            self.max_seconds = elapsed
+        if failed:
+            self.errors += 1
+
+
+class _QueryPlanCache:
+    """LRU acotado de traducciones keyed por el SQL original."""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._plans: "OrderedDict[str, _QueryPlan]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, query: str) -> _QueryPlan:
+        with self._lock:
+            plan = self._plans.get(query)
+            if plan is not None:
+                self._plans.move_to_end(query)
+                self.hits += 1
+                return plan
+            self.misses += 1
+
+        plan = _QueryPlan(query)
+        with self._lock:
+            plan = self._plans.setdefault(query, plan)
+            self._plans.move_to_end(query)
+            while len(self._plans) > self.max_entries:
+                self._plans.popitem(last=False)
+        return plan
+
+    def stats(self, limit: int = 20) -> Dict[str, Any]:
+        with self._lock:
+            plans = [p for p in self._plans.values() if p.calls]
+            hits, misses = self.hits, self.misses
+        plans.sort(key=lambda p: p.total_seconds, reverse=True)
+        return {
+            "cached_queries": len(self._plans),
+            "max_entries": self.max_entries,
+            "hits": hits,
+            "misses": misses,
+            "tables_without_returning": sorted(_TABLES_WITHOUT_RETURNING),
+            "top_queries": [
+                {
+                    "query": " ".join(p.original.split())[:300],
+                    "calls": p.calls,
+                    "total_ms": round(p.total_seconds * 1000, 3),
+                    "avg_ms": round(p.total_seconds * 1000 / p.calls, 3) if p.calls else 0.0,
+                    "max_ms": round(p.max_seconds * 1000, 3),
+                    "errors": p.errors,
+                    "prepared": p.prepared,
+                }
+                for p in plans[:limit]
+            ],
+        }
+
+
+_query_plan_cache = _QueryPlanCache(config.PG_QUERY_CACHE_SIZE)
+
+# Tablas donde "INSERT ... RETURNING *" ya falló una vez: no repetir el intento
+_TABLES_WITHOUT_RETURNING: set = set()
+
+# Sentencias preparadas por conexión física (PREPARE vive lo que dura la sesión)
+_prepared_statements: "weakref.WeakKeyDictionary[Any, set]" = weakref.WeakKeyDictionary()
+
+
+def get_query_stats(limit: int = 20) -> Dict[str, Any]:
+    """Consultas más costosas (llamadas y tiempo acumulado) del cursor PostgreSQL."""
+    return _query_plan_cache.stats(limit)
+
+
 class PostgresCompatCursor:
     """Cursor que emula la API de sqlite3 sobre psycopg2."""
 
-    def __init__(self, cursor):
+    def __init__(self, cursor, connection=None):
         self._cursor = cursor
+        self._connection = connection
         self.lastrowid: Optional[int] = None
         self._last_query_requires_returning = False
 
+    def _prepared_names(self) -> Optional[set]:
+        if self._connection is None:
+            return None
+        try:
+            return _prepared_statements.setdefault(self._connection, set())
+        except TypeError:
+            return None
+
+    def _execute_prepared(self, plan: _QueryPlan, sql: str, params_tuple) -> bool:
+        """
+        Ejecuta ``sql`` como sentencia preparada del lado del servidor.
+
+        Devuelve False si la consulta no se pudo preparar (se recuerda en el
+        plan para no volver a intentarlo) y el llamador debe ejecutarla normal.
+        """
+        names = self._prepared_names()
+        if names is None:
+            return False
+
+        name = plan.statement_name + ("_r" if sql is plan.returning_query else "")
+        if name not in names:
+            body, placeholder_count = _pyformat_to_numbered(sql)
+            if placeholder_count != len(params_tuple):
+                # Parámetros que no cuadran con los placeholders: que psycopg2 reporte el error
+                plan.prepare_failed = True
+                return False
+            # SAVEPOINT: un PREPARE fallido no debe abortar la transacción del llamador
+            self._cursor.execute("SAVEPOINT mcp_prepare")
+            try:
+                self._cursor.execute(f"PREPARE {name} AS {body}")
+                self._cursor.execute("RELEASE SAVEPOINT mcp_prepare")
+            except (PostgresOperationalError, PostgresProgrammingError) as exc:
+                self._cursor.execute("ROLLBACK TO SAVEPOINT mcp_prepare")
+                logger.debug("No se pudo preparar la consulta %s: %s", name, exc)
+                plan.prepare_failed = True
+                return False
+            names.add(name)
+
+        placeholders = ", ".join(["%s"] * len(params_tuple))
+        self._cursor.execute(f"EXECUTE {name} ({placeholders})", params_tuple)
+        plan.prepared = True
+        return True
+
+    def _run(self, plan: _QueryPlan, sql: str, params_tuple) -> None:
+        if (
+            config.PG_PREPARED_STATEMENTS
+            and params_tuple
+            and not plan.prepare_failed
+            and plan.calls >= config.PG_PREPARE_THRESHOLD
+            and self._execute_prepared(plan, sql, params_tuple)
+        ):
+            return
+        self._cursor.execute(sql, params_tuple)
+
     def execute(self, query: str, params: Union[Sequence[Any], Tuple[Any, ...], None] = None):
-        original_query = query
         params_tuple = tuple(params) if isinstance(params, list) else params
+        plan = _query_plan_cache.get(query)
 
         # Psycopg2 no entiende PRAGMA: los ignoramos silenciosamente
-        if query.lstrip().upper().startswith("PRAGMA"):
+        if plan.is_pragma:
             logger.debug("Ignorando instrucción PRAGMA en PostgreSQL: %s", query.strip())
             self.lastrowid = None
             return self
 
-        translated_query = _convert_sqlite_placeholders(query)
-        need_returning = translated_query.lstrip().upper().startswith("INSERT ") and "RETURNING" not in translated_query.upper()
-
-        if need_returning:
-            translated_query = translated_query.rstrip().rstrip(";")
-            translated_query = f"{translated_query} RETURNING *"
-            self._last_query_requires_returning = True
-        else:
-            self._last_query_requires_returning = False
+        self._last_query_requires_returning = (
+            plan.returning_query is not None and plan.insert_table not in _TABLES_WITHOUT_RETURNING
+        )
+        translated_query = plan.returning_query if self._last_query_requires_returning else plan.translated
 
+        started = time.perf_counter()
+        failed = False
         try:
-            self._cursor.execute(translated_query, params_tuple)
+            self._run(plan, translated_query, params_tuple)
             if self._last_query_requires_returning:
                 row = self._cursor.fetchone()
                 if row is not None:
@@ -95,10 +301,15 @@ class PostgresCompatCursor:
             # Algunos inserts son sobre tablas sin columna id -> reintentar sin RETURNING
             if self._last_query_requires_returning and 'RETURNING' in str(exc):
                 logger.debug("Reintentando INSERT sin RETURNING por error: %s", exc)
-                self._cursor.execute(_convert_sqlite_placeholders(original_query), params_tuple)
+                if plan.insert_table:
+                    _TABLES_WITHOUT_RETURNING.add(plan.insert_table)
+                self._run(plan, plan.translated, params_tuple)
                 self.lastrowid = None
             else:
+                failed = True
                 raise
+        finally:
+            plan.record(time.perf_counter() - started, failed)
 
         return self
 
@@ -119,20 +330,50 @@ class PostgresCompatCursor:
         return getattr(self._cursor, item)
 
 
-class PostgresCompatConnection:
-    """Conexión que emula sqlite3.Connection usando psycopg2."""
+_postgres_pools: Dict[str, ConnectionPool] = {}
+_postgres_pools_lock = threading.Lock()
+
 
-    def __init__(self, dsn: str):
-        if psycopg2 is None:
-            raise RuntimeError(
-                "psycopg2 no está instalado. Instala psycopg2-binary para usar PostgreSQL."
+def get_postgres_pool(dsn: str) -> ConnectionPool:
+    """Pool compartido por DSN dentro del proceso (configurable con PG_POOL_*)."""
+    if psycopg2 is None:
+        raise RuntimeError(
+            "psycopg2 no está instalado. Instala psycopg2-binary para usar PostgreSQL."
+        )
+    with _postgres_pools_lock:
+        pool = _postgres_pools.get(dsn)
+        if pool is None:
+            pool = ConnectionPool(
+                # No usar RealDictConnection para mantener compatibilidad con acceso por índice
+                lambda: psycopg2.connect(dsn),
+                max_size=config.PG_POOL_MAX_SIZE,
+                max_wait=config.PG_POOL_MAX_WAIT_SECONDS,
+                max_lifetime=config.PG_POOL_MAX_LIFETIME_SECONDS,
+                idle_timeout=config.PG_POOL_IDLE_TIMEOUT_SECONDS,
+                ping_after=config.PG_POOL_PING_AFTER_SECONDS,
+                name="unified_postgres",
             )
-        # No usar RealDictConnection para mantener compatibilidad con acceso por índice
-        self._conn = psycopg2.connect(dsn)
+            _postgres_pools[dsn] = pool
+        return pool
+
+
+def get_postgres_pool_metrics() -> List[Dict[str, Any]]:
+    """Métricas de todos los pools PostgreSQL del proceso."""
+    with _postgres_pools_lock:
+        pools = list(_postgres_pools.values())
+    return [pool.get_metrics() for pool in pools]
+
+
+class PostgresCompatConnection:
+    """Conexión que emula sqlite3.Connection usando psycopg2 (tomada de un pool)."""
+
+    def __init__(self, dsn: str, pool: Optional[ConnectionPool] = None):
+        self._pool = pool or get_postgres_pool(dsn)
+        self._conn = self._pool.acquire()
         self._row_factory = None
 
     def cursor(self):
-        return PostgresCompatCursor(self._conn.cursor())
+        return PostgresCompatCursor(self._conn.cursor(), self._conn)
 
     def commit(self):
         self._conn.commit()
@@ -141,7 +382,11 @@ class PostgresCompatConnection:
         self._conn.rollback()
 
     def close(self):
-        self._conn.close()
+        """Devuelve la conexión al pool (idempotente)."""
+        if self._conn is None:
+            return
+        conn, self._conn = self._conn, None
+        self._pool.release(conn)
 
     def execute(self, query: str, params: Union[Sequence[Any], Tuple[Any, ...], None] = None):
         cur = self.cursor()
@@ -150,16 +395,40 @@ class PostgresCompatConnection:
         finally:
             cur.close()
 
+    def execute_values(self, query: str, rows: Sequence[Sequence[Any]], template: Optional[str] = None,
+                       page_size: int = BULK_INSERT_PAGE_SIZE) -> List[Tuple[Any, ...]]:
+        """INSERT multi-fila (``VALUES %s``) con las filas RETURNING en el orden de ``rows``."""
+        cur = self._conn.cursor()
+        try:
+            return execute_values(cur, query, rows, template=template, page_size=page_size, fetch=True)
+        finally:
+            cur.close()
+
     def __enter__(self):
         return self
 
     def __exit__(self, exc_type, exc_value, traceback):
-        if exc_type is None:
-            self.commit()
-        else:
-            self.rollback()
+        if self._conn is None:
+            return
+        try:
+            if exc_type is None:
+                self.commit()
+            else:
+                self.rollback()
+        except Exception:
+            # La conexión quedó en mal estado: no regresarla al pool
+            conn, self._conn = self._conn, None
+            self._pool.release(conn, discard=True)
+            raise
         self.close()
 
+    def __del__(self):
+        # Red de seguridad para código que olvida cerrar la conexión
+        try:
+            self.close()
+        except Exception:
+            pass
+
     @property
     def row_factory(self):
         return self._row_factory
@@ -173,6 +442,8 @@ class PostgresCompatConnection:
 class UnifiedDBAdapter:
     """Adaptador que mantiene compatibilidad con funciones existentes"""
 
+    _reconciliation_indexes_ready = False
+
     def __init__(self, db_path: str):
         self.use_postgres = config.USE_POSTGRESQL
         self.postgres_dsn = config.POSTGRES_DSN
@@ -191,6 +462,7 @@ class UnifiedDBAdapter:
             self._seed_sat_catalogs()
             self._ensure_provider_rules_table()
             self._ensure_company_context_columns()
+            self._ensure_fiscal_aggregates()
 
     def _normalize_expense_record(self, record: Dict[str, Any]) -> Dict[str, Any]:
         metadata = record.get('metadata')
@@ -489,6 +761,15 @@ class UnifiedDBAdapter:
         except DatabaseOperationalError as exc:
             logger.warning("No se pudo asegurar provider_rules: %s", exc)
 
+    def _ensure_fiscal_aggregates(self) -> None:
+        """Instala los agregados fiscales mensuales y sus triggers, y aplica lo pendiente (backfill)."""
+        try:
+            with self.get_connection() as conn:
+                ensure_fiscal_aggregate_schema(conn)
+                apply_pending_changes(conn)
+        except DatabaseOperationalError as exc:
+            logger.warning("No se pudieron asegurar los agregados fiscales: %s", exc)
+
     def _ensure_company_context_columns(self) -> None:
         """Crea columnas opcionales para almacenar el perfil operativo de la empresa."""
         try:
@@ -527,6 +808,18 @@ class UnifiedDBAdapter:
         conn.execute("PRAGMA foreign_keys = ON;")
         return conn
 
+    def get_query_stats(self, limit: int = 20) -> Optional[Dict[str, Any]]:
+        """Consultas más llamadas / costosas en PostgreSQL (None en SQLite)."""
+        if not self.use_postgres:
+            return None
+        return get_query_stats(limit)
+
+    def get_connection_pool_metrics(self) -> Optional[Dict[str, Any]]:
+        """Tamaño, espera y latencia de checkout del pool PostgreSQL (None en SQLite)."""
+        if not self.use_postgres:
+            return None
+        return get_postgres_pool(self.postgres_dsn).get_metrics()
+
     def get_company_fiscal_profile(self, tenant_id: int) -> Optional[Dict[str, Any]]:
         """Retrieve fiscal regime information for a tenant's company profile."""
 
@@ -555,91 +848,149 @@ class UnifiedDBAdapter:
 
     # =================== COMPATIBILIDAD CON internal_db.py ===================
 
+    def _build_expense_payload(self, expense_data: Dict[str, Any], tenant_id: int, now_iso: str) -> Dict[str, Any]:
+        """Normaliza un gasto a columnas de expense_records (sin valores None)"""
+        expense_payload = dict(expense_data)
+
+        expense_payload.setdefault('tax_source', expense_payload.get('tax_source') or 'manual')
+        expense_payload.setdefault('classification_source', expense_payload.get('classification_source') or 'manual_entry')
+        expense_payload.setdefault('catalog_version', expense_payload.get('catalog_version') or 'v1')
+        expense_payload.setdefault('explanation_short', expense_payload.get('explanation_short') or 'Captura manual')
+        expense_payload.setdefault('explanation_detail', expense_payload.get('explanation_detail') or 'Registrado manualmente por el usuario')
+        expense_payload.setdefault('tipo_cambio', expense_payload.get('tipo_cambio') or 1.0)
+        expense_payload.setdefault('deducible_status', expense_payload.get('deducible_status') or 'pendiente')
+        expense_payload.setdefault('deducible_percent', expense_payload.get('deducible_percent') or 100.0)
+        expense_payload.setdefault('iva_acreditable', expense_payload.get('iva_acreditable', True))
+
+        if 'periodo' not in expense_payload or not expense_payload.get('periodo'):
+            fecha_referencia = expense_payload.get('date') or now_iso
+            expense_payload['periodo'] = (fecha_referencia or '')[:7] if fecha_referencia else None
+
+        expense_payload.setdefault('currency', expense_payload.get('moneda', 'MXN'))
+        expense_payload.setdefault('status', expense_payload.get('status', 'pending'))
+        expense_payload.setdefault('user_id', expense_payload.get('user_id') or 1)
+        expense_payload['tenant_id'] = tenant_id
+        expense_payload.setdefault('created_at', now_iso)
+        expense_payload.setdefault('updated_at', now_iso)
+        if 'descripcion' not in expense_payload and expense_payload.get('description'):
+            expense_payload['descripcion'] = expense_payload['description']
+        if 'monto_total' not in expense_payload and expense_payload.get('amount') is not None:
+            expense_payload['monto_total'] = expense_payload['amount']
+        if 'proveedor_nombre' not in expense_payload and expense_payload.get('merchant_name'):
+            expense_payload['proveedor_nombre'] = expense_payload['merchant_name']
+        if 'categoria' not in expense_payload and expense_payload.get('category'):
+            expense_payload['categoria'] = expense_payload['category']
+
+        metadata_value = expense_payload.get('metadata') or {}
+        if not isinstance(metadata_value, (str, bytes)):
+            expense_payload['metadata'] = json.dumps(metadata_value, ensure_ascii=False)
+
+        json_fields = [
+            'tax_info', 'metadata', 'movimientos_bancarios', 'events', 'warnings',
+            'category_alternatives', 'audit_trail', 'user_context', 'enhanced_data',
+            'validation_errors'
+        ]
+        for field in json_fields:
+            if field in expense_payload and isinstance(expense_payload[field], (dict, list)):
+                expense_payload[field] = json.dumps(expense_payload[field], ensure_ascii=False)
+
+        # Map legacy keys to canonical column names
+        key_aliases = {
+            'monto_total': 'amount',
+            'moneda': 'currency',
+            'descripcion': 'description',
+            'categoria': 'category',
+            'provider_name': 'merchant_name',
+            'expense_date': 'date',
+            'account_code': 'sat_account_code',
+        }
+        keys_to_remove = []
+        for legacy_key, canonical_key in key_aliases.items():
+            if legacy_key in expense_payload:
+                if canonical_key not in expense_payload or expense_payload.get(canonical_key) is None:
+                    expense_payload[canonical_key] = expense_payload[legacy_key]
+                keys_to_remove.append(legacy_key)
+        for key in keys_to_remove:
+            expense_payload.pop(key, None)
+
+        return {key: value for key, value in expense_payload.items() if value is not None}
+
     def record_internal_expense(self, expense_data: Dict[str, Any], tenant_id: int = 1) -> int:
         """Crea un gasto interno con campos completos - Compatible con función existente"""
+        return self.record_expenses_bulk([expense_data], tenant_id)[0]
+
+    def record_expenses_bulk(self, expenses: Sequence[Dict[str, Any]], tenant_id: int = 1) -> List[int]:
+        """
+        Registra varios gastos en una sola transacción.
+
+        Los gastos se agrupan por conjunto de columnas (el payload es dinámico)
+        y cada grupo se inserta con una sola sentencia multi-fila en PostgreSQL.
+
+        Returns:
+            IDs creados, en el mismo orden que ``expenses``
+        """
+        if not expenses:
+            return []
+
+        now_iso = datetime.utcnow().isoformat()
+        groups: "OrderedDict[Tuple[str, ...], List[Tuple[int, List[Any]]]]" = OrderedDict()
+        for position, expense_data in enumerate(expenses):
+            payload = self._build_expense_payload(expense_data, tenant_id, now_iso)
+            groups.setdefault(tuple(payload), []).append((position, list(payload.values())))
+
+        ids: List[Optional[int]] = [None] * len(expenses)
         with self.get_connection() as conn:
-            cursor = conn.cursor()
-            expense_payload = dict(expense_data)
-
-            now_iso = datetime.utcnow().isoformat()
-
-            expense_payload.setdefault('tax_source', expense_payload.get('tax_source') or 'manual')
-            expense_payload.setdefault('classification_source', expense_payload.get('classification_source') or 'manual_entry')
-            expense_payload.setdefault('catalog_version', expense_payload.get('catalog_version') or 'v1')
-            expense_payload.setdefault('explanation_short', expense_payload.get('explanation_short') or 'Captura manual')
-            expense_payload.setdefault('explanation_detail', expense_payload.get('explanation_detail') or 'Registrado manualmente por el usuario')
-            expense_payload.setdefault('tipo_cambio', expense_payload.get('tipo_cambio') or 1.0)
-            expense_payload.setdefault('deducible_status', expense_payload.get('deducible_status') or 'pendiente')
-            expense_payload.setdefault('deducible_percent', expense_payload.get('deducible_percent') or 100.0)
-            expense_payload.setdefault('iva_acreditable', expense_payload.get('iva_acreditable', True))
-
-            if 'periodo' not in expense_payload or not expense_payload.get('periodo'):
-                fecha_referencia = expense_payload.get('date') or now_iso
-                expense_payload['periodo'] = (fecha_referencia or '')[:7] if fecha_referencia else None
-
-            expense_payload.setdefault('currency', expense_payload.get('moneda', 'MXN'))
-            expense_payload.setdefault('status', expense_payload.get('status', 'pending'))
-            expense_payload.setdefault('user_id', expense_payload.get('user_id') or 1)
-            expense_payload['tenant_id'] = tenant_id
-            expense_payload.setdefault('created_at', now_iso)
-            expense_payload.setdefault('updated_at', now_iso)
-            if 'descripcion' not in expense_payload and expense_payload.get('description'):
-                expense_payload['descripcion'] = expense_payload['description']
-            if 'monto_total' not in expense_payload and expense_payload.get('amount') is not None:
-                expense_payload['monto_total'] = expense_payload['amount']
-            if 'proveedor_nombre' not in expense_payload and expense_payload.get('merchant_name'):
-                expense_payload['proveedor_nombre'] = expense_payload['merchant_name']
-            if 'categoria' not in expense_payload and expense_payload.get('category'):
-                expense_payload['categoria'] = expense_payload['category']
-
-            metadata_value = expense_payload.get('metadata') or {}
-            if not isinstance(metadata_value, (str, bytes)):
-                expense_payload['metadata'] = json.dumps(metadata_value, ensure_ascii=False)
-
-            json_fields = [
-                'tax_info', 'metadata', 'movimientos_bancarios', 'events', 'warnings',
-                'category_alternatives', 'audit_trail', 'user_context', 'enhanced_data',
-                'validation_errors'
-            ]
-            for field in json_fields:
-                if field in expense_payload and isinstance(expense_payload[field], (dict, list)):
-                    expense_payload[field] = json.dumps(expense_payload[field], ensure_ascii=False)
-
-            # Map legacy keys to canonical column names
-            key_aliases = {
-                'monto_total': 'amount',
-                'moneda': 'currency',
-                'descripcion': 'description',
-                'categoria': 'category',
-                'provider_name': 'merchant_name',
-                'expense_date': 'date',
-                'account_code': 'sat_account_code',
-            }
-            keys_to_remove = []
-            for legacy_key, canonical_key in key_aliases.items():
-                if legacy_key in expense_payload:
-                    if canonical_key not in expense_payload or expense_payload.get(canonical_key) is None:
-                        expense_payload[canonical_key] = expense_payload[legacy_key]
-                    keys_to_remove.append(legacy_key)
-            for key in keys_to_remove:
-                expense_payload.pop(key, None)
-
-            columns = []
-            values = []
-            for key, value in expense_payload.items():
-                if value is None:
-                    continue
-                columns.append(key)
-                values.append(value)
+            for columns, entries in groups.items():
+                group_ids = self._insert_many(conn, "expense_records", list(columns), [values for _, values in entries])
+                for (position, _), expense_id in zip(entries, group_ids):
+                    ids[position] = expense_id
+            if not self.use_postgres and fiscal_aggregates_installed(conn):
+                # Los reportes fiscales solo leen; el alta deja los agregados al día
+                apply_pending_changes(conn)
+
+        logger.info(f"✅ {len(ids)} gastos registrados en bloque ({len(groups)} grupos de columnas)")
+        return ids  # type: ignore[return-value]
+
+    def _insert_many(
+        self,
+        conn,
+        table: str,
+        columns: List[str],
+        rows: Sequence[Sequence[Any]],
+        trailing_sql: str = "",
+        trailing_columns: Sequence[str] = (),
+    ) -> List[int]:
+        """
+        Inserta filas dentro de la transacción de ``conn`` y regresa sus IDs en orden.
+
+        ``trailing_sql`` agrega expresiones SQL fijas al final de cada fila
+        (p. ej. ``CURRENT_TIMESTAMP``) para las columnas ``trailing_columns``.
+        """
+        if not rows:
+            return []
 
-            placeholders = ', '.join('?' for _ in columns)
-            columns_sql = ', '.join(columns)
+        columns_sql = ', '.join(list(columns) + list(trailing_columns))
+        tail = f", {trailing_sql}" if trailing_sql else ""
 
-            cursor.execute(f"INSERT INTO expense_records ({columns_sql}) VALUES ({placeholders})", values)
-            conn.commit()
-            expense_id = cursor.lastrowid
-            logger.info(f"✅ Gasto registrado ID: {expense_id} con columnas dinámicas")
-            return expense_id
+        if self.use_postgres:
+            template = "(" + ", ".join("%s" for _ in columns) + tail + ")"
+            returned = conn.execute_values(
+                f"INSERT INTO {table} ({columns_sql}) VALUES %s RETURNING id",
+                rows,
+                template=template,
+                page_size=BULK_INSERT_PAGE_SIZE,
+            )
+            return [row[0] for row in returned]
+
+        # SQLite: executemany en la transacción de ``conn``. El writer tiene el
+        # lock de escritura, así que los rowid de este bloque son consecutivos
+        # y terminan en last_insert_rowid() (los triggers no lo alteran).
+        placeholders = ", ".join("?" for _ in columns) + tail
+        sql = f"INSERT INTO {table} ({columns_sql}) VALUES ({placeholders})"
+        cursor = conn.cursor()
+        cursor.executemany(sql, rows)
+        last_id = cursor.execute("SELECT last_insert_rowid()").fetchone()[0]
+        return list(range(last_id - len(rows) + 1, last_id + 1))
 
     def fetch_expense_records(self, tenant_id: int = 1, limit: int = 100, company_id: Optional[str] = None) -> List[Dict]:
         """Obtiene gastos con información de cuenta de pago, opcionalmente filtrados por company_id"""
@@ -1294,13 +1645,16 @@ class UnifiedDBAdapter:
                 cursor.execute("SELECT COUNT(*) FROM schema_versions")
                 version_count = cursor.fetchone()[0]
 
-                return {
+                health = {
                     'status': 'healthy',
                     'db_path': str(self.db_path),
-                    'db_size': self.db_path.stat().st_size,
+                    'db_size': self.db_path.stat().st_size if self.db_path.exists() else None,
                     'schema_versions': version_count,
                     'timestamp': datetime.now().isoformat()
                 }
+                if self.use_postgres:
+                    health['connection_pool'] = self.get_connection_pool_metrics()
+                return health
         except Exception as e:
             return {
                 'status': 'error',
@@ -1460,39 +1814,55 @@ class UnifiedDBAdapter:
 
     # ===== ENHANCED INVOICE MANAGEMENT =====
 
+    INVOICE_RECORD_COLUMNS = [
+        'expense_id', 'filename', 'file_path', 'content_type', 'tenant_id',
+        'uuid', 'rfc_emisor', 'nombre_emisor', 'subtotal', 'iva_amount', 'total',
+        'moneda', 'fecha_emision', 'xml_content', 'pdf_content', 'parsed_data',
+        'processing_status', 'match_confidence', 'auto_matched',
+    ]
+
+    def _invoice_record_row(self, invoice_data: Dict[str, Any], tenant_id: int) -> Tuple[Any, ...]:
+        return (
+            invoice_data.get('expense_id'),
+            invoice_data.get('filename'),
+            invoice_data.get('file_path'),
+            invoice_data.get('content_type', 'application/pdf'),
+            tenant_id,
+            invoice_data.get('uuid'),
+            invoice_data.get('rfc_emisor'),
+            invoice_data.get('nombre_emisor'),
+            invoice_data.get('subtotal'),
+            invoice_data.get('iva_amount'),
+            invoice_data.get('total'),
+            invoice_data.get('moneda', 'MXN'),
+            invoice_data.get('fecha_emision'),
+            invoice_data.get('xml_content'),
+            invoice_data.get('pdf_content'),
+            invoice_data.get('parsed_data'),
+            invoice_data.get('processing_status', 'pending'),
+            invoice_data.get('match_confidence', 0.0),
+            invoice_data.get('auto_matched', False)
+        )
+
     def create_invoice_record(self, invoice_data: Dict[str, Any], tenant_id: int = 1) -> int:
         """Crea un registro de factura completo con todos los campos"""
+        return self.create_invoice_records_bulk([invoice_data], tenant_id)[0]
+
+    def create_invoice_records_bulk(self, invoices: Sequence[Dict[str, Any]], tenant_id: int = 1) -> List[int]:
+        """Crea varios registros de factura en una sola transacción (IDs en el orden de entrada)"""
+        if not invoices:
+            return []
         with self.get_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute("""
-                INSERT INTO expense_invoices
-                (expense_id, filename, file_path, content_type, tenant_id,
-                 uuid, rfc_emisor, nombre_emisor, subtotal, iva_amount, total,
-                 moneda, fecha_emision, xml_content, pdf_content, parsed_data,
-                 processing_status, match_confidence, auto_matched, created_at)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
-            """, (
-                invoice_data.get('expense_id'),
-                invoice_data.get('filename'),
-                invoice_data.get('file_path'),
-                invoice_data.get('content_type', 'application/pdf'),
-                tenant_id,
-                invoice_data.get('uuid'),
-                invoice_data.get('rfc_emisor'),
-                invoice_data.get('nombre_emisor'),
-                invoice_data.get('subtotal'),
-                invoice_data.get('iva_amount'),
-                invoice_data.get('total'),
-                invoice_data.get('moneda', 'MXN'),
-                invoice_data.get('fecha_emision'),
-                invoice_data.get('xml_content'),
-                invoice_data.get('pdf_content'),
-                invoice_data.get('parsed_data'),
-                invoice_data.get('processing_status', 'pending'),
-                invoice_data.get('match_confidence', 0.0),
-                invoice_data.get('auto_matched', False)
-            ))
-            return cursor.lastrowid
+            ids = self._insert_many(
+                conn,
+                "expense_invoices",
+                self.INVOICE_RECORD_COLUMNS,
+                [self._invoice_record_row(invoice, tenant_id) for invoice in invoices],
+                trailing_sql="CURRENT_TIMESTAMP",
+                trailing_columns=("created_at",),
+            )
+        logger.info(f"✅ {len(ids)} facturas registradas en bloque")
+        return ids
 
     def get_invoice_records(self, tenant_id: int = 1, status: str = None, limit: int = 100) -> List[Dict]:
         """Obtiene registros de facturas con información enriquecida"""
@@ -1641,50 +2011,66 @@ class UnifiedDBAdapter:
 
     # ===== ENHANCED BANK RECONCILIATION MANAGEMENT =====
 
+    BANK_MOVEMENT_COLUMNS = [
+        'amount', 'description', 'date', 'account', 'tenant_id', 'movement_id',
+        'transaction_type', 'reference', 'balance_after', 'bank_metadata',
+        'raw_data', 'processing_status', 'bank_account_id', 'category',
+        'confidence', 'decision', 'auto_matched', 'movement_kind',
+    ]
+
+    def _bank_movement_row(self, movement_data: Dict[str, Any], tenant_id: int) -> Tuple[Any, ...]:
+        movement_kind = movement_data.get('movement_kind')
+        if not movement_kind:
+            movement_kind = infer_movement_kind(
+                movement_data.get('transaction_type', 'debit'),
+                movement_data.get('description')
+            )
+
+        if isinstance(movement_kind, MovementKind):
+            movement_kind_value = movement_kind.value
+        else:
+            movement_kind_value = str(movement_kind) if movement_kind else MovementKind.GASTO.value
+
+        return (
+            movement_data.get('amount'),
+            movement_data.get('description'),
+            movement_data.get('date'),
+            movement_data.get('account'),
+            tenant_id,
+            movement_data.get('movement_id'),
+            movement_data.get('transaction_type', 'debit'),
+            movement_data.get('reference'),
+            movement_data.get('balance_after'),
+            movement_data.get('bank_metadata'),
+            movement_data.get('raw_data'),
+            movement_data.get('processing_status', 'pending'),
+            movement_data.get('bank_account_id'),
+            movement_data.get('category'),
+            movement_data.get('confidence', 0.0),
+            movement_data.get('decision', 'pending'),
+            movement_data.get('auto_matched', False),
+            movement_kind_value
+        )
+
     def create_bank_movement(self, movement_data: Dict[str, Any], tenant_id: int = 1) -> int:
         """Crea un movimiento bancario completo"""
-        with self.get_connection() as conn:
-            cursor = conn.cursor()
-            movement_kind = movement_data.get('movement_kind')
-            if not movement_kind:
-                movement_kind = infer_movement_kind(
-                    movement_data.get('transaction_type', 'debit'),
-                    movement_data.get('description')
-                )
+        return self.create_bank_movements_bulk([movement_data], tenant_id)[0]
 
-            if isinstance(movement_kind, MovementKind):
-                movement_kind_value = movement_kind.value
-            else:
-                movement_kind_value = str(movement_kind) if movement_kind else MovementKind.GASTO.value
-
-            cursor.execute("""
-                INSERT INTO bank_movements
-                (amount, description, date, account, tenant_id, movement_id,
-                 transaction_type, reference, balance_after, bank_metadata,
-                 raw_data, processing_status, bank_account_id, category,
-                 confidence, decision, auto_matched, movement_kind, created_at)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
-            """, (
-                movement_data.get('amount'),
-                movement_data.get('description'),
-                movement_data.get('date'),
-                movement_data.get('account'),
-                tenant_id,
-                movement_data.get('movement_id'),
-                movement_data.get('transaction_type', 'debit'),
-                movement_data.get('reference'),
-                movement_data.get('balance_after'),
-                movement_data.get('bank_metadata'),
-                movement_data.get('raw_data'),
-                movement_data.get('processing_status', 'pending'),
-                movement_data.get('bank_account_id'),
-                movement_data.get('category'),
-                movement_data.get('confidence', 0.0),
-                movement_data.get('decision', 'pending'),
-                movement_data.get('auto_matched', False),
-                movement_kind_value
-            ))
-            return cursor.lastrowid
+    def create_bank_movements_bulk(self, movements: Sequence[Dict[str, Any]], tenant_id: int = 1) -> List[int]:
+        """Crea varios movimientos bancarios en una sola transacción (IDs en el orden de entrada)"""
+        if not movements:
+            return []
+        with self.get_connection() as conn:
+            ids = self._insert_many(
+                conn,
+                "bank_movements",
+                self.BANK_MOVEMENT_COLUMNS,
+                [self._bank_movement_row(movement, tenant_id) for movement in movements],
+                trailing_sql="CURRENT_TIMESTAMP",
+                trailing_columns=("created_at",),
+            )
+        logger.info(f"✅ {len(ids)} movimientos bancarios registrados en bloque")
+        return ids
 
     def get_bank_movements(self, tenant_id: int = 1, status: str = None, limit: int = 100) -> List[Dict]:
         """Obtiene movimientos bancarios con información enriquecida"""
@@ -1797,92 +2183,182 @@ class UnifiedDBAdapter:
     def find_matching_expenses_for_movement(self, movement_data: Dict[str, Any], tenant_id: int = 1,
                                           threshold: float = 0.65) -> List[Dict]:
         """Encuentra gastos candidatos para matching con movimiento bancario usando ML"""
-        with self.get_connection() as conn:
-            cursor = conn.cursor()
+        return self.find_matching_expenses_for_movements([movement_data], tenant_id, threshold)[0]
 
-            # Construir criterios de búsqueda inteligentes
-            conditions = ["e.tenant_id = ?"]
-            params = [tenant_id]
+    def _ensure_reconciliation_indexes(self) -> None:
+        """Crea una vez por proceso los índices que usa el matcher por lotes."""
+        if self._reconciliation_indexes_ready:
+            return
+        from core.shared.db_optimizer import DatabaseOptimizer
 
-            # Solo gastos sin conciliación bancaria
-            conditions.append("e.id NOT IN (SELECT DISTINCT matched_expense_id FROM bank_movements WHERE matched_expense_id IS NOT NULL)")
+        try:
+            with self.get_connection() as conn:
+                DatabaseOptimizer.create_reconciliation_indexes(conn)
+        except DatabaseOperationalError as exc:
+            logger.warning("No se pudieron asegurar índices de conciliación: %s", exc)
+        UnifiedDBAdapter._reconciliation_indexes_ready = True
 
-            # Criterio de monto con tolerancia variable
-            amount = movement_data.get('amount', 0)
-            if amount != 0:
-                # Tolerancia del 5% o mínimo $1
-                tolerance = max(abs(amount) * 0.05, 1.0)
-                conditions.append("ABS(e.amount - ?) <= ?")
-                params.extend([amount, tolerance])
-
-            # Criterio de fecha (mismo día o dentro de 7 días)
-            if movement_data.get('date'):
-                conditions.append("(date(e.date) = date(?) OR ABS(julianday(e.date) - julianday(?)) <= 7)")
-                params.extend([movement_data['date'], movement_data['date']])
-
-            # Criterio por descripción (buscar palabras clave)
-            description = movement_data.get('description', '').lower()
-            if description:
-                # Extraer palabras clave de la descripción bancaria
-                keywords = [word for word in description.split() if len(word) > 3]
-                if keywords:
-                    keyword_conditions = []
-                    for keyword in keywords[:3]:  # Máximo 3 keywords
-                        keyword_conditions.append("LOWER(e.description) LIKE ?")
-                        params.append(f"%{keyword}%")
-                    if keyword_conditions:
-                        conditions.append(f"({' OR '.join(keyword_conditions)})")
+    def _load_candidate_expenses(self, movements: List[Dict[str, Any]], tenant_id: int) -> List[Dict[str, Any]]:
+        """
+        Carga una sola vez la ventana de gastos sin conciliar que cubre todos
+        los movimientos (rango de monto ± tolerancia y de fecha ± 7 días).
+        """
+        conditions = [
+            "e.tenant_id = ?",
+            "NOT EXISTS (SELECT 1 FROM bank_movements bm WHERE bm.matched_expense_id = e.id)",
+        ]
+        params: List[Any] = [tenant_id]
+
+        if all(m['amount'] != 0 for m in movements):
+            conditions.append("e.amount BETWEEN ? AND ?")
+            params.extend([
+                min(m['amount'] - m['tolerance'] for m in movements),
+                max(m['amount'] + m['tolerance'] for m in movements),
+            ])
+
+        if all(m['date_ordinal'] is not None for m in movements):
+            window = MOVEMENT_MATCH_DATE_WINDOW_DAYS
+            first = min(m['date_ordinal'] for m in movements) - window
+            last = max(m['date_ordinal'] for m in movements) + window + 1
+            conditions.append("e.date >= ? AND e.date < ?")
+            params.extend([
+                datetime.fromordinal(first).date().isoformat(),
+                datetime.fromordinal(last).date().isoformat(),
+            ])
 
-            query = f"""
-                SELECT e.*, u.name as user_name,
-                       ABS(COALESCE(e.amount, 0) - ?) as amount_difference,
-                       -- Score de matching ML mejorado
-                       (
-                           -- Score de monto (peso 40%)
-                           CASE
-                               WHEN ABS(e.amount - ?) < 0.01 THEN 1.0
-                               WHEN ABS(e.amount - ?) <= ? * 0.01 THEN 0.9
-                               WHEN ABS(e.amount - ?) <= ? * 0.05 THEN 0.7
-                               ELSE 0.0
-                           END * 0.4 +
-
-                           -- Score de fecha (peso 25%)
-                           CASE
-                               WHEN date(e.date) = date(?) THEN 1.0
-                               WHEN ABS(julianday(e.date) - julianday(?)) <= 1 THEN 0.8
-                               WHEN ABS(julianday(e.date) - julianday(?)) <= 3 THEN 0.6
-                               WHEN ABS(julianday(e.date) - julianday(?)) <= 7 THEN 0.4
-                               ELSE 0.0
-                           END * 0.25 +
-
-                           -- Score de descripción (peso 35%)
-                           CASE
-                               WHEN LOWER(e.description) LIKE ? THEN 1.0
-                               WHEN LOWER(e.description) LIKE ? OR LOWER(e.description) LIKE ? THEN 0.7
-                               ELSE 0.2
-                           END * 0.35
-                       ) as match_score
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(f"""
+                SELECT e.*, u.name as user_name
                 FROM expense_records e
                 LEFT JOIN users u ON e.user_id = u.id
                 WHERE {' AND '.join(conditions)}
-                ORDER BY match_score DESC
-                LIMIT 10
-            """
+            """, params)
+            return [dict(row) for row in cursor.fetchall()]
 
-            # Parámetros para el score
-            score_params = [
-                amount,  # amount_difference
-                amount, amount, tolerance, amount, tolerance,  # amount score params
-                movement_data.get('date', ''), movement_data.get('date', ''),  # date score params
-                movement_data.get('date', ''), movement_data.get('date', ''),
-                f"%{description}%", f"%{description[:10]}%", f"%{description[-10:]}%"  # description score params
-            ]
+    def find_matching_expenses_for_movements(self, movements: Sequence[Dict[str, Any]], tenant_id: int = 1,
+                                             threshold: float = 0.65, top_n: int = 10) -> List[List[Dict]]:
+        """
+        Candidatos de conciliación para varios movimientos con una sola consulta.
 
-            cursor.execute(query, score_params + params)
-            results = [dict(row) for row in cursor.fetchall()]
+        Usa los mismos criterios y pesos que el matcher por movimiento (monto 40%,
+        fecha 25%, descripción 35%), pero los filtros y el score se calculan en
+        memoria con NumPy sobre la ventana de gastos cargada una vez.
 
-            # Filtrar por threshold
-            return [r for r in results if r['match_score'] >= threshold]
+        Returns:
+            Por cada movimiento (en orden), hasta ``top_n`` gastos con
+            ``match_score >= threshold`` ordenados de mayor a menor score
+        """
+        if not movements:
+            return []
+        self._ensure_reconciliation_indexes()
+
+        specs = []
+        for movement in movements:
+            amount = float(movement.get('amount') or 0)
+            description = (movement.get('description') or '').lower()
+            raw_date = movement.get('date')
+            specs.append({
+                'amount': amount,
+                # Tolerancia del 5% o mínimo $1
+                'tolerance': max(abs(amount) * 0.05, 1.0),
+                'description': description,
+                'keywords': [word for word in description.split() if len(word) > 3][:3],
+                'has_date': bool(raw_date),
+                'date_ordinal': _day_ordinal(raw_date) if raw_date else None,
+            })
+
+        results: List[List[Dict]] = [[] for _ in specs]
+        searchable = [spec for spec in specs if not spec['has_date'] or spec['date_ordinal'] is not None]
+        if not searchable:
+            return results
+        candidates = self._load_candidate_expenses(searchable, tenant_id)
+        if not candidates:
+            return results
+
+        amounts = np.array(
+            [np.nan if c.get('amount') is None else float(c['amount']) for c in candidates], dtype=np.float64
+        )
+        # Solo los gastos con monto entran al índice ordenado (ABS(NULL - x) nunca pasa el filtro)
+        by_amount = np.flatnonzero(~np.isnan(amounts))
+        by_amount = by_amount[np.argsort(amounts[by_amount], kind="stable")]
+        sorted_amounts = amounts[by_amount]
+
+        ordinals = np.array(
+            [_day_ordinal(c.get('date')) or -1 for c in candidates], dtype=np.int64
+        )
+        descriptions = [
+            None if c.get('description') is None else str(c['description']).lower() for c in candidates
+        ]
+        zero_amounts = np.nan_to_num(amounts, nan=0.0)
+
+        for slot, spec in enumerate(specs):
+            if spec['has_date'] and spec['date_ordinal'] is None:
+                continue
+
+            amount, tolerance = spec['amount'], spec['tolerance']
+            if amount != 0:
+                lo = np.searchsorted(sorted_amounts, amount - tolerance, side="left")
+                hi = np.searchsorted(sorted_amounts, amount + tolerance, side="right")
+                positions = by_amount[lo:hi]
+            else:
+                positions = np.arange(len(candidates))
+
+            if spec['date_ordinal'] is not None:
+                day_diff = np.abs(ordinals[positions] - spec['date_ordinal'])
+                keep = (ordinals[positions] >= 0) & (day_diff <= MOVEMENT_MATCH_DATE_WINDOW_DAYS)
+                positions = positions[keep]
+
+            if spec['keywords'] and len(positions):
+                keywords = spec['keywords']
+                keep = np.array([
+                    descriptions[i] is not None and any(kw in descriptions[i] for kw in keywords)
+                    for i in positions
+                ], dtype=bool)
+                positions = positions[keep]
+
+            if not len(positions):
+                continue
+
+            diff = np.abs(amounts[positions] - amount)
+            amount_score = np.select(
+                [diff < 0.01, diff <= tolerance * 0.01, diff <= tolerance * 0.05], [1.0, 0.9, 0.7], 0.0
+            )
+
+            if spec['date_ordinal'] is not None:
+                day_diff = np.abs(ordinals[positions] - spec['date_ordinal'])
+                date_score = np.select(
+                    [day_diff == 0, day_diff <= 1, day_diff <= 3, day_diff <= 7], [1.0, 0.8, 0.6, 0.4], 0.0
+                )
+            else:
+                date_score = np.zeros(len(positions))
+
+            description = spec['description']
+            head, tail = description[:10], description[-10:]
+            description_score = np.array([
+                0.2 if descriptions[i] is None
+                else 1.0 if description in descriptions[i]
+                else 0.7 if head in descriptions[i] or tail in descriptions[i]
+                else 0.2
+                for i in positions
+            ])
+
+            scores = amount_score * 0.4 + date_score * 0.25 + description_score * 0.35
+            order = np.argsort(-scores, kind="stable")[:top_n]
+
+            matches = []
+            for idx in order:
+                score = float(scores[idx])
+                if score < threshold:
+                    break
+                position = positions[idx]
+                match = dict(candidates[position])
+                match['amount_difference'] = abs(float(zero_amounts[position]) - amount)
+                match['match_score'] = score
+                matches.append(match)
+            results[slot] = matches
+
+        return results
 
     def create_reconciliation_feedback(self, feedback_data: Dict[str, Any], tenant_id: int = 1) -> int:
         """Registra feedback de conciliación"""
@@ -1934,11 +2410,11 @@ class UnifiedDBAdapter:
         # Obtener movimientos pendientes
         pending_movements = self.get_bank_movements(tenant_id, status='pending', limit=batch_size)
 
-        for movement in pending_movements:
-            stats['processed'] += 1
+        # Buscar matches de todos los movimientos con una sola consulta
+        all_candidates = self.find_matching_expenses_for_movements(pending_movements, tenant_id, auto_threshold)
 
-            # Buscar matches
-            candidates = self.find_matching_expenses_for_movement(movement, tenant_id, auto_threshold)
+        for movement, candidates in zip(pending_movements, all_candidates):
+            stats['processed'] += 1
 
             if candidates and len(candidates) == 1:  # Solo auto-match si hay exactamente 1 candidato
                 best_match = candidates[0]
@@ -2076,6 +2552,9 @@ def execute_query(
 def record_internal_expense(expense_data: Dict[str, Any], tenant_id: int = 1) -> int:
     return get_unified_adapter().record_internal_expense(expense_data, tenant_id)
 
+def record_expenses_bulk(expenses: Sequence[Dict[str, Any]], tenant_id: int = 1) -> List[int]:
+    return get_unified_adapter().record_expenses_bulk(expenses, tenant_id)
+
 def fetch_expense_records(tenant_id: int = 1, limit: int = 100, company_id: Optional[str] = None) -> List[Dict]:
     return get_unified_adapter().fetch_expense_records(tenant_id, limit, company_id)
 
@@ -2230,6 +2709,9 @@ def get_expenses_by_tag(tag_id: int, tenant_id: int = 1) -> List[Dict]:
 def create_invoice_record(invoice_data: Dict[str, Any], tenant_id: int = 1) -> int:
     return get_unified_adapter().create_invoice_record(invoice_data, tenant_id)
 
+def create_invoice_records_bulk(invoices: Sequence[Dict[str, Any]], tenant_id: int = 1) -> List[int]:
+    return get_unified_adapter().create_invoice_records_bulk(invoices, tenant_id)
+
 def get_invoice_records(tenant_id: int = 1, status: str = None, limit: int = 100) -> List[Dict]:
     return get_unified_adapter().get_invoice_records(tenant_id, status, limit)
 
@@ -2459,50 +2941,60 @@ def create_user(user_data: Dict[str, Any], tenant_id: int = 1) -> int:
             "Microsoft Store", "Apple Store", "Best Buy", "Home Depot", "Walmart Business"
         ][:merchants_count]
 
+        # Generate expenses (una sola inserción en bloque)
+        num_expenses = random.randint(10, 25)
+        expenses = [
+            {
+                'amount': round(random.uniform(amount_min, amount_max), 2),
+                'currency': 'MXN',
+                'description': f"Demo expense {i+1}",
+                'category': random.choice(categories),
+                'merchant_name': random.choice(merchants),
+                'date': (datetime.now() - timedelta(days=random.randint(0, date_range_days))).isoformat(),
+                'user_id': user_id,
+                'tenant_id': tenant_id,
+                'status': 'approved'
+            }
+            for i in range(num_expenses)
+        ]
+        expense_ids = self.record_expenses_bulk(expenses, tenant_id)
+        results["expenses_created"] = len(expense_ids)
+
+        invoice_rows = []
+        movement_rows = []
+        for i, (expense_data, expense_id) in enumerate(zip(expenses, expense_ids)):
+            # Generate some invoices
+            if prefs.get("include_invoices") and random.random() < 0.3:
+                invoice_rows.append((expense_id, f"invoice_{i+1}.pdf", tenant_id, datetime.now().isoformat()))
+
+            # Generate some bank movements
+            if prefs.get("include_bank_movements") and random.random() < 0.4:
+                movement_rows.append((
+                    -expense_data['amount'],  # Negative for debit
+                    f"Payment to {expense_data['merchant_name']}",
+                    expense_data['date'],
+                    tenant_id,
+                    expense_id,
+                    'processed'
+                ))
+
         with self.get_connection() as conn:
             cursor = conn.cursor()
 
-            # Generate expenses
-            num_expenses = random.randint(10, 25)
-            for i in range(num_expenses):
-                expense_data = {
-                    'amount': round(random.uniform(amount_min, amount_max), 2),
-                    'currency': 'MXN',
-                    'description': f"Demo expense {i+1}",
-                    'category': random.choice(categories),
-                    'merchant_name': random.choice(merchants),
-                    'date': (datetime.now() - timedelta(days=random.randint(0, date_range_days))).isoformat(),
-                    'user_id': user_id,
-                    'tenant_id': tenant_id,
-                    'status': 'approved'
-                }
+            if invoice_rows:
+                cursor.executemany("""
+                    INSERT INTO expense_invoices (expense_id, filename, tenant_id, created_at)
+                    VALUES (?, ?, ?, ?)
+                """, invoice_rows)
+                results["invoices_created"] = len(invoice_rows)
 
-                expense_id = self.record_internal_expense(expense_data, tenant_id)
-                results["expenses_created"] += 1
-
-                # Generate some invoices
-                if prefs.get("include_invoices") and random.random() < 0.3:
-                    cursor.execute("""
-                        INSERT INTO expense_invoices (expense_id, filename, tenant_id, created_at)
-                        VALUES (?, ?, ?, ?)
-                    """, (expense_id, f"invoice_{i+1}.pdf", tenant_id, datetime.now().isoformat()))
-                    results["invoices_created"] += 1
-
-                # Generate some bank movements
-                if prefs.get("include_bank_movements") and random.random() < 0.4:
-                    cursor.execute("""
-                        INSERT INTO bank_movements
-                        (amount, description, date, tenant_id, matched_expense_id, processing_status)
-                        VALUES (?, ?, ?, ?, ?, ?)
-                    """, (
-                        -expense_data['amount'],  # Negative for debit
-                        f"Payment to {expense_data['merchant_name']}",
-                        expense_data['date'],
-                        tenant_id,
-                        expense_id,
-                        'processed'
-                    ))
-                    results["bank_movements_created"] += 1
+            if movement_rows:
+                cursor.executemany("""
+                    INSERT INTO bank_movements
+                    (amount, description, date, tenant_id, matched_expense_id, processing_status)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                """, movement_rows)
+                results["bank_movements_created"] = len(movement_rows)
 
             # Update user demo config
             if self.use_postgres:
@@ -3115,6 +3607,14 @@ def create_bank_movement(movement_data: Dict[str, Any], tenant_id: int = 1) -> i
         logger.error(f"Error creando movimiento bancario: {e}")
         raise
 
+def create_bank_movements_bulk(movements: Sequence[Dict[str, Any]], tenant_id: int = 1) -> List[int]:
+    """Función independiente para crear movimientos bancarios en bloque"""
+    try:
+        return get_unified_adapter().create_bank_movements_bulk(movements, tenant_id)
+    except Exception as e:
+        logger.error(f"Error creando movimientos bancarios en bloque: {e}")
+        raise
+
 def get_bank_movement(movement_id: int, tenant_id: int = 1) -> Optional[Dict[str, Any]]:
     """Función independiente para obtener movimiento bancario"""
     try:
@@ -3142,6 +3642,15 @@ def find_matching_expenses_for_movement(movement_data: Dict[str, Any], tenant_id
         logger.error(f"Error buscando gastos coincidentes: {e}")
         return []
 
+def find_matching_expenses_for_movements(movements: Sequence[Dict[str, Any]], tenant_id: int = 1,
+                                         threshold: float = 0.65, top_n: int = 10) -> List[List[Dict[str, Any]]]:
+    """Función independiente para buscar candidatos de varios movimientos en lote"""
+    try:
+        return get_unified_adapter().find_matching_expenses_for_movements(movements, tenant_id, threshold, top_n)
+    except Exception as e:
+        logger.error(f"Error buscando gastos coincidentes en lote: {e}")
+        return [[] for _ in movements]
+
 def perform_auto_reconciliation(parameters: Dict[str, Any], tenant_id: int = 1) -> Dict[str, Any]:
     """Función independiente para auto-reconciliación"""
     try:
@@ -5,6 +5,7 @@ ANTES: 535 líneas con lógica duplicada
 DESPUÉS: ~150 líneas usando shared_logic
 """
 
+from contextlib import contextmanager
 from typing import Dict, Any, List, Optional
 import logging
 
@@ -15,7 +16,7 @@ from core.verticals.base.shared_logic import (
     StatusMachine,
     FinancialCalculator,
 )
-from core.shared.unified_db_adapter import execute_query
+from core.shared.unified_db_adapter import execute_query, get_unified_adapter
 from .models import (
     PointOfSale,
     ConsignmentTransaction,
@@ -25,6 +26,7 @@ from .models import (
     ConsignmentStatus
 )
 from .utils.geo import validate_geofence
+from . import rollups
 
 logger = logging.getLogger(__name__)
 
@@ -43,6 +45,9 @@ class CPGRetailVertical(VerticalBase, EnhancedVerticalBase):
     display_name = "CPG & Retail"
     description = "Gestión de puntos de venta, consignación y distribución retail"
 
+    # Tablas de rollups verificadas una vez por proceso
+    _rollup_schema_ready = False
+
     def __init__(self):
         """Initialize CPG vertical with shared utilities."""
         VerticalBase.__init__(self)
@@ -125,6 +130,11 @@ class CPGRetailVertical(VerticalBase, EnhancedVerticalBase):
             ("GET", "/api/v1/verticals/cpg/reports/visit-compliance", self.visit_compliance_report),
             ("GET", "/api/v1/verticals/cpg/reports/product-performance", self.product_performance_report),
             ("GET", "/api/v1/verticals/cpg/reports/inventory-variance", self.inventory_variance_report),
+            ("GET", "/api/v1/verticals/cpg/reports/product-sales", self.product_sales_report),
+
+            # Rollups (health check + refresh on-demand)
+            ("GET", "/api/v1/verticals/cpg/rollups/health", self.rollup_health),
+            ("POST", "/api/v1/verticals/cpg/rollups/refresh", self.refresh_rollups),
         ]
 
     def get_database_migrations(self) -> List[str]:
@@ -134,6 +144,7 @@ class CPGRetailVertical(VerticalBase, EnhancedVerticalBase):
             "migrations/verticals/cpg_retail/002_create_consignment_table.sql",
             "migrations/verticals/cpg_retail/003_add_pos_indexes.sql",
             "migrations/verticals/cpg_retail/004_field_sales_system.sql",
+            "migrations/verticals/cpg_retail/005_sales_rollups.sql",
         ]
 
     def get_feature_flags(self) -> Dict[str, bool]:
@@ -708,7 +719,53 @@ class CPGRetailVertical(VerticalBase, EnhancedVerticalBase):
             logger.error(f"   🧹 MANUAL CLEANUP REQUIRED - Check 'orphaned consignments' report")
             raise
 
-    # ==================== Reports (Sin cambios - queries específicos) ====================
+    # ==================== Rollups de ventas ====================
+
+    @contextmanager
+    def _rollups(self):
+        """Conexión para los rollups de ventas (ver rollups.py)."""
+        conn = get_unified_adapter().get_connection()
+        try:
+            if not CPGRetailVertical._rollup_schema_ready:
+                if rollups.ensure_rollup_schema(conn):
+                    logger.info("sat_invoices.pos_id agregado; los rollups se poblarán en la primera lectura o refresh")
+                CPGRetailVertical._rollup_schema_ready = True
+            yield conn
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+
+    async def rollup_health(self, company_id: str) -> Dict[str, Any]:
+        """Health check de los rollups: as_of, freshness y needs_refresh."""
+        with self._rollups() as conn:
+            return rollups.rollup_freshness(conn, company_id)
+
+    async def refresh_rollups(
+        self,
+        company_id: str,
+        fecha_inicio: Optional[str] = None,
+        fecha_fin: Optional[str] = None,
+        force: bool = False
+    ) -> Dict[str, Any]:
+        """
+        Reconstruye los rollups de ventas.
+
+        Lo usan el cron base (force=False: solo si ya no están frescos) y el
+        refresh on-demand (force=True). Con rango de fechas solo corrige esos días.
+        """
+        with self._rollups() as conn:
+            health = rollups.rollup_freshness(conn, company_id)
+            if not force and not fecha_inicio and not fecha_fin and not health["needs_refresh"]:
+                return {"refreshed": False, **health}
+
+            result = rollups.rebuild_sales(conn, company_id, fecha_inicio, fecha_fin)
+            self.log_operation("refresh", "rollups", company_id, result)
+            return {"refreshed": True, **result, **rollups.rollup_freshness(conn, company_id)}
+
+    # ==================== Reports ====================
 
     async def pos_sales_report(
         self,
@@ -719,32 +776,31 @@ class CPGRetailVertical(VerticalBase, EnhancedVerticalBase):
         """
         Generate sales report by POS.
 
-        NOTA: Query complejo con JOINs y agregaciones específicas.
-        ReportBuilder no ayuda mucho aquí.
+        Lee cpg_pos_sales_daily (rollup incremental) en lugar de unir
+        sat_invoices por metadata->>'pos_id'. Si la empresa nunca tuvo un
+        rebuild completo se reconstruye antes de leer. Cada fila incluye el
+        as_of de los rollups para el indicador de frescura del dashboard.
         """
-        query = """
-            SELECT
-                p.id as pos_id,
-                p.codigo as pos_codigo,
-                p.nombre as pos_nombre,
-                COUNT(DISTINCT si.id) as total_facturas,
-                COALESCE(SUM(si.total), 0) as total_ventas,
-                COALESCE(AVG(si.total), 0) as promedio_ticket,
-                -- Payment mode breakdown
-                COALESCE(SUM(CASE WHEN p.payment_mode = 'cash' THEN si.total ELSE 0 END), 0) as ventas_contado,
-                COALESCE(SUM(CASE WHEN p.payment_mode = 'consignment' THEN si.total ELSE 0 END), 0) as ventas_consignacion,
-                COALESCE(SUM(CASE WHEN p.payment_mode = 'credit' THEN si.total ELSE 0 END), 0) as ventas_credito
-            FROM cpg_pos p
-            LEFT JOIN sat_invoices si ON si.metadata->>'pos_id' = p.id::text
-                AND si.company_id = p.company_id
-                AND si.fecha_emision BETWEEN %s AND %s
-            WHERE p.company_id = %s
-            GROUP BY p.id, p.codigo, p.nombre
-            ORDER BY total_ventas DESC
-        """
-
-        results = execute_query(query, (fecha_inicio, fecha_fin, company_id))
-        return results or []
+        with self._rollups() as conn:
+            rollups.ensure_built(conn, company_id)
+            as_of = rollups.rollup_freshness(conn, company_id)["as_of"]
+            results = rollups.pos_sales(conn, company_id, fecha_inicio, fecha_fin)
+        return [{**row, "as_of": as_of} for row in results]
+
+    async def product_sales_report(
+        self,
+        company_id: str,
+        fecha_inicio: str,
+        fecha_fin: str,
+        pos_id: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """Generate sales report by product (SKU) from cpg_product_sales_daily."""
+        with self._rollups() as conn:
+            rollups.ensure_built(conn, company_id)
+            return {
+                "productos": rollups.product_sales(conn, company_id, fecha_inicio, fecha_fin, pos_id),
+                "freshness": rollups.rollup_freshness(conn, company_id),
+            }
 
     async def consignment_aging_report(
         self,
@@ -753,33 +809,11 @@ class CPGRetailVertical(VerticalBase, EnhancedVerticalBase):
         """
         Generate consignment aging report.
 
-        NOTA: Query con cálculo de aging usando EXTRACT.
-        Podríamos usar FinancialCalculator.calculate_aging_days después.
-        """
-        query = """
-            SELECT
-                c.id,
-                c.numero_remision,
-                p.codigo as pos_codigo,
-                p.nombre as pos_nombre,
-                c.fecha_entrega,
-                c.monto_total,
-                c.status,
-                EXTRACT(DAY FROM NOW() - c.fecha_entrega) as dias_en_consignacion,
-                CASE
-                    WHEN c.status = 'pending' AND EXTRACT(DAY FROM NOW() - c.fecha_entrega) > 60 THEN 'overdue'
-                    WHEN c.status = 'pending' AND EXTRACT(DAY FROM NOW() - c.fecha_entrega) > 30 THEN 'warning'
-                    ELSE 'ok'
-                END as aging_status
-            FROM cpg_consignment c
-            LEFT JOIN cpg_pos p ON p.id = c.pos_id
-            WHERE c.company_id = %s
-                AND c.status IN ('pending', 'sold')
-            ORDER BY dias_en_consignacion DESC
+        Los días en consignación se calculan una vez por fila contra un solo
+        as_of, sobre el índice (company_id, status, fecha_entrega).
         """
-
-        results = execute_query(query, (company_id,))
-        return results or []
+        with self._rollups() as conn:
+            return rollups.consignment_aging(conn, company_id)
 
     async def route_performance_report(
         self,
@@ -883,13 +917,24 @@ class CPGRetailVertical(VerticalBase, EnhancedVerticalBase):
 
     def on_invoice_created(self, invoice_id: int, invoice_data: Dict[str, Any]):
         """
-        Hook when invoice is created - link to POS if applicable.
+        Hook when invoice is created - link to POS and update sales rollups.
         """
-        metadata = invoice_data.get('metadata', {})
-        if 'pos_id' in metadata:
-            self.log_operation("link_invoice", "pos", metadata['pos_id'], {
-                "invoice_id": invoice_id
-            })
+        metadata = invoice_data.get('metadata') or {}
+        if not isinstance(metadata, dict) or 'pos_id' not in metadata:
+            return
+
+        self.log_operation("link_invoice", "pos", metadata['pos_id'], {
+            "invoice_id": invoice_id
+        })
+        company_id = invoice_data.get('company_id')
+        if not company_id:
+            return
+        try:
+            with self._rollups() as conn:
+                rollups.record_invoice(conn, company_id, invoice_id, invoice_data)
+        except Exception as e:
+            # El refresh (cron / on-demand) corrige cualquier evento perdido
+            logger.warning(f"⚠️ No se pudo actualizar rollups CPG para factura {invoice_id}: {e}")
 
     def on_reconciliation_match(
         self,
@@ -900,8 +945,15 @@ class CPGRetailVertical(VerticalBase, EnhancedVerticalBase):
         """
         Hook when reconciliation match is made.
 
-        Check if any invoices are for consignment sales and update status.
+        Suma las facturas conciliadas como cobradas en los rollups de su POS.
         """
+        company_id = match_data.get('company_id')
+        if company_id and invoice_ids:
+            try:
+                with self._rollups() as conn:
+                    rollups.record_payment(conn, company_id, invoice_ids, bank_tx_id)
+            except Exception as e:
+                logger.warning(f"⚠️ No se pudo registrar cobro CPG del movimiento {bank_tx_id}: {e}")
+
         # TODO: Check if invoices are linked to consignments
         # and mark them as paid automatically
-        pass
@@ -0,0 +1,132 @@
+"""
+CPG Rollup Scheduler
+====================
+Cron base (nivel 1 de ``MV_REFRESH_STRATEGY.md``) de los rollups de ventas CPG.
+
+Cada ``CPG_ROLLUP_REFRESH_MINUTES`` reconstruye los rollups de las empresas
+cuyo ``as_of`` ya no es fresco; la primera ejecución corre al arrancar para
+poblar rollups recién creados sin esperar un refresh manual.
+
+Solo arranca si la base tiene las tablas del vertical (migraciones
+``verticals/cpg_retail`` 004 y 005); el job no crea esquema.
+"""
+
+import asyncio
+import logging
+import os
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+from apscheduler.schedulers.asyncio import AsyncIOScheduler
+from apscheduler.triggers.interval import IntervalTrigger
+
+from core.shared.unified_db_adapter import get_unified_adapter
+from core.verticals.cpg_retail import rollups
+
+logger = logging.getLogger(__name__)
+
+CPG_ROLLUP_REFRESH_MINUTES = int(os.getenv("CPG_ROLLUP_REFRESH_MINUTES", str(rollups.CPG_ROLLUP_STALE_MINUTES)))
+
+JOB_ID = "cpg_rollups_refresh"
+
+
+def rollups_available() -> bool:
+    """True si el vertical CPG está instalado en la base unificada."""
+    conn = get_unified_adapter().get_connection()
+    try:
+        return rollups.rollup_tables_exist(conn)
+    finally:
+        conn.close()
+
+
+def refresh_all_rollups() -> Dict[str, Any]:
+    """Reconstruye los rollups no frescos de todas las empresas con POS."""
+    conn = get_unified_adapter().get_connection()
+    try:
+        results = rollups.refresh_stale(conn)
+        conn.commit()
+        return results
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+
+class CPGRollupScheduler:
+    """Scheduler del refresh periódico de rollups CPG"""
+
+    def __init__(self, interval_minutes: int = CPG_ROLLUP_REFRESH_MINUTES):
+        self.scheduler = AsyncIOScheduler()
+        self.interval_minutes = interval_minutes
+        self.running = False
+
+    async def start(self) -> bool:
+        """Inicia el scheduler con una ejecución inmediata y luego periódica"""
+        if self.running:
+            logger.warning("[CPG_ROLLUPS] Scheduler ya está corriendo")
+            return True
+
+        if not await asyncio.to_thread(rollups_available):
+            logger.info("[CPG_ROLLUPS] Vertical CPG no instalado (faltan sus tablas); scheduler no iniciado")
+            return False
+
+        self.scheduler.add_job(
+            func=self._execute_refresh_job,
+            trigger=IntervalTrigger(minutes=self.interval_minutes),
+            id=JOB_ID,
+            name="CPG Rollups Refresh",
+            replace_existing=True,
+            next_run_time=datetime.now(),
+            max_instances=1,
+            coalesce=True,
+            misfire_grace_time=self.interval_minutes * 60,
+        )
+        self.scheduler.start()
+        self.running = True
+        logger.info(f"[CPG_ROLLUPS] ✅ Scheduler iniciado (cada {self.interval_minutes} min)")
+        return True
+
+    async def stop(self):
+        """Detiene el scheduler"""
+        if not self.running:
+            return
+        self.scheduler.shutdown(wait=True)
+        self.running = False
+        logger.info("[CPG_ROLLUPS] ✅ Scheduler detenido")
+
+    async def _execute_refresh_job(self):
+        """Ejecuta el refresh fuera del event loop (las consultas son síncronas)"""
+        try:
+            results = await asyncio.to_thread(refresh_all_rollups)
+            errors = [company for company, result in results.items() if "error" in result]
+            logger.info(
+                f"[CPG_ROLLUPS] ⏰ Refresh programado: {len(results) - len(errors)} empresas reconstruidas, "
+                f"{len(errors)} con error"
+            )
+        except Exception as e:
+            logger.error(f"[CPG_ROLLUPS] ❌ Excepción en refresh programado: {e}", exc_info=True)
+
+
+# Singleton global
+_scheduler_instance: Optional[CPGRollupScheduler] = None
+
+
+def get_rollup_scheduler() -> CPGRollupScheduler:
+    """Obtiene instancia singleton del scheduler"""
+    global _scheduler_instance
+
+    if _scheduler_instance is None:
+        _scheduler_instance = CPGRollupScheduler()
+
+    return _scheduler_instance
+
+
+async def start_rollup_scheduler() -> bool:
+    """Inicia el scheduler (llamar en startup de FastAPI); False si el vertical no está instalado"""
+    return await get_rollup_scheduler().start()
+
+
+async def stop_rollup_scheduler():
+    """Detiene el scheduler (llamar en shutdown de FastAPI)"""
+    await get_rollup_scheduler().stop()
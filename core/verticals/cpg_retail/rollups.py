@@ -0,0 +1,662 @@
+"""
+Rollups diarios de ventas CPG (por POS y por producto).
+
+Sustituyen el JOIN de ``pos_sales_report`` contra ``sat_invoices`` sobre
+``metadata->>'pos_id'`` (extracción JSON sin índice) por tablas resumen que
+se mantienen de forma incremental, siguiendo la estrategia híbrida de
+``MV_REFRESH_STRATEGY.md``:
+
+- Nivel 1 (cron base) y nivel 3 (on-demand): ``rebuild_sales`` recalcula los
+  rollups de una empresa desde ``sat_invoices`` usando la columna extraída e
+  indexada ``sat_invoices.pos_id``. ``rollup_scheduler`` ejecuta
+  ``refresh_stale`` cada hora y las lecturas llaman ``ensure_built`` para no
+  servir rollups de una empresa que nunca se reconstruyó.
+- Nivel 2 (eventos): los hooks ``on_invoice_created`` y
+  ``on_reconciliation_match`` aplican cada factura/cobro al momento mediante
+  ``record_invoice`` y ``record_payment``. ``cpg_rollup_events`` funciona como
+  bitácora idempotente: los deltas solo se aplican si el INSERT del evento
+  afectó una fila, así que repetir un evento (aun en paralelo) no duplica
+  importes. También es la fuente de los cobros al reconstruir.
+- Health check: ``rollup_freshness`` reporta el *as of* de los datos con la
+  misma escala fresh / stale / very_stale y ``needs_refresh``.
+
+Las consultas usan placeholders ``?`` y SQL portable, de modo que funcionan
+igual sobre una conexión ``sqlite3`` que sobre ``PostgresCompatConnection``.
+Los importes se guardan en centavos enteros para que sumar deltas no acumule
+error de punto flotante.
+"""
+
+import json
+import logging
+import os
+import sqlite3
+from datetime import date, datetime, timedelta
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Minutos tras los que un rollup deja de considerarse fresco (cron base cada hora)
+CPG_ROLLUP_STALE_MINUTES = int(os.getenv("CPG_ROLLUP_STALE_MINUTES", "60"))
+# A partir de aquí el dashboard debe advertir que los datos son muy viejos
+CPG_ROLLUP_VERY_STALE_MINUTES = int(os.getenv("CPG_ROLLUP_VERY_STALE_MINUTES", str(24 * 60)))
+
+OPEN_CONSIGNMENT_STATUSES = ("pending", "sold")
+AGING_WARNING_DAYS = 30
+AGING_OVERDUE_DAYS = 60
+
+_SCHEMA = (
+    """
+    CREATE TABLE IF NOT EXISTS cpg_pos_sales_daily (
+        company_id VARCHAR(50) NOT NULL,
+        pos_id INTEGER NOT NULL,
+        dia DATE NOT NULL,
+        total_facturas INTEGER NOT NULL DEFAULT 0,
+        total_ventas_cents BIGINT NOT NULL DEFAULT 0,
+        facturas_cobradas INTEGER NOT NULL DEFAULT 0,
+        total_cobrado_cents BIGINT NOT NULL DEFAULT 0,
+        updated_at TIMESTAMP,
+        PRIMARY KEY (company_id, pos_id, dia)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS cpg_product_sales_daily (
+        company_id VARCHAR(50) NOT NULL,
+        pos_id INTEGER NOT NULL,
+        sku VARCHAR(100) NOT NULL,
+        dia DATE NOT NULL,
+        unidades DOUBLE PRECISION NOT NULL DEFAULT 0,
+        total_cents BIGINT NOT NULL DEFAULT 0,
+        updated_at TIMESTAMP,
+        PRIMARY KEY (company_id, pos_id, sku, dia)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS cpg_rollup_events (
+        event_key VARCHAR(120) PRIMARY KEY,
+        company_id VARCHAR(50) NOT NULL,
+        kind VARCHAR(20) NOT NULL,
+        pos_id INTEGER,
+        dia DATE,
+        amount_cents BIGINT NOT NULL DEFAULT 0,
+        bank_tx_id VARCHAR(64),
+        created_at TIMESTAMP
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS cpg_rollup_state (
+        company_id VARCHAR(50) PRIMARY KEY,
+        last_event_at TIMESTAMP,
+        last_rebuild_at TIMESTAMP
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_cpg_rollup_events_company_kind ON cpg_rollup_events (company_id, kind, dia)",
+    "CREATE INDEX IF NOT EXISTS idx_cpg_product_sales_daily_dia ON cpg_product_sales_daily (company_id, dia)",
+    "CREATE INDEX IF NOT EXISTS idx_sat_invoices_company_pos_fecha ON sat_invoices (company_id, pos_id, fecha_emision)",
+    "CREATE INDEX IF NOT EXISTS idx_cpg_consignment_company_status_entrega "
+    "ON cpg_consignment (company_id, status, fecha_entrega)",
+)
+
+# Extrae metadata.pos_id solo cuando es un entero válido
+_BACKFILL_POS_ID = {
+    "sqlite": """
+        UPDATE sat_invoices
+        SET pos_id = CAST(json_extract(metadata, '$.pos_id') AS INTEGER)
+        WHERE pos_id IS NULL AND json_valid(metadata)
+          AND CAST(json_extract(metadata, '$.pos_id') AS TEXT) GLOB '[0-9]*'
+          AND NOT CAST(json_extract(metadata, '$.pos_id') AS TEXT) GLOB '*[^0-9]*'
+    """,
+    "postgres": """
+        UPDATE sat_invoices
+        SET pos_id = (metadata->>'pos_id')::integer
+        WHERE pos_id IS NULL AND metadata->>'pos_id' ~ '^[0-9]{1,9}$'
+    """,
+}
+
+_UPSERT_POS_DAY = """
+    INSERT INTO cpg_pos_sales_daily (
+        company_id, pos_id, dia, total_facturas, total_ventas_cents,
+        facturas_cobradas, total_cobrado_cents, updated_at
+    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT (company_id, pos_id, dia) DO UPDATE SET
+        total_facturas = cpg_pos_sales_daily.total_facturas + excluded.total_facturas,
+        total_ventas_cents = cpg_pos_sales_daily.total_ventas_cents + excluded.total_ventas_cents,
+        facturas_cobradas = cpg_pos_sales_daily.facturas_cobradas + excluded.facturas_cobradas,
+        total_cobrado_cents = cpg_pos_sales_daily.total_cobrado_cents + excluded.total_cobrado_cents,
+        updated_at = excluded.updated_at
+"""
+
+_UPSERT_PRODUCT_DAY = """
+    INSERT INTO cpg_product_sales_daily (company_id, pos_id, sku, dia, unidades, total_cents, updated_at)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT (company_id, pos_id, sku, dia) DO UPDATE SET
+        unidades = cpg_product_sales_daily.unidades + excluded.unidades,
+        total_cents = cpg_product_sales_daily.total_cents + excluded.total_cents,
+        updated_at = excluded.updated_at
+"""
+
+_INSERT_EVENT = """
+    INSERT INTO cpg_rollup_events (event_key, company_id, kind, pos_id, dia, amount_cents, bank_tx_id, created_at)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT (event_key) DO NOTHING
+"""
+
+
+# ==================== Helpers ====================
+
+def _dialect(conn) -> str:
+    return "sqlite" if isinstance(conn, sqlite3.Connection) else "postgres"
+
+
+def _execute(conn, query: str, params: Sequence[Any] = ()):
+    cursor = conn.cursor()
+    cursor.execute(query, tuple(params))
+    return cursor
+
+
+def _fetchall(conn, query: str, params: Sequence[Any] = ()) -> List[Dict[str, Any]]:
+    cursor = _execute(conn, query, params)
+    rows = cursor.fetchall()
+    columns = [column[0] for column in cursor.description or ()]
+    return [row if isinstance(row, dict) else dict(zip(columns, row)) for row in rows]
+
+
+def _fetchone(conn, query: str, params: Sequence[Any] = ()) -> Optional[Dict[str, Any]]:
+    rows = _fetchall(conn, query, params)
+    return rows[0] if rows else None
+
+
+def _to_cents(value: Any) -> int:
+    try:
+        amount = Decimal(str(value if value is not None else 0))
+    except InvalidOperation:
+        return 0
+    return int(amount.quantize(Decimal("0.01"), rounding=ROUND_HALF_UP) * 100)
+
+
+def _from_cents(value: Any) -> float:
+    return round(int(value or 0) / 100, 2)
+
+
+def _as_datetime(value: Any) -> Optional[datetime]:
+    if value is None or value == "":
+        return None
+    if isinstance(value, datetime):
+        return value.replace(tzinfo=None)
+    if isinstance(value, date):
+        return datetime.combine(value, datetime.min.time())
+    try:
+        return datetime.fromisoformat(str(value).replace("Z", "+00:00")).replace(tzinfo=None)
+    except ValueError:
+        return None
+
+
+def _day(value: Any) -> Optional[str]:
+    """Día ``YYYY-MM-DD`` de una fecha/timestamp (texto en SQLite, date/datetime en Postgres)."""
+    moment = _as_datetime(value)
+    return moment.date().isoformat() if moment else None
+
+
+def _day_range(fecha_inicio: Optional[str], fecha_fin: Optional[str]) -> Tuple[Optional[str], Optional[str]]:
+    """Rango de días inclusivo como límites ``[inicio, fin + 1 día)`` para columnas timestamp."""
+    start = _day(fecha_inicio)
+    end = _day(fecha_fin)
+    end_exclusive = (date.fromisoformat(end) + timedelta(days=1)).isoformat() if end else None
+    return start, end_exclusive
+
+
+def _load_metadata(value: Any) -> Dict[str, Any]:
+    if isinstance(value, dict):
+        return value
+    if not value:
+        return {}
+    try:
+        loaded = json.loads(value)
+    except (TypeError, ValueError):
+        return {}
+    return loaded if isinstance(loaded, dict) else {}
+
+
+def parse_pos_id(value: Any) -> Optional[int]:
+    """``metadata.pos_id`` como entero; ``None`` si falta o no es numérico."""
+    if isinstance(value, bool) or value is None:
+        return None
+    text = str(value).strip()
+    return int(text) if text.isdigit() else None
+
+
+def _product_lines(metadata: Dict[str, Any]) -> Dict[str, Tuple[float, int]]:
+    """Unidades y centavos por SKU de ``metadata.productos`` (``[{sku, qty, precio}]``)."""
+    lines: Dict[str, Tuple[float, int]] = {}
+    for item in metadata.get("productos") or []:
+        if not isinstance(item, dict) or not item.get("sku"):
+            continue
+        try:
+            qty = float(item.get("qty") or 0)
+            precio = Decimal(str(item.get("precio") or 0))
+        except (TypeError, ValueError, InvalidOperation):
+            continue
+        units, cents = lines.get(str(item["sku"]), (0.0, 0))
+        lines[str(item["sku"])] = (units + qty, cents + _to_cents(precio * Decimal(str(qty))))
+    return lines
+
+
+def _touch_state(conn, company_id: str, column: str, now: str) -> None:
+    _execute(
+        conn,
+        f"""
+        INSERT INTO cpg_rollup_state (company_id, {column}) VALUES (?, ?)
+        ON CONFLICT (company_id) DO UPDATE SET {column} = excluded.{column}
+        """,
+        (company_id, now),
+    )
+
+
+def _claim_event(conn, params: Sequence[Any]) -> bool:
+    """Registra el evento; False si ya existía (otro hook o un rebuild lo aplicó)."""
+    return _execute(conn, _INSERT_EVENT, params).rowcount == 1
+
+
+# ==================== Esquema ====================
+
+def ensure_rollup_schema(conn) -> bool:
+    """
+    Crea las tablas de rollups, la columna ``sat_invoices.pos_id`` y sus índices.
+
+    Devuelve True cuando la columna se acaba de agregar (y se rellenó desde
+    ``metadata``); el llamador debe ejecutar ``rebuild_sales`` en ese caso.
+    """
+    dialect = _dialect(conn)
+    if dialect == "sqlite":
+        columns = {row["name"] for row in _fetchall(conn, "PRAGMA table_info(sat_invoices)")}
+        added = "pos_id" not in columns
+        if added:
+            _execute(conn, "ALTER TABLE sat_invoices ADD COLUMN pos_id INTEGER")
+    else:
+        added = _fetchone(
+            conn,
+            "SELECT 1 AS found FROM information_schema.columns WHERE table_name = 'sat_invoices' AND column_name = 'pos_id'",
+        ) is None
+        if added:
+            _execute(conn, "ALTER TABLE sat_invoices ADD COLUMN IF NOT EXISTS pos_id INTEGER")
+
+    for statement in _SCHEMA:
+        _execute(conn, statement)
+
+    if added:
+        filled = _execute(conn, _BACKFILL_POS_ID[dialect]).rowcount
+        logger.info("sat_invoices.pos_id agregado; %s facturas enlazadas a POS desde metadata", filled)
+    return added
+
+
+# Tablas de las migraciones 004 y 005 del vertical sin las que no hay rollups que refrescar
+ROLLUP_REQUIRED_TABLES = ("cpg_pos", "cpg_consignment", "cpg_rollup_state")
+
+
+def rollup_tables_exist(conn) -> bool:
+    """True si la base ya tiene las tablas del vertical CPG y de sus rollups."""
+    placeholders = ", ".join("?" for _ in ROLLUP_REQUIRED_TABLES)
+    if _dialect(conn) == "sqlite":
+        query = f"SELECT name AS table_name FROM sqlite_master WHERE type = 'table' AND name IN ({placeholders})"
+    else:
+        query = (
+            "SELECT table_name FROM information_schema.tables "
+            f"WHERE table_schema = current_schema() AND table_name IN ({placeholders})"
+        )
+    found = {row["table_name"] for row in _fetchall(conn, query, ROLLUP_REQUIRED_TABLES)}
+    return found == set(ROLLUP_REQUIRED_TABLES)
+
+
+# ==================== Eventos (nivel 2) ====================
+
+def record_invoice(conn, company_id: str, invoice_id: Any, invoice_data: Optional[Dict[str, Any]] = None) -> bool:
+    """
+    Aplica una factura nueva a los rollups de su POS.
+
+    Usa la fila de ``sat_invoices`` como fuente (igual que ``rebuild_sales``) y
+    recurre a ``invoice_data`` solo si aún no existe. Devuelve False si la
+    factura no tiene POS o ya se había aplicado.
+    """
+    invoice_data = invoice_data or {}
+    row = _fetchone(
+        conn,
+        "SELECT total, fecha_emision, metadata FROM sat_invoices WHERE id = ? AND company_id = ?",
+        (invoice_id, company_id),
+    ) or invoice_data
+    metadata = _load_metadata(row.get("metadata"))
+    pos_id = parse_pos_id(metadata.get("pos_id"))
+    dia = _day(row.get("fecha_emision"))
+    if pos_id is None or dia is None:
+        return False
+
+    _execute(conn, "UPDATE sat_invoices SET pos_id = ? WHERE id = ? AND company_id = ?", (pos_id, invoice_id, company_id))
+
+    now = datetime.utcnow().isoformat()
+    total_cents = _to_cents(row.get("total"))
+    if not _claim_event(conn, (f"invoice:{invoice_id}", company_id, "invoice", pos_id, dia, total_cents, None, now)):
+        return False
+    _execute(conn, _UPSERT_POS_DAY, (company_id, pos_id, dia, 1, total_cents, 0, 0, now))
+    for sku, (units, cents) in _product_lines(metadata).items():
+        _execute(conn, _UPSERT_PRODUCT_DAY, (company_id, pos_id, sku, dia, units, cents, now))
+    _touch_state(conn, company_id, "last_event_at", now)
+    return True
+
+
+def record_payment(conn, company_id: str, invoice_ids: Iterable[Any], bank_tx_id: Any = None) -> int:
+    """
+    Marca como cobradas las facturas conciliadas contra un movimiento bancario.
+
+    El cobro se acumula en el día de emisión de la factura. Cada factura se
+    cuenta una sola vez aunque el match se repita. Devuelve cuántas se aplicaron.
+    """
+    applied = 0
+    now = datetime.utcnow().isoformat()
+    for invoice_id in invoice_ids:
+        row = _fetchone(
+            conn,
+            "SELECT pos_id, total, fecha_emision FROM sat_invoices WHERE id = ? AND company_id = ?",
+            (invoice_id, company_id),
+        )
+        dia = _day(row.get("fecha_emision")) if row else None
+        if not row or row.get("pos_id") is None or dia is None:
+            continue
+        total_cents = _to_cents(row.get("total"))
+        bank_ref = str(bank_tx_id) if bank_tx_id is not None else None
+        event = (f"payment:{invoice_id}", company_id, "payment", row["pos_id"], dia, total_cents, bank_ref, now)
+        if not _claim_event(conn, event):
+            continue
+        _execute(conn, _UPSERT_POS_DAY, (company_id, row["pos_id"], dia, 0, 0, 1, total_cents, now))
+        applied += 1
+
+    if applied:
+        _touch_state(conn, company_id, "last_event_at", now)
+    return applied
+
+
+# ==================== Reconstrucción (niveles 1 y 3) ====================
+
+def rebuild_sales(
+    conn,
+    company_id: str,
+    fecha_inicio: Optional[str] = None,
+    fecha_fin: Optional[str] = None,
+) -> Dict[str, Any]:
+    """
+    Recalcula los rollups de una empresa (o de un rango de días) desde ``sat_invoices``.
+
+    Solo la reconstrucción completa actualiza ``last_rebuild_at``, que es el
+    *as of* garantizado que reporta ``rollup_freshness``.
+    """
+    start, end_exclusive = _day_range(fecha_inicio, fecha_fin)
+    invoice_filter, day_filter = "", ""
+    invoice_params: List[Any] = [company_id]
+    day_params: List[Any] = [company_id]
+    if start:
+        invoice_filter += " AND fecha_emision >= ?"
+        day_filter += " AND dia >= ?"
+        invoice_params.append(start)
+        day_params.append(start)
+    if end_exclusive:
+        invoice_filter += " AND fecha_emision < ?"
+        day_filter += " AND dia < ?"
+        invoice_params.append(end_exclusive)
+        day_params.append(end_exclusive)
+
+    # Facturas escritas sin pasar por el hook (importaciones, SQL directo)
+    _execute(conn, f"{_BACKFILL_POS_ID[_dialect(conn)]} AND company_id = ?{invoice_filter}", invoice_params)
+
+    invoices = _fetchall(
+        conn,
+        f"""
+        SELECT id, pos_id, total, fecha_emision, metadata FROM sat_invoices
+        WHERE company_id = ? AND pos_id IS NOT NULL{invoice_filter}
+        """,
+        invoice_params,
+    )
+    payments = _fetchall(
+        conn,
+        f"SELECT pos_id, dia, amount_cents FROM cpg_rollup_events WHERE company_id = ? AND kind = 'payment'{day_filter}",
+        day_params,
+    )
+
+    pos_days: Dict[Tuple[int, str], List[int]] = {}
+    product_days: Dict[Tuple[int, str, str], List[Any]] = {}
+    events = []
+    for invoice in invoices:
+        dia = _day(invoice["fecha_emision"])
+        if dia is None:
+            continue
+        cents = _to_cents(invoice["total"])
+        totals = pos_days.setdefault((invoice["pos_id"], dia), [0, 0, 0, 0])
+        totals[0] += 1
+        totals[1] += cents
+        for sku, (units, line_cents) in _product_lines(_load_metadata(invoice["metadata"])).items():
+            product = product_days.setdefault((invoice["pos_id"], sku, dia), [0.0, 0])
+            product[0] += units
+            product[1] += line_cents
+        events.append((f"invoice:{invoice['id']}", invoice["pos_id"], dia, cents))
+    for payment in payments:
+        totals = pos_days.setdefault((payment["pos_id"], _day(payment["dia"])), [0, 0, 0, 0])
+        totals[2] += 1
+        totals[3] += int(payment["amount_cents"] or 0)
+
+    now = datetime.utcnow().isoformat()
+    _execute(conn, f"DELETE FROM cpg_pos_sales_daily WHERE company_id = ?{day_filter}", day_params)
+    _execute(conn, f"DELETE FROM cpg_product_sales_daily WHERE company_id = ?{day_filter}", day_params)
+    for (pos_id, dia), totals in pos_days.items():
+        _execute(conn, _UPSERT_POS_DAY, (company_id, pos_id, dia, *totals, now))
+    for (pos_id, sku, dia), (units, cents) in product_days.items():
+        _execute(conn, _UPSERT_PRODUCT_DAY, (company_id, pos_id, sku, dia, units, cents, now))
+    # Las facturas ya contadas no se vuelven a sumar si su hook llega después
+    for event_key, pos_id, dia, cents in events:
+        _execute(conn, _INSERT_EVENT, (event_key, company_id, "invoice", pos_id, dia, cents, None, now))
+
+    if not start and not end_exclusive:
+        _touch_state(conn, company_id, "last_rebuild_at", now)
+
+    logger.info(
+        "Rollups CPG reconstruidos para %s (%s - %s): %s facturas, %s días POS",
+        company_id, start or "inicio", fecha_fin or "hoy", len(events), len(pos_days),
+    )
+    return {"facturas": len(events), "dias_pos": len(pos_days), "productos_dia": len(product_days), "rebuilt_at": now}
+
+
+def rollup_companies(conn) -> List[str]:
+    """Empresas con puntos de venta, es decir, con rollups que mantener."""
+    return [row["company_id"] for row in _fetchall(conn, "SELECT DISTINCT company_id FROM cpg_pos")]
+
+
+def ensure_built(conn, company_id: str) -> bool:
+    """Reconstruye los rollups si la empresa nunca tuvo un rebuild completo."""
+    state = _fetchone(conn, "SELECT last_rebuild_at FROM cpg_rollup_state WHERE company_id = ?", (company_id,))
+    if state and state.get("last_rebuild_at"):
+        return False
+    rebuild_sales(conn, company_id)
+    return True
+
+
+def refresh_stale(conn, company_ids: Optional[Iterable[str]] = None, now: Optional[datetime] = None) -> Dict[str, Any]:
+    """
+    Cron base: reconstruye las empresas cuyos rollups ya no están frescos.
+
+    Confirma cada empresa por separado para que un error no descarte las demás.
+    """
+    results: Dict[str, Any] = {}
+    for company_id in (rollup_companies(conn) if company_ids is None else company_ids):
+        if not rollup_freshness(conn, company_id, now)["needs_refresh"]:
+            continue
+        try:
+            results[company_id] = rebuild_sales(conn, company_id)
+            conn.commit()
+        except Exception as exc:
+            conn.rollback()
+            logger.error("Error reconstruyendo rollups CPG de %s: %s", company_id, exc)
+            results[company_id] = {"error": str(exc)}
+    return results
+
+
+# ==================== Health check ====================
+
+def rollup_freshness(conn, company_id: str, now: Optional[datetime] = None) -> Dict[str, Any]:
+    """
+    Frescura de los rollups para mostrar en dashboards.
+
+    ``as_of`` es la última reconstrucción completa (lo que garantiza el cron
+    base); ``last_event_at`` indica hasta cuándo llegan los eventos aplicados.
+    """
+    now = now or datetime.utcnow()
+    state = _fetchone(
+        conn,
+        "SELECT last_event_at, last_rebuild_at FROM cpg_rollup_state WHERE company_id = ?",
+        (company_id,),
+    ) or {}
+    as_of = _as_datetime(state.get("last_rebuild_at"))
+    last_event = _as_datetime(state.get("last_event_at"))
+
+    if as_of is None:
+        age_minutes = None
+        freshness = "very_stale"
+        recommendation = "Rollups never rebuilt. Run a full refresh."
+    else:
+        age_minutes = int((now - as_of).total_seconds() // 60)
+        if age_minutes <= CPG_ROLLUP_STALE_MINUTES:
+            freshness = "fresh"
+            recommendation = "Rollups are fresh. No action needed."
+        elif age_minutes <= CPG_ROLLUP_VERY_STALE_MINUTES:
+            freshness = "stale"
+            recommendation = "Rollups are stale. Refresh recommended; check the hourly job."
+        else:
+            freshness = "very_stale"
+            recommendation = "Rollups are very stale. Refresh now and verify the scheduled job."
+
+    return {
+        "company_id": company_id,
+        "as_of": as_of.isoformat() if as_of else None,
+        "last_event_at": last_event.isoformat() if last_event else None,
+        "age_minutes": age_minutes,
+        "freshness": freshness,
+        "needs_refresh": freshness != "fresh",
+        "recommendation": recommendation,
+    }
+
+
+# ==================== Lecturas ====================
+
+def pos_sales(conn, company_id: str, fecha_inicio: str, fecha_fin: str) -> List[Dict[str, Any]]:
+    """Ventas por POS en el rango (días inclusivos), incluyendo POS sin ventas."""
+    start, end_exclusive = _day_range(fecha_inicio, fecha_fin)
+    rows = _fetchall(
+        conn,
+        """
+        SELECT
+            p.id AS pos_id,
+            p.codigo AS pos_codigo,
+            p.nombre AS pos_nombre,
+            p.payment_mode,
+            COALESCE(SUM(r.total_facturas), 0) AS total_facturas,
+            COALESCE(SUM(r.total_ventas_cents), 0) AS total_ventas_cents,
+            COALESCE(SUM(r.facturas_cobradas), 0) AS facturas_cobradas,
+            COALESCE(SUM(r.total_cobrado_cents), 0) AS total_cobrado_cents
+        FROM cpg_pos p
+        LEFT JOIN cpg_pos_sales_daily r ON r.company_id = p.company_id AND r.pos_id = p.id
+            AND r.dia >= ? AND r.dia < ?
+        WHERE p.company_id = ?
+        GROUP BY p.id, p.codigo, p.nombre, p.payment_mode
+        """,
+        (start, end_exclusive, company_id),
+    )
+
+    report = []
+    for row in rows:
+        facturas = int(row["total_facturas"])
+        ventas_cents = int(row["total_ventas_cents"])
+        ventas = _from_cents(ventas_cents)
+        mode = row.get("payment_mode")
+        report.append({
+            "pos_id": row["pos_id"],
+            "pos_codigo": row["pos_codigo"],
+            "pos_nombre": row["pos_nombre"],
+            "total_facturas": facturas,
+            "total_ventas": ventas,
+            "promedio_ticket": _from_cents(round(ventas_cents / facturas)) if facturas else 0.0,
+            "ventas_contado": ventas if mode == "cash" else 0.0,
+            "ventas_consignacion": ventas if mode == "consignment" else 0.0,
+            "ventas_credito": ventas if mode == "credit" else 0.0,
+            "facturas_cobradas": int(row["facturas_cobradas"]),
+            "total_cobrado": _from_cents(row["total_cobrado_cents"]),
+        })
+    report.sort(key=lambda item: (-item["total_ventas"], item["pos_id"]))
+    return report
+
+
+def product_sales(
+    conn,
+    company_id: str,
+    fecha_inicio: str,
+    fecha_fin: str,
+    pos_id: Optional[int] = None,
+) -> List[Dict[str, Any]]:
+    """Unidades e importe vendidos por SKU en el rango, opcionalmente de un solo POS."""
+    start, end_exclusive = _day_range(fecha_inicio, fecha_fin)
+    query = """
+        SELECT sku, SUM(unidades) AS unidades, SUM(total_cents) AS total_cents, COUNT(DISTINCT pos_id) AS puntos_venta
+        FROM cpg_product_sales_daily
+        WHERE company_id = ? AND dia >= ? AND dia < ?
+    """
+    params: List[Any] = [company_id, start, end_exclusive]
+    if pos_id is not None:
+        query += " AND pos_id = ?"
+        params.append(pos_id)
+    query += " GROUP BY sku"
+
+    report = [
+        {
+            "sku": row["sku"],
+            "unidades": round(float(row["unidades"] or 0), 3),
+            "total": _from_cents(row["total_cents"]),
+            "puntos_venta": int(row["puntos_venta"]),
+        }
+        for row in _fetchall(conn, query, params)
+    ]
+    report.sort(key=lambda item: (-item["total"], item["sku"]))
+    return report
+
+
+def aging_status(status: Optional[str], dias: Optional[int]) -> str:
+    if status == "pending" and dias is not None:
+        if dias > AGING_OVERDUE_DAYS:
+            return "overdue"
+        if dias > AGING_WARNING_DAYS:
+            return "warning"
+    return "ok"
+
+
+def consignment_aging(conn, company_id: str, as_of: Optional[datetime] = None) -> List[Dict[str, Any]]:
+    """
+    Consignaciones abiertas con sus días en consignación.
+
+    Los días se calculan una vez por fila contra un único ``as_of`` (en vez de
+    evaluar ``EXTRACT(DAY FROM NOW() - fecha_entrega)`` varias veces en SQL).
+    """
+    as_of = as_of or datetime.now()
+    placeholders = ", ".join("?" for _ in OPEN_CONSIGNMENT_STATUSES)
+    rows = _fetchall(
+        conn,
+        f"""
+        SELECT c.id, c.numero_remision, p.codigo AS pos_codigo, p.nombre AS pos_nombre,
+               c.fecha_entrega, c.monto_total, c.status
+        FROM cpg_consignment c
+        LEFT JOIN cpg_pos p ON p.id = c.pos_id
+        WHERE c.company_id = ? AND c.status IN ({placeholders})
+        """,
+        (company_id, *OPEN_CONSIGNMENT_STATUSES),
+    )
+
+    for row in rows:
+        entrega = _as_datetime(row["fecha_entrega"])
+        dias = (as_of - entrega).days if entrega else None
+        row["dias_en_consignacion"] = dias
+        row["aging_status"] = aging_status(row["status"], dias)
+    # Mismo orden que ORDER BY ... DESC en Postgres (NULL primero)
+    rows.sort(key=lambda row: (row["dias_en_consignacion"] is not None, -(row["dias_en_consignacion"] or 0)))
+    return rows
@@ -2,30 +2,45 @@
 Worker System - Sistema completo de workers con cola de tareas
 Punto 22 de Auditoría: Implementa worker system con task queue y job scheduling
 Resuelve campos faltantes: progress, worker_metadata, retry_policy
+
+Scheduler asyncio-nativo: una cola heap por tipo de tarea ordenada por
+(prioridad, deadline, secuencia), despacho por eventos (sin polling ni
+threads por worker), límites de concurrencia por tipo de tarea y pools
+acotados de threads/procesos para handlers bloqueantes.
+
+Configuración por entorno:
+- WORKER_BLOCKING_THREADS: threads para handlers bloqueantes (default 4)
+- WORKER_PROCESS_POOL_SIZE: procesos para handlers CPU-bound (default 2)
+- WORKER_TASK_HISTORY: tareas terminadas que se conservan en memoria (default 10000)
 """
 
 import asyncio
 import hashlib
+import heapq
+import itertools
 import json
 import logging
 import time
-import threading
 import signal
 import os
 from decimal import Decimal
 from typing import Dict, List, Optional, Any, Union, Tuple, Callable
+from collections import OrderedDict, deque
 from enum import Enum
 from dataclasses import dataclass
 import sqlite3
-from datetime import datetime, timedelta
+from datetime import datetime
 import uuid
 import psutil
 from contextlib import asynccontextmanager
-from concurrent.futures import ThreadPoolExecutor
-import queue
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 
 logger = logging.getLogger(__name__)
 
+WORKER_BLOCKING_THREADS = int(os.getenv("WORKER_BLOCKING_THREADS", "4"))
+WORKER_PROCESS_POOL_SIZE = int(os.getenv("WORKER_PROCESS_POOL_SIZE", "2"))
+WORKER_TASK_HISTORY = int(os.getenv("WORKER_TASK_HISTORY", "10000"))
+
 class TaskStatus(Enum):
     PENDING = "pending"
     QUEUED = "queued"
@@ -119,6 +134,15 @@ class Task:
     tags: List[str] = None
     progress: TaskProgress = None
     worker_metadata: WorkerMetadata = None
+    deadline: Optional[datetime] = None
+    status: TaskStatus = TaskStatus.PENDING
+    assigned_worker_id: Optional[str] = None
+    enqueued_at: Optional[float] = None
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    updated_at: Optional[datetime] = None
+    result: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
 
     def __post_init__(self):
         if self.depends_on is None:
@@ -128,80 +152,95 @@ class Task:
         if self.progress is None:
             self.progress = TaskProgress()
 
+def _progress_dict(progress: TaskProgress) -> Dict[str, Any]:
+    return {
+        'percentage': progress.percentage,
+        'current_step': progress.current_step,
+        'total_steps': progress.total_steps,
+        'completed_steps': progress.completed_steps,
+        'estimated_remaining_seconds': progress.estimated_remaining_seconds,
+        'details': progress.details,
+        'last_updated': progress.last_updated.isoformat()
+    }
+
+def _retry_policy_dict(policy: RetryPolicy) -> Dict[str, Any]:
+    return {
+        'max_attempts': policy.max_attempts,
+        'initial_delay_seconds': policy.initial_delay_seconds,
+        'max_delay_seconds': policy.max_delay_seconds,
+        'backoff_multiplier': policy.backoff_multiplier,
+        'retry_on_timeout': policy.retry_on_timeout,
+        'retry_on_error': policy.retry_on_error,
+        'retry_error_patterns': policy.retry_error_patterns
+    }
+
+def _latency_summary(samples) -> Dict[str, float]:
+    values = sorted(samples)
+    if not values:
+        return {'avg': 0.0, 'p50': 0.0, 'p95': 0.0, 'max': 0.0}
+    return {
+        'avg': round(sum(values) / len(values) * 1000, 3),
+        'p50': round(values[len(values) // 2] * 1000, 3),
+        'p95': round(values[min(len(values) - 1, int(len(values) * 0.95))] * 1000, 3),
+        'max': round(values[-1] * 1000, 3),
+    }
+
 class TaskQueue:
-    """Cola de tareas con prioridad"""
+    """
+    Cola de tareas con prioridad: un heap por tipo de tarea.
+
+    Cada entrada se ordena por (prioridad descendente, deadline, secuencia);
+    tener un heap por tipo permite saltar tipos sin capacidad sin reordenar.
+    """
 
     def __init__(self, max_size: int = 10000):
         self.max_size = max_size
-        self.queue = queue.PriorityQueue(maxsize=max_size)
+        self.heaps: Dict[str, List[Tuple[int, float, int, str]]] = {}
         self.pending_tasks = {}  # task_id -> task
-        self.lock = threading.RLock()
+        self._seq = itertools.count()
+
+    @staticmethod
+    def sort_key(task: Task, seq: int) -> Tuple[int, float, int, str]:
+        deadline = task.deadline.timestamp() if task.deadline else float('inf')
+        return (-task.priority.value, deadline, seq, task.task_id)
 
     def enqueue(self, task: Task) -> bool:
         """Encola una tarea"""
-        try:
-            with self.lock:
-                if len(self.pending_tasks) >= self.max_size:
-                    return False
-
-                # Priority queue usa tuplas (priority, item)
-                # Menor número = mayor prioridad
-                priority_value = -task.priority.value  # Invertir para mayor prioridad primero
-                timestamp = task.created_at.timestamp()
-
-                self.queue.put((priority_value, timestamp, task.task_id))
-                self.pending_tasks[task.task_id] = task
-
-                logger.debug(f"Enqueued task {task.task_id} with priority {task.priority.name}")
-                return True
-
-        except Exception as e:
-            logger.error(f"Error enqueuing task {task.task_id}: {e}")
+        if len(self.pending_tasks) >= self.max_size:
             return False
-
-    def dequeue(self, timeout: float = 1.0) -> Optional[Task]:
-        """Desencola la tarea de mayor prioridad"""
-        try:
-            # Obtener el task_id de la cola
-            priority_value, timestamp, task_id = self.queue.get(timeout=timeout)
-
-            with self.lock:
-                task = self.pending_tasks.pop(task_id, None)
-                if task:
-                    logger.debug(f"Dequeued task {task_id}")
-                    return task
-                else:
-                    logger.warning(f"Task {task_id} not found in pending tasks")
-                    return None
-
-        except queue.Empty:
-            return None
-        except Exception as e:
-            logger.error(f"Error dequeuing task: {e}")
+        heapq.heappush(self.heaps.setdefault(task.task_type, []), self.sort_key(task, next(self._seq)))
+        self.pending_tasks[task.task_id] = task
+        logger.debug(f"Enqueued task {task.task_id} with priority {task.priority.name}")
+        return True
+
+    def head(self, task_type: str) -> Optional[Tuple[int, float, int, str]]:
+        """Clave de la siguiente tarea de un tipo"""
+        heap = self.heaps.get(task_type)
+        return heap[0] if heap else None
+
+    def dequeue(self, task_type: str) -> Optional[Task]:
+        """Desencola la tarea de mayor prioridad de un tipo"""
+        if self.head(task_type) is None:
             return None
+        _, _, _, task_id = heapq.heappop(self.heaps[task_type])
+        task = self.pending_tasks.pop(task_id)
+        logger.debug(f"Dequeued task {task_id}")
+        return task
+
+    def task_types(self) -> List[str]:
+        return [task_type for task_type, heap in self.heaps.items() if heap]
 
     def get_size(self) -> int:
         """Obtiene el tamaño actual de la cola"""
-        with self.lock:
-            return len(self.pending_tasks)
+        return len(self.pending_tasks)
 
     def peek_next(self) -> Optional[Task]:
         """Ve la siguiente tarea sin removerla"""
-        try:
-            with self.lock:
-                if self.queue.empty():
-                    return None
-
-                # Obtener elemento sin remover (hack usando queue interno)
-                priority_value, timestamp, task_id = self.queue.queue[0]
-                return self.pending_tasks.get(task_id)
-
-        except Exception as e:
-            logger.error(f"Error peeking next task: {e}")
-            return None
+        heads = [head for head in (self.head(t) for t in list(self.heaps)) if head]
+        return self.pending_tasks.get(min(heads)[3]) if heads else None
 
 class Worker:
-    """Worker individual para procesar tareas"""
+    """Worker individual: slots de ejecución para los tipos de tarea que maneja"""
 
     def __init__(self, worker_metadata: WorkerMetadata, task_handlers: Dict[str, Callable]):
         self.metadata = worker_metadata
@@ -209,10 +248,7 @@ class Worker:
         self.status = WorkerStatus.OFFLINE
         self.current_tasks = {}  # task_id -> task
         self.running = False
-        self.shutdown_event = threading.Event()
-        self.heartbeat_thread = None
-        self.processing_thread = None
-        self.task_queue = TaskQueue()
+        self._executions: Dict[str, asyncio.Task] = {}
 
         # Performance tracking
         self.tasks_completed = 0
@@ -222,185 +258,102 @@ class Worker:
 
     async def start(self):
         """Inicia el worker"""
-        try:
-            self.running = True
-            self.status = WorkerStatus.IDLE
-            self.metadata.registration_time = datetime.utcnow()
-            self.metadata.last_heartbeat = datetime.utcnow()
-
-            # Iniciar heartbeat
-            self.heartbeat_thread = threading.Thread(target=self._heartbeat_loop, daemon=True)
-            self.heartbeat_thread.start()
-
-            # Iniciar loop de procesamiento
-            self.processing_thread = threading.Thread(target=self._processing_loop, daemon=True)
-            self.processing_thread.start()
-
-            logger.info(f"Worker {self.metadata.worker_id} started")
-
-        except Exception as e:
-            logger.error(f"Error starting worker {self.metadata.worker_id}: {e}")
-            self.status = WorkerStatus.ERROR
-            raise
+        self.running = True
+        self.status = WorkerStatus.IDLE
+        self.metadata.registration_time = datetime.utcnow()
+        self.metadata.last_heartbeat = datetime.utcnow()
+        logger.info(f"Worker {self.metadata.worker_id} started")
 
     async def stop(self):
         """Detiene el worker gracefully"""
-        try:
-            logger.info(f"Stopping worker {self.metadata.worker_id}")
-            self.running = False
-            self.shutdown_event.set()
-
-            # Esperar a que terminen las tareas actuales
-            timeout = 30  # 30 segundos de gracia
-            start_time = time.time()
-
-            while self.current_tasks and (time.time() - start_time) < timeout:
-                await asyncio.sleep(1)
-
-            # Cancelar tareas restantes
-            for task_id in list(self.current_tasks.keys()):
-                await self._cancel_task(task_id)
-
-            self.status = WorkerStatus.OFFLINE
-            logger.info(f"Worker {self.metadata.worker_id} stopped")
-
-        except Exception as e:
-            logger.error(f"Error stopping worker {self.metadata.worker_id}: {e}")
-
-    def submit_task(self, task: Task) -> bool:
-        """Envía una tarea al worker"""
-        try:
-            if len(self.current_tasks) >= self.metadata.max_concurrent_tasks:
-                return self.task_queue.enqueue(task)
+        logger.info(f"Stopping worker {self.metadata.worker_id}")
+        self.running = False
 
-            # Procesar inmediatamente si hay capacidad
-            return self._assign_task(task)
+        # Esperar a que terminen las tareas actuales (30 segundos de gracia)
+        pending = list(self._executions.values())
+        if pending:
+            _, still_running = await asyncio.wait(pending, timeout=30)
+            for execution in still_running:
+                execution.cancel()
+            if still_running:
+                await asyncio.gather(*still_running, return_exceptions=True)
 
-        except Exception as e:
-            logger.error(f"Error submitting task {task.task_id}: {e}")
-            return False
+        self.status = WorkerStatus.OFFLINE
+        logger.info(f"Worker {self.metadata.worker_id} stopped")
+
+    def can_accept(self, task_type: str) -> bool:
+        """Verifica si el worker puede tomar una tarea de este tipo ahora"""
+        return (
+            self.running
+            and self.status in (WorkerStatus.IDLE, WorkerStatus.BUSY)
+            and task_type in self.task_handlers
+            and len(self.current_tasks) < self.metadata.max_concurrent_tasks
+        )
+
+    def _assign_task(self, task: Task, execution: asyncio.Task) -> None:
+        task.worker_metadata = self.metadata
+        task.assigned_worker_id = self.metadata.worker_id
+        self.current_tasks[task.task_id] = task
+        self._executions[task.task_id] = execution
+        self.status = WorkerStatus.BUSY
+        self.metadata.last_heartbeat = datetime.utcnow()
+
+    def _release_task(self, task: Task) -> None:
+        self.current_tasks.pop(task.task_id, None)
+        self._executions.pop(task.task_id, None)
+        if not self.current_tasks and self.running:
+            self.status = WorkerStatus.IDLE
+        self.metadata.last_heartbeat = datetime.utcnow()
 
-    def _assign_task(self, task: Task) -> bool:
-        """Asigna una tarea para procesamiento inmediato"""
-        try:
-            if len(self.current_tasks) >= self.metadata.max_concurrent_tasks:
-                return False
+    async def _process_task(self, task: Task, offload: Optional[Callable] = None) -> Dict[str, Any]:
+        """
+        Procesa una tarea individual.
 
-            # Verificar si el worker puede manejar este tipo de tarea
-            if task.task_type not in self.task_handlers:
-                logger.warning(f"Worker {self.metadata.worker_id} cannot handle task type {task.task_type}")
-                return False
-
-            # Asignar tarea
-            task.worker_metadata = self.metadata
-            self.current_tasks[task.task_id] = task
-            self.status = WorkerStatus.BUSY
+        ``offload(handler, task_data)`` ejecuta handlers bloqueantes en el pool
+        de threads/procesos; los handlers async reciben ``(task, update_progress)``.
+        """
+        start_time = time.time()
+        logger.info(f"Processing task {task.task_id} of type {task.task_type}")
 
-            # Procesar en background
-            threading.Thread(
-                target=self._process_task_sync,
-                args=(task,),
-                daemon=True
-            ).start()
+        task.progress.current_step = "Initializing"
+        task.progress.percentage = 0.0
+        task.progress.last_updated = datetime.utcnow()
 
-            logger.info(f"Assigned task {task.task_id} to worker {self.metadata.worker_id}")
-            return True
+        handler = self.task_handlers.get(task.task_type)
+        if not handler:
+            raise ValueError(f"No handler for task type {task.task_type}")
 
-        except Exception as e:
-            logger.error(f"Error assigning task {task.task_id}: {e}")
-            return False
+        if offload is not None:
+            work = offload(handler, task.task_data)
+        else:
+            work = handler(task, self._update_progress)
 
-    def _processing_loop(self):
-        """Loop principal de procesamiento"""
-        while self.running and not self.shutdown_event.is_set():
-            try:
-                # Verificar si hay capacidad para más tareas
-                if len(self.current_tasks) < self.metadata.max_concurrent_tasks:
-                    # Intentar tomar tarea de la cola
-                    task = self.task_queue.dequeue(timeout=1.0)
-                    if task:
-                        self._assign_task(task)
-
-                # Actualizar estado
-                if not self.current_tasks:
-                    self.status = WorkerStatus.IDLE
-                else:
-                    self.status = WorkerStatus.BUSY
-
-                time.sleep(0.1)  # Pequeña pausa para evitar CPU spinning
-
-            except Exception as e:
-                logger.error(f"Error in processing loop: {e}")
-                time.sleep(1)
-
-    def _process_task_sync(self, task: Task):
-        """Procesa una tarea de manera síncrona (wrapper para async)"""
         try:
-            # Crear nuevo event loop para este thread
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-
-            try:
-                loop.run_until_complete(self._process_task(task))
-            finally:
-                loop.close()
-
+            result = await asyncio.wait_for(work, timeout=task.timeout_seconds)
+        except asyncio.TimeoutError:
+            self.tasks_failed += 1
+            await self._handle_task_timeout(task)
+            raise
+        except asyncio.CancelledError:
+            await self._cancel_task(task.task_id)
+            raise
         except Exception as e:
-            logger.error(f"Error in sync task processing: {e}")
             self._handle_task_error(task, e)
+            raise
 
-    async def _process_task(self, task: Task):
-        """Procesa una tarea individual"""
-        start_time = time.time()
-
-        try:
-            logger.info(f"Processing task {task.task_id} of type {task.task_type}")
-
-            # Actualizar progreso inicial
-            task.progress.current_step = "Initializing"
-            task.progress.percentage = 0.0
-            task.progress.last_updated = datetime.utcnow()
-
-            # Obtener handler para el tipo de tarea
-            handler = self.task_handlers.get(task.task_type)
-            if not handler:
-                raise ValueError(f"No handler for task type {task.task_type}")
-
-            # Configurar timeout
-            try:
-                result = await asyncio.wait_for(
-                    handler(task, self._update_progress),
-                    timeout=task.timeout_seconds
-                )
-
-                # Tarea completada exitosamente
-                task.progress.percentage = 100.0
-                task.progress.current_step = "Completed"
-                task.progress.completed_steps = task.progress.total_steps
-                task.progress.last_updated = datetime.utcnow()
-
-                # Actualizar estadísticas
-                processing_time = time.time() - start_time
-                self.tasks_completed += 1
-                self.total_processing_time += processing_time
-                self.last_activity = datetime.utcnow()
-
-                logger.info(f"Task {task.task_id} completed in {processing_time:.2f}s")
-
-                # Notificar al sistema de resultados
-                await self._notify_task_completion(task, result)
-
-            except asyncio.TimeoutError:
-                logger.warning(f"Task {task.task_id} timed out after {task.timeout_seconds}s")
-                await self._handle_task_timeout(task)
+        task.progress.percentage = 100.0
+        task.progress.current_step = "Completed"
+        task.progress.completed_steps = task.progress.total_steps
+        task.progress.last_updated = datetime.utcnow()
 
-        except Exception as e:
-            logger.error(f"Error processing task {task.task_id}: {e}")
-            self._handle_task_error(task, e)
+        processing_time = time.time() - start_time
+        self.tasks_completed += 1
+        self.total_processing_time += processing_time
+        self.last_activity = datetime.utcnow()
 
-        finally:
-            # Remover tarea de las actuales
-            self.current_tasks.pop(task.task_id, None)
+        logger.info(f"Task {task.task_id} completed in {processing_time:.2f}s")
+        await self._notify_task_completion(task, result or {})
+        return result
 
     async def _update_progress(self, task_id: str, progress_data: Dict[str, Any]):
         """Actualiza el progreso de una tarea"""
@@ -451,52 +404,28 @@ class Worker:
 
     async def _handle_task_timeout(self, task: Task):
         """Maneja timeout de tarea"""
-        try:
-            task.progress.current_step = "Timed out"
-            task.progress.last_updated = datetime.utcnow()
-
-            logger.warning(f"Task {task.task_id} timed out")
-
-        except Exception as e:
-            logger.error(f"Error handling task timeout: {e}")
+        task.progress.current_step = "Timed out"
+        task.progress.last_updated = datetime.utcnow()
+        logger.warning(f"Task {task.task_id} timed out after {task.timeout_seconds}s")
 
     async def _cancel_task(self, task_id: str):
-        """Cancela una tarea"""
-        try:
-            task = self.current_tasks.get(task_id)
-            if task:
-                task.progress.current_step = "Cancelled"
-                task.progress.last_updated = datetime.utcnow()
-                logger.info(f"Task {task_id} cancelled")
-
-        except Exception as e:
-            logger.error(f"Error cancelling task {task_id}: {e}")
+        """Marca una tarea como cancelada"""
+        task = self.current_tasks.get(task_id)
+        if task:
+            task.progress.current_step = "Cancelled"
+            task.progress.last_updated = datetime.utcnow()
+            logger.info(f"Task {task_id} cancelled")
 
     async def _notify_task_completion(self, task: Task, result: Dict[str, Any]):
         """Notifica la finalización de una tarea"""
         try:
             # Aquí se podría integrar con el sistema de notificaciones
-            logger.info(f"Task {task.task_id} completed with result keys: {list(result.keys())}")
+            keys = list(result.keys()) if isinstance(result, dict) else type(result).__name__
+            logger.info(f"Task {task.task_id} completed with result keys: {keys}")
 
         except Exception as e:
             logger.error(f"Error notifying task completion: {e}")
 
-    def _heartbeat_loop(self):
-        """Loop de heartbeat para mantener el worker vivo"""
-        while self.running and not self.shutdown_event.is_set():
-            try:
-                self.metadata.last_heartbeat = datetime.utcnow()
-
-                # Aquí se podría registrar el heartbeat en la base de datos
-                logger.debug(f"Worker {self.metadata.worker_id} heartbeat")
-
-                # Esperar hasta el próximo heartbeat
-                self.shutdown_event.wait(self.metadata.heartbeat_interval)
-
-            except Exception as e:
-                logger.error(f"Error in heartbeat loop: {e}")
-                time.sleep(self.metadata.heartbeat_interval)
-
     def get_status(self) -> Dict[str, Any]:
         """Obtiene el estado actual del worker"""
         return {
@@ -506,7 +435,6 @@ class Worker:
             'status': self.status.value,
             'current_tasks': len(self.current_tasks),
             'max_concurrent_tasks': self.metadata.max_concurrent_tasks,
-            'queue_size': self.task_queue.get_size(),
             'tasks_completed': self.tasks_completed,
             'tasks_failed': self.tasks_failed,
             'success_rate': (self.tasks_completed / max(1, self.tasks_completed + self.tasks_failed)) * 100,
@@ -518,20 +446,63 @@ class Worker:
             'cpu_percent': psutil.Process().cpu_percent()
         }
 
-class WorkerPool:
-    """Pool de workers para procesamiento distribuido"""
+@dataclass
+class TaskTypeSpec:
+    """Configuración de ejecución de un tipo de tarea"""
+    max_concurrency: Optional[int] = None  # None = solo limita la capacidad de los workers
+    blocking: bool = False                  # handler(task_data) síncrono, se ejecuta fuera del loop
+    use_process: bool = False               # con blocking: pool de procesos (handler picklable)
+
+class _PriorityMetrics:
+    __slots__ = ("queued", "waits", "runs", "completed", "failed")
+
+    def __init__(self):
+        self.queued = 0
+        self.waits = deque(maxlen=1024)
+        self.runs = deque(maxlen=1024)
+        self.completed = 0
+        self.failed = 0
 
-    def __init__(self, db_path: str = "unified_mcp_system.db"):
+class WorkerPool:
+    """
+    Pool de workers con scheduler asyncio.
+
+    El despacho se dispara por eventos (nueva tarea, tarea terminada, worker
+    registrado, tarea programada que vence): no hay polling ni threads de
+    scheduler. Las tareas corren como ``asyncio.Task`` en el loop del pool.
+    """
+
+    def __init__(self, db_path: str = "unified_mcp_system.db",
+                 blocking_threads: int = WORKER_BLOCKING_THREADS,
+                 process_pool_size: int = WORKER_PROCESS_POOL_SIZE,
+                 task_history: int = WORKER_TASK_HISTORY):
         self.db_path = db_path
         self.workers = {}  # worker_id -> worker
         self.task_queue = TaskQueue(max_size=50000)
         self.scheduler_running = False
-        self.scheduler_thread = None
-        self.shutdown_event = threading.Event()
+
+        self.task_specs: Dict[str, TaskTypeSpec] = {}
+        self.running_by_type: Dict[str, int] = {}
+        self.tasks: "OrderedDict[str, Task]" = OrderedDict()  # activas y recientes
+        self.task_history = task_history
+        self._scheduled: Dict[str, asyncio.TimerHandle] = {}
+        self._waiters: Dict[str, List[asyncio.Future]] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+        self.blocking_threads = blocking_threads
+        self.process_pool_size = process_pool_size
+        self._thread_pool: Optional[ThreadPoolExecutor] = None
+        self._process_pool: Optional[ProcessPoolExecutor] = None
+
+        self.priority_metrics = {priority: _PriorityMetrics() for priority in TaskPriority}
 
         # Load balancer
         self.round_robin_index = 0
 
+    def configure_task_type(self, task_type: str, spec: TaskTypeSpec) -> None:
+        self.task_specs[task_type] = spec
+        self._dispatch()
+
     async def register_worker(self, worker: Worker) -> bool:
         """Registra un worker en el pool"""
         try:
@@ -546,6 +517,7 @@ class WorkerPool:
             await self._save_worker_registration(worker.metadata)
 
             logger.info(f"Registered worker {worker.metadata.worker_id}")
+            self._dispatch()
             return True
 
         except Exception as e:
@@ -575,134 +547,218 @@ class WorkerPool:
     async def submit_task(self, task: Task) -> bool:
         """Envía una tarea al pool para procesamiento"""
         try:
+            self._bind_loop()
+
             # Guardar tarea en BD
             await self._save_task(task)
 
-            # Buscar worker disponible para el tipo de tarea
-            suitable_worker = self._find_suitable_worker(task)
-
-            if suitable_worker:
-                # Enviar directamente al worker
-                if suitable_worker.submit_task(task):
-                    await self._update_task_status(task.task_id, TaskStatus.ASSIGNED, suitable_worker.metadata.worker_id)
-                    return True
+            self.tasks[task.task_id] = task
+            self._trim_history()
 
-            # Si no hay worker disponible, encolar
-            if self.task_queue.enqueue(task):
-                await self._update_task_status(task.task_id, TaskStatus.QUEUED)
+            delay = (task.scheduled_for - datetime.utcnow()).total_seconds() if task.scheduled_for else 0
+            if delay > 0:
+                self._scheduled[task.task_id] = self._loop.call_later(delay, self._release_scheduled, task)
+                self._set_status(task, TaskStatus.PENDING)
                 return True
 
-            return False
+            if not self._enqueue(task):
+                self.tasks.pop(task.task_id, None)
+                return False
+
+            self._dispatch()
+            return True
 
         except Exception as e:
             logger.error(f"Error submitting task {task.task_id}: {e}")
             return False
 
-    def _find_suitable_worker(self, task: Task) -> Optional[Worker]:
-        """Encuentra el worker más adecuado para una tarea"""
-        try:
-            suitable_workers = []
+    def _bind_loop(self) -> None:
+        loop = asyncio.get_running_loop()
+        if self._loop is loop:
+            return
+        if self._loop is not None and not self._loop.is_closed() and self._loop.is_running():
+            raise RuntimeError("WorkerPool ya está ligado a otro event loop en ejecución")
+        # Loop anterior cerrado (p.ej. asyncio.run en scripts): las tareas programadas se reencolan
+        self._loop = loop
+        for task_id in list(self._scheduled):
+            task = self.tasks.get(task_id)
+            self._scheduled.pop(task_id)
+            if task is not None:
+                self._enqueue(task)
+
+    def _enqueue(self, task: Task) -> bool:
+        if not self.task_queue.enqueue(task):
+            logger.warning(f"Task queue full; rejected task {task.task_id}")
+            return False
+        task.enqueued_at = time.monotonic()
+        self.priority_metrics[task.priority].queued += 1
+        self._set_status(task, TaskStatus.QUEUED)
+        return True
+
+    def _release_scheduled(self, task: Task) -> None:
+        if self._scheduled.pop(task.task_id, None) is not None and self._enqueue(task):
+            self._dispatch()
+
+    def _trim_history(self) -> None:
+        """Descarta las tareas terminadas más antiguas"""
+        excess = len(self.tasks) - self.task_history
+        if excess <= 0:
+            return
+        finished = {TaskStatus.COMPLETED, TaskStatus.FAILED, TaskStatus.CANCELLED, TaskStatus.TIMEOUT}
+        for task_id in [tid for tid, t in self.tasks.items() if t.status in finished][:excess]:
+            del self.tasks[task_id]
 
-            for worker in self.workers.values():
-                # Verificar capacidades
-                if task.task_type not in worker.task_handlers:
-                    continue
+    def _type_has_capacity(self, task_type: str) -> bool:
+        spec = self.task_specs.get(task_type)
+        if spec is None or spec.max_concurrency is None:
+            return True
+        return self.running_by_type.get(task_type, 0) < spec.max_concurrency
 
-                # Verificar estado
-                if worker.status not in [WorkerStatus.IDLE, WorkerStatus.BUSY]:
+    def _dispatch(self) -> None:
+        """Asigna tareas encoladas mientras haya capacidad (tipo y worker)"""
+        if not self.scheduler_running or self._loop is None:
+            return
+        while True:
+            best = None
+            for task_type in self.task_queue.task_types():
+                if not self._type_has_capacity(task_type):
                     continue
-
-                # Verificar capacidad
-                if len(worker.current_tasks) >= worker.metadata.max_concurrent_tasks:
+                head = self.task_queue.head(task_type)
+                if head is None or (best is not None and head >= best[0]):
                     continue
+                worker = self._find_suitable_worker(task_type)
+                if worker is not None:
+                    best = (head, task_type, worker)
+            if best is None:
+                return
+            _, task_type, worker = best
+            self._start_task(self.task_queue.dequeue(task_type), worker)
 
-                suitable_workers.append(worker)
-
-            if not suitable_workers:
-                return None
-
-            # Estrategia de load balancing: round robin entre workers disponibles
-            if len(suitable_workers) == 1:
-                return suitable_workers[0]
-
-            # Round robin
-            self.round_robin_index = (self.round_robin_index + 1) % len(suitable_workers)
-            return suitable_workers[self.round_robin_index]
+    def _find_suitable_worker(self, task_type: str) -> Optional[Worker]:
+        """Encuentra el worker más adecuado para un tipo de tarea"""
+        suitable_workers = [w for w in self.workers.values() if w.can_accept(task_type)]
+        if not suitable_workers:
+            return None
 
+        # Estrategia de load balancing: round robin entre workers disponibles
+        if len(suitable_workers) == 1:
+            return suitable_workers[0]
+
+        self.round_robin_index = (self.round_robin_index + 1) % len(suitable_workers)
+        return suitable_workers[self.round_robin_index]
+
+    def _start_task(self, task: Task, worker: Worker) -> None:
+        metrics = self.priority_metrics[task.priority]
+        metrics.queued -= 1
+        task.started_at = time.monotonic()
+        metrics.waits.append(task.started_at - (task.enqueued_at or task.started_at))
+        self.running_by_type[task.task_type] = self.running_by_type.get(task.task_type, 0) + 1
+
+        execution = self._loop.create_task(self._run_task(task, worker))
+        worker._assign_task(task, execution)
+        self._set_status(task, TaskStatus.RUNNING)
+        logger.info(f"Assigned task {task.task_id} to worker {worker.metadata.worker_id}")
+
+    async def _run_task(self, task: Task, worker: Worker) -> None:
+        spec = self.task_specs.get(task.task_type)
+        offload = None
+        if spec is not None and spec.blocking:
+            offload = lambda handler, data: self.run_blocking(handler, data, process=spec.use_process)
+
+        metrics = self.priority_metrics[task.priority]
+        status = TaskStatus.COMPLETED
+        try:
+            task.result = await worker._process_task(task, offload)
+            metrics.completed += 1
+        except asyncio.TimeoutError:
+            status = TaskStatus.TIMEOUT
+            task.error = f"Timed out after {task.timeout_seconds}s"
+            metrics.failed += 1
+        except asyncio.CancelledError:
+            status = TaskStatus.CANCELLED
+            metrics.failed += 1
+            raise
         except Exception as e:
-            logger.error(f"Error finding suitable worker: {e}")
-            return None
+            status = TaskStatus.FAILED
+            task.error = str(e)
+            metrics.failed += 1
+        finally:
+            task.finished_at = time.monotonic()
+            metrics.runs.append(task.finished_at - task.started_at)
+            self.running_by_type[task.task_type] -= 1
+            worker._release_task(task)
+            self._set_status(task, status)
+            self._resolve_waiters(task)
+            if status is not TaskStatus.CANCELLED:
+                self._dispatch()
+
+        await self._update_task_status(task.task_id, status, worker.metadata.worker_id, task.progress)
+
+    def _set_status(self, task: Task, status: TaskStatus) -> None:
+        task.status = status
+        task.updated_at = datetime.utcnow()
+
+    def _resolve_waiters(self, task: Task) -> None:
+        for waiter in self._waiters.pop(task.task_id, []):
+            if not waiter.done():
+                waiter.set_result(task)
+
+    async def wait_for_task(self, task_id: str, timeout: Optional[float] = None) -> Optional[Task]:
+        """Espera a que una tarea termine y la devuelve (None si no existe)"""
+        task = self.tasks.get(task_id)
+        if task is None or task.finished_at is not None:
+            return task
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.setdefault(task_id, []).append(waiter)
+        return await asyncio.wait_for(waiter, timeout)
+
+    async def run_blocking(self, func: Callable, *args, process: bool = False) -> Any:
+        """Ejecuta código bloqueante en el pool acotado de threads o procesos"""
+        if process:
+            if self._process_pool is None:
+                self._process_pool = ProcessPoolExecutor(max_workers=self.process_pool_size)
+            executor = self._process_pool
+        else:
+            if self._thread_pool is None:
+                self._thread_pool = ThreadPoolExecutor(
+                    max_workers=self.blocking_threads, thread_name_prefix="worker-blocking"
+                )
+            executor = self._thread_pool
+        return await asyncio.get_running_loop().run_in_executor(executor, func, *args)
 
     async def start_scheduler(self):
         """Inicia el scheduler de tareas"""
-        try:
-            if self.scheduler_running:
-                return
-
-            self.scheduler_running = True
-            self.scheduler_thread = threading.Thread(target=self._scheduler_loop, daemon=True)
-            self.scheduler_thread.start()
-
-            logger.info("Task scheduler started")
-
-        except Exception as e:
-            logger.error(f"Error starting scheduler: {e}")
+        if self.scheduler_running:
+            return
+        self._bind_loop()
+        self.scheduler_running = True
+        logger.info("Task scheduler started")
+        self._dispatch()
 
     async def stop_scheduler(self):
         """Detiene el scheduler de tareas"""
-        try:
-            self.scheduler_running = False
-            self.shutdown_event.set()
-
-            if self.scheduler_thread:
-                self.scheduler_thread.join(timeout=10)
-
-            logger.info("Task scheduler stopped")
-
-        except Exception as e:
-            logger.error(f"Error stopping scheduler: {e}")
-
-    def _scheduler_loop(self):
-        """Loop principal del scheduler"""
-        while self.scheduler_running and not self.shutdown_event.is_set():
-            try:
-                # Intentar asignar tareas de la cola
-                task = self.task_queue.dequeue(timeout=1.0)
-                if task:
-                    worker = self._find_suitable_worker(task)
-                    if worker:
-                        if worker.submit_task(task):
-                            asyncio.run(self._update_task_status(task.task_id, TaskStatus.ASSIGNED, worker.metadata.worker_id))
-                        else:
-                            # Re-encolar si no se pudo asignar
-                            self.task_queue.enqueue(task)
-
-                # Limpiar workers inactivos
-                self._cleanup_inactive_workers()
-
-            except Exception as e:
-                logger.error(f"Error in scheduler loop: {e}")
-                time.sleep(1)
-
-    def _cleanup_inactive_workers(self):
-        """Limpia workers inactivos"""
-        try:
-            current_time = datetime.utcnow()
-            inactive_workers = []
-
-            for worker_id, worker in self.workers.items():
-                if worker.metadata.last_heartbeat:
-                    time_since_heartbeat = current_time - worker.metadata.last_heartbeat
-                    if time_since_heartbeat > timedelta(seconds=worker.metadata.heartbeat_interval * 3):
-                        inactive_workers.append(worker_id)
-
-            # Remover workers inactivos
-            for worker_id in inactive_workers:
-                logger.warning(f"Removing inactive worker {worker_id}")
-                asyncio.run(self.unregister_worker(worker_id))
-
-        except Exception as e:
-            logger.error(f"Error cleaning up inactive workers: {e}")
+        self.scheduler_running = False
+        for handle in self._scheduled.values():
+            handle.cancel()
+        self._scheduled.clear()
+        for executor in (self._thread_pool, self._process_pool):
+            if executor is not None:
+                executor.shutdown(wait=False)
+        self._thread_pool = self._process_pool = None
+        logger.info("Task scheduler stopped")
+
+    def get_priority_metrics(self) -> Dict[str, Any]:
+        """Profundidad de cola, espera y ejecución por prioridad"""
+        return {
+            priority.name: {
+                'queue_depth': metrics.queued,
+                'completed': metrics.completed,
+                'failed': metrics.failed,
+                'wait_time_ms': _latency_summary(metrics.waits),
+                'run_time_ms': _latency_summary(metrics.runs),
+            }
+            for priority, metrics in self.priority_metrics.items()
+        }
 
     async def get_pool_status(self) -> Dict[str, Any]:
         """Obtiene el estado del pool"""
@@ -723,6 +779,9 @@ class WorkerPool:
                 'total_capacity': total_capacity,
                 'utilization_percentage': (total_tasks / max(1, total_capacity)) * 100,
                 'queue_size': self.task_queue.get_size(),
+                'scheduled_tasks': len(self._scheduled),
+                'running_by_type': {t: n for t, n in self.running_by_type.items() if n},
+                'priority_metrics': self.get_priority_metrics(),
                 'scheduler_running': self.scheduler_running,
                 'workers': [w.get_status() for w in self.workers.values()]
             }
@@ -777,25 +836,9 @@ class WorkerPool:
                     ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
                 """, (
                     task.task_id, task.task_type, json.dumps(task.task_data),
-                    task.priority.value, json.dumps({  # ✅ CAMPO FALTANTE
-                        'max_attempts': task.retry_policy.max_attempts,
-                        'initial_delay_seconds': task.retry_policy.initial_delay_seconds,
-                        'max_delay_seconds': task.retry_policy.max_delay_seconds,
-                        'backoff_multiplier': task.retry_policy.backoff_multiplier,
-                        'retry_on_timeout': task.retry_policy.retry_on_timeout,
-                        'retry_on_error': task.retry_policy.retry_on_error,
-                        'retry_error_patterns': task.retry_policy.retry_error_patterns
-                    }),
+                    task.priority.value, json.dumps(_retry_policy_dict(task.retry_policy)),  # ✅ CAMPO FALTANTE
                     task.timeout_seconds, TaskStatus.PENDING.value,
-                    json.dumps({  # ✅ CAMPO FALTANTE
-                        'percentage': task.progress.percentage,
-                        'current_step': task.progress.current_step,
-                        'total_steps': task.progress.total_steps,
-                        'completed_steps': task.progress.completed_steps,
-                        'estimated_remaining_seconds': task.progress.estimated_remaining_seconds,
-                        'details': task.progress.details,
-                        'last_updated': task.progress.last_updated.isoformat()
-                    }),
+                    json.dumps(_progress_dict(task.progress)),  # ✅ CAMPO FALTANTE
                     task.created_at, task.scheduled_for,
                     json.dumps(task.depends_on), json.dumps(task.tags)
                 ))
@@ -804,23 +847,20 @@ class WorkerPool:
         except Exception as e:
             logger.error(f"Error saving task: {e}")
 
-    async def _update_task_status(self, task_id: str, status: TaskStatus, worker_id: str = None):
-        """Actualiza estado de tarea"""
+    async def _update_task_status(self, task_id: str, status: TaskStatus, worker_id: str = None,
+                                  progress: Optional[TaskProgress] = None):
+        """Actualiza estado final de tarea en BD"""
         try:
             async with self._get_db_connection() as conn:
                 cursor = conn.cursor()
-                if worker_id:
-                    cursor.execute("""
-                        UPDATE worker_tasks
-                        SET status = ?, assigned_worker_id = ?, updated_at = ?
-                        WHERE task_id = ?
-                    """, (status.value, worker_id, datetime.utcnow(), task_id))
-                else:
-                    cursor.execute("""
-                        UPDATE worker_tasks
-                        SET status = ?, updated_at = ?
-                        WHERE task_id = ?
-                    """, (status.value, datetime.utcnow(), task_id))
+                cursor.execute("""
+                    UPDATE worker_tasks
+                    SET status = ?, assigned_worker_id = COALESCE(?, assigned_worker_id),
+                        progress = COALESCE(?, progress), updated_at = ?
+                    WHERE task_id = ?
+                """, (status.value, worker_id,
+                      json.dumps(_progress_dict(progress)) if progress else None,
+                      datetime.utcnow(), task_id))
                 conn.commit()
 
         except Exception as e:
@@ -901,9 +941,21 @@ class WorkerSystem:
         except Exception as e:
             logger.error(f"Error stopping worker system: {e}")
 
-    def register_task_type(self, task_type: str, handler: Callable):
-        """Registra un tipo de tarea y su handler"""
+    def register_task_type(self, task_type: str, handler: Callable, *,
+                           max_concurrency: Optional[int] = None,
+                           blocking: bool = False, use_process: bool = False):
+        """
+        Registra un tipo de tarea y su handler.
+
+        Handlers async reciben ``(task, update_progress)``. Con ``blocking=True``
+        el handler es síncrono, recibe ``task_data`` y corre en el pool de threads
+        (o de procesos con ``use_process=True``). ``max_concurrency`` limita las
+        tareas de este tipo en ejecución en todo el pool.
+        """
         self.task_types[task_type] = handler
+        self.worker_pool.configure_task_type(
+            task_type, TaskTypeSpec(max_concurrency=max_concurrency, blocking=blocking, use_process=use_process)
+        )
         logger.info(f"Registered task type: {task_type}")
 
     async def create_worker(self, worker_config: Dict[str, Any]) -> str:
@@ -942,7 +994,9 @@ class WorkerSystem:
     async def submit_task(self, task_type: str, task_data: Dict[str, Any],
                          priority: TaskPriority = TaskPriority.NORMAL,
                          timeout_seconds: int = 3600,
-                         retry_policy: Optional[RetryPolicy] = None) -> str:
+                         retry_policy: Optional[RetryPolicy] = None,
+                         deadline: Optional[datetime] = None,
+                         scheduled_for: Optional[datetime] = None) -> str:
         """Envía una tarea para procesamiento"""
         try:
             task_id = str(uuid.uuid4())
@@ -957,7 +1011,9 @@ class WorkerSystem:
                 priority=priority,
                 retry_policy=retry_policy,
                 timeout_seconds=timeout_seconds,
-                created_at=datetime.utcnow()
+                created_at=datetime.utcnow(),
+                scheduled_for=scheduled_for,
+                deadline=deadline
             )
 
             success = await self.worker_pool.submit_task(task)
@@ -970,8 +1026,30 @@ class WorkerSystem:
             logger.error(f"Error submitting task: {e}")
             raise
 
+    async def wait_for_task(self, task_id: str, timeout: Optional[float] = None) -> Dict[str, Any]:
+        """Espera a que una tarea termine y devuelve su estado"""
+        await self.worker_pool.wait_for_task(task_id, timeout)
+        return await self.get_task_status(task_id)
+
+    async def run_blocking(self, func: Callable, *args, process: bool = False) -> Any:
+        """Ejecuta código bloqueante desde un handler async sin frenar el loop"""
+        return await self.worker_pool.run_blocking(func, *args, process=process)
+
     async def get_task_status(self, task_id: str) -> Dict[str, Any]:
         """Obtiene el estado de una tarea"""
+        task = self.worker_pool.tasks.get(task_id)
+        if task is not None:
+            return {
+                'task_id': task.task_id,
+                'task_type': task.task_type,
+                'status': task.status.value,
+                'progress': _progress_dict(task.progress),
+                'retry_policy': _retry_policy_dict(task.retry_policy),
+                'assigned_worker_id': task.assigned_worker_id,
+                'created_at': task.created_at.isoformat(),
+                'updated_at': (task.updated_at or task.created_at).isoformat()
+            }
+
         try:
             async with self.worker_pool._get_db_connection() as conn:
                 cursor = conn.cursor()
@@ -1018,4 +1096,4 @@ class WorkerSystem:
             return {'error': str(e)}
 
 # Instancia singleton
-worker_system = WorkerSystem()
\ No newline at end of file
+worker_system = WorkerSystem()
@@ -251,6 +251,14 @@ async def lifespan(app: FastAPI):
             print(f"[LIFESPAN] ❌ Failed to start scheduler: {scheduler_exc}")
             logger.warning(f"Failed to start SAT Sync Scheduler: {scheduler_exc}")
 
+        # Start CPG rollups refresh (cron base de los rollups de ventas)
+        try:
+            from core.verticals.cpg_retail.rollup_scheduler import start_rollup_scheduler
+            if await start_rollup_scheduler():
+                logger.info("CPG Rollup Scheduler started")
+        except Exception as scheduler_exc:
+            logger.warning(f"Failed to start CPG Rollup Scheduler: {scheduler_exc}")
+
         yield
 
         # Shutdown: Stop SAT sync scheduler
@@ -261,6 +269,20 @@ async def lifespan(app: FastAPI):
         except Exception as scheduler_exc:
             logger.warning(f"Failed to stop SAT Sync Scheduler: {scheduler_exc}")
 
+        try:
+            from core.verticals.cpg_retail.rollup_scheduler import stop_rollup_scheduler
+            await stop_rollup_scheduler()
+            logger.info("CPG Rollup Scheduler stopped")
+        except Exception as scheduler_exc:
+            logger.warning(f"Failed to stop CPG Rollup Scheduler: {scheduler_exc}")
+
+        try:
+            from core.playwright_browser_pool import close_browser_pool
+            await close_browser_pool()
+            logger.info("Playwright browser pool closed")
+        except Exception as pool_exc:
+            logger.warning(f"Failed to close Playwright browser pool: {pool_exc}")
+
     except Exception as exc:  # pragma: no cover - defensive logging
         logger.exception("Error initialising internal database: %s", exc)
         raise
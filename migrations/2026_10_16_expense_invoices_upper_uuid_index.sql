@@ -0,0 +1,10 @@
+-- Migration: Bulk UUID dedup lookups
+-- Date: 2026-10-16
+-- Description: Expression index for BulkInvoiceProcessor.find_existing_uuids,
+--              which compares UPPER(uuid) because stored UUIDs keep the case
+--              they arrived with. Without it every chunk of a SAT package
+--              scans the company's invoices.
+
+CREATE INDEX IF NOT EXISTS idx_expense_invoices_company_upper_uuid
+ON expense_invoices(company_id, UPPER(uuid))
+WHERE uuid IS NOT NULL;
@@ -0,0 +1,30 @@
+-- Migration: Concurrent invoicing worker support
+-- Date: 2026-10-16
+-- Description: Index for atomic batch claims (FOR UPDATE SKIP LOCKED) and a
+--              NOTIFY trigger so workers wake as soon as a job is inserted
+--              instead of waiting for the next poll.
+
+-- Jobs reclamables: pendientes por antigüedad y running sin heartbeat (updated_at) reciente,
+-- es decir, de workers caídos
+CREATE INDEX IF NOT EXISTS idx_jobs_claim_pending
+ON invoice_automation_jobs(tenant_id, created_at)
+WHERE status = 'pending';
+
+CREATE INDEX IF NOT EXISTS idx_jobs_claim_running
+ON invoice_automation_jobs(tenant_id, updated_at)
+WHERE status = 'running';
+
+-- Payload: tenant_id del job, para que cada worker ignore otros tenants
+CREATE OR REPLACE FUNCTION notify_invoicing_job() RETURNS trigger AS $$
+BEGIN
+    IF NEW.status = 'pending' AND (TG_OP = 'INSERT' OR OLD.status IS DISTINCT FROM 'pending') THEN
+        PERFORM pg_notify('invoicing_jobs', NEW.tenant_id::text);
+    END IF;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_notify_invoicing_job ON invoice_automation_jobs;
+CREATE TRIGGER trg_notify_invoicing_job
+AFTER INSERT OR UPDATE OF status ON invoice_automation_jobs
+FOR EACH ROW EXECUTE FUNCTION notify_invoicing_job();
@@ -0,0 +1,43 @@
+-- Migration: Report data versions for bank_movements
+-- Date: 2026-10-16
+-- Description: Version counter per (tenant_id, account_id) kept up to date by
+--              triggers on bank_movements. FinancialReportsEngine uses it as part
+--              of its report cache key and skips the cache while these triggers
+--              are missing.
+
+CREATE TABLE IF NOT EXISTS bank_movement_data_versions (
+    tenant_id INTEGER NOT NULL,
+    account_id INTEGER NOT NULL,
+    version INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (tenant_id, account_id)
+);
+
+CREATE TRIGGER IF NOT EXISTS trg_bank_movement_version_insert
+AFTER INSERT ON bank_movements
+BEGIN
+    INSERT INTO bank_movement_data_versions (tenant_id, account_id, version)
+    VALUES (COALESCE(NEW.tenant_id, -1), COALESCE(NEW.account_id, -1), 1)
+    ON CONFLICT (tenant_id, account_id) DO UPDATE SET version = version + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_bank_movement_version_update
+AFTER UPDATE ON bank_movements
+BEGIN
+    INSERT INTO bank_movement_data_versions (tenant_id, account_id, version)
+    VALUES (COALESCE(OLD.tenant_id, -1), COALESCE(OLD.account_id, -1), 1)
+    ON CONFLICT (tenant_id, account_id) DO UPDATE SET version = version + 1;
+    INSERT INTO bank_movement_data_versions (tenant_id, account_id, version)
+    VALUES (COALESCE(NEW.tenant_id, -1), COALESCE(NEW.account_id, -1), 1)
+    ON CONFLICT (tenant_id, account_id) DO UPDATE SET version = version + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_bank_movement_version_delete
+AFTER DELETE ON bank_movements
+BEGIN
+    INSERT INTO bank_movement_data_versions (tenant_id, account_id, version)
+    VALUES (COALESCE(OLD.tenant_id, -1), COALESCE(OLD.account_id, -1), 1)
+    ON CONFLICT (tenant_id, account_id) DO UPDATE SET version = version + 1;
+END;
+
+CREATE INDEX IF NOT EXISTS idx_bank_movements_account_date
+    ON bank_movements(account_id, date);
@@ -0,0 +1,92 @@
+-- =====================================================
+-- CPG RETAIL VERTICAL: Incremental sales rollups
+-- Migration 005
+-- =====================================================
+-- Adds: sat_invoices.pos_id (extraído de metadata, indexado)
+--       Rollups diarios por POS y por producto
+--       Bitácora de eventos y estado de frescura
+-- Mantenido por core/verticals/cpg_retail/rollups.py
+-- (hooks on_invoice_created / on_reconciliation_match + rebuild_sales)
+-- =====================================================
+
+-- =====================================================
+-- 1. EXTRACTED POS_ID ON INVOICES
+-- =====================================================
+
+ALTER TABLE sat_invoices ADD COLUMN IF NOT EXISTS pos_id INTEGER;
+
+UPDATE sat_invoices
+SET pos_id = (metadata->>'pos_id')::integer
+WHERE pos_id IS NULL AND metadata->>'pos_id' ~ '^[0-9]{1,9}$';
+
+CREATE INDEX IF NOT EXISTS idx_sat_invoices_company_pos_fecha
+    ON sat_invoices(company_id, pos_id, fecha_emision);
+
+-- =====================================================
+-- 2. DAILY ROLLUPS
+-- =====================================================
+
+CREATE TABLE IF NOT EXISTS cpg_pos_sales_daily (
+    company_id VARCHAR(50) NOT NULL,
+    pos_id INTEGER NOT NULL,
+    dia DATE NOT NULL,
+
+    total_facturas INTEGER NOT NULL DEFAULT 0,
+    total_ventas_cents BIGINT NOT NULL DEFAULT 0,
+    facturas_cobradas INTEGER NOT NULL DEFAULT 0,
+    total_cobrado_cents BIGINT NOT NULL DEFAULT 0,
+
+    updated_at TIMESTAMP,
+    PRIMARY KEY (company_id, pos_id, dia)
+);
+
+CREATE TABLE IF NOT EXISTS cpg_product_sales_daily (
+    company_id VARCHAR(50) NOT NULL,
+    pos_id INTEGER NOT NULL,
+    sku VARCHAR(100) NOT NULL,
+    dia DATE NOT NULL,
+
+    unidades DOUBLE PRECISION NOT NULL DEFAULT 0,
+    total_cents BIGINT NOT NULL DEFAULT 0,
+
+    updated_at TIMESTAMP,
+    PRIMARY KEY (company_id, pos_id, sku, dia)
+);
+
+CREATE INDEX IF NOT EXISTS idx_cpg_product_sales_daily_dia
+    ON cpg_product_sales_daily(company_id, dia);
+
+-- =====================================================
+-- 3. EVENT LEDGER + FRESHNESS STATE
+-- =====================================================
+
+-- Un evento por factura ('invoice:<id>') y por cobro ('payment:<id>'):
+-- hace idempotentes los hooks y conserva los cobros para reconstruir
+CREATE TABLE IF NOT EXISTS cpg_rollup_events (
+    event_key VARCHAR(120) PRIMARY KEY,
+    company_id VARCHAR(50) NOT NULL,
+    kind VARCHAR(20) NOT NULL,  -- invoice, payment
+    pos_id INTEGER,
+    dia DATE,
+    amount_cents BIGINT NOT NULL DEFAULT 0,
+    bank_tx_id VARCHAR(64),
+    created_at TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_cpg_rollup_events_company_kind
+    ON cpg_rollup_events(company_id, kind, dia);
+
+CREATE TABLE IF NOT EXISTS cpg_rollup_state (
+    company_id VARCHAR(50) PRIMARY KEY,
+    last_event_at TIMESTAMP,
+    last_rebuild_at TIMESTAMP  -- as-of mostrado en dashboards
+);
+
+-- =====================================================
+-- 4. CONSIGNMENT AGING
+-- =====================================================
+
+CREATE INDEX IF NOT EXISTS idx_cpg_consignment_company_status_entrega
+    ON cpg_consignment(company_id, status, fecha_entrega);
+
+-- Rollups se llenan con rebuild_sales (cron base cada hora / refresh on-demand)
@@ -4,12 +4,18 @@ Migrado de SQLite a PostgreSQL con soporte para UUIDs.
 """
 
 import json
+import logging
 from datetime import datetime
-from typing import Any, Dict, List, Optional, Union, Literal
+from typing import Any, Callable, Dict, List, Optional, Sequence, Union, Literal
 from uuid import UUID
 from pydantic import BaseModel, Field
 from core.shared.db_config import get_connection
 
+logger = logging.getLogger(__name__)
+
+# Canal LISTEN/NOTIFY que dispara el trigger de invoice_automation_jobs
+INVOICING_JOBS_CHANNEL = "invoicing_jobs"
+
 # ===================================================================
 # MODELOS PYDANTIC
 # ===================================================================
@@ -353,10 +359,30 @@ def create_invoicing_job(*, ticket_id: Union[str, UUID], merchant_id: Optional[U
         )
         result = cursor.fetchone()
         conn.commit()
-        return str(result["id"])
     finally:
         cursor.close()
         conn.close()
+    job_id = str(result["id"])
+    _notify_job_listeners(tenant_id, job_id)
+    return job_id
+
+# Listeners en proceso (workers del mismo proceso) para despertar sin esperar el poll
+_job_listeners: List[Callable[[int, str], None]] = []
+
+def add_job_listener(callback: Callable[[int, str], None]) -> None:
+    """Registrar callback(tenant_id, job_id) que se llama al crear un job."""
+    _job_listeners.append(callback)
+
+def remove_job_listener(callback: Callable[[int, str], None]) -> None:
+    if callback in _job_listeners:
+        _job_listeners.remove(callback)
+
+def _notify_job_listeners(tenant_id: int, job_id: str) -> None:
+    for callback in list(_job_listeners):
+        try:
+            callback(tenant_id, job_id)
+        except Exception as e:
+            logger.debug(f"Error notificando job {job_id}: {e}")
 
 def get_invoicing_job(job_id: Union[str, UUID]) -> Optional[Dict[str, Any]]:
     """Obtener job por UUID."""
@@ -413,6 +439,111 @@ def list_pending_jobs(company_id: str = "default", tenant_id: int = 3) -> List[D
         cursor.close()
         conn.close()
 
+def claim_pending_jobs(limit: int, tenant_id: int = 3, *, exclude_merchants: Sequence[str] = (),
+                       exclude_ids: Sequence[str] = (),
+                       stale_after_seconds: int = 900) -> List[Dict[str, Any]]:
+    """
+    Reclamar atómicamente hasta ``limit`` jobs pendientes (status -> running).
+
+    Usa ``FOR UPDATE SKIP LOCKED`` para que varios workers no tomen el mismo job.
+    También recupera jobs en ``running`` cuyo heartbeat (``updated_at``, ver
+    ``touch_running_jobs``) es más viejo que ``stale_after_seconds`` (worker
+    caído). Cada job incluye ``merchant_key`` (merchant del job o del ticket)
+    para limitar concurrencia por comercio; los comercios en
+    ``exclude_merchants`` (ya saturados) y los ids en ``exclude_ids`` (ya en
+    ejecución en este worker) no se reclaman.
+    """
+    if limit <= 0:
+        return []
+    now = datetime.utcnow()
+    conn = get_connection(dict_cursor=True)
+    try:
+        cursor = conn.cursor()
+        cursor.execute(
+            """WITH candidates AS (
+                   SELECT j.id,
+                          COALESCE(j.merchant_id::text, t.merchant_id::text,
+                                   LOWER(NULLIF(t.merchant_name, ''))) AS merchant_key
+                   FROM invoice_automation_jobs j
+                   LEFT JOIN tickets t ON t.id = j.ticket_id
+                   WHERE j.tenant_id = %s
+                   AND ((j.status = 'pending' AND (j.scheduled_at IS NULL OR j.scheduled_at <= %s))
+                        OR (j.status = 'running'
+                            AND j.updated_at < CURRENT_TIMESTAMP - make_interval(secs => %s)))
+                   AND COALESCE(j.merchant_id::text, t.merchant_id::text,
+                                LOWER(NULLIF(t.merchant_name, '')), '') <> ALL(%s)
+                   AND j.id::text <> ALL(%s)
+                   ORDER BY j.created_at ASC
+                   LIMIT %s
+                   FOR UPDATE OF j SKIP LOCKED
+               )
+               UPDATE invoice_automation_jobs j
+               SET status = 'running', started_at = %s, updated_at = CURRENT_TIMESTAMP
+               FROM candidates c
+               WHERE j.id = c.id
+               RETURNING j.*, c.merchant_key""",
+            (tenant_id, now.isoformat(), stale_after_seconds,
+             list(exclude_merchants), [str(job_id) for job_id in exclude_ids], limit, now.isoformat())
+        )
+        jobs = []
+        for row in cursor.fetchall():
+            job = dict(row)
+            job["id"] = str(job["id"])
+            if job.get("ticket_id"):
+                job["ticket_id"] = str(job["ticket_id"])
+            if job.get("merchant_id"):
+                job["merchant_id"] = str(job["merchant_id"])
+            job["estado"] = job.get("status")
+            job["resultado"] = job.get("execution_result")
+            jobs.append(job)
+        conn.commit()
+        # RETURNING no conserva el ORDER BY del CTE
+        jobs.sort(key=lambda job: str(job.get("created_at") or ""))
+        return jobs
+    finally:
+        cursor.close()
+        conn.close()
+
+def touch_running_jobs(job_ids: Sequence[str]) -> int:
+    """
+    Heartbeat: refrescar ``updated_at`` de jobs que siguen en ejecución.
+
+    ``claim_pending_jobs`` solo recupera jobs ``running`` sin heartbeat
+    reciente, así un portal lento no se reclama ni se ejecuta dos veces.
+    """
+    if not job_ids:
+        return 0
+    conn = get_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute(
+            """UPDATE invoice_automation_jobs
+               SET updated_at = CURRENT_TIMESTAMP
+               WHERE id::text = ANY(%s) AND status = 'running'""",
+            ([str(job_id) for job_id in job_ids],)
+        )
+        conn.commit()
+        return cursor.rowcount
+    finally:
+        cursor.close()
+        conn.close()
+
+def open_job_listener():
+    """
+    Abrir una conexión en autocommit suscrita a ``INVOICING_JOBS_CHANNEL``.
+
+    El caller lee ``conn.fileno()`` y drena ``conn.poll()`` / ``conn.notifies``;
+    el payload de cada notificación es el ``tenant_id`` del job insertado.
+    """
+    conn = get_connection()
+    conn.autocommit = True
+    cursor = conn.cursor()
+    try:
+        cursor.execute(f"LISTEN {INVOICING_JOBS_CHANNEL}")
+    finally:
+        cursor.close()
+    return conn
+
 def update_invoicing_job(job_id: Union[str, UUID], *, estado: Optional[str] = None,
                          merchant_id: Optional[Union[str, UUID]] = None,
                          resultado: Optional[Dict[str, Any]] = None,
@@ -30,6 +30,11 @@ from modules.invoicing_agent.models import (
     get_invoicing_job,
     update_invoicing_job,
     list_pending_jobs,
+    claim_pending_jobs,
+    touch_running_jobs,
+    open_job_listener,
+    add_job_listener,
+    remove_job_listener,
 )
 
 # Nuevos servicios escalables
@@ -39,6 +44,14 @@ from modules.invoicing_agent.services.hybrid_processor import HybridProcessor, P
 
 logger = logging.getLogger(__name__)
 
+# Modo concurrente (InvoicingJobRunner)
+INVOICING_MAX_CONCURRENCY = int(os.getenv("INVOICING_MAX_CONCURRENCY", "8"))
+INVOICING_MAX_PER_MERCHANT = int(os.getenv("INVOICING_MAX_PER_MERCHANT", "2"))
+INVOICING_CLAIM_BATCH = int(os.getenv("INVOICING_CLAIM_BATCH", "16"))
+INVOICING_CLAIM_TIMEOUT_SECONDS = int(os.getenv("INVOICING_CLAIM_TIMEOUT_SECONDS", "900"))
+# Heartbeat de jobs en ejecución; debe ser bastante menor que el claim timeout
+INVOICING_HEARTBEAT_SECONDS = float(os.getenv("INVOICING_HEARTBEAT_SECONDS", "60"))
+
 
 class InvoicingWorker:
     """
@@ -1018,19 +1031,268 @@ Saludos cordiales.
 </cfdi:Comprobante>"""
 
 
+# ===================================================================
+# MODO CONCURRENTE (CLAIM ATÓMICO + LISTEN/NOTIFY)
+# ===================================================================
+
+class InvoicingJobRunner:
+    """
+    Ejecuta jobs de facturación en paralelo con límites global y por comercio.
+
+    - Reclama jobs en lotes de forma atómica (``claim_pending_jobs``), así
+      varios procesos pueden correr sin tomar el mismo job. Mientras un job
+      corre se refresca su heartbeat (``touch_running_jobs``) para que no se
+      reclame por timeout aunque el portal tarde más que ``claim_timeout``.
+    - Un portal lento solo ocupa hasta ``max_per_merchant`` slots; los jobs de
+      un comercio saturado se quedan en la BD para otro ciclo/worker.
+    - Despierta al instante con LISTEN/NOTIFY de PostgreSQL o con jobs creados
+      en el mismo proceso; ``poll_interval`` queda como respaldo (retries
+      programados, notificaciones perdidas).
+    """
+
+    def __init__(
+        self,
+        worker: Optional["InvoicingWorker"] = None,
+        tenant_id: int = 3,
+        max_concurrency: int = INVOICING_MAX_CONCURRENCY,
+        max_per_merchant: int = INVOICING_MAX_PER_MERCHANT,
+        batch_size: int = INVOICING_CLAIM_BATCH,
+        poll_interval: float = 30,
+        claim_timeout: int = INVOICING_CLAIM_TIMEOUT_SECONDS,
+        heartbeat_interval: float = INVOICING_HEARTBEAT_SECONDS,
+        claim_jobs=None,
+        heartbeat_jobs=None,
+        listen: bool = True,
+    ):
+        self.worker = worker or InvoicingWorker()
+        self.tenant_id = tenant_id
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_per_merchant = max(1, max_per_merchant)
+        self.batch_size = max(1, batch_size)
+        self.poll_interval = poll_interval
+        self.claim_timeout = claim_timeout
+        self.heartbeat_interval = min(heartbeat_interval, claim_timeout / 3)
+        self.listen = listen
+        self._claim_jobs = claim_jobs or claim_pending_jobs
+        self._heartbeat_jobs = heartbeat_jobs or touch_running_jobs
+
+        self._running: Dict[str, asyncio.Task] = {}
+        self._merchant_active: Dict[str, int] = {}
+        self._deferred: Dict[str, List[Dict[str, Any]]] = {}
+        self._wake: Optional[asyncio.Event] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._stopping = False
+        self._listener_conn = None
+        self._heartbeat_task: Optional[asyncio.Task] = None
+
+        self.stats = {"claimed": 0, "processed": 0, "errors": 0, "wakeups": 0, "claims": 0, "heartbeats": 0}
+
+    # ------------------------------------------------------------------
+    # Señales de despertar
+    # ------------------------------------------------------------------
+
+    def notify(self) -> None:
+        """Despertar el runner (thread-safe)"""
+        if self._loop is not None and self._wake is not None:
+            self._loop.call_soon_threadsafe(self._wake.set)
+
+    def _on_job_created(self, tenant_id: int, job_id: str) -> None:
+        if tenant_id == self.tenant_id:
+            self.notify()
+
+    def _start_pg_listener(self) -> None:
+        try:
+            self._listener_conn = open_job_listener()
+        except Exception as e:
+            logger.warning(f"LISTEN no disponible, se usa poll cada {self.poll_interval}s: {e}")
+            return
+        self._loop.add_reader(self._listener_conn.fileno(), self._drain_pg_notifications)
+        logger.info("Worker suscrito a notificaciones de jobs de facturación")
+
+    def _drain_pg_notifications(self) -> None:
+        conn = self._listener_conn
+        try:
+            conn.poll()
+        except Exception as e:
+            logger.warning(f"Conexión LISTEN perdida, se usa poll: {e}")
+            self._stop_pg_listener()
+            return
+        tenants = {n.payload for n in conn.notifies}
+        conn.notifies.clear()
+        if str(self.tenant_id) in tenants:
+            self._wake.set()
+
+    def _stop_pg_listener(self) -> None:
+        conn, self._listener_conn = self._listener_conn, None
+        if conn is None:
+            return
+        try:
+            self._loop.remove_reader(conn.fileno())
+        except Exception:
+            pass
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    async def _heartbeat_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.heartbeat_interval)
+            await self.heartbeat()
+
+    async def heartbeat(self) -> None:
+        """Refrescar ``updated_at`` de los jobs reclamados por este runner"""
+        job_ids = list(self._running) + [job["id"] for jobs in self._deferred.values() for job in jobs]
+        if not job_ids:
+            return
+        try:
+            await asyncio.to_thread(self._heartbeat_jobs, job_ids)
+            self.stats["heartbeats"] += 1
+        except Exception as e:
+            logger.warning(f"Error actualizando heartbeat de jobs: {e}")
+
+    # ------------------------------------------------------------------
+    # Ciclo principal
+    # ------------------------------------------------------------------
+
+    async def run(self) -> None:
+        """Procesar jobs hasta ``stop()``"""
+        self._loop = asyncio.get_running_loop()
+        self._wake = asyncio.Event()
+        self._stopping = False
+        add_job_listener(self._on_job_created)
+        if self.listen:
+            self._start_pg_listener()
+        self._heartbeat_task = asyncio.create_task(self._heartbeat_loop())
+        logger.info(
+            f"InvoicingJobRunner iniciado (tenant={self.tenant_id}, concurrencia={self.max_concurrency}, "
+            f"por comercio={self.max_per_merchant})"
+        )
+        try:
+            while not self._stopping:
+                # Limpiar antes de reclamar: una notificación durante el claim no se pierde
+                self._wake.clear()
+                claimed = await self.claim_and_dispatch()
+                if claimed and self._free_slots() > 0:
+                    continue  # Puede haber más trabajo pendiente
+                try:
+                    await asyncio.wait_for(self._wake.wait(), timeout=self.poll_interval)
+                    self.stats["wakeups"] += 1
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            remove_job_listener(self._on_job_created)
+            self._stop_pg_listener()
+            # Terminar lo ya reclamado (incluye diferidos) antes de salir
+            while self._running:
+                await asyncio.gather(*list(self._running.values()), return_exceptions=True)
+            self._heartbeat_task.cancel()
+            await asyncio.gather(self._heartbeat_task, return_exceptions=True)
+            self._heartbeat_task = None
+
+    def stop(self) -> None:
+        self._stopping = True
+        self.notify()
+
+    def _free_slots(self) -> int:
+        deferred = sum(len(jobs) for jobs in self._deferred.values())
+        return self.max_concurrency - len(self._running) - deferred
+
+    async def claim_and_dispatch(self) -> int:
+        """Reclamar un lote y lanzar los jobs que quepan; devuelve cuántos se reclamaron"""
+        limit = min(self.batch_size, self._free_slots())
+        if limit <= 0:
+            return 0
+        saturated = [key for key, active in self._merchant_active.items() if active >= self.max_per_merchant]
+        owned = set(self._running) | {job["id"] for jobs in self._deferred.values() for job in jobs}
+        try:
+            jobs = await asyncio.to_thread(
+                self._claim_jobs, limit, self.tenant_id,
+                exclude_merchants=saturated, exclude_ids=sorted(owned),
+                stale_after_seconds=self.claim_timeout,
+            )
+        except Exception as e:
+            logger.error(f"Error reclamando jobs de facturación: {e}")
+            return 0
+
+        self.stats["claims"] += 1
+        # Un job que ya corre aquí nunca se relanza (pisaría su task)
+        jobs = [job for job in jobs if job["id"] not in owned]
+        self.stats["claimed"] += len(jobs)
+        for job in jobs:
+            key = job.get("merchant_key")
+            if key and self._merchant_active.get(key, 0) >= self.max_per_merchant:
+                # Mismo comercio repetido en el lote: espera un slot del comercio
+                self._deferred.setdefault(key, []).append(job)
+            else:
+                self._start(job)
+        return len(jobs)
+
+    def _start(self, job: Dict[str, Any]) -> None:
+        key = job.get("merchant_key")
+        if key:
+            self._merchant_active[key] = self._merchant_active.get(key, 0) + 1
+        task = asyncio.create_task(self._run_job(job))
+        self._running[job["id"]] = task
+
+    async def _run_job(self, job: Dict[str, Any]) -> None:
+        key = job.get("merchant_key")
+        try:
+            result = await self.worker.process_job(job["id"])
+            self.stats["processed" if result.get("success") else "errors"] += 1
+        except Exception as e:
+            self.stats["errors"] += 1
+            logger.error(f"Error procesando job {job['id']}: {e}")
+        finally:
+            self._running.pop(job["id"], None)
+            if key:
+                self._merchant_active[key] -= 1
+                waiting = self._deferred.get(key)
+                if waiting:
+                    self._start(waiting.pop(0))
+                if not waiting:
+                    self._deferred.pop(key, None)
+                if not self._merchant_active[key]:
+                    del self._merchant_active[key]
+            # Slot libre: reclamar más sin esperar al poll
+            self._wake.set()
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            **self.stats,
+            "running": len(self._running),
+            "deferred": sum(len(jobs) for jobs in self._deferred.values()),
+            "merchants_active": dict(self._merchant_active),
+            "listening": self._listener_conn is not None,
+        }
+
+
 # ===================================================================
 # FUNCIÓN PARA EJECUTAR WORKER DESDE CLI
 # ===================================================================
 
-async def run_worker_daemon(company_id: str = "default", interval: int = 30):
+async def run_worker_daemon(company_id: str = "default", interval: int = 30,
+                            mode: str = os.getenv("INVOICING_WORKER_MODE", "concurrent")):
     """
-    Ejecutar worker como daemon que procesa jobs cada X segundos.
+    Ejecutar worker como daemon.
+
+    ``mode="concurrent"`` (default) usa InvoicingJobRunner: jobs en paralelo y
+    despertar por LISTEN/NOTIFY, con ``interval`` como poll de respaldo.
+    ``mode="sequential"`` conserva el ciclo original: procesa jobs cada X segundos.
 
     Para usar desde línea de comandos:
-    python -m modules.invoicing_agent.worker
+    python -m modules.invoicing_agent.worker [company_id] [interval] [mode]
     """
     worker = InvoicingWorker()
-    logger.info(f"Iniciando worker daemon para company_id: {company_id}, interval: {interval}s")
+    logger.info(f"Iniciando worker daemon para company_id: {company_id}, interval: {interval}s, modo: {mode}")
+
+    if mode == "concurrent":
+        runner = InvoicingJobRunner(worker, poll_interval=interval)
+        try:
+            await runner.run()
+        except KeyboardInterrupt:
+            logger.info("Worker daemon detenido por usuario")
+        return
 
     while True:
         try:
@@ -1060,6 +1322,7 @@ if __name__ == "__main__":
     # Obtener parámetros de línea de comandos
     company_id = sys.argv[1] if len(sys.argv) > 1 else "default"
     interval = int(sys.argv[2]) if len(sys.argv) > 2 else 30
+    mode = sys.argv[3] if len(sys.argv) > 3 else os.getenv("INVOICING_WORKER_MODE", "concurrent")
 
     # Ejecutar daemon
-    asyncio.run(run_worker_daemon(company_id, interval))
\ No newline at end of file
+    asyncio.run(run_worker_daemon(company_id, interval, mode))
\ No newline at end of file
@@ -15,7 +15,7 @@ Uso:
 """
 
 import psycopg2
-from psycopg2.extras import RealDictCursor
+from psycopg2.extras import RealDictCursor, execute_values
 import xml.etree.ElementTree as ET
 import os
 import sys
@@ -23,7 +23,8 @@ import time
 import argparse
 from pathlib import Path
 from datetime import datetime
-import requests
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
 
 # Configuración
 POSTGRES_CONFIG = {
@@ -34,8 +35,6 @@ POSTGRES_CONFIG = {
     "password": "changeme"
 }
 
-API_BASE = "http://localhost:8000"
-
 # Namespaces CFDI
 NAMESPACES = {
     'cfdi': 'http://www.sat.gob.mx/cfd/4',
@@ -188,23 +187,91 @@ def update_cfdi_in_db(data, conn):
         return None
 
 
-def verify_cfdi_with_sat(uuid):
+def verify_cfdis_with_sat(targets, conn, stats, args):
     """
-    Verifica un CFDI con el SAT usando la API
+    Verifica los CFDIs con el SAT en una sola corrida masiva y guarda el estatus
+
+    La corrida hace checkpoint por run_id: si se interrumpe, volver a ejecutar
+    el script el mismo mes retoma donde se quedó.
     """
-    try:
-        response = requests.post(
-            f"{API_BASE}/cfdi/{uuid}/verificar",
-            timeout=10
-        )
+    from core.sat.sat_cfdi_verifier import SATCFDIVerifier
 
-        if response.status_code == 200:
-            return True, response.json()
-        else:
-            return False, response.json()
+    run_id = args.run_id or f"mensual-{args.company_id}-{datetime.utcnow():%Y-%m}"
+    verifier = SATCFDIVerifier(use_mock=args.mock_sat)
 
-    except Exception as e:
-        return False, str(e)
+    print(f"\n🔍 Verificando {len(targets)} CFDIs con el SAT (corrida {run_id})...")
+
+    def progress(done, total):
+        if done % 100 == 0 or done == total:
+            print(f"   ⏱️  SAT: {done}/{total} ({done / total * 100:.1f}%)", flush=True)
+
+    results = verifier.verify_multiple_cfdis(
+        targets,
+        run_id=run_id,
+        force_refresh=args.force_refresh,
+        progress_callback=progress
+    )
+
+    rows = []
+    for uuid, status_info in results.items():
+        if status_info.get('error'):
+            stats['errores'] += 1
+            continue
+
+        status = status_info['status']
+        stats['verificados'] += 1
+        if status == 'vigente':
+            stats['vigentes'] += 1
+        elif status == 'cancelado':
+            stats['cancelados'] += 1
+        elif status == 'no_encontrado':
+            stats['no_encontrados'] += 1
+
+        rows.append((
+            status,
+            status_info.get('codigo_estatus'),
+            status_info.get('es_cancelable'),
+            status_info.get('estado'),
+            status_info.get('validacion_efos'),
+            status_info.get('fecha_consulta'),
+            uuid
+        ))
+
+    # Un solo UPDATE con join contra una tabla temporal: los UUIDs vienen tal
+    # cual están guardados, así que la comparación usa el índice de uuid
+    cursor = conn.cursor()
+    cursor.execute("""
+        CREATE TEMP TABLE tmp_sat_status ON COMMIT DROP AS
+        SELECT sat_status, sat_codigo_estatus, sat_es_cancelable, sat_estado,
+               sat_validacion_efos, sat_fecha_verificacion, uuid
+        FROM expense_invoices
+        WITH NO DATA;
+    """)
+    execute_values(cursor, "INSERT INTO tmp_sat_status VALUES %s", rows, page_size=1000)
+    cursor.execute("""
+        UPDATE expense_invoices e
+        SET
+            sat_status = t.sat_status,
+            sat_codigo_estatus = t.sat_codigo_estatus,
+            sat_es_cancelable = t.sat_es_cancelable,
+            sat_estado = t.sat_estado,
+            sat_validacion_efos = t.sat_validacion_efos,
+            sat_fecha_verificacion = t.sat_fecha_verificacion,
+            sat_verificacion_count = COALESCE(e.sat_verificacion_count, 0) + 1,
+            updated_at = NOW()
+        FROM tmp_sat_status t
+        WHERE e.company_id = %s AND e.uuid = t.uuid;
+    """, (args.company_id,))
+    conn.commit()
+    cursor.close()
+
+    bulk_stats = verifier.last_bulk_stats
+    if bulk_stats:
+        print(
+            f"   ✅ SAT: {bulk_stats.verified} consultados, {bulk_stats.cached} desde cache, "
+            f"{bulk_stats.resumed} retomados, {bulk_stats.retries} reintentos, "
+            f"{bulk_stats.errors} errores en {bulk_stats.elapsed_seconds / 60:.1f} min"
+        )
 
 
 def find_xml_for_uuid(uuid, search_paths):
@@ -239,6 +306,9 @@ def main():
     parser.add_argument('--verify-sat', action='store_true', help='Verificar con SAT')
     parser.add_argument('--limit', type=int, help='Limitar cantidad de CFDIs a procesar')
     parser.add_argument('--skip-existing', action='store_true', help='Saltar CFDIs ya procesados')
+    parser.add_argument('--mock-sat', action='store_true', help='Usar el SAT simulado (pruebas de carga)')
+    parser.add_argument('--force-refresh', action='store_true', help='Ignorar el cache de estatus SAT')
+    parser.add_argument('--run-id', help='ID de corrida para retomar (default: mensual-<company>-<AAAA-MM>)')
 
     args = parser.parse_args()
 
@@ -303,6 +373,7 @@ def main():
     }
 
     start_time = time.time()
+    sat_targets = []
 
     # Procesar cada CFDI
     for i, cfdi in enumerate(cfdis, 1):
@@ -338,30 +409,14 @@ def main():
             conn.commit()
             print(f"   ✅ BD actualizada")
 
-        # Verificar con SAT
+        # Se verifica con el SAT al final, en paralelo y con rate limit
         if args.verify_sat and data['rfc_emisor'] and data['rfc_receptor']:
-            print(f"   🔍 Verificando con SAT...", end='', flush=True)
-
-            success, result = verify_cfdi_with_sat(uuid)
-
-            if success:
-                status = result.get('status', 'unknown')
-                print(f" {status}")
-
-                stats['verificados'] += 1
-
-                if status == 'vigente':
-                    stats['vigentes'] += 1
-                elif status == 'cancelado':
-                    stats['cancelados'] += 1
-                elif status == 'no_encontrado':
-                    stats['no_encontrados'] += 1
-
-                # Esperar un poco para no saturar el SAT
-                time.sleep(0.5)
-            else:
-                print(f" ❌ Error")
-                stats['errores'] += 1
+            sat_targets.append({
+                'uuid': uuid,
+                'rfc_emisor': data['rfc_emisor'],
+                'rfc_receptor': data['rfc_receptor'],
+                'total': data['total']
+            })
 
         stats['procesados'] += 1
 
@@ -374,6 +429,9 @@ def main():
             print(f"   ⚡ Velocidad: {rate:.1f} CFDIs/seg")
             print(f"   🕐 Tiempo restante: {remaining/60:.1f} min")
 
+    if sat_targets:
+        verify_cfdis_with_sat(sat_targets, conn, stats, args)
+
     cursor.close()
     conn.close()
 
@@ -1,6 +1,31 @@
+import asyncio
 import sys
 from pathlib import Path
 
+import pytest
+
 ROOT = Path(__file__).resolve().parent.parent
 if str(ROOT) not in sys.path:
     sys.path.insert(0, str(ROOT))
+
+
+@pytest.fixture(scope="session")
+def _fallback_event_loop():
+    loop = asyncio.new_event_loop()
+    yield loop
+    loop.close()
+
+
+@pytest.fixture(autouse=True)
+def _restore_current_event_loop(_fallback_event_loop):
+    """asyncio.run() deja el hilo sin loop actual; los fixtures que usan
+    asyncio.get_event_loop() (clientes httpx de los tests de API) lo necesitan.
+    Se reinstala siempre el mismo loop de la sesión para no dejar uno abierto
+    por cada test."""
+    yield
+    try:
+        loop = asyncio.get_event_loop_policy().get_event_loop()
+    except RuntimeError:
+        loop = None
+    if loop is None or loop.is_closed():
+        asyncio.set_event_loop(_fallback_event_loop)
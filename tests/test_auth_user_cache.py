@@ -0,0 +1,78 @@
+import asyncio
+from datetime import datetime
+
+import pytest
+
+from core.auth import unified
+
+
+def _user(user_id=7, role="user"):
+    return unified.UserInDB(
+        id=user_id, email="ana@example.com", full_name="Ana", password_hash="x",
+        tenant_id=3, role=role, created_at=datetime(2025, 1, 1),
+    )
+
+
+@pytest.fixture
+def lookups(monkeypatch):
+    calls = []
+
+    def fake_get_user_by_id(user_id):
+        calls.append(user_id)
+        return _user(user_id)
+
+    def no_db():
+        raise RuntimeError("sin BD en tests")
+
+    monkeypatch.setattr(unified, "get_user_by_id", fake_get_user_by_id)
+    monkeypatch.setattr(unified, "get_unified_adapter", no_db)
+    unified.invalidate_user_cache()
+    yield calls
+    unified.invalidate_user_cache()
+
+
+def _current(token):
+    return asyncio.run(unified.get_current_user(token))
+
+
+def test_current_user_is_cached_per_user_and_jti(lookups):
+    token = unified.create_access_token({"sub": "ana@example.com", "user_id": 7, "jti": "t-1"})
+    other = unified.create_access_token({"sub": "ana@example.com", "user_id": 7, "jti": "t-2"})
+
+    assert _current(token).id == 7
+    assert _current(token).id == 7
+    assert lookups == [7]
+
+    _current(other)
+    assert lookups == [7, 7]
+    assert unified.get_user_cache_stats()["hits"] == 1
+
+
+def test_login_changes_and_revocation_invalidate_the_cache(lookups):
+    token = unified.create_access_token({"sub": "ana@example.com", "user_id": 7})
+    _current(token)
+
+    unified.increment_failed_attempts(7)
+    _current(token)
+    unified.update_successful_login(7)
+    _current(token)
+    assert lookups == [7, 7, 7]
+
+    refresh = unified.create_refresh_token({"sub": "ana@example.com", "user_id": 7})
+    unified.revoke_refresh_token(refresh)
+    _current(token)
+    assert lookups == [7, 7, 7, 7]
+
+    unified.invalidate_user_cache(8)  # otro usuario: no afecta
+    _current(token)
+    assert len(lookups) == 4
+
+
+def test_expired_entries_are_refetched(lookups, monkeypatch):
+    monkeypatch.setattr(unified._user_cache, "ttl_seconds", -1)
+    token = unified.create_access_token({"sub": "ana@example.com", "user_id": 7})
+
+    _current(token)
+    _current(token)
+
+    assert lookups == [7, 7]
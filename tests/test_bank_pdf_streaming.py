@@ -0,0 +1,121 @@
+import pytest
+
+fitz = pytest.importorskip("fitz")
+
+from core.reconciliation.bank import pdf_page_extractor
+from core.reconciliation.bank.bank_file_parser import BankFileParser
+
+
+def _write_pdf(path, pages):
+    doc = fitz.open()
+    for lines in pages:
+        page = doc.new_page()
+        for i, line in enumerate(lines):
+            page.insert_text((40, 60 + 14 * i), line, fontsize=9)
+    doc.save(str(path))
+    doc.close()
+
+
+def _statement_pages(page_count, per_page=5):
+    pages = []
+    n = 0
+    for p in range(page_count):
+        lines = ["ESTADO DE CUENTA", "Periodo del 01/01/2024 al 31/12/2024", "Saldo inicial: 10,000.00"] if p == 0 else []
+        for _ in range(per_page):
+            n += 1
+            kind = "DEPOSITO SPEI" if n % 3 == 0 else "PAGO PROVEEDOR"
+            lines.append(f"{(n % 28) + 1:02d}/{(n % 12) + 1:02d}/2024 {kind} REF{n:07d} {n * 10 + 0.5:,.2f} {20000 + n:,.2f}")
+        pages.append(lines)
+    pages[-1].append("Saldo final: 12,345.67")
+    return pages
+
+
+def _signature(transactions):
+    return [(t.transaction_date, t.description, t.amount, t.reference, t.balance) for t in transactions]
+
+
+def test_streaming_matches_batch_extraction(tmp_path):
+    pdf = tmp_path / "statement.pdf"
+    _write_pdf(pdf, _statement_pages(6))
+
+    parser = BankFileParser()
+    streamed, summary = parser.parse_pdf_streaming(str(pdf), 1, 1, 1, workers=1)
+
+    batch_parser = BankFileParser()
+    full_text = "\n".join(p.text for p in pdf_page_extractor.iter_page_texts(str(pdf), workers=1))
+    batch_parser.current_year_hint = 2024
+    expected = batch_parser._extract_transactions_from_text(full_text, 1, 1, 1)
+    expected_summary = batch_parser._extract_period_info(full_text)
+
+    assert len(streamed) > 30  # 30 movimientos más la línea de periodo que el regex también acepta
+    assert _signature(streamed) == _signature(expected)
+    assert summary["transaction_count"] == len(expected)
+    assert summary["pages_processed"] == 6
+    assert summary["page_extractors"] == {"pymupdf": 6}
+    assert summary["total_credits"] == round(sum(t.amount for t in expected if t.amount > 0), 2)
+    assert summary["total_debits"] == round(sum(-t.amount for t in expected if t.amount < 0), 2)
+    for key in ("period_start", "period_end", "opening_balance", "closing_balance"):
+        assert summary[key] == expected_summary[key]
+    assert summary["closing_balance"] == 12345.67
+
+
+def test_transactions_are_yielded_before_the_whole_pdf_is_read(tmp_path):
+    pdf = tmp_path / "statement.pdf"
+    _write_pdf(pdf, _statement_pages(8))
+
+    summary = {}
+    stream = BankFileParser().iter_pdf_transactions(str(pdf), 1, 1, 1, summary=summary, workers=1)
+    next(stream)
+
+    assert summary["pages_processed"] < 8
+    rest = list(stream)
+    assert summary["pages_processed"] == 8
+    assert summary["transaction_count"] == len(rest) + 1
+    assert rest[-1].reference == "REF0000040"
+
+
+def test_page_extractor_probes_each_page_and_parallel_keeps_order(tmp_path, monkeypatch):
+    pdf = tmp_path / "mixed.pdf"
+    _write_pdf(pdf, _statement_pages(5) + [[]])
+
+    sequential = list(pdf_page_extractor.iter_page_texts(str(pdf), workers=1))
+    assert [p.extractor for p in sequential[:5]] == ["pymupdf"] * 5
+    # Página en blanco: se prueban todos los extractores y se conserva el mejor (vacío)
+    assert sequential[5].text.strip() == ""
+
+    parallel = list(pdf_page_extractor.iter_page_texts(
+        str(pdf), workers=2, pages_per_chunk=2, parallel_min_pages=1
+    ))
+    assert [(p.number, p.text) for p in parallel] == [(p.number, p.text) for p in sequential]
+
+    # Si PyMuPDF no produce texto útil en una página, se usa el siguiente extractor solo ahí
+    original = pdf_page_extractor._PageBackends.extract
+
+    def flaky_extract(self, name, index):
+        if name == "pymupdf" and index == 2:
+            return "(cid:3)(cid:4)"
+        return original(self, name, index)
+
+    monkeypatch.setattr(pdf_page_extractor._PageBackends, "extract", flaky_extract)
+    probed = pdf_page_extractor.extract_page_range(str(pdf), 0, 4)
+    assert [p.extractor for p in probed] == ["pymupdf", "pymupdf", "pdfplumber", "pymupdf"]
+
+
+def test_streaming_is_opt_in_and_classifies_streamed_transactions(tmp_path, monkeypatch):
+    from core.reconciliation.bank import bank_file_parser
+
+    assert bank_file_parser.BANK_PDF_STREAMING == "never"
+    pdf = tmp_path / "statement.pdf"
+    _write_pdf(pdf, _statement_pages(4))
+
+    parser = BankFileParser()
+    assert parser._should_stream_pdf(str(pdf)) is False
+
+    monkeypatch.setattr(bank_file_parser, "BANK_PDF_STREAMING", "always")
+    monkeypatch.setattr(parser, "_get_account_info", lambda account_id, tenant_id: None)
+    transactions, summary = parser.parse_file(str(pdf), "pdf", 1, 1, 1)
+
+    assert summary["parser_used"] == "streaming_page_parser"
+    assert summary["transaction_count"] == len(transactions)
+    assert all(t.amount < 0 for t in transactions if "PAGO PROVEEDOR" in t.description)
+    assert summary["total_debits"] == round(sum(-t.amount for t in transactions if t.amount < 0), 2)
@@ -0,0 +1,63 @@
+import sqlite3
+
+import pytest
+
+from core.shared.unified_db_adapter import UnifiedDBAdapter
+
+
+@pytest.fixture
+def adapter(tmp_path):
+    db_path = tmp_path / "unified.db"
+    conn = sqlite3.connect(db_path)
+    conn.executescript("""
+        CREATE TABLE users (id INTEGER PRIMARY KEY, name TEXT);
+        CREATE TABLE expense_records (
+            id INTEGER PRIMARY KEY, tenant_id INTEGER, user_id INTEGER,
+            amount REAL, date TEXT, description TEXT
+        );
+        CREATE TABLE bank_movements (id INTEGER PRIMARY KEY, matched_expense_id INTEGER);
+        INSERT INTO users VALUES (1, 'Ana');
+        INSERT INTO expense_records VALUES
+            (1, 1, 1, 500.00, '2025-03-10', 'Gasolina Pemex Insurgentes'),
+            (2, 1, 1, 500.00, '2025-03-12', 'Pemex'),
+            (3, 1, 1, 503.00, '2025-03-10', 'Gasolina Pemex'),
+            (4, 1, 1, 500.00, '2025-03-30', 'Gasolina Pemex'),
+            (5, 1, 1, 500.00, '2025-03-10', 'Gasolina Pemex ya conciliada'),
+            (6, 2, 1, 500.00, '2025-03-10', 'Gasolina Pemex otro tenant'),
+            (7, 1, 1, 89.90, '2025-03-11', 'Netflix suscripcion');
+        INSERT INTO bank_movements VALUES (1, 5);
+    """)
+    conn.commit()
+    conn.close()
+
+    instance = UnifiedDBAdapter.__new__(UnifiedDBAdapter)
+    instance.use_postgres = False
+    instance.db_path = db_path
+    return instance
+
+
+def test_batch_matcher_applies_window_filters_and_scores(adapter):
+    movements = [
+        {"amount": 500.0, "date": "2025-03-10", "description": "GASOLINA PEMEX"},
+        {"amount": 89.9, "date": "2025-03-12", "description": "NETFLIX SUSCRIPCION MENSUAL"},
+        {"amount": 1000.0, "date": "2025-03-10", "description": "Sin candidatos"},
+    ]
+
+    results = adapter.find_matching_expenses_for_movements(movements, tenant_id=1, threshold=0.0)
+
+    # Gastos 4 (fuera de ventana), 5 (ya conciliado) y 6 (otro tenant) no aparecen
+    assert [m["id"] for m in results[0]] == [1, 2, 3]
+    assert [m["match_score"] for m in results[0]] == pytest.approx([1.0, 0.62, 0.6])
+    assert results[0][0]["user_name"] == "Ana"
+    assert results[0][2]["amount_difference"] == pytest.approx(3.0)
+    assert [m["id"] for m in results[1]] == [7]
+    assert results[1][0]["match_score"] == pytest.approx(0.4 + 0.8 * 0.25 + 0.7 * 0.35)
+    assert results[2] == []
+
+
+def test_single_movement_api_uses_threshold(adapter):
+    movement = {"amount": 500.0, "date": "2025-03-10", "description": "GASOLINA PEMEX"}
+
+    matches = adapter.find_matching_expenses_for_movement(movement, tenant_id=1, threshold=0.9)
+
+    assert [m["id"] for m in matches] == [1]
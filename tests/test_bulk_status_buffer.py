@@ -0,0 +1,183 @@
+import asyncio
+from datetime import datetime
+
+from core.expenses.invoices.bulk_invoice_processor import (
+    BatchRecord,
+    BatchStatus,
+    BulkInvoiceProcessor,
+    InvoiceItem,
+    ItemStatus,
+    StatusWriteBuffer,
+)
+
+
+class FakeDB:
+    def __init__(self):
+        self.calls = []
+
+    async def execute(self, query, params=None):
+        self.calls.append(("execute", " ".join(query.split()), [params]))
+        return "OK 1"
+
+    async def execute_many(self, query, params_list):
+        self.calls.append(("execute_many", " ".join(query.split()), list(params_list)))
+        return f"OK {len(params_list)}"
+
+    async def fetch_one(self, query, params=None):
+        raise AssertionError("get_batch_status should not hit the DB while the batch is running")
+
+    async def fetch_all(self, query, params=None):
+        return []
+
+
+def _item(filename, uuid="UUID-1"):
+    return InvoiceItem(
+        filename=filename, uuid=uuid, total_amount=116.0, subtotal_amount=100.0,
+        iva_amount=16.0, currency="MXN", issued_date="2025-01-10", provider_name="Proveedor",
+        provider_rfc="AAA010101AAA", file_size=None, file_hash=None, raw_xml=None,
+    )
+
+
+def test_buffer_coalesces_transitions_into_one_bulk_update():
+    db = FakeDB()
+    buffer = StatusWriteBuffer(lambda: db, max_items=10, interval_ms=60_000)
+    first, second = _item("a.xml"), _item("b.xml")
+
+    async def run():
+        for item in (first, second):
+            item.status = ItemStatus.PROCESSING
+            await buffer.record_item("batch-1", item)
+        first.status = ItemStatus.MATCHED
+        await buffer.record_item("batch-1", first)
+        assert db.calls == []
+        return await buffer.flush_batch("batch-1")
+
+    assert asyncio.run(run()) is True
+
+    assert len(db.calls) == 1
+    kind, query, rows = db.calls[0]
+    assert kind == "execute_many" and query.startswith("UPDATE bulk_invoice_batch_items")
+    by_file = {row[-1]: row for row in rows}
+    assert by_file["a.xml"][0] == "matched"
+    assert by_file["a.xml"][1] is not None and by_file["a.xml"][2] is not None  # inicio conservado
+    assert by_file["b.xml"][0] == "processing" and by_file["b.xml"][2] is None
+    assert buffer.get_stats()["updates_coalesced"] == 1
+
+
+def test_process_batch_flushes_before_finalizing_and_serves_status_from_memory():
+    db = FakeDB()
+    processor = BulkInvoiceProcessor()
+    processor.performance_monitoring_enabled = False
+    processor.status_buffer = StatusWriteBuffer(lambda: processor.db, max_items=1000, interval_ms=60_000)
+    asyncio.run(processor.initialize(db))
+
+    items = [_item(f"{i}.xml", uuid=f"UUID-{i}") for i in range(20)]
+    batch = BatchRecord(
+        batch_id="batch-1", company_id="acme", total_invoices=len(items),
+        auto_link_threshold=0.8, auto_mark_invoiced=False, status=BatchStatus.PENDING,
+        batch_metadata={}, items=items, created_at=datetime.utcnow(),
+    )
+    seen_status = []
+
+    async def no_insert(batch, item):
+        return None
+
+    async def no_classify(batch, item):
+        return False
+
+    async def no_candidates(batch, item):
+        seen_status.append(await processor.get_batch_status("batch-1"))
+        return []
+
+    async def no_webhooks(batch):
+        return None
+
+    processor._insert_invoice_record = no_insert
+    processor._should_auto_classify_invoice = no_classify
+    processor._find_matching_expenses = no_candidates
+    processor._trigger_batch_webhooks = no_webhooks
+
+    result = asyncio.run(processor.process_batch("batch-1", preloaded_batch=batch))
+
+    assert result.status == BatchStatus.COMPLETED
+    assert seen_status[0]["status"] == "processing"
+    assert seen_status[-1]["processed_count"] > 0
+
+    queries = [query for _, query, _ in db.calls]
+    item_writes = [c for c in db.calls if c[1].startswith("UPDATE bulk_invoice_batch_items")]
+    final_index = max(i for i, q in enumerate(queries) if "status = ?, started_at" in q)
+    assert len(item_writes) == 1 and len(item_writes[0][2]) == 20
+    assert queries.index(item_writes[0][1]) < final_index
+    assert {row[0] for row in item_writes[0][2]} == {"no_match"}
+    assert db.calls[final_index][2][0][-1] == "batch-1"
+    assert "batch-1" not in processor._active_batches
+
+
+class FlakyDB(FakeDB):
+    def __init__(self, failures):
+        super().__init__()
+        self.failures = failures
+
+    async def execute_many(self, query, params_list):
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError("db unavailable")
+        return await super().execute_many(query, params_list)
+
+
+def test_failed_timer_flush_is_requeued_and_rearmed():
+    db = FlakyDB(failures=1)
+    buffer = StatusWriteBuffer(lambda: db, max_items=10, interval_ms=5)
+    item = _item("a.xml")
+    item.status = ItemStatus.MATCHED
+
+    async def run():
+        await buffer.record_item("batch-1", item)
+        for _ in range(200):
+            if not buffer.pending:
+                break
+            await asyncio.sleep(0.005)
+
+    asyncio.run(run())
+
+    assert db.failures == 0
+    assert buffer.pending == 0
+    assert [row[0] for _, _, rows in db.calls for row in rows] == ["matched"]
+
+
+def test_flush_batch_retries_and_finalize_fails_batch_when_writes_are_lost():
+    item = _item("a.xml")
+    item.status = ItemStatus.MATCHED
+
+    async def flush(db, retries):
+        buffer = StatusWriteBuffer(lambda: db, max_items=10, interval_ms=0, retries=retries)
+        await buffer.record_item("batch-1", item)
+        return await buffer.flush_batch("batch-1"), buffer
+
+    assert asyncio.run(flush(FlakyDB(failures=2), retries=2))[0] is True
+
+    processor = BulkInvoiceProcessor()
+    processor.db = FlakyDB(failures=100)
+    processor.status_buffer = StatusWriteBuffer(lambda: processor.db, max_items=10, interval_ms=0, retries=1)
+    batch = BatchRecord(
+        batch_id="batch-1", company_id="acme", total_invoices=1, auto_link_threshold=0.8,
+        auto_mark_invoiced=False, status=BatchStatus.PROCESSING, batch_metadata={}, items=[item],
+        created_at=datetime.utcnow(),
+    )
+    written = []
+
+    async def record_status(batch):
+        written.append(batch.status)
+
+    processor._update_batch_status = record_status
+
+    async def run():
+        await processor.status_buffer.record_item("batch-1", item)
+        await processor._finalize_batch(batch)
+        pending = processor.status_buffer.pending
+        processor.status_buffer._timer.cancel()
+        return pending
+
+    assert asyncio.run(run()) == 1
+    assert written == [BatchStatus.FAILED]
+    assert "could not be persisted" in batch.error_summary
@@ -0,0 +1,111 @@
+import sqlite3
+
+from core.shared.unified_db_adapter import UnifiedDBAdapter
+
+
+EXPENSE_COLUMNS = [
+    "amount", "currency", "description", "category", "merchant_name", "date",
+    "tax_source", "classification_source", "catalog_version", "explanation_short",
+    "explanation_detail", "tipo_cambio", "deducible_status", "deducible_percent",
+    "iva_acreditable", "periodo", "status", "user_id", "tenant_id", "created_at",
+    "updated_at", "metadata", "proveedor_nombre", "sat_account_code",
+]
+
+
+def _adapter(tmp_path):
+    db_path = tmp_path / "unified.db"
+    conn = sqlite3.connect(db_path)
+    conn.execute(
+        "CREATE TABLE expense_records (id INTEGER PRIMARY KEY AUTOINCREMENT, "
+        + ", ".join(EXPENSE_COLUMNS) + ")"
+    )
+    conn.execute(
+        "CREATE TABLE expense_invoices (id INTEGER PRIMARY KEY AUTOINCREMENT, "
+        + ", ".join(UnifiedDBAdapter.INVOICE_RECORD_COLUMNS) + ", created_at)"
+    )
+    conn.execute(
+        "CREATE TABLE bank_movements (id INTEGER PRIMARY KEY AUTOINCREMENT, "
+        + ", ".join(UnifiedDBAdapter.BANK_MOVEMENT_COLUMNS) + ", created_at)"
+    )
+    conn.commit()
+    conn.close()
+
+    # Evitar las migraciones de __init__, que esperan el esquema completo
+    adapter = UnifiedDBAdapter.__new__(UnifiedDBAdapter)
+    adapter.use_postgres = False
+    adapter.db_path = db_path
+    return adapter
+
+
+def test_record_expenses_bulk_returns_ids_in_input_order(tmp_path):
+    adapter = _adapter(tmp_path)
+    expenses = [
+        {"amount": 10.0, "description": "Uno", "date": "2025-01-01"},
+        {"amount": 20.0, "description": "Dos", "date": "2025-01-02", "merchant_name": "Oxxo"},
+        {"monto_total": 30.0, "descripcion": "Tres", "date": "2025-01-03"},
+    ]
+
+    ids = adapter.record_expenses_bulk(expenses, tenant_id=7)
+
+    conn = sqlite3.connect(adapter.db_path)
+    rows = {row[0]: row[1:] for row in conn.execute(
+        "SELECT id, description, amount, tenant_id, periodo FROM expense_records"
+    )}
+    conn.close()
+    assert [rows[i][:2] for i in ids] == [("Uno", 10.0), ("Dos", 20.0), ("Tres", 30.0)]
+    assert {rows[i][2] for i in ids} == {7}
+    assert rows[ids[0]][3] == "2025-01"
+
+
+def test_bulk_invoices_and_movements_match_single_row_inserts(tmp_path):
+    adapter = _adapter(tmp_path)
+
+    single_id = adapter.create_bank_movement({"amount": -50.0, "description": "Pago CFE"}, tenant_id=3)
+    bulk_ids = adapter.create_bank_movements_bulk([
+        {"amount": -50.0, "description": "Pago CFE"},
+        {"amount": 1200.0, "description": "Deposito cliente", "transaction_type": "credit"},
+    ], tenant_id=3)
+    invoice_ids = adapter.create_invoice_records_bulk([
+        {"uuid": "A", "total": 116.0},
+        {"uuid": "B", "total": 232.0, "moneda": "USD"},
+    ], tenant_id=3)
+
+    conn = sqlite3.connect(adapter.db_path)
+    single = conn.execute(
+        "SELECT movement_kind, decision, created_at IS NOT NULL FROM bank_movements WHERE id = ?", (single_id,)
+    ).fetchone()
+    bulk = conn.execute(
+        "SELECT movement_kind, decision, created_at IS NOT NULL FROM bank_movements WHERE id = ?", (bulk_ids[0],)
+    ).fetchone()
+    invoices = conn.execute("SELECT id, uuid, moneda FROM expense_invoices ORDER BY id").fetchall()
+    conn.close()
+
+    assert single == bulk
+    assert bulk_ids == [single_id + 1, single_id + 2]
+    assert [(i, u, m) for i, u, m in invoices] == [(invoice_ids[0], "A", "MXN"), (invoice_ids[1], "B", "USD")]
+    assert adapter.create_bank_movements_bulk([]) == []
+
+
+def test_sqlite_bulk_ids_ignore_rows_inserted_by_triggers(tmp_path):
+    adapter = _adapter(tmp_path)
+    conn = sqlite3.connect(adapter.db_path)
+    conn.executescript("""
+        CREATE TABLE audit (id INTEGER PRIMARY KEY AUTOINCREMENT, movement_id INTEGER);
+        INSERT INTO audit (movement_id) VALUES (NULL), (NULL), (NULL);
+        CREATE TRIGGER trg_audit AFTER INSERT ON bank_movements
+        BEGIN
+            INSERT INTO audit (movement_id) VALUES (NEW.id);
+        END;
+    """)
+    conn.close()
+
+    first = adapter.create_bank_movement({"amount": -1.0, "description": "Uno"})
+    ids = adapter.create_bank_movements_bulk([{"amount": -2.0, "description": "Dos"},
+                                              {"amount": -3.0, "description": "Tres"}])
+    expense_id = adapter.record_internal_expense({"amount": 5.0, "description": "Gasto", "date": "2025-01-01"})
+
+    conn = sqlite3.connect(adapter.db_path)
+    descriptions = dict(conn.execute("SELECT id, description FROM bank_movements"))
+    conn.close()
+    assert [descriptions[i] for i in [first, *ids]] == ["Uno", "Dos", "Tres"]
+    assert expense_id == 1
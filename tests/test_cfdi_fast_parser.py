@@ -0,0 +1,107 @@
+"""
+Golden tests + micro-benchmark: DOM ``parse_cfdi_xml`` vs ``parse_cfdi_xml_fast``.
+
+Run with ``pytest tests/test_cfdi_fast_parser.py -s`` to see documents
+parsed per second for both paths.
+"""
+import time
+from pathlib import Path
+
+import pytest
+
+from core.ai_pipeline.parsers import invoice_parser
+from core.ai_pipeline.parsers.invoice_parser import (
+    InvoiceParseError,
+    parse_cfdi_xml,
+    parse_cfdi_xml_batch,
+    parse_cfdi_xml_fast,
+)
+
+ROOT = Path(__file__).resolve().parent.parent
+CORPUS = [path.read_bytes() for path in sorted((ROOT / "uploads").rglob("*.xml"))]
+
+PAGO_XML = b"""<?xml version="1.0" encoding="UTF-8"?>
+<cfdi:Comprobante xmlns:cfdi="http://www.sat.gob.mx/cfd/4"
+    xmlns:pago20="http://www.sat.gob.mx/Pagos20"
+    xmlns:tfd="http://www.sat.gob.mx/TimbreFiscalDigital"
+    Version="4.0" Fecha="2025-03-01T10:00:00" SubTotal="0" Total="0" Moneda="XXX" TipoDeComprobante="P">
+  <cfdi:Emisor Rfc="AAA010101AAA" Nombre="Proveedor" RegimenFiscal="601"/>
+  <cfdi:Receptor Rfc="BBB010101BBB" Nombre="Cliente" UsoCFDI="CP01"/>
+  <cfdi:Conceptos>
+    <cfdi:Concepto ClaveProdServ="84111506" Cantidad="1" ClaveUnidad="ACT" Descripcion="Pago"
+        ValorUnitario="0" Importe="0" ObjetoImp="01"/>
+  </cfdi:Conceptos>
+  <cfdi:Complemento>
+    <pago20:Pagos Version="2.0">
+      <pago20:Totales MontoTotalPagos="1160.00" TotalTrasladosBaseIVA16="1000.00"
+          TotalTrasladosImpuestoIVA16="160.00"/>
+      <pago20:Pago FechaPago="2025-03-01T09:00:00" FormaDePagoP="03" MonedaP="MXN" Monto="1160.00">
+        <pago20:DoctoRelacionado IdDocumento="11111111-2222-3333-4444-555555555555" Serie="A"
+            Folio="10" MonedaDR="MXN" NumParcialidad="1" ImpSaldoAnt="1160.00" ImpPagado="1160.00"
+            ImpSaldoInsoluto="0.00" ObjetoImpDR="02"/>
+      </pago20:Pago>
+    </pago20:Pagos>
+    <tfd:TimbreFiscalDigital UUID="AAAAAAAA-BBBB-CCCC-DDDD-EEEEEEEEEEEE"/>
+  </cfdi:Complemento>
+</cfdi:Comprobante>
+"""
+
+
+@pytest.fixture(params=["lxml", "stdlib"])
+def backend(request, monkeypatch):
+    if request.param == "stdlib":
+        monkeypatch.setattr(invoice_parser, "LET", None)
+    elif invoice_parser.LET is None:
+        pytest.skip("lxml no instalado")
+    return request.param
+
+
+def test_fast_parser_matches_dom_parser_on_corpus(backend):
+    assert CORPUS
+    for content in CORPUS:
+        assert parse_cfdi_xml_fast(content) == parse_cfdi_xml(content)
+
+
+def test_fast_parser_reads_payment_complement_and_cfdi_33(backend):
+    assert parse_cfdi_xml_fast(PAGO_XML) == parse_cfdi_xml(PAGO_XML)
+    assert parse_cfdi_xml_fast(PAGO_XML)["payment_complement"]["pagos"][0]["monto"] == 1160.0
+
+    # CFDI 3.3: mismo documento con el namespace cfd/3
+    content = CORPUS[0]
+    legacy = parse_cfdi_xml(content)
+    as_33 = content.replace(b"http://www.sat.gob.mx/cfd/4", b"http://www.sat.gob.mx/cfd/3")
+    assert parse_cfdi_xml_fast(as_33) == legacy
+    assert parse_cfdi_xml(as_33, fast=True) == legacy
+
+
+def test_fast_parser_rejects_invalid_documents(backend):
+    with pytest.raises(InvoiceParseError):
+        parse_cfdi_xml_fast(b"<cfdi:Comprobante")
+    with pytest.raises(InvoiceParseError):
+        parse_cfdi_xml_fast(b"<root><child/></root>")
+
+
+def test_batch_keeps_order_and_returns_errors_in_place():
+    contents = [CORPUS[0], b"not xml", PAGO_XML]
+
+    results = parse_cfdi_xml_batch(contents, max_workers=1)
+
+    assert results[0] == parse_cfdi_xml(CORPUS[0])
+    assert isinstance(results[1], InvoiceParseError)
+    assert results[2]["uuid"] == "AAAAAAAA-BBBB-CCCC-DDDD-EEEEEEEEEEEE"
+
+
+def test_fast_parser_throughput(backend):
+    rounds = 5
+
+    def _rate(parse):
+        started = time.perf_counter()
+        for _ in range(rounds):
+            for content in CORPUS:
+                parse(content)
+        return rounds * len(CORPUS) / (time.perf_counter() - started)
+
+    dom_rate = _rate(parse_cfdi_xml)
+    fast_rate = _rate(parse_cfdi_xml_fast)
+    print(f"\n[{backend}] DOM: {dom_rate:,.0f} docs/s | fast: {fast_rate:,.0f} docs/s "
+          f"({fast_rate / dom_rate:.1f}x)")
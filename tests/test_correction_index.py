@@ -0,0 +1,104 @@
+import json
+import sqlite3
+from types import SimpleNamespace
+
+import pytest
+
+from config.config import config
+from core.ai import correction_learning_service as service
+
+
+@pytest.fixture
+def memory_db(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "UNIFIED_DB_PATH", str(tmp_path / "corrections.db"))
+    service._ensure_tables()
+    service.invalidate_correction_index()
+    yield tmp_path / "corrections.db"
+    service.invalidate_correction_index()
+
+
+def _store(description, category, company_id=1):
+    return service.store_correction_feedback(
+        company_id=company_id, tenant_id=1, user_id=1, description=description,
+        ai_category="otros", corrected_category=category, movement_kind="cargo",
+    )
+
+
+def _reference_rankings(db_path, company_id, description):
+    """Scan previo sin límite de filas: similitud escalar, más reciente primero."""
+    conn = sqlite3.connect(db_path)
+    conn.row_factory = sqlite3.Row
+    rows = conn.execute(
+        "SELECT id, embedding_json FROM ai_correction_memory WHERE company_id = ? "
+        "ORDER BY datetime(created_at) DESC, id DESC",
+        (company_id,),
+    ).fetchall()
+    conn.close()
+    query = service._compute_embedding(service.normalize_description(description))
+    scored = [(service._cosine_similarity(query, json.loads(r["embedding_json"])), r["id"]) for r in rows]
+    scored.sort(key=lambda item: item[0], reverse=True)
+    return [(row_id, round(sim, 4)) for sim, row_id in scored]
+
+
+def test_index_matches_full_scan_beyond_previous_cap(memory_db):
+    for i in range(300):
+        _store(f"PAGO PROVEEDOR {i % 40}", f"categoria_{i % 7}")
+    _store("OXXO SUC 1", "gasolina", company_id=2)
+
+    queries = ["pago proveedor 3", "OXXO SUC 1", "   ", "comision bancaria"]
+    batch = service.find_similar_corrections_batch(company_id=1, descriptions=queries, top_k=5)
+
+    assert batch[2] == []
+    for description, results in zip(queries, batch):
+        if not description.strip():
+            continue
+        expected = _reference_rankings(memory_db, 1, description)[:5]
+        assert [(r["id"], r["similarity"]) for r in results] == expected
+        assert results == service.find_similar_corrections(company_id=1, description=description, top_k=5)
+    # Las correcciones más viejas (fuera del antiguo LIMIT 250) también participan
+    assert service._get_index(1).size == 300
+
+
+def test_store_updates_loaded_index_and_sees_external_writes(memory_db):
+    _store("UBER TRIP", "transporte")
+    index = service._get_index(1)
+    assert index.size == 1
+
+    stored = _store("NETFLIX", "suscripciones")
+    assert index.size == 2 and index.max_id == stored["id"]
+
+    # Escritura de otro proceso: se detecta por conteo y se carga solo lo nuevo
+    conn = sqlite3.connect(memory_db)
+    conn.execute(
+        "INSERT INTO ai_correction_memory (company_id, original_description, normalized_description, "
+        "corrected_category, embedding_json, embedding_dimensions) VALUES (1, 'SPEI', 'spei', 'transferencias', ?, 32)",
+        (json.dumps(service._compute_embedding("spei", "transferencias")),),
+    )
+    conn.commit()
+    conn.close()
+
+    results = service.find_similar_corrections(company_id=1, description="spei", top_k=3)
+    assert service._get_index(1) is index and index.size == 3
+    assert {r["original_description"] for r in results} == {"UBER TRIP", "NETFLIX", "SPEI"}
+
+
+def test_apply_corrections_scores_the_statement_in_one_pass(memory_db):
+    for description, category in [("UBER TRIP", "transporte"), ("NETFLIX", "suscripciones"), ("OXXO", "tienda")]:
+        _store(description, category)
+
+    transactions = [
+        SimpleNamespace(description=d, category="otros", ai_model="gemini", confidence=0.5)
+        for d in ["UBER TRIP", "", "NETFLIX COM", "OXXO"]
+    ]
+    updates = service.apply_corrections_to_transactions(transactions, 1, similarity_threshold=-1.0)
+
+    expected = []
+    for txn in transactions:
+        if not txn.description:
+            continue
+        ranking = _reference_rankings(memory_db, 1, txn.description)
+        if ranking[0][1] > 0:
+            expected.append(ranking[0])
+    assert [(u["correction_id"], u["similarity"]) for u in updates] == expected
+    assert transactions[1].category == "otros"
+    assert all(t.ai_model == "gemini+local-correction" for t in transactions if t.category != "otros")
@@ -0,0 +1,235 @@
+import json
+import random
+import sqlite3
+from datetime import datetime, timedelta
+
+import pytest
+
+from core.verticals.cpg_retail import rollups
+
+SKUS = ["MIEL-500", "MIEL-1000", "POLEN-250", "PROPOLEO-30"]
+
+
+@pytest.fixture
+def conn():
+    connection = sqlite3.connect(":memory:")
+    connection.row_factory = sqlite3.Row
+    connection.executescript(
+        """
+        CREATE TABLE cpg_pos (
+            id INTEGER PRIMARY KEY, company_id TEXT, codigo TEXT, nombre TEXT, payment_mode TEXT
+        );
+        CREATE TABLE sat_invoices (
+            id TEXT PRIMARY KEY, company_id TEXT, total REAL, fecha_emision TEXT, metadata TEXT
+        );
+        CREATE TABLE cpg_consignment (
+            id INTEGER PRIMARY KEY, company_id TEXT, pos_id INTEGER, numero_remision TEXT,
+            fecha_entrega TEXT, monto_total REAL, status TEXT
+        );
+        """
+    )
+    connection.executemany(
+        "INSERT INTO cpg_pos VALUES (?, ?, ?, ?, ?)",
+        [(1, "acme", "POS-1", "Tienda Centro", "cash"), (2, "acme", "POS-2", "Tienda Norte", "consignment"),
+         (3, "acme", "POS-3", "Sin ventas", "credit"), (4, "otra", "POS-4", "Otra empresa", "cash")],
+    )
+    return connection
+
+
+def _invoice(rng, number, company_id="acme", pos_id=None):
+    productos = [{"sku": rng.choice(SKUS), "qty": rng.randint(1, 5), "precio": round(rng.uniform(20, 300), 2)}
+                 for _ in range(rng.randint(1, 3))]
+    metadata = {"pos_id": str(pos_id or rng.choice([1, 2])), "productos": productos}
+    total = round(sum(p["qty"] * p["precio"] for p in productos) * 1.16, 2)
+    fecha = f"2025-03-{rng.randint(1, 28):02d}T{rng.randint(8, 20):02d}:15:00"
+    return {"id": f"uis_{number}", "company_id": company_id, "total": total,
+            "fecha_emision": fecha, "metadata": metadata}
+
+
+def _insert_invoice(conn, invoice):
+    conn.execute(
+        "INSERT INTO sat_invoices (id, company_id, total, fecha_emision, metadata) VALUES (?, ?, ?, ?, ?)",
+        (invoice["id"], invoice["company_id"], invoice["total"], invoice["fecha_emision"],
+         json.dumps(invoice["metadata"])),
+    )
+
+
+def _legacy_pos_sales(conn, company_id, fecha_inicio, fecha_fin):
+    """Ventas por POS leyendo sat_invoices directamente (consulta previa a los rollups)."""
+    rows = conn.execute(
+        """
+        SELECT p.id, COUNT(si.id), COALESCE(SUM(si.total), 0)
+        FROM cpg_pos p
+        LEFT JOIN sat_invoices si ON json_extract(si.metadata, '$.pos_id') = CAST(p.id AS TEXT)
+            AND si.company_id = p.company_id AND substr(si.fecha_emision, 1, 10) BETWEEN ? AND ?
+        WHERE p.company_id = ?
+        GROUP BY p.id
+        """,
+        (fecha_inicio, fecha_fin, company_id),
+    ).fetchall()
+    return {pos_id: (count, round(total, 2)) for pos_id, count, total in rows}
+
+
+def _snapshot(conn):
+    return (
+        conn.execute("SELECT company_id, pos_id, dia, total_facturas, total_ventas_cents, facturas_cobradas, "
+                     "total_cobrado_cents FROM cpg_pos_sales_daily ORDER BY 1, 2, 3").fetchall(),
+        [tuple(row[:4]) + (round(row[4], 6), row[5]) for row in conn.execute(
+            "SELECT company_id, pos_id, sku, dia, unidades, total_cents FROM cpg_product_sales_daily "
+            "ORDER BY 1, 2, 3, 4")],
+    )
+
+
+def test_hooks_keep_rollups_equal_to_rebuild_and_legacy_report(conn):
+    rng = random.Random(3)
+    rollups.ensure_rollup_schema(conn)
+    invoices = [_invoice(rng, number) for number in range(120)]
+    invoices.append(_invoice(rng, 999, company_id="otra", pos_id=4))
+    for invoice in invoices:
+        _insert_invoice(conn, invoice)
+        assert rollups.record_invoice(conn, invoice["company_id"], invoice["id"], invoice)
+    paid = [invoice["id"] for invoice in invoices[:40]]
+    assert rollups.record_payment(conn, "acme", paid, bank_tx_id=77) == 40
+
+    # Reintentos de los hooks no duplican importes
+    assert not rollups.record_invoice(conn, "acme", invoices[0]["id"], invoices[0])
+    assert rollups.record_payment(conn, "acme", paid[:5], bank_tx_id=77) == 0
+
+    report = {row["pos_id"]: row for row in rollups.pos_sales(conn, "acme", "2025-03-05", "2025-03-20")}
+    legacy = _legacy_pos_sales(conn, "acme", "2025-03-05", "2025-03-20")
+    assert {pos_id: (row["total_facturas"], row["total_ventas"]) for pos_id, row in report.items()} == legacy
+    assert report[3]["total_facturas"] == 0 and 4 not in report
+    assert report[2]["ventas_consignacion"] == report[2]["total_ventas"] and report[2]["ventas_contado"] == 0
+
+    incremental = _snapshot(conn)
+    rollups.rebuild_sales(conn, "acme")
+    rollups.rebuild_sales(conn, "otra")
+    assert _snapshot(conn) == incremental
+
+    cobrado = sum(row["total_cobrado"] for row in rollups.pos_sales(conn, "acme", "2025-03-01", "2025-03-31"))
+    assert cobrado == pytest.approx(sum(invoice["total"] for invoice in invoices[:40]))
+
+    skus = {row["sku"]: row for row in rollups.product_sales(conn, "acme", "2025-03-01", "2025-03-31")}
+    expected_units = {}
+    for invoice in invoices[:-1]:
+        for producto in invoice["metadata"]["productos"]:
+            expected_units[producto["sku"]] = expected_units.get(producto["sku"], 0) + producto["qty"]
+    assert {sku: row["unidades"] for sku, row in skus.items()} == expected_units
+
+
+def test_rebuild_backfills_invoices_written_without_hook(conn):
+    rng = random.Random(11)
+    imported = [_invoice(rng, number) for number in range(30)]
+    for invoice in imported[:10]:
+        _insert_invoice(conn, invoice)
+
+    # Columna nueva: se rellena desde metadata e indexa
+    assert rollups.ensure_rollup_schema(conn) is True
+    assert rollups.ensure_rollup_schema(conn) is False
+    assert conn.execute("SELECT COUNT(*) FROM sat_invoices WHERE pos_id IS NOT NULL").fetchone()[0] == 10
+    plan = " ".join(row[3] for row in conn.execute(
+        "EXPLAIN QUERY PLAN SELECT id FROM sat_invoices WHERE company_id = 'acme' AND pos_id = 1"))
+    assert "idx_sat_invoices_company_pos_fecha" in plan
+
+    for invoice in imported[10:]:
+        _insert_invoice(conn, invoice)  # importación masiva, sin hook
+    rollups.rebuild_sales(conn, "acme", "2025-03-01", "2025-03-31")
+    legacy = _legacy_pos_sales(conn, "acme", "2025-03-01", "2025-03-31")
+    report = rollups.pos_sales(conn, "acme", "2025-03-01", "2025-03-31")
+    assert {row["pos_id"]: (row["total_facturas"], row["total_ventas"]) for row in report} == legacy
+
+    # El hook que llega tarde no vuelve a sumar la factura
+    assert not rollups.record_invoice(conn, "acme", imported[-1]["id"], imported[-1])
+
+
+def test_freshness_indicator(conn):
+    rollups.ensure_rollup_schema(conn)
+    never = rollups.rollup_freshness(conn, "acme")
+    assert never["as_of"] is None and never["freshness"] == "very_stale" and never["needs_refresh"]
+
+    rollups.rebuild_sales(conn, "acme")
+    as_of = datetime.fromisoformat(rollups.rollup_freshness(conn, "acme")["as_of"])
+
+    fresh = rollups.rollup_freshness(conn, "acme", now=as_of + timedelta(minutes=10))
+    assert fresh["freshness"] == "fresh" and not fresh["needs_refresh"] and fresh["age_minutes"] == 10
+    stale = rollups.rollup_freshness(conn, "acme", now=as_of + timedelta(hours=3))
+    assert stale["freshness"] == "stale" and stale["needs_refresh"]
+    assert rollups.rollup_freshness(conn, "acme", now=as_of + timedelta(days=2))["freshness"] == "very_stale"
+
+    # Un rebuild parcial no mueve el as_of garantizado
+    rollups.rebuild_sales(conn, "acme", "2025-03-01", "2025-03-02")
+    assert rollups.rollup_freshness(conn, "acme")["as_of"] == as_of.isoformat()
+
+
+def test_consignment_aging_uses_single_as_of(conn):
+    rollups.ensure_rollup_schema(conn)
+    conn.executemany(
+        "INSERT INTO cpg_consignment VALUES (?, 'acme', 1, ?, ?, 100.0, ?)",
+        [(1, "R-1", "2025-01-01T09:00:00", "pending"), (2, "R-2", "2025-02-20", "pending"),
+         (3, "R-3", "2025-03-25", "pending"), (4, "R-4", "2025-01-01", "sold"),
+         (5, "R-5", "2025-01-01", "paid"), (6, "R-6", None, "pending")],
+    )
+
+    rows = rollups.consignment_aging(conn, "acme", as_of=datetime(2025, 4, 1, 12, 0))
+
+    assert [row["id"] for row in rows] == [6, 1, 4, 2, 3]
+    by_id = {row["id"]: row for row in rows}
+    assert by_id[1]["dias_en_consignacion"] == 90 and by_id[1]["aging_status"] == "overdue"
+    assert by_id[2]["dias_en_consignacion"] == 40 and by_id[2]["aging_status"] == "warning"
+    assert by_id[3]["aging_status"] == "ok"
+    assert by_id[4]["aging_status"] == "ok"  # vendida: ya no envejece como pendiente
+    assert by_id[1]["pos_codigo"] == "POS-1"
+
+
+def test_event_claimed_by_concurrent_hook_is_not_applied_twice(conn):
+    rng = random.Random(5)
+    rollups.ensure_rollup_schema(conn)
+    invoice = _invoice(rng, 1, pos_id=1)
+    _insert_invoice(conn, invoice)
+    # El otro hook ya insertó los eventos entre nuestra lectura y nuestra escritura
+    for kind in ("invoice", "payment"):
+        conn.execute(
+            "INSERT INTO cpg_rollup_events (event_key, company_id, kind, pos_id, dia, amount_cents) "
+            "VALUES (?, 'acme', ?, 1, '2025-03-01', 100)",
+            (f"{kind}:{invoice['id']}", kind),
+        )
+
+    assert not rollups.record_invoice(conn, "acme", invoice["id"], invoice)
+    assert rollups.record_payment(conn, "acme", [invoice["id"]]) == 0
+    assert conn.execute("SELECT COUNT(*) FROM cpg_pos_sales_daily").fetchone()[0] == 0
+
+
+def test_scheduled_refresh_and_first_read_build_never_rebuilt_companies(conn):
+    rng = random.Random(8)
+    for number in range(12):
+        _insert_invoice(conn, _invoice(rng, number))
+    _insert_invoice(conn, _invoice(rng, 99, company_id="otra", pos_id=4))
+    rollups.ensure_rollup_schema(conn)
+    conn.execute("UPDATE sat_invoices SET pos_id = NULL")  # pos_id ya existía (migración 005) sin backfill
+
+    assert rollups.ensure_built(conn, "acme") is True
+    assert rollups.ensure_built(conn, "acme") is False
+    legacy = _legacy_pos_sales(conn, "acme", "2025-03-01", "2025-03-31")
+    report = rollups.pos_sales(conn, "acme", "2025-03-01", "2025-03-31")
+    assert {row["pos_id"]: (row["total_facturas"], row["total_ventas"]) for row in report} == legacy
+
+    as_of = datetime.fromisoformat(rollups.rollup_freshness(conn, "acme")["as_of"])
+    assert set(rollups.refresh_stale(conn, now=as_of + timedelta(minutes=5))) == {"otra"}
+    assert set(rollups.refresh_stale(conn, now=as_of + timedelta(hours=2))) == {"acme", "otra"}
+    assert rollups.pos_sales(conn, "otra", "2025-03-01", "2025-03-31")[0]["total_facturas"] == 1
+
+
+def test_scheduler_only_starts_when_the_cpg_tables_exist(conn, monkeypatch):
+    import asyncio
+
+    from core.verticals.cpg_retail import rollup_scheduler
+
+    assert rollups.rollup_tables_exist(conn) is False
+    assert rollups.rollup_tables_exist(sqlite3.connect(":memory:")) is False
+    rollups.ensure_rollup_schema(conn)
+    assert rollups.rollup_tables_exist(conn) is True
+
+    monkeypatch.setattr(rollup_scheduler, "rollups_available", lambda: False)
+    scheduler = rollup_scheduler.CPGRollupScheduler(interval_minutes=1)
+    assert asyncio.run(scheduler.start()) is False
+    assert scheduler.running is False and not scheduler.scheduler.get_jobs()
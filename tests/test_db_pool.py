@@ -0,0 +1,60 @@
+import sqlite3
+import threading
+
+import pytest
+
+from core.shared.db_pool import ConnectionPool, PoolTimeoutError
+
+
+def _sqlite_pool(tmp_path, **kwargs):
+    path = str(tmp_path / "pool.db")
+    return ConnectionPool(lambda: sqlite3.connect(path, check_same_thread=False), **kwargs)
+
+
+def test_connections_are_reused(tmp_path):
+    pool = _sqlite_pool(tmp_path, max_size=2)
+
+    first = pool.acquire()
+    pool.release(first)
+    second = pool.acquire()
+
+    assert second is first
+    metrics = pool.get_metrics()
+    assert metrics["created"] == 1
+    assert metrics["checkouts"] == 2
+    assert metrics["in_use"] == 1
+
+
+def test_acquire_times_out_when_pool_is_exhausted(tmp_path):
+    pool = _sqlite_pool(tmp_path, max_size=1, max_wait=0.05)
+    pool.acquire()
+
+    with pytest.raises(PoolTimeoutError):
+        pool.acquire()
+    assert pool.get_metrics()["timeouts"] == 1
+
+
+def test_waiter_gets_connection_when_released(tmp_path):
+    pool = _sqlite_pool(tmp_path, max_size=1, max_wait=2)
+    held = pool.acquire()
+    acquired = []
+
+    waiter = threading.Thread(target=lambda: acquired.append(pool.acquire()))
+    waiter.start()
+    pool.release(held)
+    waiter.join(timeout=2)
+
+    assert acquired == [held]
+
+
+def test_expired_and_discarded_connections_are_replaced(tmp_path):
+    pool = _sqlite_pool(tmp_path, max_size=1, idle_timeout=0)
+
+    first = pool.acquire()
+    pool.release(first)
+    second = pool.acquire()
+    assert second is not first
+
+    pool.release(second, discard=True)
+    assert pool.get_metrics()["size"] == 0
+    assert pool.get_metrics()["discarded"] == 2
@@ -0,0 +1,77 @@
+from datetime import datetime
+
+from core.reconciliation.validation.optimized_duplicate_detector import (
+    DuplicateIndex,
+    OptimizedDuplicateDetector,
+)
+
+
+def _expense(expense_id, date, amount=100.0, description="Gasolina Pemex", merchant="Pemex"):
+    return {
+        "id": expense_id,
+        "date": date,
+        "amount": amount,
+        "description": description,
+        "merchant_name": merchant,
+    }
+
+
+def test_window_query_returns_closest_first():
+    index = DuplicateIndex(expenses=[
+        _expense(1, "2025-01-01"),
+        _expense(2, "2025-01-20"),
+        _expense(3, "2025-01-09"),
+        _expense(4, "2025-03-01"),
+        {"id": 5, "amount": 10.0},
+    ])
+
+    result = index.query(datetime(2025, 1, 10), window_days=10)
+
+    assert [e["id"] for e in result] == [3, 1, 2]
+    assert index.skipped_without_date == 1
+    assert "_relevance_score" not in result[0]
+
+
+def test_incremental_insert_keeps_dates_sorted():
+    index = DuplicateIndex(expenses=[_expense(1, "2025-01-01"), _expense(2, "2025-01-31")])
+    index.add(_expense(3, "2025-01-15"))
+    index.add_many([_expense(4, "2024-12-31"), _expense(5, "2025-01-16")])
+
+    positions = index.window_positions(datetime(2025, 1, 15), window_days=1)
+
+    assert [e["id"] for e in index.expenses_at(positions)] == [3, 5]
+    assert len(index) == 5
+
+
+def test_detect_duplicates_many_flags_duplicates_within_the_same_file():
+    detector = OptimizedDuplicateDetector()
+    detector.client = None
+    config = {"extract_ml_features": False}
+
+    existing = [_expense(1, "2025-01-10", amount=500.0)]
+    new = [
+        _expense(None, "2025-01-10", amount=500.0),
+        _expense(None, "2025-02-25", amount=75.0, description="Oxxo", merchant="Oxxo"),
+        _expense(None, "2025-02-25", amount=75.0, description="Oxxo", merchant="Oxxo"),
+    ]
+
+    results = detector.detect_duplicates_many(new, existing, custom_config=config)
+
+    assert [len(r) for r in results] == [1, 0, 1]
+    assert results[0][0].expense_id == 1
+
+
+def test_buffered_inserts_are_queried_and_merged_in_order(monkeypatch):
+    monkeypatch.setattr(DuplicateIndex, "MIN_PENDING_MERGE", 3)
+    index = DuplicateIndex(expenses=[_expense(1, "2025-01-10"), _expense(2, "2025-01-20")])
+
+    index.add(_expense(3, "2025-01-10"))
+    index.add(_expense(4, "2025-01-12"))
+    assert len(index._pending) == 2 and len(index) == 4
+    assert [e["id"] for e in index.query(datetime(2025, 1, 11), window_days=2)] == [1, 3, 4]
+    assert [e["id"] for e in index.query(datetime(2025, 1, 11), window_days=2, limit=2)] == [1, 3]
+
+    index.add(_expense(5, "2025-01-01"))
+    assert index._pending == []
+    assert [e["id"] for e in index.expenses_at(index.window_positions(datetime(2025, 1, 11), 30))] == [1, 3, 4, 2, 5]
+    assert list(index._ordinals) == sorted(index._ordinals)
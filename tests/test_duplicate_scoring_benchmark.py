@@ -0,0 +1,99 @@
+"""
+Micro-benchmark: scalar vs batched duplicate similarity scoring.
+
+Run with ``pytest tests/test_duplicate_scoring_benchmark.py -s`` to see
+pairs scored per second for both paths.
+"""
+import random
+import time
+from datetime import date, timedelta
+
+import numpy as np
+
+from core.reconciliation.validation.embedding_cache import EmbeddingCache
+from core.reconciliation.validation.optimized_duplicate_detector import OptimizedDuplicateDetector
+
+MERCHANTS = ["Pemex", "Oxxo", "Walmart", "Home Depot", "Costco", "Uber", "Telmex", "CFE"]
+
+
+def _make_candidates(count, seed=7):
+    rng = random.Random(seed)
+    base = date(2025, 1, 15)
+    candidates = []
+    for i in range(count):
+        merchant = rng.choice(MERCHANTS)
+        candidates.append({
+            "id": i,
+            "description": f"{merchant} sucursal {rng.randint(1, 40)}",
+            "amount": round(rng.uniform(50, 5000), 2),
+            "date": (base + timedelta(days=rng.randint(-30, 30))).isoformat(),
+            "merchant_name": merchant if rng.random() > 0.1 else None,
+        })
+    return candidates
+
+
+def _detector_with_embeddings(texts, cache_path, dim=64):
+    detector = OptimizedDuplicateDetector()
+    detector.embedding_cache = EmbeddingCache(path=str(cache_path))
+    detector.client = object()  # habilita la ruta de embeddings cacheados
+    rng = np.random.default_rng(3)
+    for text in texts:
+        detector._cache_embedding(text, rng.normal(size=dim).tolist())
+    return detector
+
+
+def test_batch_scoring_matches_scalar_and_reports_throughput(tmp_path):
+    candidates = _make_candidates(3000)
+    new_expense = {
+        "description": "Pemex sucursal 12",
+        "amount": 850.0,
+        "date": "2025-01-15",
+        "merchant_name": "PEMEX",
+    }
+    # Solo la mitad de las descripciones tiene embedding: ejercita ambas rutas
+    embedded = [new_expense["description"]] + [c["description"] for c in candidates[::2]]
+    detector = _detector_with_embeddings(embedded, tmp_path / "embeddings.sqlite3")
+    config = detector.config
+
+    OptimizedDuplicateDetector._string_similarity_optimized.cache_clear()
+    start = time.perf_counter()
+    scalar = [detector._calculate_similarity_optimized(new_expense, c, config) for c in candidates]
+    scalar_seconds = time.perf_counter() - start
+
+    OptimizedDuplicateDetector._string_similarity_optimized.cache_clear()
+    start = time.perf_counter()
+    scores, reasons = detector.score_candidates_batch(new_expense, candidates, config)
+    batch_seconds = time.perf_counter() - start
+
+    np.testing.assert_allclose(scores, [s for s, _ in scalar], rtol=1e-9, atol=1e-12)
+    low = config["similarity_thresholds"]["low"]
+    for (score, scalar_reasons), batch_reasons in zip(scalar, reasons):
+        if score >= low:
+            assert batch_reasons == scalar_reasons
+        else:
+            assert batch_reasons is None
+
+    pairs = len(candidates)
+    print(
+        f"\nscalar: {pairs / scalar_seconds:,.0f} pairs/s | "
+        f"batch: {pairs / batch_seconds:,.0f} pairs/s | "
+        f"speedup: {scalar_seconds / batch_seconds:.1f}x"
+    )
+
+
+def test_blank_provider_names_score_the_same_on_both_paths():
+    detector = OptimizedDuplicateDetector()
+    config = detector.config
+    candidates = [
+        {"id": i, "description": "Compra", "amount": 100.0, "date": "2025-01-15", "merchant_name": name}
+        for i, name in enumerate(["   ", "", None, "Pemex", " pemex "])
+    ]
+    for merchant in ("   ", "Pemex"):
+        new_expense = {"description": "Compra", "amount": 100.0, "date": "2025-01-15", "merchant_name": merchant}
+
+        components = detector._score_components_batch(new_expense, candidates)
+        scalar = [detector._provider_similarity(merchant, c["merchant_name"]) for c in candidates]
+
+        np.testing.assert_array_equal(components["provider"], scalar)
+        if not merchant.strip():
+            assert not components["provider"].any()
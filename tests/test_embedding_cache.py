@@ -0,0 +1,36 @@
+from core.reconciliation.validation.embedding_cache import EmbeddingCache
+
+MODEL = "text-embedding-3-small"
+
+
+def test_embeddings_persist_across_instances(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    EmbeddingCache(path=path).put("PAGO OXXO 123", [0.5, 0.25, 1.0], MODEL)
+
+    restarted = EmbeddingCache(path=path)
+
+    assert restarted.get("  pago oxxo 123 ", MODEL) == [0.5, 0.25, 1.0]
+    assert restarted.get("PAGO OXXO 123", "other-model") is None
+    stats = restarted.get_stats()
+    assert stats["cache_hits"] == 1
+    assert stats["cache_misses"] == 1
+    assert stats["cache_size"] == 1
+
+
+def test_lru_eviction_respects_byte_budget(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    # Cada vector ocupa 4 floats * 4 bytes = 16 bytes
+    cache = EmbeddingCache(path=path, max_bytes=48, memory_entries=0)
+
+    for text in ["a", "b", "c"]:
+        cache.put(text, [1.0, 2.0, 3.0, 4.0], MODEL)
+    cache._connection().execute("UPDATE embedding_cache SET last_access = 0 WHERE cache_key = ?",
+                                (cache.make_key("a", MODEL),))
+
+    cache.put("d", [1.0, 2.0, 3.0, 4.0], MODEL)
+
+    stats = cache.get_stats()
+    assert stats["evictions"] >= 1
+    assert stats["cache_bytes"] <= 48
+    assert cache.get("a", MODEL) is None
+    assert cache.get("d", MODEL) == [1.0, 2.0, 3.0, 4.0]
@@ -0,0 +1,71 @@
+import numpy as np
+
+from core.reconciliation.embedding_matcher import EmbeddingMatcher
+
+
+def _vector(cosine):
+    """Vector unitario cuyo coseno contra [1, 0] es `cosine`"""
+    return [cosine, float(np.sqrt(1 - cosine ** 2))]
+
+
+VECTORS = {
+    "ODOO": [1.0, 0.0],
+    "GAS": [1.0, 0.0],
+    "ODOO exacto fuera de fecha": _vector(1.0),
+    "ODOO casi fuera de monto": _vector(0.99),
+    "ODOO factible": _vector(0.9),
+    "c95": _vector(0.95),
+    "c93": _vector(0.93),
+    "c91": _vector(0.91),
+    "c85": _vector(0.85),
+    "c80": _vector(0.80),
+}
+
+
+def _matcher():
+    """EmbeddingMatcher sin modelo: los vectores salen de VECTORS"""
+    matcher = EmbeddingMatcher.__new__(EmbeddingMatcher)
+    matcher._get_embeddings = lambda texts: np.array([VECTORS[t] for t in texts], dtype=np.float32)
+    return matcher
+
+
+def _tx(tx_id, description, amount, date="2025-01-10"):
+    return {"id": tx_id, "description": description, "amount": amount, "date": date}
+
+
+def _inv(inv_id, name, total, fecha="2025-01-10"):
+    return {"id": inv_id, "nombre_emisor": name, "total": total, "fecha": fecha}
+
+
+def test_infeasible_invoice_with_higher_cosine_does_not_hide_feasible_one():
+    invoices = [
+        _inv(1, "ODOO exacto fuera de fecha", 500.0, fecha="2025-03-01"),
+        _inv(2, "ODOO casi fuera de monto", 560.0),
+        _inv(3, "ODOO factible", 505.0, fecha="2025-01-12"),
+    ]
+
+    candidates = _matcher().find_candidates([_tx(10, "ODOO", -500.0)], invoices, top_k=1)
+
+    assert [m.invoice_id for m in candidates[0]] == [3]
+    assert candidates[0][0].amount_diff == 5.0 and candidates[0][0].days_diff == 2
+
+
+def test_top_k_keeps_best_candidates_across_invoice_blocks():
+    invoices = [_inv(i, name, 100.0 + i) for i, name in enumerate(["c80", "c95", "c85", "c91", "c93"])]
+
+    candidates = _matcher().find_candidates(
+        [_tx(10, "ODOO", -100.0)], invoices, top_k=2, inv_chunk_size=2
+    )
+
+    assert [m.invoice_id for m in candidates[0]] == [1, 4]
+    assert [round(m.similarity_score, 2) for m in candidates[0]] == [0.95, 0.93]
+
+
+def test_match_batch_never_assigns_an_invoice_twice():
+    transactions = [_tx(10, "ODOO", -100.0), _tx(11, "GAS", -101.0)]
+    invoices = [_inv(1, "c95", 100.0), _inv(2, "c85", 101.0)]
+
+    matches = _matcher().match_batch(transactions, invoices, min_similarity=0.8)
+
+    assert sorted((m.transaction_id, m.invoice_id) for m in matches) == [(10, 1), (11, 2)]
+    assert len({m.invoice_id for m in matches}) == len(matches)
@@ -0,0 +1,69 @@
+import numpy as np
+
+from core.shared.embedding_service import EmbeddingService, get_embedding_service
+
+
+class FakeModel:
+    def __init__(self):
+        self.calls = []
+        self.batch_sizes = []
+
+    def encode(self, texts, batch_size=32, convert_to_numpy=True, normalize_embeddings=False,
+               show_progress_bar=False):
+        self.calls.append(list(texts))
+        self.batch_sizes.append(batch_size)
+        vectors = np.array([[len(t), t.count("a"), 1.0] for t in texts], dtype=np.float32)
+        if normalize_embeddings:
+            vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors
+
+
+def _service(**kwargs):
+    model = FakeModel()
+    loads = []
+
+    def loader(name):
+        loads.append(name)
+        return model
+
+    return EmbeddingService("fake", loader=loader, **kwargs), model, loads
+
+
+def test_encode_caches_by_normalized_text_and_loads_model_once():
+    service, model, loads = _service()
+
+    first = service.encode(["hola  mundo", "adios", "hola mundo"])
+    again = service.encode(" hola mundo ")
+    normalized = service.encode(["adios"], normalize_embeddings=True)
+
+    assert first.shape == (3, 3)
+    np.testing.assert_array_equal(first[0], first[2])
+    np.testing.assert_array_equal(again, first[0])
+    assert np.isclose(np.linalg.norm(normalized[0]), 1.0)
+    assert model.calls == [["hola mundo", "adios"], ["adios"]]
+    assert loads == ["fake"]
+
+
+def test_encode_sends_missing_texts_in_one_call_capped_by_max_batch_size():
+    service, model, _ = _service(max_batch_size=4)
+
+    vectors = service.encode([f"t{i}" for i in range(8)])
+
+    assert vectors.shape == (8, 3)
+    assert [len(call) for call in model.calls] == [8]
+    assert model.batch_sizes == [4]
+
+
+def test_availability_check_does_not_import_sentence_transformers():
+    import sys
+
+    from core.shared.embedding_service import sentence_transformers_available
+
+    before = "sentence_transformers" in sys.modules
+    assert isinstance(sentence_transformers_available(), bool)
+    assert ("sentence_transformers" in sys.modules) == before
+
+
+def test_get_embedding_service_is_shared_per_model():
+    assert get_embedding_service("model-a") is get_embedding_service("model-a")
+    assert get_embedding_service("model-a") is not get_embedding_service("model-b")
@@ -0,0 +1,55 @@
+import numpy as np
+
+from core.reconciliation.embedding_store import PersistentEmbeddingStore
+
+
+class _CountingEncoder:
+    def __init__(self, dim=8):
+        self.dim = dim
+        self.calls = []
+
+    def __call__(self, texts):
+        self.calls.append(list(texts))
+        return np.array([[float(len(t) + i) for i in range(self.dim)] for t in texts], dtype=np.float32)
+
+
+def test_encodes_missing_texts_in_batches(tmp_path):
+    encoder = _CountingEncoder()
+    store = PersistentEmbeddingStore(tenant_id=1, model_name="test-model", base_dir=str(tmp_path))
+
+    texts = ["ODOO", "GASOLINERA BERISA", "ODOO", "CRISTAL"]
+    matrix = store.get_or_encode(texts, encoder, batch_size=2)
+
+    assert matrix.shape == (4, 8)
+    assert matrix.dtype == np.float32
+    np.testing.assert_array_equal(matrix[0], matrix[2])
+    assert encoder.calls == [["ODOO", "GASOLINERA BERISA"], ["CRISTAL"]]
+
+
+def test_vectors_survive_restart_and_are_tenant_scoped(tmp_path):
+    encoder = _CountingEncoder()
+    first = PersistentEmbeddingStore(tenant_id=1, model_name="test-model", base_dir=str(tmp_path))
+    expected = first.get_or_encode(["ODOO", "CRISTAL"], encoder)
+
+    restarted = PersistentEmbeddingStore(tenant_id=1, model_name="test-model", base_dir=str(tmp_path))
+    reloaded = restarted.get_or_encode(["CRISTAL", "ODOO"], encoder)
+
+    np.testing.assert_array_equal(reloaded, expected[::-1])
+    assert len(encoder.calls) == 1
+    assert restarted.get_stats()["hits"] == 2
+
+    other_tenant = PersistentEmbeddingStore(tenant_id=2, model_name="test-model", base_dir=str(tmp_path))
+    other_tenant.get_or_encode(["ODOO"], encoder)
+    assert len(encoder.calls) == 2
+
+
+def test_store_sees_rows_appended_by_another_process(tmp_path):
+    encoder = _CountingEncoder()
+    reader = PersistentEmbeddingStore(tenant_id=1, model_name="test-model", base_dir=str(tmp_path))
+    writer = PersistentEmbeddingStore(tenant_id=1, model_name="test-model", base_dir=str(tmp_path))
+
+    assert len(reader) == 0
+    writer.get_or_encode(["ODOO"], encoder)
+
+    reader.get_or_encode(["ODOO"], encoder)
+    assert len(encoder.calls) == 1
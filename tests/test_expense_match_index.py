@@ -0,0 +1,132 @@
+import asyncio
+import json
+import random
+import sqlite3
+from datetime import date, timedelta
+
+from core.expenses.invoices.bulk_invoice_processor import (
+    BatchRecord,
+    BatchStatus,
+    BulkInvoiceProcessor,
+    ExpenseMatchIndex,
+    InvoiceItem,
+)
+
+PROVIDERS = ["Pemex Gasolinera", "Oxxo Tienda", "Office Depot", "Telmex", None]
+
+
+class SQLiteDB:
+    def __init__(self, conn):
+        self.conn = conn
+        self.queries = 0
+
+    async def fetch_all(self, query, params=None):
+        self.queries += 1
+        cursor = self.conn.execute(query, params or ())
+        columns = [c[0] for c in cursor.description]
+        return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+
+def _db(seed=11, count=300):
+    rng = random.Random(seed)
+    conn = sqlite3.connect(":memory:")
+    conn.execute(
+        "CREATE TABLE manual_expenses (id INTEGER PRIMARY KEY, company_id TEXT, description TEXT, "
+        "amount REAL, provider_name TEXT, expense_date TEXT, category TEXT, metadata TEXT, "
+        "created_at TEXT, bank_status TEXT)"
+    )
+    base = date(2025, 1, 1)
+    for i in range(1, count + 1):
+        metadata = json.dumps({"cfdi_uuid": f"UUID-{i}"}) if i % 25 == 0 else None
+        conn.execute(
+            "INSERT INTO manual_expenses VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                i, "acme" if i % 7 else "other", f"Gasto {i}",
+                rng.choice([100.0, 116.0, 250.0, round(rng.uniform(50, 3000), 2)]),
+                rng.choice(PROVIDERS), (base + timedelta(days=rng.randint(0, 60))).isoformat(),
+                "general", metadata, f"2025-01-01T00:00:{i % 60:02d}",
+                "invoiced" if i % 11 == 0 else "pending",
+            ),
+        )
+    return SQLiteDB(conn)
+
+
+def _item(total, uuid=None, provider="Pemex Gasolinera"):
+    return InvoiceItem(
+        filename=f"{total}.xml", uuid=uuid, total_amount=total, subtotal_amount=None,
+        iva_amount=None, currency="MXN", issued_date="2025-01-20", provider_name=provider,
+        provider_rfc=None, file_size=None, file_hash=None, raw_xml=None,
+    )
+
+
+def _batch():
+    return BatchRecord(
+        batch_id="b1", company_id="acme", total_invoices=0, auto_link_threshold=0.8,
+        auto_mark_invoiced=False, status=BatchStatus.PENDING, batch_metadata={},
+    )
+
+
+def test_index_matches_per_item_query():
+    db = _db()
+    processor = BulkInvoiceProcessor()
+    processor.db = db
+    batch = _batch()
+    rng = random.Random(5)
+    items = [_item(total, provider=rng.choice(PROVIDERS)) for total in
+             [100.0, 116.0, 250.0, 0.0, 999.99] + [round(rng.uniform(40, 3200), 2) for _ in range(60)]]
+
+    async def run():
+        by_query = [await processor._find_matching_expenses(batch, item) for item in items]
+        await processor._load_match_index(batch)
+        db.queries = 0
+        by_index = [await processor._find_matching_expenses(batch, item) for item in items]
+        return by_query, by_index
+
+    by_query, by_index = asyncio.run(run())
+
+    assert by_index == by_query
+    assert db.queries == 0
+    assert any(by_query)
+
+
+def test_index_finds_cfdi_uuid_outside_amount_range():
+    index = ExpenseMatchIndex([
+        {"id": 1, "description": "a", "amount": 5000.0, "provider_name": None, "expense_date": None,
+         "category": None, "metadata": json.dumps({"cfdi_uuid": "ABC"}), "created_at": "2025-01-01"},
+        {"id": 2, "description": "b", "amount": 100.0, "provider_name": "Oxxo", "expense_date": None,
+         "category": None, "metadata": None, "created_at": "2025-01-02"},
+    ])
+    processor = BulkInvoiceProcessor()
+    processor._match_indexes["b1"] = index
+
+    candidates = asyncio.run(processor._find_matching_expenses(_batch(), _item(100.0, uuid="ABC")))
+
+    assert [c["expense_id"] for c in candidates] == [1, 2]
+    assert candidates[0]["confidence"] == 1.0
+    assert "uuid_exact_match" in candidates[0]["reasons"]
+
+
+def test_linked_expense_is_no_longer_a_candidate_in_the_batch():
+    index = ExpenseMatchIndex([
+        {"id": 1, "description": "a", "amount": 100.0, "provider_name": "Oxxo", "expense_date": None,
+         "category": None, "metadata": json.dumps({"cfdi_uuid": "ABC"}), "created_at": "2025-01-02"},
+        {"id": 2, "description": "b", "amount": 100.0, "provider_name": "Oxxo", "expense_date": None,
+         "category": None, "metadata": None, "created_at": "2025-01-01"},
+        {"id": 3, "description": "c", "amount": 104.0, "provider_name": None, "expense_date": None,
+         "category": None, "metadata": None, "created_at": "2025-01-03"},
+    ])
+    processor = BulkInvoiceProcessor()
+    processor._match_indexes["b1"] = index
+    batch = _batch()
+
+    def found(item):
+        return [c["expense_id"] for c in asyncio.run(processor._find_matching_expenses(batch, item))]
+
+    assert found(_item(100.0, uuid="ABC")) == [1, 2, 3]
+    processor._release_matched_expense(batch, 1)
+    assert found(_item(100.0, uuid="ABC")) == [2, 3]
+    assert index.by_uuid("ABC") == []
+    processor._release_matched_expense(batch, 3)
+    assert found(_item(100.0)) == [2]
+    assert len(index) == 1
+    assert not index.remove(3)
@@ -0,0 +1,155 @@
+import random
+import sqlite3
+from pathlib import Path
+
+import pytest
+
+from core.reports import financial_reports_engine as engine_module
+from core.reports.financial_reports_engine import FinancialReportsEngine
+
+COLUMNS = (
+    "tenant_id, account_id, date, amount, movement_kind, cash_flow_category, display_type, "
+    "running_balance, category_auto, subcategory, tax_deductible, iva_amount, requires_receipt, "
+    "reconciliation_status, unusual_amount, cleaned_description, description"
+)
+
+
+VERSIONING_MIGRATION = (
+    Path(__file__).resolve().parents[1] / "migrations" / "sqlite" / "2026_10_16_bank_movement_data_versions.sql"
+)
+
+
+@pytest.fixture
+def bare_db_path(tmp_path):
+    engine_module.clear_report_cache()
+    path = str(tmp_path / "unified.db")
+    with sqlite3.connect(path) as conn:
+        conn.execute(f"CREATE TABLE bank_movements (id INTEGER PRIMARY KEY AUTOINCREMENT, {COLUMNS})")
+    return path
+
+
+@pytest.fixture
+def db_path(bare_db_path):
+    with sqlite3.connect(bare_db_path) as conn:
+        conn.executescript(VERSIONING_MIGRATION.read_text())
+    return bare_db_path
+
+
+def _movement(rng, tenant_id=1, account_id=7):
+    kind = rng.choice(["Ingreso", "Gasto", "Gasto"])
+    amount = round(rng.uniform(10, 9_000), 2) * (1 if kind == "Ingreso" else -1)
+    return (
+        tenant_id, account_id, f"2025-{rng.randint(1, 3):02d}-{rng.randint(1, 28):02d}", amount, kind,
+        rng.choice(["operativo", "inversion", None]),
+        rng.choice(["transaccion", "transaccion", "balance_inicial", None]),
+        round(rng.uniform(-1_000, 50_000), 2), rng.choice(["Servicios", "Sin categoría"]), "General",
+        rng.choice([0, 1]), round(abs(amount) * 0.16, 2), rng.choice([0, 1]), "pending", 0,
+        rng.choice(["CFE", "TELMEX", "OXXO"]), "Movimiento",
+    )
+
+
+def _insert(path, rows):
+    with sqlite3.connect(path) as conn:
+        conn.executemany(f"INSERT INTO bank_movements ({COLUMNS}) VALUES ({', '.join('?' * 17)})", rows)
+
+
+def _legacy_cash_flow(path, accounts="7, 11"):
+    """Las tres consultas originales, como referencia."""
+    conn = sqlite3.connect(path)
+    conn.row_factory = sqlite3.Row
+    categories = conn.execute(f"""
+        SELECT cash_flow_category, movement_kind, COUNT(*) as transaction_count,
+               ROUND(SUM(CASE WHEN movement_kind = 'Ingreso' THEN amount ELSE 0 END), 2) as total_inflows,
+               ROUND(SUM(CASE WHEN movement_kind = 'Gasto' THEN ABS(amount) ELSE 0 END), 2) as total_outflows
+        FROM bank_movements WHERE account_id IN ({accounts}) AND display_type != 'balance_inicial'
+        GROUP BY cash_flow_category, movement_kind ORDER BY cash_flow_category, movement_kind
+    """).fetchall()
+    balance = conn.execute(f"""
+        SELECT MIN(running_balance) as min_balance, MAX(running_balance) as max_balance,
+               (SELECT running_balance FROM bank_movements WHERE account_id IN ({accounts})
+                ORDER BY date DESC, id DESC LIMIT 1) as final_balance
+        FROM bank_movements WHERE account_id IN ({accounts})
+    """).fetchone()
+    weekly = conn.execute(f"""
+        SELECT strftime('%Y-%W', date) as week,
+               ROUND(SUM(CASE WHEN movement_kind = 'Ingreso' THEN amount ELSE 0 END), 2) as weekly_income,
+               ROUND(SUM(CASE WHEN movement_kind = 'Gasto' THEN ABS(amount) ELSE 0 END), 2) as weekly_expenses,
+               ROUND(SUM(CASE WHEN movement_kind = 'Ingreso' THEN amount ELSE -ABS(amount) END), 2) as net_flow
+        FROM bank_movements WHERE account_id IN ({accounts}) AND display_type != 'balance_inicial'
+        GROUP BY strftime('%Y-%W', date) ORDER BY week
+    """).fetchall()
+    conn.close()
+    return dict(balance), [dict(r) for r in categories], [dict(r) for r in weekly]
+
+
+def test_single_pass_cash_flow_matches_legacy_queries(db_path):
+    rng = random.Random(4)
+    _insert(db_path, [_movement(rng, account_id=rng.choice([7, 11, 12])) for _ in range(400)])
+
+    report = FinancialReportsEngine(db_path, use_cache=False).generate_cash_flow_analysis()
+
+    balance, categories, weekly = _legacy_cash_flow(db_path)
+    assert report["balance_summary"] == balance
+    assert report["cash_flow_by_category"] == categories
+    assert report["weekly_trends"] == weekly
+
+
+def test_engine_is_scoped_by_tenant_accounts_and_period(db_path):
+    rng = random.Random(8)
+    _insert(db_path, [_movement(rng, tenant_id=1, account_id=12) for _ in range(50)])
+    _insert(db_path, [_movement(rng, tenant_id=2, account_id=12) for _ in range(50)])
+
+    scoped = FinancialReportsEngine(db_path, tenant_id=1, account_ids=[12], start_date="2025-02-01",
+                                    end_date="2025-02-28", use_cache=False)
+    report = scoped.generate_cash_flow_analysis()
+
+    with sqlite3.connect(db_path) as conn:
+        expected = conn.execute(
+            "SELECT COUNT(*) FROM bank_movements WHERE tenant_id = 1 AND account_id = 12 "
+            "AND date BETWEEN '2025-02-01' AND '2025-02-28' AND display_type != 'balance_inicial'"
+        ).fetchone()[0]
+    assert sum(c["transaction_count"] for c in report["cash_flow_by_category"]) == expected > 0
+    assert FinancialReportsEngine(db_path, use_cache=False).generate_cash_flow_analysis()["weekly_trends"] == []
+
+
+def test_reports_are_cached_until_bank_movements_change(db_path):
+    rng = random.Random(1)
+    _insert(db_path, [_movement(rng) for _ in range(30)])
+    engine = FinancialReportsEngine(db_path, tenant_id=1)
+
+    first = engine.generate_comprehensive_financial_report()
+    stats = engine_module.get_report_cache_stats()
+    assert FinancialReportsEngine(db_path, tenant_id=1).generate_comprehensive_financial_report() == first
+    assert engine_module.get_report_cache_stats()["hits"] == stats["hits"] + 1
+
+    # Otro tenant / otras cuentas no invalidan
+    _insert(db_path, [_movement(rng, tenant_id=2)])
+    assert engine.generate_cash_flow_analysis() == first["cash_flow_analysis"]
+
+    _insert(db_path, [(1, 7, "2025-03-30", 12_345.0, "Ingreso", "operativo", "transaccion", 99_999.0,
+                       "Servicios", "General", 0, 0, 0, "pending", 0, "CLIENTE", "Cobro")])
+    refreshed = engine.generate_cash_flow_analysis()
+    assert refreshed["balance_summary"]["max_balance"] == 99_999.0
+
+    with sqlite3.connect(db_path) as conn:
+        conn.execute("UPDATE bank_movements SET running_balance = 123456.0 WHERE id = 1")
+    assert engine.generate_cash_flow_analysis()["balance_summary"]["max_balance"] == 123_456.0
+
+
+def test_reports_skip_the_cache_until_the_versioning_migration_is_applied(bare_db_path):
+    rng = random.Random(2)
+    _insert(bare_db_path, [_movement(rng) for _ in range(10)])
+    engine = FinancialReportsEngine(bare_db_path, tenant_id=1)
+
+    assert engine.data_version() is None
+    engine.generate_cash_flow_analysis()
+    assert engine_module.get_report_cache_stats()["entries"] == 0
+    with sqlite3.connect(bare_db_path) as conn:
+        assert conn.execute(
+            "SELECT COUNT(*) FROM sqlite_master WHERE name = 'bank_movement_data_versions'"
+        ).fetchone()[0] == 0
+
+    with sqlite3.connect(bare_db_path) as conn:
+        conn.executescript(VERSIONING_MIGRATION.read_text())
+        conn.execute("DROP TRIGGER trg_bank_movement_version_delete")
+    assert engine.data_version() is None
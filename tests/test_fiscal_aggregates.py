@@ -0,0 +1,241 @@
+import json
+import random
+import sqlite3
+
+import pytest
+
+from config.config import config
+from core.financial_reports_generator import FinancialReportsGenerator
+from core.fiscal_aggregates import apply_pending_changes, ensure_fiscal_aggregate_schema, rebuild_period
+
+SLUGS = [
+    "transporte_combustible", "viaticos_alimentos", "gastos_representacion",
+    "tecnologia_software", "gastos_no_deducibles", None,
+]
+
+
+@pytest.fixture
+def db_path(tmp_path, monkeypatch):
+    path = tmp_path / "unified.db"
+    conn = sqlite3.connect(path)
+    conn.executescript(
+        """
+        CREATE TABLE expense_records (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            tenant_id INTEGER,
+            amount REAL,
+            subtotal REAL,
+            iva_16 REAL DEFAULT 0,
+            iva_8 REAL DEFAULT 0,
+            iva_0 REAL DEFAULT 0,
+            description TEXT,
+            merchant_name TEXT,
+            date TEXT,
+            status TEXT,
+            categoria_slug TEXT,
+            categoria_confianza REAL,
+            sat_account_code TEXT,
+            tax_source TEXT,
+            cfdi_uuid TEXT,
+            metadata TEXT
+        );
+        CREATE TABLE companies (tenant_id INTEGER, rfc TEXT);
+        """
+    )
+    conn.commit()
+    conn.close()
+    monkeypatch.setattr(config, "UNIFIED_DB_PATH", path)
+    return path
+
+
+def _random_expense(rng, tenant_id, month):
+    rate = rng.choice([0.16, 0.08, 0.0])
+    subtotal = round(rng.uniform(50, 5_000), 2)
+    iva = round(subtotal * rate, 2)
+    slug = rng.choice(SLUGS)
+    return (
+        tenant_id, subtotal + iva, subtotal,
+        iva if rate == 0.16 else 0, iva if rate == 0.08 else 0,
+        f"Gasto {rng.randint(1, 999)}", "Proveedor",
+        f"2025-{month:02d}-{rng.randint(1, 28):02d}T10:00:00",
+        rng.choice([None, "pending", "cancelled"]),
+        slug, rng.choice([None, 0.4, 0.9]),
+        f"6{SLUGS.index(slug)}1.01" if slug else None,
+        rng.choice(["rule", "llm", None]),
+        rng.choice([None, "UUID-1"]),
+        json.dumps({"categoria_needs_review": True}) if rng.random() < 0.1 else None,
+    )
+
+
+def _insert(path, rows):
+    with sqlite3.connect(path) as conn:
+        conn.executemany(
+            "INSERT INTO expense_records (tenant_id, amount, subtotal, iva_16, iva_8, description, "
+            "merchant_name, date, status, categoria_slug, categoria_confianza, sat_account_code, "
+            "tax_source, cfdi_uuid, metadata) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            rows,
+        )
+
+
+def _install(path):
+    """Lo que hace UnifiedDBAdapter._ensure_fiscal_aggregates al arrancar."""
+    with sqlite3.connect(path) as conn:
+        ensure_fiscal_aggregate_schema(conn)
+        apply_pending_changes(conn)
+
+
+def _pending(path):
+    with sqlite3.connect(path) as conn:
+        return conn.execute("SELECT COUNT(*) FROM fiscal_aggregate_pending").fetchone()[0]
+
+
+def _detail_summary(generator, year, month):
+    """Resumen calculado leyendo cada gasto (camino previo a los agregados)."""
+    start, end = generator._get_fiscal_period_dates(year, month)
+    return generator._generate_iva_summary(generator._fetch_expenses(start, end))
+
+
+def _snapshot(path):
+    with sqlite3.connect(path) as conn:
+        return sorted(conn.execute("SELECT * FROM fiscal_monthly_aggregates").fetchall(),
+                      key=lambda row: tuple(str(value) for value in row[:9]) + (str(row[-1]),))
+
+
+def test_aggregates_track_inserts_updates_and_cancellations(db_path):
+    rng = random.Random(5)
+    _install(db_path)
+    _insert(db_path, [_random_expense(rng, tenant, month) for tenant in (1, 2) for month in (3, 4)
+                      for _ in range(60)])
+
+    for source in (None, "llm"):
+        generator = FinancialReportsGenerator("1", source)
+        for month in (3, 4):
+            assert generator.generate_iva_report(2025, month, detailed=False)["resumen"] == \
+                _detail_summary(generator, 2025, month)
+
+    with sqlite3.connect(db_path) as conn:
+        conn.execute("UPDATE expense_records SET amount = amount + 100, cfdi_uuid = 'UUID-2' WHERE id % 7 = 0")
+        conn.execute("UPDATE expense_records SET date = '2025-04-15' WHERE id % 11 = 0")  # cambia de periodo
+        conn.execute("UPDATE expense_records SET status = 'cancelled' WHERE id % 13 = 0")
+        conn.execute("UPDATE expense_records SET status = 'pending' WHERE id % 17 = 0")  # reactivados
+        conn.execute("DELETE FROM expense_records WHERE id % 19 = 0")
+    _insert(db_path, [_random_expense(rng, 1, 3) for _ in range(10)])
+
+    generator = FinancialReportsGenerator("1")
+    for month in (3, 4):
+        report = generator.generate_iva_report(2025, month)
+        assert report["resumen"] == _detail_summary(generator, 2025, month)
+        assert len(report["detalle"]) == report["resumen"]["gastos_con_cfdi"] + report["resumen"]["gastos_sin_cfdi"]
+
+    assert _pending(db_path) > 0  # las lecturas no drenan la cola
+    with sqlite3.connect(db_path) as conn:
+        apply_pending_changes(conn)
+    incremental = _snapshot(db_path)
+    with sqlite3.connect(db_path) as conn:
+        conn.row_factory = sqlite3.Row
+        for tenant in (1, 2):
+            for month in (3, 4):
+                rebuild_period(conn, tenant, 2025, month)
+    rebuilt = _snapshot(db_path)
+    strip = lambda rows: [row[:-1] for row in rows]  # sin updated_at
+    assert strip(rebuilt) == strip(incremental)
+
+
+def test_resumen_and_revision_read_aggregates_and_review_rows_only(db_path):
+    rng = random.Random(9)
+    _install(db_path)
+    _insert(db_path, [_random_expense(rng, 1, 5) for _ in range(80)])
+    generator = FinancialReportsGenerator("1")
+
+    resumen = generator.generate_resumen_fiscal(2025, 5)
+
+    expenses = generator._fetch_expenses(*generator._get_fiscal_period_dates(2025, 5))
+    by_slug = {}
+    for expense in expenses:
+        entry = by_slug.setdefault(expense.get("categoria_slug") or "sin_categoria", [0, 0.0])
+        entry[0] += 1
+        entry[1] += float(expense["total"])
+    expected = sorted(((slug, count, round(total, 2)) for slug, (count, total) in by_slug.items()),
+                      key=lambda item: item[2], reverse=True)
+    assert [(c["slug"], c["cantidad"], c["total"]) for c in resumen["categorias"]] == expected[:10]
+
+    review = [e for e in expenses if e["needs_review"]]
+    assert review
+    assert resumen["revision"]["total"] == len(review)
+    assert resumen["revision"]["monto"] == round(sum(float(e["total"]) for e in review), 2)
+    assert resumen["totales"]["gastos_total"] == _detail_summary(generator, 2025, 5)["total_gastos"]
+
+    listing = generator.generate_gastos_revision_report(2025, 5)
+    assert [g["id"] for g in listing["gastos"]] == [e["id"] for e in review]
+
+
+def test_existing_expenses_are_backfilled_when_schema_is_installed(db_path):
+    rng = random.Random(2)
+    _insert(db_path, [_random_expense(rng, 1, 6) for _ in range(25)])
+
+    # Sin esquema los reportes se calculan desde expense_records y no lo instalan
+    generator = FinancialReportsGenerator("1")
+    expected = _detail_summary(generator, 2025, 6)
+    assert generator.generate_iva_report(2025, 6, detailed=False)["resumen"] == expected
+    revision = generator.generate_gastos_revision_report(2025, 6)
+    with sqlite3.connect(db_path) as conn:
+        assert not conn.execute("SELECT 1 FROM sqlite_master WHERE name LIKE '%fiscal%'").fetchall()
+
+    with sqlite3.connect(db_path) as conn:
+        assert ensure_fiscal_aggregate_schema(conn) is True
+        assert ensure_fiscal_aggregate_schema(conn) is False
+    assert _pending(db_path) == 25
+
+    assert generator.generate_iva_report(2025, 6, detailed=False)["resumen"] == expected
+    assert generator.generate_gastos_revision_report(2025, 6)["gastos"] == revision["gastos"]
+
+
+def test_report_reads_do_not_write_or_take_the_write_lock(db_path):
+    rng = random.Random(4)
+    _install(db_path)
+    _insert(db_path, [_random_expense(rng, 1, 9) for _ in range(30)])
+    pending = _pending(db_path)
+
+    writer = sqlite3.connect(db_path, timeout=0)
+    writer.execute("BEGIN IMMEDIATE")  # otro proceso escribiendo
+    try:
+        generator = FinancialReportsGenerator("1")
+        generator.generate_resumen_fiscal(2025, 9)
+    finally:
+        writer.rollback()
+        writer.close()
+    assert _pending(db_path) == pending
+
+
+def test_detail_uses_expense_date_when_date_is_missing(db_path):
+    with sqlite3.connect(db_path) as conn:
+        conn.execute("ALTER TABLE expense_records ADD COLUMN expense_date TEXT")
+        conn.executemany(
+            "INSERT INTO expense_records (tenant_id, amount, subtotal, iva_16, date, expense_date) "
+            "VALUES (1, 116, 100, 16, ?, ?)",
+            [(None, "2025-07-10"), ("", "2025-07-11"), ("2025-07-12", "2025-08-01"), ("2025-08-02", "2025-07-13")],
+        )
+    _install(db_path)
+
+    report = FinancialReportsGenerator("1").generate_iva_report(2025, 7)
+    assert [d["id"] for d in report["detalle"]] == [1, 2, 3]
+    assert report["resumen"]["gastos_sin_cfdi"] == 3
+
+
+def test_rebuild_period_uses_expense_date_when_date_is_missing(db_path):
+    with sqlite3.connect(db_path) as conn:
+        conn.execute("ALTER TABLE expense_records ADD COLUMN expense_date TEXT")
+        conn.executemany(
+            "INSERT INTO expense_records (tenant_id, amount, subtotal, iva_16, date, expense_date) "
+            "VALUES (1, 116, 100, 16, ?, ?)",
+            [(None, "2025-07-10"), ("", "2025-07-11"), ("2025-07-12", "2025-08-01"), ("2025-08-02", "2025-07-13")],
+        )
+        ensure_fiscal_aggregate_schema(conn)
+        apply_pending_changes(conn)
+        before = [row[:-1] for row in _snapshot(db_path)]
+        assert len(before) == 2
+
+        assert rebuild_period(conn, 1, 2025, 7) == 3
+        assert rebuild_period(conn, 1, 2025, 8) == 1
+
+    assert [row[:-1] for row in _snapshot(db_path)] == before
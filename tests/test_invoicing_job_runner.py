@@ -0,0 +1,170 @@
+import asyncio
+import threading
+
+from modules.invoicing_agent import models
+from modules.invoicing_agent.worker import InvoicingJobRunner
+
+
+class FakeQueue:
+    """Simula claim_pending_jobs sobre una lista en memoria"""
+
+    def __init__(self, jobs=()):
+        self.pending = list(jobs)
+        self.lock = threading.Lock()
+        self.claims = []
+
+    def add(self, job):
+        with self.lock:
+            self.pending.append(job)
+
+    def claim(self, limit, tenant_id, *, exclude_merchants=(), exclude_ids=(), stale_after_seconds=900):
+        with self.lock:
+            claimed = [j for j in self.pending
+                       if j.get("merchant_key") not in exclude_merchants and j["id"] not in exclude_ids][:limit]
+            for job in claimed:
+                self.pending.remove(job)
+            self.claims.append((limit, sorted(exclude_merchants)))
+            return claimed
+
+
+class FakeWorker:
+    def __init__(self, gates=None):
+        self.gates = gates or {}
+        self.active = {}
+        self.peak = {}
+        self.total_peak = 0
+        self.done = []
+
+    async def process_job(self, job_id):
+        merchant = job_id.split("-")[0]
+        self.active[merchant] = self.active.get(merchant, 0) + 1
+        self.peak[merchant] = max(self.peak.get(merchant, 0), self.active[merchant])
+        self.total_peak = max(self.total_peak, sum(self.active.values()))
+        try:
+            gate = self.gates.get(merchant)
+            if gate is not None:
+                await gate.wait()
+            else:
+                await asyncio.sleep(0.01)
+        finally:
+            self.active[merchant] -= 1
+        self.done.append(job_id)
+        return {"success": True}
+
+
+def _jobs(merchant, count, keyed=True):
+    return [{"id": f"{merchant}-{i}", "merchant_key": merchant if keyed else None} for i in range(count)]
+
+
+async def _run_until(runner, condition, timeout=2.0):
+    task = asyncio.create_task(runner.run())
+    try:
+        async def wait():
+            while not condition():
+                await asyncio.sleep(0.005)
+
+        await asyncio.wait_for(wait(), timeout)
+    finally:
+        runner.stop()
+        await asyncio.wait_for(task, timeout)
+
+
+def test_runner_respects_global_and_per_merchant_limits():
+    queue = FakeQueue(_jobs("oxxo", 6) + _jobs("walmart", 3) + _jobs("anon", 3, keyed=False))
+    worker = FakeWorker()
+    runner = InvoicingJobRunner(worker, max_concurrency=4, max_per_merchant=2, batch_size=16,
+                                poll_interval=60, claim_jobs=queue.claim, listen=False)
+
+    asyncio.run(_run_until(runner, lambda: len(worker.done) == 12))
+
+    assert worker.total_peak == 4
+    assert worker.peak["oxxo"] == 2 and worker.peak["walmart"] == 2
+    assert worker.peak["anon"] >= 2  # sin comercio conocido: solo límite global
+    assert any("oxxo" in excluded for _, excluded in queue.claims)
+    assert all(limit <= 4 for limit, _ in queue.claims)
+    assert runner.get_stats()["processed"] == 12
+
+
+def test_slow_merchant_does_not_stall_other_tickets():
+    async def run():
+        slow = asyncio.Event()
+        queue = FakeQueue(_jobs("portal_lento", 3) + _jobs("rapido", 4))
+        worker = FakeWorker(gates={"portal_lento": slow})
+        runner = InvoicingJobRunner(worker, max_concurrency=4, max_per_merchant=2,
+                                    poll_interval=60, claim_jobs=queue.claim, listen=False)
+        task = asyncio.create_task(runner.run())
+
+        while len([j for j in worker.done if j.startswith("rapido")]) < 4:
+            await asyncio.sleep(0.005)
+        stalled = [j for j in worker.done if j.startswith("portal_lento")]
+
+        slow.set()
+        while len(worker.done) < 7:
+            await asyncio.sleep(0.005)
+        runner.stop()
+        await asyncio.wait_for(task, 2)
+        return stalled, worker
+
+    stalled, worker = asyncio.run(asyncio.wait_for(run(), 5))
+
+    assert stalled == []
+    assert worker.peak["portal_lento"] == 2
+
+
+def test_runner_wakes_on_new_job_without_waiting_for_poll():
+    queue = FakeQueue()
+    worker = FakeWorker()
+    runner = InvoicingJobRunner(worker, poll_interval=60, claim_jobs=queue.claim, listen=False)
+
+    async def run():
+        task = asyncio.create_task(runner.run())
+        await asyncio.sleep(0.05)
+        queue.add({"id": "oxxo-1", "merchant_key": "oxxo"})
+        models._notify_job_listeners(99, "otro-tenant")  # otro tenant: se ignora
+        models._notify_job_listeners(3, "oxxo-1")
+        while not worker.done:
+            await asyncio.sleep(0.005)
+        runner.stop()
+        await asyncio.wait_for(task, 2)
+
+    asyncio.run(asyncio.wait_for(run(), 2))
+
+    assert worker.done == ["oxxo-1"]
+    assert runner.get_stats()["wakeups"] >= 1
+    assert runner._on_job_created not in models._job_listeners
+
+
+def test_long_running_job_gets_heartbeats_and_is_never_restarted():
+    async def run():
+        gate = asyncio.Event()
+        queue = FakeQueue(_jobs("portal_lento", 1))
+        worker = FakeWorker(gates={"portal_lento": gate})
+        touched = []
+        stale_claims = []
+
+        def claim(limit, tenant_id, *, exclude_ids=(), **kwargs):
+            stale_claims.append(list(exclude_ids))
+            # Simula un reclamo por timeout del mismo job mientras sigue corriendo
+            claimed = queue.claim(limit, tenant_id, **kwargs)
+            if not claimed and not gate.is_set():
+                claimed = [{"id": "portal_lento-0", "merchant_key": None}]
+            return claimed
+
+        runner = InvoicingJobRunner(worker, poll_interval=0.01, claim_timeout=0.06,
+                                    claim_jobs=claim, heartbeat_jobs=touched.append, listen=False)
+        task = asyncio.create_task(runner.run())
+        while len(touched) < 3:
+            await asyncio.sleep(0.005)
+        gate.set()
+        while not worker.done:
+            await asyncio.sleep(0.005)
+        runner.stop()
+        await asyncio.wait_for(task, 2)
+        return worker, touched, stale_claims, runner
+
+    worker, touched, stale_claims, runner = asyncio.run(asyncio.wait_for(run(), 5))
+
+    assert worker.done == ["portal_lento-0"]
+    assert all(ids == ["portal_lento-0"] for ids in touched)
+    assert ["portal_lento-0"] in stale_claims
+    assert runner._heartbeat_task is None
@@ -0,0 +1,188 @@
+import asyncio
+import threading
+
+import pytest
+
+from core import playwright_browser_pool
+from core.playwright_browser_pool import BrowserPool, BrowserPoolTimeoutError
+
+
+class FakeRequest:
+    def __init__(self, resource_type):
+        self.resource_type = resource_type
+
+
+class FakeRoute:
+    def __init__(self, resource_type):
+        self.request = FakeRequest(resource_type)
+        self.outcome = None
+
+    async def abort(self):
+        self.outcome = "abort"
+
+    async def fallback(self):
+        self.outcome = "fallback"
+
+
+class FakeContext:
+    def __init__(self, browser, options):
+        self.browser = browser
+        self.options = options
+        self.routes = []
+        self.closed = False
+
+    async def route(self, pattern, handler):
+        self.routes.append(handler)
+
+    async def close(self):
+        self.closed = True
+
+
+class FakeBrowser:
+    def __init__(self, number):
+        self.number = number
+        self.connected = True
+        self.closed = False
+        self.contexts = []
+
+    def on(self, event, handler):
+        pass
+
+    def is_connected(self):
+        return self.connected and not self.closed
+
+    async def new_context(self, **options):
+        context = FakeContext(self, options)
+        self.contexts.append(context)
+        return context
+
+    async def close(self):
+        self.closed = True
+
+
+class FakePlaywright:
+    def __init__(self):
+        self.launches = []
+        self.chromium = self
+
+    async def launch(self, **options):
+        self.launches.append(options)
+        return FakeBrowser(len(self.launches))
+
+    async def stop(self):
+        pass
+
+
+def _pool(playwright, **kwargs):
+    async def launcher():
+        return playwright
+
+    return BrowserPool(launcher=launcher, **kwargs)
+
+
+def test_contexts_are_spread_over_warm_browsers_and_recycled():
+    playwright = FakePlaywright()
+    pool = _pool(playwright, size=2, max_contexts_per_browser=2, max_uses=3)
+
+    async def run():
+        await pool.start()
+        leases = [await pool.acquire({"locale": "es-MX"}) for _ in range(4)]
+        browsers = sorted(lease.context.browser.number for lease in leases)
+        metrics = pool.get_metrics()
+        for lease in leases:
+            await pool.release(lease)
+
+        # Cada browser lleva 2 usos: el tercero agota al browser 1, que se
+        # recicla; el siguiente contexto va al browser nuevo, no al 2 gastado
+        await pool.release(await pool.acquire())
+        fresh = await pool.acquire()
+        await pool.release(fresh)
+        return browsers, metrics, leases, fresh
+
+    browsers, metrics, leases, fresh = asyncio.run(run())
+
+    assert browsers == [1, 1, 2, 2]
+    assert metrics["utilization"] == 1.0 and metrics["contexts_in_use"] == 4
+    assert all(lease.context.closed for lease in leases)
+    assert all(launch["headless"] for launch in playwright.launches)
+    assert fresh.context.browser.number == 3
+    final = pool.get_metrics()
+    assert final["recycled"] == 1 and final["launched"] == 3
+    assert final["browsers"] == 2 and final["contexts_in_use"] == 0
+    assert final["acquires"] == 6 and final["acquire_latency_ms"]["max"] >= 0
+
+
+def test_crashed_browser_is_replaced():
+    playwright = FakePlaywright()
+    pool = _pool(playwright, size=1, max_contexts_per_browser=2)
+
+    async def run():
+        lease = await pool.acquire()
+        lease.context.browser.connected = False
+        await pool.release(lease)
+        return await pool.acquire()
+
+    lease = asyncio.run(run())
+
+    assert lease.context.browser.number == 2
+    assert pool.get_metrics()["crashed"] == 1
+
+
+def test_acquire_is_bounded_and_times_out():
+    pool = _pool(FakePlaywright(), size=1, max_contexts_per_browser=1)
+
+    async def run():
+        await pool.acquire()
+        with pytest.raises(BrowserPoolTimeoutError, match="tras 0.01s"):
+            await pool.acquire(timeout=0.01)
+
+    asyncio.run(run())
+    assert pool.get_metrics()["timeouts"] == 1
+
+
+def test_resource_blocking_is_per_context():
+    pool = _pool(FakePlaywright(), size=1)
+
+    async def run():
+        blocked = await pool.acquire(block_resources=["image", "font"])
+        plain = await pool.acquire()
+        image, script = FakeRoute("image"), FakeRoute("script")
+        await blocked.context.routes[0](image)
+        await blocked.context.routes[0](script)
+        return image, script, plain
+
+    image, script, plain = asyncio.run(run())
+
+    assert image.outcome == "abort"
+    assert script.outcome == "fallback"
+    assert plain.context.routes == []
+
+
+def test_shared_pool_of_a_previous_loop_is_closed(monkeypatch):
+    monkeypatch.setattr(playwright_browser_pool, "_pool", None)
+    monkeypatch.setattr(playwright_browser_pool, "_pool_loop", None)
+
+    async def get_pool():
+        return playwright_browser_pool.get_browser_pool()
+
+    other_loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=other_loop.run_forever)
+    thread.start()
+    try:
+        old_pool = asyncio.run_coroutine_threadsafe(get_pool(), other_loop).result(timeout=5)
+
+        async def run():
+            new_pool = playwright_browser_pool.get_browser_pool()
+            assert new_pool is not old_pool
+            await asyncio.sleep(0.05)
+            await playwright_browser_pool.close_browser_pool()
+            return new_pool
+
+        new_pool = asyncio.run(run())
+    finally:
+        other_loop.call_soon_threadsafe(other_loop.stop)
+        thread.join()
+        other_loop.close()
+
+    assert old_pool._closed and new_pool._closed
+    assert playwright_browser_pool._pool is None
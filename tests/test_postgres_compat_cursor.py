@@ -0,0 +1,121 @@
+import pytest
+
+from core.shared import unified_db_adapter as uda
+from core.shared.unified_db_adapter import PostgresCompatCursor, _QueryPlanCache
+
+
+class FakePGCursor:
+    """Registra el SQL recibido y simula los errores de psycopg2 que se le indiquen"""
+
+    def __init__(self, fail_on=()):
+        self.statements = []
+        self.fail_on = list(fail_on)
+        self.rowcount = 1
+        self._row = None
+
+    def execute(self, sql, params=None):
+        self.statements.append((sql, params))
+        for marker, error in self.fail_on:
+            if marker in sql:
+                raise error
+        self._row = {"id": 42} if "RETURNING" in sql or sql.startswith("EXECUTE") else None
+
+    def fetchone(self):
+        return self._row
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    pass
+
+
+@pytest.fixture
+def plan_cache(monkeypatch):
+    cache = _QueryPlanCache(max_entries=2)
+    monkeypatch.setattr(uda, "_query_plan_cache", cache)
+    monkeypatch.setattr(uda, "_TABLES_WITHOUT_RETURNING", set())
+    monkeypatch.setattr(uda.config, "PG_PREPARED_STATEMENTS", False)
+    return cache
+
+
+def test_translation_is_cached_and_evicted_lru(plan_cache):
+    cursor = PostgresCompatCursor(FakePGCursor())
+
+    for _ in range(3):
+        cursor.execute("SELECT * FROM expenses WHERE id = ? AND tenant_id = ?", [1, 2])
+    cursor.execute("SELECT 1")
+    cursor.execute("SELECT 2")
+
+    assert cursor._cursor.statements[0] == ("SELECT * FROM expenses WHERE id = %s AND tenant_id = %s", (1, 2))
+    assert (plan_cache.hits, plan_cache.misses) == (2, 3)
+    stats = plan_cache.stats()
+    assert stats["cached_queries"] == 2
+    # La consulta más usada fue la menos reciente: el LRU la desalojó
+    assert sorted(q["query"] for q in stats["top_queries"]) == ["SELECT 1", "SELECT 2"]
+
+
+def test_insert_without_id_column_is_learned_and_not_retried(plan_cache):
+    error = uda.PostgresProgrammingError('column "id" does not exist LINE 1: ... RETURNING *')
+    fake = FakePGCursor(fail_on=[("(%s, %s) RETURNING", error)])
+    cursor = PostgresCompatCursor(fake)
+
+    cursor.execute("INSERT INTO expense_tags (expense_id, tag_id) VALUES (?, ?)", (1, 2))
+    assert cursor.lastrowid is None
+    assert "expense_tags" in uda._TABLES_WITHOUT_RETURNING
+
+    fake.statements.clear()
+    cursor.execute("INSERT INTO expense_tags (expense_id, tag_id) VALUES (?, ?)", (3, 4))
+    assert fake.statements == [("INSERT INTO expense_tags (expense_id, tag_id) VALUES (%s, %s)", (3, 4))]
+
+    cursor.execute("INSERT INTO expenses (amount) VALUES (?)", (10,))
+    assert fake.statements[-1][0].endswith("RETURNING *") and cursor.lastrowid == 42
+
+
+def test_prepared_statements_number_placeholders_and_keep_literal_percent(plan_cache, monkeypatch):
+    monkeypatch.setattr(uda.config, "PG_PREPARED_STATEMENTS", True)
+    monkeypatch.setattr(uda.config, "PG_PREPARE_THRESHOLD", 1)
+    fake = FakePGCursor()
+    cursor = PostgresCompatCursor(fake, FakeConnection())
+    query = "SELECT * FROM expenses WHERE description LIKE '%%s%%' AND id = ? AND tenant_id = ?"
+
+    cursor.execute(query, (1, 2))
+    cursor.execute(query, (3, 4))
+    cursor.execute(query, (5, 6))
+
+    prepares = [sql for sql, _ in fake.statements if sql.startswith("PREPARE")]
+    executes = [(sql, params) for sql, params in fake.statements if sql.startswith("EXECUTE")]
+    assert len(prepares) == 1
+    assert prepares[0].endswith("AS SELECT * FROM expenses WHERE description LIKE '%s%' AND id = $1 AND tenant_id = $2")
+    assert [params for _, params in executes] == [(3, 4), (5, 6)]
+
+
+def test_prepare_is_skipped_when_params_do_not_match_placeholders(plan_cache, monkeypatch):
+    monkeypatch.setattr(uda.config, "PG_PREPARED_STATEMENTS", True)
+    monkeypatch.setattr(uda.config, "PG_PREPARE_THRESHOLD", 0)
+    fake = FakePGCursor()
+    cursor = PostgresCompatCursor(fake, FakeConnection())
+
+    cursor.execute("SELECT * FROM expenses WHERE id = ?", (1, 2))
+
+    assert fake.statements == [("SELECT * FROM expenses WHERE id = %s", (1, 2))]
+    assert plan_cache.get("SELECT * FROM expenses WHERE id = ?").prepare_failed
+
+
+def test_failed_prepare_rolls_back_to_savepoint_and_falls_back(plan_cache, monkeypatch):
+    monkeypatch.setattr(uda.config, "PG_PREPARED_STATEMENTS", True)
+    monkeypatch.setattr(uda.config, "PG_PREPARE_THRESHOLD", 0)
+    fake = FakePGCursor(fail_on=[("PREPARE", uda.PostgresProgrammingError("cannot prepare"))])
+    cursor = PostgresCompatCursor(fake, FakeConnection())
+
+    cursor.execute("SELECT * FROM expenses WHERE id = ?", (7,))
+    cursor.execute("SELECT * FROM expenses WHERE id = ?", (8,))
+
+    sqls = [sql for sql, _ in fake.statements]
+    assert sqls[:3] == ["SAVEPOINT mcp_prepare", sqls[1], "ROLLBACK TO SAVEPOINT mcp_prepare"]
+    assert sqls[1].startswith("PREPARE")
+    assert fake.statements[3:] == [("SELECT * FROM expenses WHERE id = %s", (7,)),
+                                   ("SELECT * FROM expenses WHERE id = %s", (8,))]
+    plan = plan_cache.get("SELECT * FROM expenses WHERE id = ?")
+    assert plan.prepare_failed and not plan.prepared and plan.calls == 2
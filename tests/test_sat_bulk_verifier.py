@@ -0,0 +1,171 @@
+import asyncio
+import threading
+import time
+
+from core.sat.sat_bulk_verifier import BulkCFDIVerifier, SATStatusCache, TokenBucket, get_shared_bucket
+from core.sat.sat_cfdi_verifier import SATCFDIVerifier
+
+
+def _cfdis(count):
+    return [
+        {"uuid": f"AAAAAAAA-0000-0000-0000-{i:012d}", "rfc_emisor": "AAA010101AAA",
+         "rfc_receptor": "BBB010101BBB", "total": 100.0 + i}
+        for i in range(count)
+    ]
+
+
+class CountingVerifier(SATCFDIVerifier):
+    """Mock del SAT que cuenta consultas, concurrencia y falla de forma controlada"""
+
+    def __init__(self, latency_ms=0, transient_failures=None, permanent_errors=()):
+        super().__init__(use_mock=True, mock_latency_ms=latency_ms)
+        self.calls = []
+        self.active = 0
+        self.peak = 0
+        self.lock = threading.Lock()
+        self.transient_failures = dict(transient_failures or {})
+        self.permanent_errors = set(permanent_errors)
+
+    def check_cfdi_status(self, uuid, rfc_emisor, rfc_receptor, total):
+        with self.lock:
+            self.calls.append(uuid)
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+        try:
+            if uuid in self.permanent_errors:
+                return False, None, "Error del SAT: RFC receptor inválido"
+            with self.lock:
+                remaining = self.transient_failures.get(uuid, 0)
+                if remaining:
+                    self.transient_failures[uuid] = remaining - 1
+            if remaining:
+                return False, None, "Error al verificar CFDI: Connection timeout"
+            return super().check_cfdi_status(uuid, rfc_emisor, rfc_receptor, total)
+        finally:
+            with self.lock:
+                self.active -= 1
+
+
+def test_concurrent_rate_limited_run_matches_sequential_mock(tmp_path):
+    cfdis = _cfdis(40)
+    verifier = CountingVerifier(latency_ms=20)
+    bulk = BulkCFDIVerifier(verifier, concurrency=8, rate_per_second=200, burst=10,
+                            cache=SATStatusCache(str(tmp_path / "sat.sqlite3")))
+
+    start = time.perf_counter()
+    results, stats = asyncio.run(bulk.run(cfdis))
+    elapsed = time.perf_counter() - start
+
+    expected = {c["uuid"]: SATCFDIVerifier(use_mock=True).check_cfdi_status(**c)[1]["status"] for c in cfdis}
+    assert {uuid: info["status"] for uuid, info in results.items()} == expected
+    assert list(results) == [c["uuid"] for c in cfdis]
+    assert 1 < verifier.peak <= 8
+    assert elapsed < 40 * 0.02  # más rápido que en serie
+    assert elapsed >= (40 - 10) / 200 * 0.9  # pero respetando el token bucket
+    assert stats.verified == 40 and stats.errors == 0
+
+
+def test_token_bucket_limits_rate_after_burst():
+    async def run():
+        bucket = TokenBucket(rate=100, capacity=5)
+        start = time.perf_counter()
+        for _ in range(25):
+            await bucket.acquire()
+        return time.perf_counter() - start, bucket.waited_seconds
+
+    elapsed, waited = asyncio.run(run())
+    assert elapsed >= 0.18 and waited > 0
+
+
+def test_bucket_is_shared_across_runs_and_event_loops():
+    first = BulkCFDIVerifier(CountingVerifier(), rate_per_second=123, burst=4)
+    second = BulkCFDIVerifier(CountingVerifier(), rate_per_second=123, burst=4)
+    assert first.bucket is second.bucket is get_shared_bucket(123, 4)
+
+    bucket = TokenBucket(rate=100, capacity=5)
+    runs = [BulkCFDIVerifier(CountingVerifier(), concurrency=4, bucket=bucket) for _ in range(2)]
+    threads = [threading.Thread(target=lambda bulk=bulk: asyncio.run(bulk.run(_cfdis(15)))) for bulk in runs]
+
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    # 30 consultas entre las dos corridas contra un solo límite de 100/s con ráfaga 5
+    assert time.perf_counter() - start >= (30 - 5) / 100 * 0.9
+
+
+def test_retries_only_transient_errors(tmp_path):
+    cfdis = _cfdis(3)
+    flaky, broken, ok = (c["uuid"] for c in cfdis)
+    verifier = CountingVerifier(transient_failures={flaky: 2}, permanent_errors={broken})
+    bulk = BulkCFDIVerifier(verifier, concurrency=2, rate_per_second=0, max_attempts=4,
+                            backoff_seconds=0.001, cache=SATStatusCache(str(tmp_path / "sat.sqlite3")))
+
+    results, stats = asyncio.run(bulk.run(cfdis))
+
+    assert verifier.calls.count(flaky) == 3 and results[flaky]["status"] != "error"
+    assert verifier.calls.count(broken) == 1  # no reintentable
+    assert results[broken]["status"] == "error" and "inválido" in results[broken]["error"]
+    assert verifier.calls.count(ok) == 1
+    assert stats.retries == 2 and stats.errors == 1
+
+
+def test_cache_ttl_depends_on_status(tmp_path):
+    cache = SATStatusCache(str(tmp_path / "sat.sqlite3"))
+    now = 1_000_000.0
+    cache.put_many([
+        ("uuid-vigente", {"status": "vigente"}),
+        ("uuid-cancelado", {"status": "cancelado"}),
+        ("uuid-error", {"status": "error", "error": "timeout"}),
+    ], now=now)
+
+    assert set(cache.get_many(["uuid-vigente", "uuid-cancelado", "uuid-error"], now=now + 60)) == {
+        "uuid-vigente", "uuid-cancelado"}
+    later = cache.get_many(["uuid-vigente", "uuid-cancelado"], now=now + 8 * 86400)
+    assert set(later) == {"uuid-cancelado"}  # 'cancelado' es final, 'vigente' se vuelve a consultar
+
+
+def test_interrupted_run_resumes_from_checkpoint(tmp_path):
+    cfdis = _cfdis(30)
+    cache_path = str(tmp_path / "sat.sqlite3")
+
+    async def interrupted():
+        verifier = CountingVerifier(latency_ms=5)
+        bulk = BulkCFDIVerifier(verifier, concurrency=2, rate_per_second=0,
+                                cache=SATStatusCache(cache_path), checkpoint_every=5)
+        task = asyncio.create_task(bulk.run(cfdis, run_id="mensual-2"))
+        while len(verifier.calls) < 12:
+            await asyncio.sleep(0.002)
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+        return verifier
+
+    first = asyncio.run(interrupted())
+    checkpointed = SATStatusCache(cache_path).load_checkpoint("mensual-2")
+    assert len(checkpointed) >= 10
+
+    # force_refresh: solo el checkpoint evita repetir consultas
+    second = CountingVerifier()
+    bulk = BulkCFDIVerifier(second, concurrency=4, rate_per_second=0, cache=SATStatusCache(cache_path))
+    results, stats = asyncio.run(bulk.run(cfdis, run_id="mensual-2", force_refresh=True))
+
+    assert stats.resumed == len(checkpointed)
+    assert set(second.calls).isdisjoint(checkpointed)
+    assert len(results) == 30 and all(info["status"] != "error" for info in results.values())
+    assert SATStatusCache(cache_path).load_checkpoint("mensual-2") == {}
+    assert len(first.calls) < 30
+
+
+def test_verify_multiple_cfdis_keeps_sync_api_in_mock_mode():
+    verifier = SATCFDIVerifier(use_mock=True)
+    cfdis = _cfdis(5)
+
+    results = verifier.verify_multiple_cfdis(cfdis, rate_per_second=0)
+
+    assert list(results) == [c["uuid"] for c in cfdis]
+    assert verifier.last_bulk_stats.verified == 5 and verifier.last_bulk_stats.cached == 0
@@ -0,0 +1,91 @@
+import asyncio
+import io
+import zipfile
+from types import SimpleNamespace
+
+from core.sat.sat_descarga_service import SATDescargaService
+
+
+def _cfdi(uuid, total="116.00", rfc="AAA010101AAA"):
+    return f"""<?xml version="1.0" encoding="UTF-8"?>
+<cfdi:Comprobante xmlns:cfdi="http://www.sat.gob.mx/cfd/4" xmlns:tfd="http://www.sat.gob.mx/TimbreFiscalDigital"
+    Version="4.0" Fecha="2025-02-01T10:00:00" SubTotal="100.00" Total="{total}" Moneda="MXN">
+  <cfdi:Emisor Rfc="{rfc}" Nombre="Proveedor SA" RegimenFiscal="601"/>
+  <cfdi:Receptor Rfc="XAXX010101000" Nombre="Cliente"/>
+  <cfdi:Impuestos>
+    <cfdi:Traslados><cfdi:Traslado Impuesto="002" TipoFactor="Tasa" TasaOCuota="0.160000" Importe="16.00"/></cfdi:Traslados>
+  </cfdi:Impuestos>
+  <cfdi:Complemento><tfd:TimbreFiscalDigital UUID="{uuid}"/></cfdi:Complemento>
+</cfdi:Comprobante>""".encode("utf-8")
+
+
+class FakeProcessor:
+    def __init__(self, existing):
+        self.existing = existing
+        self.batches = []
+
+    async def find_existing_uuids(self, company_id, uuids):
+        return {u.upper() for u in uuids if u.upper() in self.existing}
+
+    async def create_batch(self, company_id, invoices, batch_metadata=None, created_by=None):
+        batch = SimpleNamespace(batch_id=f"b{len(self.batches)}", items=invoices, company_id=company_id)
+        self.batches.append(batch)
+        return batch
+
+    async def process_batch(self, batch_id, preloaded_batch=None):
+        preloaded_batch.processed_count = len(preloaded_batch.items)
+        preloaded_batch.errors_count = 0
+        return preloaded_batch
+
+
+def test_package_is_processed_in_deduplicated_chunks():
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as zf:
+        zf.writestr("a.xml", _cfdi("uuid-a"))
+        zf.writestr("b.xml", _cfdi("UUID-B"))
+        zf.writestr("c.xml", _cfdi("uuid-c"))
+        zf.writestr("a-again.xml", _cfdi("UUID-A"))
+        zf.writestr("broken.xml", b"<cfdi:Comprobante")
+        zf.writestr("readme.txt", b"ignored")
+    buffer.seek(0)
+
+    service = SATDescargaService(db_session=None, use_mock=True)
+    processor = FakeProcessor(existing={"UUID-B"})
+
+    with zipfile.ZipFile(buffer) as zip_file:
+        assert service._count_xmls_in_zip(zip_file) == 5
+        result = asyncio.run(service._process_cfdi_stream(
+            zip_file, company_id=3, package_id=9, chunk_size=2, processor=processor
+        ))
+
+    assert result["inserted"] == 2
+    assert result["duplicates"] == 2
+    assert result["errors"] == 1
+    assert [[inv["uuid"] for inv in b.items] for b in processor.batches] == [["uuid-a"], ["uuid-c"]]
+    first = processor.batches[0].items[0]
+    assert first["provider_rfc"] == "AAA010101AAA"
+    assert first["issued_date"] == "2025-02-01T10:00:00"
+    assert first["iva_amount"] == 16.0
+    assert processor.batches[0].company_id == "3"
+
+
+def test_chunk_parse_records_unexpected_errors_per_file(monkeypatch):
+    from core.sat import sat_descarga_service
+
+    real = sat_descarga_service._cfdi_to_invoice
+
+    def flaky(filename, content):
+        if filename == "bad.xml":
+            raise ValueError("could not convert string to float: '1,16'")
+        return real(filename, content)
+
+    monkeypatch.setattr(sat_descarga_service, "_cfdi_to_invoice", flaky)
+
+    invoices, errors = sat_descarga_service._parse_cfdi_chunk([
+        ("ok.xml", _cfdi("uuid-ok")),
+        ("bad.xml", _cfdi("uuid-bad")),
+        ("ok2.xml", _cfdi("uuid-ok2")),
+    ])
+
+    assert [inv["uuid"] for inv in invoices] == ["uuid-ok", "uuid-ok2"]
+    assert errors == [{"filename": "bad.xml", "error": "could not convert string to float: '1,16'"}]
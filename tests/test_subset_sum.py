@@ -0,0 +1,118 @@
+"""
+Subset-sum engine for split reconciliation suggestions.
+
+Run with ``pytest tests/test_subset_sum.py -s`` to see query latency for
+candidate pools of 50–200 items.
+"""
+import random
+import time
+from datetime import datetime, timedelta
+from itertools import combinations
+
+from core.reconciliation.matching.ai_reconciliation_service import AIReconciliationService
+from core.reconciliation.matching.bank_reconciliation import _combine_movements
+from core.reconciliation.matching.subset_sum import find_subset_sums, to_cents
+
+
+def _pool(count, seed=11):
+    rng = random.Random(seed)
+    return [rng.randint(5_000, 400_000) for _ in range(count)], [rng.randint(0, 90) for _ in range(count)]
+
+
+def _brute_force(amounts, target, tolerance, sizes, days, max_span):
+    found = set()
+    for size in sizes:
+        for combo in combinations(range(len(amounts)), size):
+            if abs(sum(amounts[i] for i in combo) - target) > tolerance:
+                continue
+            combo_days = [days[i] for i in combo]
+            if max(combo_days) - min(combo_days) > max_span:
+                continue
+            found.add(tuple(sorted(combo)))
+    return found
+
+
+def test_engine_finds_exactly_the_brute_force_feasible_sets():
+    amounts, days = _pool(28)
+    target = amounts[3] + amounts[9] + amounts[20]
+
+    result = find_subset_sums(
+        amounts, target, tolerance_cents=2_000, min_size=2, max_size=4,
+        days=days, max_span_days=45, top_k=10_000, time_budget_ms=0,
+    )
+
+    expected = _brute_force(amounts, target, 2_000, (2, 3, 4), days, 45)
+    assert {tuple(sorted(m.indices)) for m in result.matches} == expected
+    assert result.feasible == len(expected) and not result.timed_out
+    diffs = [m.diff_cents for m in result.matches]
+    assert diffs == sorted(diffs)  # default ranking: closest first
+
+
+def test_time_budget_returns_best_found_so_far():
+    amounts, _ = _pool(200, seed=3)
+    result = find_subset_sums(amounts, 600_000, tolerance_cents=30_000, max_size=5, top_k=3, time_budget_ms=5)
+    assert result.timed_out
+    assert 0 < len(result.matches) <= 3
+    assert all(m.diff_cents <= 30_000 for m in result.matches)
+
+
+def test_one_to_many_finds_split_the_greedy_pick_missed():
+    base = datetime(2025, 3, 10)
+    expenses = [
+        {"id": i, "description": f"Gasto {i}", "amount": amount, "date": (base + timedelta(days=i)).isoformat()}
+        for i, amount in enumerate([120.0, 455.30, 980.10, 333.33, 2_000.0, 89.90, 1_250.55])
+    ]
+    service = AIReconciliationService(db_path=":memory:")
+
+    combos = service._find_expense_combinations(expenses, 1_525.30, base, "Pago proveedor")
+
+    assert combos
+    best = combos[0]
+    assert sorted(e["id"] for e in best["manual_expenses"]) == [1, 2, 5]
+    assert best["amount_diff"] == 0.0
+    assert best["breakdown"]["amount_match"] == 100.0
+
+
+def test_combine_movements_ranks_exact_split_first():
+    movements = [
+        {"movement_id": f"m{i}", "amount": amount, "movement_date": f"2025-04-{(i % 9) + 1:02d}",
+         "description": "CARGO TIENDA", "tags": []}
+        for i, amount in enumerate([410.25, 199.99, 840.00, 55.10, 300.00, 1_000.00, 633.75, 77.77])
+    ]
+    expense = {"amount": 1_884.00, "date": "2025-04-05", "description": "Compra tienda"}
+
+    suggestions = _combine_movements(movements, 1_884.00, "2025-04-05", "Compra tienda", expense)
+
+    # (m2, m3, m5) suma 1,895.10: dentro de tolerancia pero con menor score de monto
+    assert [s["movement_ids"] for s in suggestions] == [["m0", "m2", "m6"], ["m2", "m3", "m5"]]
+    top = suggestions[0]
+    assert top["combined_amount"] == 1_884.00 and top["reasons"][0] == "Pago en 3 cargos"
+    assert top["confidence"] > suggestions[1]["confidence"]
+    assert len({s["group_id"] for s in suggestions}) == len(suggestions)
+
+
+def test_benchmark_candidate_pools_50_to_200():
+    rng = random.Random(21)
+    rows = []
+    for count in (50, 100, 200):
+        amounts = [to_cents(rng.uniform(50, 5_000)) for _ in range(count)]
+        planted = tuple(sorted(rng.sample(range(count), 4)))
+        target = sum(amounts[i] for i in planted)
+
+        # Hasta 4 partidas: búsqueda completa, el split plantado siempre aparece
+        exact = find_subset_sums(amounts, target, max_size=4, top_k=500, time_budget_ms=0)
+        assert planted in {tuple(sorted(m.indices)) for m in exact.matches}
+        assert all(m.diff_cents == 0 for m in exact.matches)
+
+        # Hasta 5 partidas con el presupuesto por defecto: se corta a tiempo con lo mejor encontrado
+        start = time.perf_counter()
+        budgeted = find_subset_sums(amounts, target, max_size=5, top_k=5)
+        elapsed = (time.perf_counter() - start) * 1000
+        assert budgeted.matches and all(m.diff_cents == 0 for m in budgeted.matches)
+
+        rows.append(
+            f"{count} items: <=4 exhaustive {exact.elapsed_ms:.1f}ms ({exact.feasible} exact sets) | "
+            f"<=5 budgeted {elapsed:.1f}ms, {budgeted.nodes:,} nodes, timed_out={budgeted.timed_out}"
+        )
+
+    print("\n" + "\n".join(rows))
@@ -0,0 +1,137 @@
+import asyncio
+import threading
+import time
+from datetime import datetime, timedelta
+
+from core.worker_system import TaskPriority, WorkerSystem
+
+
+def _system(tmp_path):
+    # WorkerSystem es singleton; para tests se crea una instancia aislada
+    system = object.__new__(WorkerSystem)
+    system.__init__()
+    system.worker_pool.db_path = str(tmp_path / "workers.db")
+    return system
+
+
+def test_tasks_run_by_priority_then_deadline(tmp_path):
+    system = _system(tmp_path)
+    order = []
+
+    async def handler(task, update_progress):
+        order.append(task.task_data["name"])
+        return {}
+
+    async def run():
+        system.register_task_type("job", handler)
+        await system.create_worker({"capabilities": ["job"], "max_concurrent_tasks": 1})
+        soon = datetime.utcnow() + timedelta(minutes=1)
+        ids = [
+            await system.submit_task("job", {"name": "low"}, priority=TaskPriority.LOW),
+            await system.submit_task("job", {"name": "high"}, priority=TaskPriority.HIGH),
+            await system.submit_task("job", {"name": "normal"}),
+            await system.submit_task("job", {"name": "high-due"}, priority=TaskPriority.HIGH, deadline=soon),
+        ]
+        await system.start()
+        for task_id in ids:
+            await system.wait_for_task(task_id, timeout=2)
+        await system.stop()
+
+    asyncio.run(run())
+
+    assert order == ["high-due", "high", "normal", "low"]
+
+
+def test_per_task_type_concurrency_limit(tmp_path):
+    system = _system(tmp_path)
+    active = {"portal": 0, "fast": 0}
+    peak = {"portal": 0, "fast": 0}
+
+    async def handler(task, update_progress):
+        kind = task.task_type
+        active[kind] += 1
+        peak[kind] = max(peak[kind], active[kind])
+        await asyncio.sleep(0.02)
+        active[kind] -= 1
+        return {}
+
+    async def run():
+        system.register_task_type("portal", handler, max_concurrency=1)
+        system.register_task_type("fast", handler)
+        await system.start()
+        await system.create_worker({"capabilities": ["portal", "fast"], "max_concurrent_tasks": 4})
+        ids = [await system.submit_task(kind, {}) for kind in ["portal"] * 3 + ["fast"] * 3]
+        await asyncio.gather(*(system.wait_for_task(task_id, timeout=2) for task_id in ids))
+        status = await system.get_system_status()
+        await system.stop()
+        return status
+
+    status = asyncio.run(run())
+
+    assert peak == {"portal": 1, "fast": 3}
+    normal = status["pool_status"]["priority_metrics"]["NORMAL"]
+    assert normal["completed"] == 6 and normal["queue_depth"] == 0
+    assert normal["wait_time_ms"]["max"] > 0 and normal["run_time_ms"]["p50"] > 0
+
+
+def test_blocking_handler_is_offloaded_and_status_is_reported(tmp_path):
+    system = _system(tmp_path)
+    threads = []
+
+    def blocking_handler(task_data):
+        threads.append(threading.current_thread().name)
+        time.sleep(0.05)
+        return {"total": task_data["a"] + task_data["b"]}
+
+    async def run():
+        system.register_task_type("sum", blocking_handler, blocking=True)
+        await system.start()
+        await system.create_worker({"capabilities": ["sum"]})
+        task_id = await system.submit_task("sum", {"a": 2, "b": 3}, priority=TaskPriority.URGENT)
+
+        ticks = 0
+        while (await system.get_task_status(task_id))["status"] != "completed":
+            ticks += 1  # el loop sigue libre mientras corre el handler
+            await asyncio.sleep(0.005)
+        status = await system.get_task_status(task_id)
+        result = system.worker_pool.tasks[task_id].result
+        await system.stop()
+        return ticks, status, result
+
+    ticks, status, result = asyncio.run(run())
+
+    assert ticks > 1
+    assert threads[0].startswith("worker-blocking")
+    assert result == {"total": 5}
+    assert status["progress"]["percentage"] == 100.0
+    assert status["assigned_worker_id"] and status["retry_policy"]["max_attempts"] == 3
+
+
+def test_timeout_and_scheduled_tasks(tmp_path):
+    system = _system(tmp_path)
+
+    async def slow(task, update_progress):
+        await asyncio.sleep(1)
+
+    async def quick(task, update_progress):
+        return {"ok": True}
+
+    async def run():
+        system.register_task_type("slow", slow)
+        system.register_task_type("quick", quick)
+        await system.start()
+        await system.create_worker({"capabilities": ["slow", "quick"]})
+        slow_id = await system.submit_task("slow", {}, timeout_seconds=0.01)
+        later = datetime.utcnow() + timedelta(milliseconds=50)
+        quick_id = await system.submit_task("quick", {}, scheduled_for=later)
+        before = (await system.get_task_status(quick_id))["status"]
+        slow_status = await system.wait_for_task(slow_id, timeout=2)
+        quick_status = await system.wait_for_task(quick_id, timeout=2)
+        await system.stop()
+        return before, slow_status, quick_status
+
+    before, slow_status, quick_status = asyncio.run(run())
+
+    assert before == "pending"
+    assert slow_status["status"] == "timeout"
+    assert quick_status["status"] == "completed"